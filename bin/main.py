@@ -1,11 +1,13 @@
 import uvicorn
 from fastapi import FastAPI
-from polymanager.containers import CoreContainer
+from polymanager.containers import CoreContainer, ClickhouseContainer, SpoolContainer, IngestionContainer
 from polymanager.routers import dgraph
 from polymanager.routers import manticoresearch
 from polymanager.routers import clickhouse
 from polymanager.routers import arangodb
 from polymanager.routers import global_api
+from polymanager.routers import composite
+from polymanager.routers import federated
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
 from polymanager.helper.conf_helper import load_env
 from fastapi.routing import APIRoute
@@ -42,22 +44,41 @@ class PolyglotDataManager:
             if datastore == "manticoresearch":
                 internal_schema = KVRocksInternalSchema( "manticoresearch")
                 app.include_router(manticoresearch.router)
+                #search then read the records of the hits in a graph collection
+                app.include_router(federated.router)
             elif datastore == "dgraph":
                 internal_schema = KVRocksInternalSchema("dgraph")
                 app.include_router(dgraph.router)
             elif datastore == "clickhouse":
                 internal_schema = KVRocksInternalSchema( "clickhouse")
                 app.include_router(clickhouse.router)
+                #flush pending inserts before stopping
+                app.add_event_handler("shutdown", ClickhouseContainer.buffers().close)
+                app.add_event_handler("shutdown", ClickhouseContainer.delete_buffers().close)
             elif datastore == "arangodb":
                 internal_schema = KVRocksInternalSchema( "arangodb")
                 app.include_router(arangodb.router)
+
+        #replay the batches spooled before the last stop
+        if CoreContainer.config.spool_dir():
+            SpoolContainer.spools().recover()
+            app.add_event_handler("shutdown", SpoolContainer.spools().close)
+
+        #the consumers of the ingestion queue write the batches queued by all nodes
+        if CoreContainer.config.ingest_queue():
+            IngestionContainer.queue().start()
+            app.add_event_handler("shutdown", IngestionContainer.queue().close)
         
+        #composite collections write to the collections of the other datastores
+        app.include_router(composite.router)
+
         #check node type (chief or worker )
         if CoreContainer.config.node_type() == "worker":
             excluded_schema_handlers = ["add_clickhouse_collection", "delete_clickhouse_collection",
             "add_dgraph_collection", "delete_dgraph_collection",
             "add_manticore_collection", "delete_manticore_collection",
-            "add_arangodb_collection", "delete_arangodb_collection"]
+            "add_arangodb_collection", "delete_arangodb_collection",
+            "add_composite_collection", "delete_composite_collection"]
             routes_to_exclude = [r for r in app.routes if r.name in excluded_schema_handlers]
             for x in routes_to_exclude:
                 app.routes.remove(x)
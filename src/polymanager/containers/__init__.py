@@ -4,3 +4,5 @@ from polymanager.containers.dgraph_container import DGraphContainer
 from polymanager.containers.manticore_container import ManticoreContainer
 from polymanager.containers.clickhouse_container import ClickhouseContainer
 from polymanager.containers.arangodb_container import ArangoDBContainer
+from polymanager.containers.spool_container import SpoolContainer
+from polymanager.containers.ingestion_container import IngestionContainer
@@ -1,13 +1,23 @@
 from dependency_injector import containers, providers
 from polymanager.containers.core_container import CoreContainer
 from polymanager.core.arangodb.arangodb_handler import ArangoDBHandler
+from polymanager.core.arangodb.async_arangodb_handler import AsyncArangoDBHandler
 
 class ArangoDBContainer(containers.DeclarativeContainer):
 
-    handler : ArangoDBHandler = providers.Factory(
+    handler : ArangoDBHandler = providers.ThreadSafeSingleton(
             ArangoDBHandler,
             hostname=CoreContainer.config.arangodb_hostname,
             port=CoreContainer.config.arangodb_port,
             user=CoreContainer.config.arangodb_user,
-            password=CoreContainer.config.arangodb_password
+            password=CoreContainer.config.arangodb_password,
+            pool_size=CoreContainer.config.arangodb_pool_size,
+            chunk_size=CoreContainer.config.arangodb_chunk_size,
+            wait_for_sync=CoreContainer.config.arangodb_wait_for_sync
+        )
+
+    async_handler : AsyncArangoDBHandler = providers.ThreadSafeSingleton(
+            AsyncArangoDBHandler,
+            handler,
+            pool_size=CoreContainer.config.arangodb_pool_size
         )
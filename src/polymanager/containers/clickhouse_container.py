@@ -1,11 +1,37 @@
 from dependency_injector import containers, providers
 from polymanager.containers.core_container import CoreContainer
 from polymanager.core.clickchouse.clickhouse_handler import ClickhouseHandler
+from polymanager.core.clickchouse.async_clickhouse_handler import AsyncClickhouseHandler
+from polymanager.core.clickchouse.insert_buffer import InsertBufferRegistry
+from polymanager.core.clickchouse.delete_buffer import DeleteBufferRegistry
+from polymanager.containers.redis_container import RedisContainer
+from polymanager.helper.lock_helper import KVRocksLock
 
 class ClickhouseContainer(containers.DeclarativeContainer):
 
-    handler : ClickhouseHandler = providers.Factory(
+    handler : ClickhouseHandler = providers.ThreadSafeSingleton(
             ClickhouseHandler,
             hostname=CoreContainer.config.clickhouse_hostname,
-            port=CoreContainer.config.clickhouse_port
+            port=CoreContainer.config.clickhouse_port,
+            pool_size=CoreContainer.config.clickhouse_pool_size,
+            insert_format=CoreContainer.config.clickhouse_insert_format,
+            compression=CoreContainer.config.clickhouse_compression,
+            delete_mode=CoreContainer.config.clickhouse_delete_mode
         )
+
+    async_handler : AsyncClickhouseHandler = providers.ThreadSafeSingleton(
+            AsyncClickhouseHandler,
+            handler,
+            pool_size=CoreContainer.config.clickhouse_pool_size
+        )
+
+    buffers : InsertBufferRegistry = providers.ThreadSafeSingleton(InsertBufferRegistry, handler)
+
+    delete_buffers : DeleteBufferRegistry = providers.ThreadSafeSingleton(
+            DeleteBufferRegistry,
+            handler,
+            window_ms=CoreContainer.config.clickhouse_delete_window_ms
+        )
+
+    #the updates of a CollapsingMergeTree document read its state, they are serialised by id in all the processes
+    update_locks : KVRocksLock = providers.ThreadSafeSingleton(KVRocksLock, RedisContainer.db.provider, prefix="polymanager:lock:clickhouse")
@@ -2,6 +2,7 @@ from dependency_injector import containers, providers
 from polymanager.core.dgraph.dgraph_conn import DGraphConn
 from polymanager.containers.core_container import CoreContainer
 from polymanager.core.dgraph.dgraph_handler import DGraphHandler
+from polymanager.core.dgraph.async_dgraph_handler import AsyncDGraphHandler
 
 class DGraphContainer(containers.DeclarativeContainer):
 
@@ -11,4 +12,13 @@ class DGraphContainer(containers.DeclarativeContainer):
         port=CoreContainer.config.dgraph_port
     )
 
-    handler : DGraphHandler = providers.Factory(DGraphHandler, conn, dgraph_admin=CoreContainer.config.dgraph_addresses, dgraph_admin_port=CoreContainer.config.dgraph_admin_port)
+    handler : DGraphHandler = providers.Factory(
+            DGraphHandler,
+            conn,
+            dgraph_admin=CoreContainer.config.dgraph_addresses,
+            dgraph_admin_port=CoreContainer.config.dgraph_admin_port,
+            chunk_size=CoreContainer.config.dgraph_chunk_size,
+            parallel_txns=CoreContainer.config.dgraph_parallel_txns
+        )
+
+    async_handler : AsyncDGraphHandler = providers.ThreadSafeSingleton(AsyncDGraphHandler, handler)
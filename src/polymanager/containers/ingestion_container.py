@@ -0,0 +1,41 @@
+from dependency_injector import containers, providers
+from polymanager.containers.core_container import CoreContainer
+from polymanager.containers.clickhouse_container import ClickhouseContainer
+from polymanager.containers.manticore_container import ManticoreContainer
+from polymanager.containers.dgraph_container import DGraphContainer
+from polymanager.containers.arangodb_container import ArangoDBContainer
+from polymanager.core.ingestion_queue import IngestionQueue
+import redis
+
+class IngestionContainer(containers.DeclarativeContainer):
+
+    #the consumers block on their reads, they do not share the connections of the api
+    pool : redis.BlockingConnectionPool = providers.ThreadSafeSingleton(
+            redis.BlockingConnectionPool,
+            host=CoreContainer.config.kvrocks_hostname,
+            port=CoreContainer.config.kvrocks_port,
+            max_connections=CoreContainer.config.ingest_pool_size
+    )
+
+    db : redis.Redis = providers.Factory(
+            redis.Redis,
+            connection_pool=pool
+    )
+
+    queue : IngestionQueue = providers.ThreadSafeSingleton(
+            IngestionQueue,
+            db.provider,
+            handlers=providers.Dict(
+                clickhouse=ClickhouseContainer.handler.provider,
+                manticoresearch=ManticoreContainer.handler.provider,
+                dgraph=DGraphContainer.handler.provider,
+                arangodb=ArangoDBContainer.handler.provider
+            ),
+            connectors=CoreContainer.config.ingest_connectors,
+            enabled=CoreContainer.config.ingest_queue,
+            consumers=CoreContainer.config.ingest_consumers,
+            batch_size=CoreContainer.config.ingest_batch_size,
+            claim_idle_ms=CoreContainer.config.ingest_claim_idle_ms,
+            max_deliveries=CoreContainer.config.ingest_max_deliveries,
+            max_len=CoreContainer.config.ingest_max_len
+        )
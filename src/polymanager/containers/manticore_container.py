@@ -1,11 +1,28 @@
 from dependency_injector import containers, providers
 from polymanager.containers.core_container import CoreContainer
 from polymanager.core.manticore.manticore_handler import ManticoreHandler
+from polymanager.core.manticore.async_manticore_handler import AsyncManticoreHandler
+from polymanager.core.manticore.search_cache import SearchCache
 
 class ManticoreContainer(containers.DeclarativeContainer):
 
-    handler : ManticoreHandler = providers.Factory(
+    handler : ManticoreHandler = providers.ThreadSafeSingleton(
             ManticoreHandler,
             hostname=CoreContainer.config.manticoresearch_hostname,
             port=CoreContainer.config.manticoresearch_port,
+            pool_size=CoreContainer.config.manticoresearch_pool_size,
+            bulk_max_bytes=CoreContainer.config.manticoresearch_bulk_max_bytes,
+            bulk_chunked=CoreContainer.config.manticoresearch_bulk_chunked
+        )
+
+    async_handler : AsyncManticoreHandler = providers.ThreadSafeSingleton(
+            AsyncManticoreHandler,
+            handler,
+            pool_size=CoreContainer.config.manticoresearch_pool_size
+        )
+
+    search_cache : SearchCache = providers.ThreadSafeSingleton(
+            SearchCache,
+            max_size=CoreContainer.config.manticoresearch_search_cache_size,
+            ttl_ms=CoreContainer.config.manticoresearch_search_cache_ttl_ms
         )
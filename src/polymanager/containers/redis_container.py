@@ -1,11 +1,20 @@
 from dependency_injector import containers, providers
 from polymanager.containers.core_container import CoreContainer
+from polymanager.schemas.schema_cache import SchemaCache
 import redis
 
 class RedisContainer(containers.DeclarativeContainer):
 
+    pool : redis.BlockingConnectionPool = providers.ThreadSafeSingleton(
+            redis.BlockingConnectionPool,
+            host=CoreContainer.config.kvrocks_hostname,
+            port=CoreContainer.config.kvrocks_port,
+            max_connections=CoreContainer.config.kvrocks_pool_size
+    )
+
     db : redis.Redis = providers.Factory(
             redis.Redis,
-            host=CoreContainer.config.kvrocks_hostname,
-            port=CoreContainer.config.kvrocks_port
-    )
\ No newline at end of file
+            connection_pool=pool
+    )
+
+    schema_cache : SchemaCache = providers.Singleton(SchemaCache, db.provider)
@@ -0,0 +1,24 @@
+from dependency_injector import containers, providers
+from polymanager.containers.core_container import CoreContainer
+from polymanager.containers.clickhouse_container import ClickhouseContainer
+from polymanager.containers.manticore_container import ManticoreContainer
+from polymanager.containers.dgraph_container import DGraphContainer
+from polymanager.containers.arangodb_container import ArangoDBContainer
+from polymanager.core.spool import SpoolRegistry
+
+class SpoolContainer(containers.DeclarativeContainer):
+
+    spools : SpoolRegistry = providers.ThreadSafeSingleton(
+            SpoolRegistry,
+            directory=CoreContainer.config.spool_dir,
+            handlers=providers.Dict(
+                clickhouse=ClickhouseContainer.handler.provider,
+                manticoresearch=ManticoreContainer.handler.provider,
+                dgraph=DGraphContainer.handler.provider,
+                arangodb=ArangoDBContainer.handler.provider
+            ),
+            connectors=CoreContainer.config.spool_connectors,
+            segment_bytes=CoreContainer.config.spool_segment_bytes,
+            max_bytes=CoreContainer.config.spool_max_bytes,
+            max_attempts=CoreContainer.config.spool_max_attempts
+        )
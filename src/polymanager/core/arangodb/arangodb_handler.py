@@ -1,36 +1,66 @@
 
 import logging
-import requests
 from pyArango.connection import Connection
 from polymanager.core.graph_handler import GraphHandler
+from polymanager.helper.pool_helper import create_session, get_session_stats
 import uuid
 import json
 from tenacity import retry, wait_fixed, stop_after_attempt
 
+TRAVERSAL_DIRECTIONS = {"outbound": "OUTBOUND", "inbound": "INBOUND", "any": "ANY"}
+
+REMOVE_DOCUMENTS_QUERY = "FOR k IN @keys REMOVE k IN @@collection OPTIONS { ignoreErrors: true } RETURN OLD._key"
+
+GET_DOCUMENTS_QUERY = "FOR doc IN DOCUMENT(@collection, @keys) RETURN UNSET(doc, \"_rev\")"
+
+GET_DOCUMENTS_FIELDS_QUERY = "FOR doc IN DOCUMENT(@collection, @keys) RETURN KEEP(doc, @fields)"
+
+UPSERT_EDGES_QUERY = """
+FOR edge IN @edges
+    UPSERT { _from: edge._from, _to: edge._to }
+    INSERT edge
+    UPDATE UNSET(edge, "_key")
+    IN @@collection
+    RETURN { _key: NEW._key, _id: NEW._id }
+"""
+
 class ArangoDBHandler(GraphHandler):
 
     @retry(wait=wait_fixed(10), stop=stop_after_attempt(18))
     def get_conn(self):
-        return Connection(arangoURL=self.url,
+        conn = Connection(arangoURL=self.url,
         username=self.user, password=self.password, max_retries=10)
+        #pyArango shares the keep-alive pool of this handler
+        conn.session.session = create_session(adapter=self.session.get_adapter("http://"))
+        return conn
     
     def __init__(
                 self,
                 hostname="127.0.0.1",
                 port="8529",
                 user="root",
-                password=""
+                password="",
+                pool_size=10,
+                chunk_size=1000,
+                wait_for_sync=False
                 ):
         self._hostname = hostname
         self._port = port
         self.user = user
         self.password = password
         self.url = "http://{}:{}".format(self._hostname, self._port)
+        self.session = create_session(pool_size, max_retries=10)
+        self.session.auth = (self.user, self.password)
+        self.chunk_size = chunk_size
+        self.wait_for_sync = wait_for_sync
         self.conn = self.get_conn() 
         self._log = logging.getLogger(__name__)
 
+    def get_pool_stats(self):
+        return get_session_stats(self.session)
+
     def get_health(self):
-        res = requests.get(self.url+"/_db/_system/_admin/server/availability", timeout=5)
+        res = self.session.get(self.url+"/_db/_system/_admin/server/availability", timeout=5)
         return json.loads(res.text)
 
     def create_indexes(self, collection, collection_opts):
@@ -55,24 +85,24 @@ class ArangoDBHandler(GraphHandler):
         db_name = schema.get_namespace()
         if not self.conn.hasDatabase(db_name):
             self.conn.createDatabase(db_name)
-        self.db = self.conn[db_name]
+        db = self.conn[db_name]
         collection = None
         collection_opts = schema.get_global_collection_opts()
         if collection_opts:
             if collection_opts["edge_collection"]:
-                collection = self.db.createCollection("Edges", name=schema.get_collection_name())
+                collection = db.createCollection("Edges", name=schema.get_collection_name())
             else:
-                collection = self.db.createCollection(name=schema.get_collection_name())
+                collection = db.createCollection(name=schema.get_collection_name())
         else:
-            collection = self.db.createCollection(name=schema.get_collection_name())
+            collection = db.createCollection(name=schema.get_collection_name())
         
         if collection_opts:
             self.create_indexes(collection, collection_opts)
 
     def delete_schema(self, schema):
         db_name = schema.get_namespace()
-        self.db = self.conn[db_name]
-        collection = self.db[schema.get_collection_name()]
+        db = self.conn[db_name]
+        collection = db[schema.get_collection_name()]
         collection.delete()
 
         
@@ -80,28 +110,71 @@ class ArangoDBHandler(GraphHandler):
         for db in self.conn.databases.keys():
             if db == "_system":
                 continue
-            session = requests.Session()
-            session.auth = (self.user, self.password)
-            session.delete(self.url+"/_api/database/"+db)
+            self.session.delete(self.url+"/_api/database/"+db)
+
+    def add_nodes(self, namespace, collection_name, list_nodes, ref_node, keys=None, overwrite_mode=None, wait_for_sync=None):
+        '''
+        insert nodes with one request per chunk of chunk_size nodes
+
+        :param keys: the keys of the nodes, uuid4 keys are generated by default
+        :param overwrite_mode: what to do when a key already exists (ignore, replace, update or conflict)
+        :param wait_for_sync: True to wait until the nodes are synced to disk
+
+        :return: a {_key, _id} dict for every node in the order of list_nodes,
+        with an error message for the nodes that were not inserted
+        '''
+        documents = self.build_node_documents(list_nodes, keys)
+        ids = []
+        for index in range(0, len(documents), self.chunk_size):
+            chunk = documents[index:index + self.chunk_size]
+            results = self.insert_documents(namespace, collection_name, chunk, overwrite_mode, wait_for_sync)
+            ids.extend(self.get_node_ids(collection_name, chunk, results))
+        return ids
+
+    def build_node_documents(self, list_nodes, keys=None):
+        if keys is None:
+            keys = [str(uuid.uuid4()) for node in list_nodes]
+        documents = []
+        for key, node in zip(keys, list_nodes):
+            document = dict(node)
+            document["_key"] = key
+            documents.append(document)
+        return documents
 
-    def add_nodes(self, namespace, collection_name, list_nodes, ref_node):
-        self.db = self.conn[namespace]
-        collection = self.db[collection_name]
+    def get_node_ids(self, collection_name, documents, results):
         ids = []
-        for node in list_nodes:
-            doc = collection.createDocument()
-            doc.set(node)
-            key = str(uuid.uuid4())
-            doc._key = key
-            doc.save()
-            arangodb_id = "{}/{}".format(collection_name, key)
-            node = {"_key": key, "_id": arangodb_id}
+        for document, result in zip(documents, results):
+            node = {"_key": document["_key"], "_id": "{}/{}".format(collection_name, document["_key"])}
+            if result.get("error"):
+                node["error"] = result.get("errorMessage")
             ids.append(node)
         return ids
 
+    def insert_documents(self, namespace, collection_name, documents, overwrite_mode=None, wait_for_sync=None):
+        '''
+        insert a list of documents with the array api of arangodb
+
+        :return: the result of every document, with error and errorMessage for the failed ones
+        '''
+        res = self.session.post(
+            "{}/_db/{}/_api/document/{}".format(self.url, namespace, collection_name),
+            params=self.build_insert_params(overwrite_mode, wait_for_sync),
+            data=json.dumps(documents))
+        if res.status_code not in [200, 201, 202]:
+            raise Exception(res.text)
+        return res.json()
+
+    def build_insert_params(self, overwrite_mode=None, wait_for_sync=None):
+        if wait_for_sync is None:
+            wait_for_sync = self.wait_for_sync
+        params = {"waitForSync": "true" if wait_for_sync else "false"}
+        if overwrite_mode:
+            params["overwriteMode"] = overwrite_mode
+        return params
+
     def add_node(self, namespace, collection_name, node, ref_node):
-        self.db = self.conn[namespace]
-        collection = self.db[collection_name]
+        db = self.conn[namespace]
+        collection = db[collection_name]
         doc = collection.createDocument()
         doc.set(node)
         key = str(uuid.uuid4())
@@ -112,28 +185,96 @@ class ArangoDBHandler(GraphHandler):
         return node
 
     def delete_node(self,  namespace, collection_name, node_id):
-        self.db = self.conn[namespace]
-        collection = self.db[collection_name]
+        db = self.conn[namespace]
+        collection = db[collection_name]
         doc = collection[node_id]
         doc.delete()
 
     def delete_nodes(self, namespace, collection_name, nodes_id):
-        self.db = self.conn[namespace]
-        collection = self.db[collection_name]
-        for node_id in nodes_id:
-            doc = collection[node_id]
-            doc.delete()
+        return self.remove_documents(namespace, collection_name, nodes_id)
+
+    def remove_documents(self, namespace, collection_name, keys):
+        '''
+        remove documents by key with one AQL query, missing keys are ignored
+
+        :return: the keys of the removed documents
+        '''
+        return self.aql(namespace, REMOVE_DOCUMENTS_QUERY, {"keys": list(keys), "@collection": collection_name})
+
+    def build_get_documents(self, collection_name, keys, fields=None):
+        '''
+        build the AQL query that reads documents by key, _key and _id are always returned
+
+        :param fields: the attributes to return, all attributes by default
+        :return: the query and its bind variables
+        '''
+        bind_vars = {"keys": list(keys), "collection": collection_name}
+        if not fields:
+            return GET_DOCUMENTS_QUERY, bind_vars
+        bind_vars["fields"] = ["_key", "_id"] + [field for field in fields if field not in ["_key", "_id"]]
+        return GET_DOCUMENTS_FIELDS_QUERY, bind_vars
+
+    def get_documents(self, namespace, collection_name, keys, fields=None):
+        '''
+        read documents by key with one AQL query, missing keys are ignored
+
+        :return: the documents found, in no particular order
+        '''
+        query, bind_vars = self.build_get_documents(collection_name, keys, fields)
+        return self.aql(namespace, query, bind_vars)
+
+    def iter_aql(self, namespace, query, bind_vars=None, batch_size=1000, stream=False):
+        '''
+        run an AQL query with a server-side cursor. The query is sent right away so
+        its errors are raised here, the next batches are fetched while iterating.
+
+        :param stream: True to let arangodb compute the results while they are fetched
+
+        :return: a generator of the batches of results
+        '''
+        url = "{}/_db/{}/_api/cursor".format(self.url, namespace)
+        res = self.session.post(url, data=json.dumps(self.build_cursor_body(query, bind_vars, batch_size, stream)))
+        cursor = res.json()
+        if cursor.get("error"):
+            raise Exception(cursor.get("errorMessage"))
+        return self._iter_cursor(url, cursor)
+
+    def build_cursor_body(self, query, bind_vars=None, batch_size=1000, stream=False):
+        body = {"query": query, "bindVars": bind_vars or {}, "batchSize": batch_size}
+        if stream:
+            body["options"] = {"stream": True}
+        return body
+
+    def _iter_cursor(self, url, cursor):
+        try:
+            yield cursor["result"]
+            while cursor.get("hasMore"):
+                res = self.session.put("{}/{}".format(url, cursor["id"]))
+                cursor = res.json()
+                if cursor.get("error"):
+                    raise Exception(cursor.get("errorMessage"))
+                yield cursor["result"]
+        finally:
+            if cursor.get("hasMore"):
+                #release the cursor when the results are not read until the end
+                self.session.delete("{}/{}".format(url, cursor["id"]))
+
+    def aql(self, namespace, query, bind_vars=None):
+        results = []
+        for batch in self.iter_aql(namespace, query, bind_vars):
+            results.extend(batch)
+        return results
 
     def get_predicate(self, namespace, collection_name, node_id, predicate):
-        self.db = self.conn[namespace]
-        res = self.db.AQLQuery("""RETURN DOCUMENT("{}", "{}")""".format(collection_name, node_id))
+        db = self.conn[namespace]
+        res = db.AQLQuery("RETURN DOCUMENT(@collection, @key)", bindVars={"collection": collection_name, "key": node_id})
         doc = res.response["result"][0]
         if doc:
             return doc[predicate]
 
     def update_node(self, namespace, collection_name, node_id, node):
-        self.db = self.conn[namespace]
-        collection = self.db[collection_name]
+        db = self.conn[namespace]
+        collection = db[collection_name]
         doc = collection[node_id]
         doc.set(node)
         doc.save()
@@ -142,72 +283,107 @@ class ArangoDBHandler(GraphHandler):
     def reset_relationships(self, relationships, node_id):
         pass
 
-    def get_edges(self,namespace, collection_name, node_id):
+    def get_edges(self,namespace, collection_name, node_id, direction="any"):
         try :
-            self.db = self.conn[namespace]
-            query = '''
-            FOR e IN `{}`
-            FILTER e._from == '{}' || e._to == '{}'
-            RETURN e
-            '''.format(collection_name, node_id, node_id)
-            query_result = self.db.AQLQuery(query, rawResults=True)
-            return query_result.response["result"]
+            return self.aql(namespace, self.build_edges_query(direction), {"start": node_id, "@edges": collection_name})
         except Exception:
             return None
 
+    def build_edges_query(self, direction="any"):
+        #a one step traversal reads the edge index of the start node only
+        return "FOR v, e IN 1..1 {} @start @@edges RETURN e".format(TRAVERSAL_DIRECTIONS[direction])
+
+    def traverse(self, namespace, collection_name, node_id, min_depth=1, max_depth=1, direction="any", limit=1000):
+        '''
+        walk the edges of an edge collection from a node, breadth first
+
+        :param node_id: the _id of the start node
+        :param direction: outbound, inbound or any
+
+        :return: a generator of the batches of {vertex, edge, depth} results
+        '''
+        query = self.build_traverse_query(min_depth, max_depth, direction)
+        bind_vars = {"start": node_id, "@edges": collection_name, "limit": limit}
+        return self.iter_aql(namespace, query, bind_vars, stream=True)
+
+    def build_traverse_query(self, min_depth=1, max_depth=1, direction="any"):
+        return '''
+        FOR v, e, p IN {}..{} {} @start @@edges
+            OPTIONS {{ bfs: true, uniqueVertices: "global" }}
+            LIMIT @limit
+            RETURN {{ vertex: v, edge: e, depth: LENGTH(p.edges) }}
+        '''.format(int(min_depth), int(max_depth), TRAVERSAL_DIRECTIONS[direction])
+
     def has_collection(self, namespace, collection):
         return self.conn[namespace].hasCollection(collection)
 
     def update_relationships(self, namespace, collection_name, relationships):
         try :
-            self.db = self.conn[namespace]
-            collection = self.db[collection_name]
-            id_from = "{}".format(relationships["from"])
-            id_to = "{}".format(relationships["to"])
-            relationships.pop("from")
-            relationships.pop("to")
-            edge = collection.fetchFirstExample({"_to": id_to, "_from": id_from})
-            if edge.result:
-                id_ = edge.result[0]["_key"]
-                doc = collection[id_]
-                for key in relationships.keys():
-                    doc[key] = relationships[key]
-                doc.save()
-                return {"_key": doc._key, "_id": doc._id}
-            _key = str(uuid.uuid4())
-            arangodb_id = "{}/{}".format(collection_name, _key)
-            doc = collection.createEdge()
-            doc._key = _key
-            doc.links(id_from, id_to)
-            for key in relationships.keys():
-                doc[key] = relationships[key]
-            doc.save()
-            return {"_key": _key, "_id": arangodb_id}
+            return self.upsert_edges(namespace, collection_name, [relationships])[0]
         except Exception as e:
+            self._log.exception(e)
             return None
-            
+
+    def upsert_edges(self, namespace, collection_name, edges):
+        '''
+        insert or update edges by (from, to) with one AQL query
+
+        :param edges: a list of dict with from, to and the attributes of the edges
+
+        :return: a {_key, _id} dict for every edge in the order of edges
+        '''
+        bind_vars = {"edges": self.build_edge_documents(edges), "@collection": collection_name}
+        return self.aql(namespace, UPSERT_EDGES_QUERY, bind_vars)
+
+    def build_edge_documents(self, edges):
+        documents = []
+        for edge in edges:
+            document = {key: value for key, value in edge.items() if key not in ["from", "to"]}
+            document["_from"] = "{}".format(edge["from"])
+            document["_to"] = "{}".format(edge["to"])
+            document["_key"] = str(uuid.uuid4())
+            documents.append(document)
+        return documents
+
     def delete_relationships(self, namespace, collection_name, edges_id):
         try :
-            self.db = self.conn[namespace]
-            collection = self.db[collection_name]
-            for edge_id in edges_id:
-                doc = collection[edge_id]
-                doc.delete()
+            self.remove_documents(namespace, collection_name, edges_id)
             return True
         except Exception as e:
+            self._log.exception(e)
             return False
 
+    def write_deferred_batch(self, record):
+        '''
+        insert a batch of nodes of the write-ahead spool or of the ingestion queue with the keys
+        given when it was deferred, the nodes already inserted by a previous attempt are ignored
+
+        :return: the number of rejected nodes
+        '''
+        ids = self.add_nodes(
+            record["namespace"],
+            record["collection"],
+            record["rows"],
+            "new_node",
+            keys=record["keys"],
+            overwrite_mode=record["overwrite_mode"] or "ignore",
+            wait_for_sync=record["wait_for_sync"])
+        rejected = [node for node in ids if "error" in node]
+        if rejected:
+            self._log.error("the nodes %s of %s were not inserted", rejected, record["collection"])
+        return len(rejected)
+
     def truncate(self, namespace, collection_name):
-        self.db = self.conn[namespace]
-        collection = self.db[collection_name]
+        db = self.conn[namespace]
+        collection = db[collection_name]
         collection.truncate()
 
     def query(self, namespace, query):
-        self.db = self.conn[namespace]
-        res = self.db.AQLQuery(query)
+        db = self.conn[namespace]
+        res = db.AQLQuery(query)
         return res.response
 
     def node_exists(self, namespace, collection_name, node_id):
-        self.db = self.conn[namespace]
-        res = self.db.AQLQuery("""RETURN DOCUMENT("{}", "{}")""".format(collection_name, node_id))
+        db = self.conn[namespace]
+        res = db.AQLQuery("RETURN DOCUMENT(@collection, @key)", bindVars={"collection": collection_name, "key": node_id})
         return res.response
\ No newline at end of file
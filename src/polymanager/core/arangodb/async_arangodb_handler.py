@@ -0,0 +1,134 @@
+import json
+import logging
+from polymanager.core.async_handler import AsyncHandler
+from polymanager.core.arangodb.arangodb_handler import REMOVE_DOCUMENTS_QUERY, UPSERT_EDGES_QUERY
+
+
+class AsyncArangoDBHandler(AsyncHandler):
+    '''
+    async variant of the arangodb handler for the requests of the REST API.
+    It only uses the http api of arangodb, the requests are built by the sync handler.
+    '''
+
+    def __init__(self, handler, pool_size=10):
+        super().__init__(pool_size, auth=(handler.user, handler.password))
+        self.handler = handler
+        self.url = handler.url
+        self._log = logging.getLogger(__name__)
+
+    async def get_health(self):
+        res = await self.client.get(self.url+"/_db/_system/_admin/server/availability", timeout=5)
+        return res.json()
+
+    def get_document_url(self, namespace, collection_name, key=None):
+        url = "{}/_db/{}/_api/document/{}".format(self.url, namespace, collection_name)
+        if key is not None:
+            url = "{}/{}".format(url, key)
+        return url
+
+    async def insert_documents(self, namespace, collection_name, documents, overwrite_mode=None, wait_for_sync=None):
+        res = await self.client.post(
+            self.get_document_url(namespace, collection_name),
+            params=self.handler.build_insert_params(overwrite_mode, wait_for_sync),
+            content=json.dumps(documents))
+        if res.status_code not in [200, 201, 202]:
+            raise Exception(res.text)
+        return res.json()
+
+    async def add_nodes(self, namespace, collection_name, list_nodes, ref_node, keys=None, overwrite_mode=None, wait_for_sync=None):
+        documents = self.handler.build_node_documents(list_nodes, keys)
+        ids = []
+        for index in range(0, len(documents), self.handler.chunk_size):
+            chunk = documents[index:index + self.handler.chunk_size]
+            results = await self.insert_documents(namespace, collection_name, chunk, overwrite_mode, wait_for_sync)
+            ids.extend(self.handler.get_node_ids(collection_name, chunk, results))
+        return ids
+
+    async def add_node(self, namespace, collection_name, node, ref_node):
+        node = (await self.add_nodes(namespace, collection_name, [node], ref_node))[0]
+        if "error" in node:
+            raise Exception(node["error"])
+        return node
+
+    async def delete_node(self, namespace, collection_name, node_id):
+        res = await self.client.delete(self.get_document_url(namespace, collection_name, node_id))
+        if res.status_code not in [200, 202]:
+            raise Exception(res.text)
+
+    async def delete_nodes(self, namespace, collection_name, nodes_id):
+        return await self.remove_documents(namespace, collection_name, nodes_id)
+
+    async def remove_documents(self, namespace, collection_name, keys):
+        return await self.aql(namespace, REMOVE_DOCUMENTS_QUERY, {"keys": list(keys), "@collection": collection_name})
+
+    async def get_documents(self, namespace, collection_name, keys, fields=None):
+        query, bind_vars = self.handler.build_get_documents(collection_name, keys, fields)
+        return await self.aql(namespace, query, bind_vars)
+
+    async def update_node(self, namespace, collection_name, node_id, node):
+        #the attributes are replaced like the sync handler does, nested objects are not merged
+        res = await self.client.patch(
+            self.get_document_url(namespace, collection_name, node_id),
+            params={"mergeObjects": "false"},
+            content=json.dumps(node))
+        if res.status_code not in [200, 201, 202]:
+            raise Exception(res.text)
+
+    async def iter_aql(self, namespace, query, bind_vars=None, batch_size=1000, stream=False):
+        '''
+        run an AQL query with a server-side cursor, the query is sent right away so
+        its errors are raised here
+
+        :return: an async generator of the batches of results
+        '''
+        url = "{}/_db/{}/_api/cursor".format(self.url, namespace)
+        body = self.handler.build_cursor_body(query, bind_vars, batch_size, stream)
+        res = await self.client.post(url, content=json.dumps(body))
+        cursor = res.json()
+        if cursor.get("error"):
+            raise Exception(cursor.get("errorMessage"))
+        return self._iter_cursor(url, cursor)
+
+    async def _iter_cursor(self, url, cursor):
+        try:
+            yield cursor["result"]
+            while cursor.get("hasMore"):
+                res = await self.client.put("{}/{}".format(url, cursor["id"]))
+                cursor = res.json()
+                if cursor.get("error"):
+                    raise Exception(cursor.get("errorMessage"))
+                yield cursor["result"]
+        finally:
+            if cursor.get("hasMore"):
+                #release the cursor when the results are not read until the end
+                await self.client.delete("{}/{}".format(url, cursor["id"]))
+
+    async def aql(self, namespace, query, bind_vars=None):
+        results = []
+        async for batch in await self.iter_aql(namespace, query, bind_vars):
+            results.extend(batch)
+        return results
+
+    async def traverse(self, namespace, collection_name, node_id, min_depth=1, max_depth=1, direction="any", limit=1000):
+        query = self.handler.build_traverse_query(min_depth, max_depth, direction)
+        bind_vars = {"start": node_id, "@edges": collection_name, "limit": limit}
+        return await self.iter_aql(namespace, query, bind_vars, stream=True)
+
+    async def upsert_edges(self, namespace, collection_name, edges):
+        bind_vars = {"edges": self.handler.build_edge_documents(edges), "@collection": collection_name}
+        return await self.aql(namespace, UPSERT_EDGES_QUERY, bind_vars)
+
+    async def update_relationships(self, namespace, collection_name, relationships):
+        try :
+            return (await self.upsert_edges(namespace, collection_name, [relationships]))[0]
+        except Exception as e:
+            self._log.exception(e)
+            return None
+
+    async def delete_relationships(self, namespace, collection_name, edges_id):
+        try :
+            await self.remove_documents(namespace, collection_name, edges_id)
+            return True
+        except Exception as e:
+            self._log.exception(e)
+            return False
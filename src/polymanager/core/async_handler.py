@@ -0,0 +1,39 @@
+import asyncio
+from polymanager.helper.pool_helper import create_async_client, get_async_client_stats
+
+
+class AsyncHandler:
+    '''
+    base of the async handlers. The connections of a httpx client belong to the
+    event loop that opened them, so a client is created for every event loop.
+    '''
+
+    def __init__(self, pool_size=10, auth=None):
+        self.pool_size = pool_size
+        self.auth = auth
+        self._client = None
+        self._loop = None
+
+    @property
+    def client(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = create_async_client(self.pool_size, auth=self.auth)
+            self._loop = loop
+        return self._client
+
+    def get_pool_stats(self):
+        if self._client is None:
+            return {"pool_size": self.pool_size, "in_use": 0, "idle": 0, "created": 0}
+        return get_async_client_stats(self._client)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+async def iter_chunks(chunks):
+    "send the chunks of a sync generator as the chunked body of an async request"
+    for chunk in chunks:
+        yield chunk
@@ -0,0 +1,80 @@
+import json
+from polymanager.core.async_handler import AsyncHandler, iter_chunks
+
+
+class AsyncClickhouseHandler(AsyncHandler):
+    '''
+    async variant of the clickhouse handler for the requests of the REST API.
+    The queries are built by the sync handler, only the I/O is done here.
+    '''
+
+    def __init__(self, handler, pool_size=10):
+        super().__init__(pool_size)
+        self.handler = handler
+        self.url = handler.url
+
+    async def ping(self):
+        res = await self.client.get(self.url+"/ping", timeout=5)
+        return res.text
+
+    async def query(self, query):
+        return await self.client.post(self.url, params={"query": query})
+
+    async def get_version(self):
+        if self.handler._version is None:
+            res = await self.query("SELECT version()")
+            if res.status_code != 200:
+                raise Exception(res.text)
+            self.handler._version = self.handler.parse_version(res.text)
+        return self.handler._version
+
+    async def select(self, sql, params=None, raw=False):
+        '''
+        run a select query and stream its result
+
+        :return: an async generator of bytes chunks or dict rows
+        '''
+        request = self.client.build_request("GET", self.url, params=self.handler.build_select_params(sql, params))
+        res = await self.client.send(request, stream=True)
+        if res.status_code != 200:
+            await res.aread()
+            await res.aclose()
+            raise Exception(res.text)
+        return self.iter_result(res, raw)
+
+    async def iter_result(self, res, raw):
+        try:
+            if raw:
+                async for chunk in res.aiter_bytes(chunk_size=self.handler.chunk_size):
+                    yield chunk
+            else:
+                async for line in res.aiter_lines():
+                    if line:
+                        yield json.loads(line)
+        finally:
+            await res.aclose()
+
+    async def delete_documents(self, table, docs_id, wait=True):
+        version = await self.get_version() if self.handler.delete_mode != "mutation" else None
+        res = await self.client.post(self.url, params=self.handler.build_delete_params(table, docs_id, wait, version))
+        if res.status_code != 200:
+            raise Exception(res.text)
+        return res.text
+
+    async def bulk_add_documents(self, collection_name, documents_list, columns=None):
+        if not documents_list:
+            raise Exception("documents list is empty")
+        if columns is None:
+            columns = list(documents_list[0].keys())
+        if self.handler.insert_format == "values":
+            res = await self.query(self.handler.build_values_query(collection_name, documents_list, columns))
+        else:
+            params, headers, body = self.handler.build_insert_request(collection_name, documents_list, columns)
+            res = await self.client.post(self.url, params=params, content=iter_chunks(body), headers=headers)
+        if res.status_code != 200:
+            raise Exception(res.text)
+        return res.text
+
+    async def replace_document(self, collection, document):
+        res = await self.query(self.handler.build_replace_query(collection, document))
+        return res.text
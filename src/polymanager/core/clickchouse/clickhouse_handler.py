@@ -1,75 +1,267 @@
-import requests
+import json
+import zlib
 import logging
 from polymanager.core.document_handler import DocumentHandler
+from polymanager.helper.pool_helper import create_session, get_session_stats
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 class ClickhouseHandler(DocumentHandler):
 
     def __init__(
                 self,
-                hostname="127.0.0.1", port="8123"
+                hostname="127.0.0.1", port="8123", pool_size=10,
+                insert_format="JSONEachRow", compression="none", chunk_size=65536,
+                delete_mode="auto"
                 ):
         self.hostname = hostname
         self.port = port
         self.url = "http://{}:{}".format(self.hostname, self.port)
+        self.session = create_session(pool_size)
+        if insert_format not in ["JSONEachRow", "values"]:
+            raise Exception("{} is not a supported insert format".format(insert_format))
+        if compression not in ["none", "gzip", "zstd"]:
+            raise Exception("{} is not a supported compression".format(compression))
+        if compression == "zstd" and zstandard is None:
+            raise Exception("zstd compression requires the zstandard package")
+        if delete_mode not in ["auto", "lightweight", "mutation"]:
+            raise Exception("{} is not a supported delete mode".format(delete_mode))
+        self.insert_format = insert_format
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.delete_mode = delete_mode
+        self._version = None
         self._log = logging.getLogger(__name__)
 
+    def get_pool_stats(self):
+        return get_session_stats(self.session)
+
     def ping(self):
-        res = requests.get(self.url+"/ping", timeout=120)
+        res = self.session.get(self.url+"/ping", timeout=120)
         return res.text
 
     def insert_schema(self, schema):
         gen_chema = schema.generate_schema()
         if gen_chema:
             has_database = "query=SHOW TABLES FROM {}".format(schema.get_namespace())
-            res = requests.post(self.url+"?{}".format(has_database), timeout=120)
+            res = self.session.post(self.url+"?{}".format(has_database), timeout=120)
             if res.status_code == 404:
                 #we create the database
                 self.query("CREATE DATABASE {}".format(schema.get_namespace()))
-            res = requests.post(self.url+"?{}".format(gen_chema), timeout=120)
+            res = self.session.post(self.url+"?{}".format(gen_chema), timeout=120)
             print(res.text)
 
     def get_tables(self, database):
         req = "query=show tables from {};".format(database)
-        res = requests.get(self.url+"?{}".format(req), timeout=120)
+        res = self.session.get(self.url+"?{}".format(req), timeout=120)
         return res.text.splitlines()
 
     def query(self, query):
         req = "query={}".format(query)
-        res = requests.post(self.url+"?{}".format(req), timeout=120)
+        res = self.session.post(self.url+"?{}".format(req), timeout=120)
         return res
 
+    def select(self, sql, params=None, raw=False):
+        '''
+        run a select query and stream its result
+
+        :param sql: a query with the JSONEachRow output format
+        :param params: the values of the query parameters
+        :param raw: True to get the bytes sent by clickhouse, False to get a dict per row
+
+        :return: a generator of bytes chunks or dict rows
+        '''
+        #GET requests are read-only for clickhouse
+        res = self.session.get(self.url, params=self.build_select_params(sql, params), stream=True, timeout=120)
+        if res.status_code != 200:
+            error = res.text
+            res.close()
+            raise Exception(error)
+        return self.iter_result(res, raw)
+
+    def build_select_params(self, sql, params=None):
+        query_params = {"query": sql, "output_format_json_quote_64bit_integers": 0}
+        for name, value in (params or {}).items():
+            query_params["param_{}".format(name)] = value
+        return query_params
+
+    def iter_result(self, res, raw):
+        try:
+            if raw:
+                for chunk in res.iter_content(chunk_size=self.chunk_size):
+                    yield chunk
+            else:
+                for line in res.iter_lines():
+                    if line:
+                        yield json.loads(line)
+        finally:
+            res.close()
+
     def truncate(self, table):
         req = "query=TRUNCATE TABLE {}".format(table)
-        res = requests.post(self.url+"?{}".format(req), timeout=120)
+        res = self.session.post(self.url+"?{}".format(req), timeout=120)
         print(res.text)
 
-    def delete_document(self, table, doc_id):
-        req = "query=ALTER TABLE {} DELETE WHERE id={} SETTINGS mutations_sync = 2".format(table, doc_id)
-        res = requests.post(self.url+"?{}".format(req), timeout=120)
-        print(res.text)
+    def get_version(self):
+        if self._version is None:
+            res = self.query("SELECT version()")
+            if res.status_code != 200:
+                raise Exception(res.text)
+            self._version = self.parse_version(res.text)
+        return self._version
 
-    def delete_documents(self, table, docs_id):
-        req = "query=ALTER TABLE {} DELETE WHERE id IN ({}) SETTINGS mutations_sync = 2".format(table, ",".join(docs_id))
-        res = requests.post(self.url+"?{}".format(req), timeout=120)
-        print(res.text)
+    def parse_version(self, text):
+        return tuple(int(part) for part in text.strip().split(".")[:2])
+
+    def use_lightweight_delete(self, version=None):
+        if self.delete_mode == "auto":
+            #lightweight deletes are generally available since 23.3
+            return (version or self.get_version()) >= (23, 3)
+        return self.delete_mode == "lightweight"
+
+    def delete_document(self, table, doc_id, wait=True):
+        return self.delete_documents(table, [doc_id], wait=wait)
+
+    def delete_documents(self, table, docs_id, wait=True):
+        '''
+        delete documents by id
+
+        :param docs_id: a list of document id
+        :param wait: True to return once the deletion is applied on all replicas,
+        False to return once the mutation is created
+
+        :return: the response of clickhouse
+        '''
+        #the server version is only needed to choose and tune the lightweight deletes
+        version = self.get_version() if self.delete_mode != "mutation" else None
+        res = self.session.post(self.url, params=self.build_delete_params(table, docs_id, wait, version), timeout=120)
+        if res.status_code != 200:
+            raise Exception(res.text)
+        return res.text
+
+    def build_delete_params(self, table, docs_id, wait, version):
+        params = {"mutations_sync": 2 if wait else 0}
+        ids = ",".join(str(doc_id) for doc_id in docs_id)
+        if self.use_lightweight_delete(version):
+            params["query"] = "DELETE FROM {} WHERE id IN ({})".format(table, ids)
+            if version < (23, 3):
+                params["allow_experimental_lightweight_delete"] = 1
+            if version >= (24, 4):
+                params["lightweight_deletes_sync"] = 2 if wait else 0
+        else:
+            params["query"] = "ALTER TABLE {} DELETE WHERE id IN ({})".format(table, ids)
+        return params
+
+    def get_mutations(self, table, only_pending=False):
+        '''
+        return the last mutations of a table from system.mutations
+        '''
+        database, table_name = table.split(".", 1)
+        sql = "SELECT mutation_id, command, create_time, is_done, parts_to_do, latest_fail_reason FROM system.mutations WHERE database = {database:String} AND table = {table:String}"
+        if only_pending:
+            sql = sql + " AND is_done = 0"
+        sql = sql + " ORDER BY create_time DESC LIMIT 100 FORMAT JSONEachRow"
+        return list(self.select(sql, {"database": database, "table": table_name}))
 
     def delete_schema(self, schema):
         req = "query=DROP TABLE {}".format(schema.get_collection_name())
-        res = requests.post(self.url+"?{}".format(req), timeout=120)
+        res = self.session.post(self.url+"?{}".format(req), timeout=120)
         req = "query=SHOW TABLES FROM {}".format(schema.get_namespace())
-        res2 = requests.post(self.url+"?{}".format(req), timeout=120)
+        res2 = self.session.post(self.url+"?{}".format(req), timeout=120)
         if res2.status_code == 200:
             req = "query=DROP DATABASE {}".format(schema.get_namespace())
-            res = requests.post(self.url+"?{}".format(req), timeout=120)
+            res = self.session.post(self.url+"?{}".format(req), timeout=120)
+
+    def write_deferred_batch(self, record):
+        '''
+        insert a batch of the write-ahead spool or of the ingestion queue
+
+        :return: the number of rejected rows, clickhouse accepts or rejects the whole batch
+        '''
+        self.bulk_add_documents(record["collection"], record["rows"], columns=record["columns"])
+        return 0
 
     def bulk_replace_documents(self, collection_name, documents_list):
         pass
 
-    def bulk_add_documents(self, collection_name, documents_list):
+    def bulk_add_documents(self, collection_name, documents_list, columns=None):
+        '''
+        insert a list of documents in a clickhouse table
+
+        :param documents_list: A list of dict document with properties
+        :param columns: the columns of the table, by default the keys of the first document
+
+        :return: the response of clickhouse
+        '''
+        if not documents_list:
+            raise Exception("documents list is empty")
+        if columns is None:
+            columns = list(documents_list[0].keys())
+        if self.insert_format == "values":
+            return self.bulk_add_values(collection_name, documents_list, columns)
+        params, headers, body = self.build_insert_request(collection_name, documents_list, columns)
+        res = self.session.post(self.url, params=params, data=body, headers=headers, timeout=120)
+        if res.status_code != 200:
+            raise Exception(res.text)
+        return res.text
+
+    def build_insert_request(self, collection_name, documents_list, columns):
+        '''
+        build the query parameters, the headers and the body chunks of a JSONEachRow insert
+        '''
+        headers = {"Content-Type": "application/x-ndjson"}
+        if self.compression != "none":
+            headers["Content-Encoding"] = self.compression
+        sql = "INSERT INTO {} ({}) FORMAT JSONEachRow".format(collection_name, ",".join(columns))
+        body = self.compress_body(self.build_json_each_row(documents_list, columns))
+        return {"query": sql}, headers, body
+
+    def build_json_each_row(self, documents_list, columns):
+        '''
+        generate the JSONEachRow body by chunks of about chunk_size bytes
+        '''
+        chunk = []
+        size = 0
+        for document in documents_list:
+            row = {column: document[column] for column in columns}
+            line = json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n"
+            chunk.append(line)
+            size = size + len(line)
+            if size >= self.chunk_size:
+                yield b"".join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield b"".join(chunk)
+
+    def compress_body(self, chunks):
+        if self.compression == "none":
+            yield from chunks
+            return
+        if self.compression == "gzip":
+            compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+        else:
+            compressor = zstandard.ZstdCompressor().compressobj()
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def bulk_add_values(self, collection_name, documents_list, columns):
+        res = self.query(self.build_values_query(collection_name, documents_list, columns))
+        if res.status_code != 200:
+            raise Exception(res.text)
+        return res.text
+
+    def build_values_query(self, collection_name, documents_list, columns):
         c_documents = []
         for document in documents_list:
             values = []
-            for v in document.values():
+            for column in columns:
+                v = document[column]
                 if isinstance(v, str):
                     values.append("'"+v+"'")
                 elif isinstance(v, int) or isinstance(v, float):
@@ -77,13 +269,13 @@ class ClickhouseHandler(DocumentHandler):
                 else:
                     values.append(str(v))
             c_documents.append("("+ ",".join(values) +")")
-        sql = "INSERT INTO {} ({}) VALUES {}".format(collection_name, ",".join(documents_list[0].keys()), ",".join(c_documents))
-        res = self.query(sql)
-        if res.status_code != 200:
-            raise Exception(res.text)
-        return res.text
+        return "INSERT INTO {} ({}) VALUES {}".format(collection_name, ",".join(columns), ",".join(c_documents))
 
     def replace_document(self, collection, document):
+        res = self.query(self.build_replace_query(collection, document))
+        return res.text
+
+    def build_replace_query(self, collection, document):
         values = []
         for k,v in document.items():
             if k == "id":
@@ -94,9 +286,7 @@ class ClickhouseHandler(DocumentHandler):
                 values.append(k+"="+str(v))
             else:
                 values.append(k+"="+str(v))
-        sql = "ALTER TABLE {} UPDATE {} WHERE id={} SETTINGS mutations_sync = 2".format(
+        return "ALTER TABLE {} UPDATE {} WHERE id={} SETTINGS mutations_sync = 2".format(
             collection,
             ",".join(values),
-            document["id"])
-        res = self.query(sql)
-        return res.text
\ No newline at end of file
+            document["id"])
\ No newline at end of file
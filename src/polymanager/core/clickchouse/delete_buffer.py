@@ -0,0 +1,67 @@
+import threading
+from polymanager.core.clickchouse.insert_buffer import InsertBuffer
+
+
+class DeleteBuffer(InsertBuffer):
+    '''
+    group the ids deleted in a clickhouse table during a short window to delete
+    them with one mutation instead of one mutation per request.
+    '''
+
+    name = "delete buffer"
+
+    def __init__(self, handler, collection_name, wait=True, max_rows=10000, max_latency=0.05):
+        self.wait = wait
+        super().__init__(handler, collection_name, ["id"], max_rows=max_rows, max_bytes=max_rows * 20, max_latency=max_latency)
+
+    def flush(self, rows):
+        self.handler.delete_documents(self.collection_name, sorted(set(rows)), wait=self.wait)
+
+
+class DeleteBufferRegistry:
+    "keep one delete buffer for every clickhouse collection and completion mode"
+
+    def __init__(self, handler, window_ms=50, max_rows=10000):
+        self.handler = handler
+        self.window_ms = window_ms
+        self.max_rows = max_rows
+        self._buffers = dict()
+        self._lock = threading.Lock()
+
+    def delete(self, collection_name, docs_id, wait=True):
+        '''
+        delete documents by id, the deletes of the same window are sent together
+
+        :param wait: True to wait until the mutation is applied, False to return once it is created
+        '''
+        if not self.window_ms:
+            return self.handler.delete_documents(collection_name, docs_id, wait=wait)
+        self.get_buffer(collection_name, wait).add(list(docs_id))
+
+    def get_buffer(self, collection_name, wait=True):
+        key = (collection_name, wait)
+        with self._lock:
+            if key not in self._buffers:
+                self._buffers[key] = DeleteBuffer(
+                    self.handler,
+                    collection_name,
+                    wait=wait,
+                    max_rows=self.max_rows,
+                    max_latency=self.window_ms / 1000
+                )
+            return self._buffers[key]
+
+    def close(self):
+        with self._lock:
+            buffers = list(self._buffers.values())
+            self._buffers.clear()
+        for buffer in buffers:
+            buffer.close()
+
+    def get_stats(self):
+        with self._lock:
+            buffers = dict(self._buffers)
+        return {
+            "{}:{}".format(collection_name, "sync" if wait else "async"): buffer.get_stats()
+            for (collection_name, wait), buffer in buffers.items()
+        }
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from polymanager.helper.metrics_helper import Histogram
+
+
+def get_rows_size(rows):
+    return sum(len(json.dumps(row)) for row in rows)
+
+
+class Batch:
+
+    def __init__(self):
+        self.rows = []
+        self.size = 0
+        self.created = None
+        self.done = threading.Event()
+        self.error = None
+        self.waiters = []
+
+    def set_done(self):
+        self.done.set()
+        for loop, future in self.waiters:
+            try:
+                loop.call_soon_threadsafe(self.set_future, future)
+            except RuntimeError:
+                #the event loop of the caller is already closed
+                pass
+
+    def set_future(self, future):
+        if future.done():
+            return
+        if self.error:
+            future.set_exception(self.error)
+        else:
+            future.set_result(None)
+
+
+class InsertBuffer:
+    '''
+    group the rows inserted in a clickhouse table to send them with one INSERT.
+
+    A batch is flushed when it reaches max_rows rows or max_bytes bytes, or when
+    its oldest row has waited max_latency seconds. The callers of add() wait
+    until the INSERT of their batch is acknowledged by clickhouse.
+    '''
+
+    name = "insert buffer"
+
+    def __init__(self, handler, collection_name, columns, max_rows=1000, max_bytes=1048576, max_latency=0.2):
+        self.handler = handler
+        self.collection_name = collection_name
+        self.columns = columns
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_latency = max_latency
+        self.flush_rows = Histogram([1, 10, 100, 1000, 10000, 100000])
+        self.flush_bytes = Histogram([1024, 16384, 131072, 1048576, 8388608, 67108864])
+        self.flush_latency_ms = Histogram([1, 5, 10, 50, 100, 250, 500, 1000, 5000])
+        self._cond = threading.Condition()
+        self._batch = Batch()
+        self._ready = []
+        self._closed = False
+        self._log = logging.getLogger(__name__)
+        self._thread = threading.Thread(target=self._run, name="{}-{}".format(self.name.replace(" ", "-"), collection_name), daemon=True)
+        self._thread.start()
+
+    def add(self, rows):
+        '''
+        add rows to the current batch and wait until it is flushed
+
+        :param rows: a list of dict documents already transformed by the schema
+
+        :raise Exception: the error returned by clickhouse for the batch
+        '''
+        batch = self._append(rows)
+        batch.done.wait()
+        if batch.error:
+            raise batch.error
+
+    async def add_async(self, rows):
+        '''
+        add rows to the current batch and wait until it is flushed without blocking the event loop
+        '''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._append(rows, (loop, future))
+        await future
+
+    def _append(self, rows, waiter=None, size=None):
+        if size is None:
+            size = get_rows_size(rows)
+        with self._cond:
+            if self._closed:
+                raise Exception("the {} of {} is closed".format(self.name, self.collection_name))
+            batch = self._batch
+            if not batch.rows:
+                batch.created = time.monotonic()
+            batch.rows.extend(rows)
+            batch.size = batch.size + size
+            #the waiter is added with the rows so the batch cannot be flushed in between
+            if waiter:
+                batch.waiters.append(waiter)
+            if len(batch.rows) >= self.max_rows or batch.size >= self.max_bytes:
+                self._ready.append(batch)
+                self._batch = Batch()
+            self._cond.notify()
+        return batch
+
+    def flush(self, rows):
+        self.handler.bulk_add_documents(self.collection_name, rows, columns=self.columns)
+
+    def close(self):
+        '''
+        flush the pending rows and stop the buffer
+        '''
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    def get_stats(self):
+        with self._cond:
+            pending = len(self._batch.rows) + sum(len(batch.rows) for batch in self._ready)
+        return {
+            "pending_rows": pending,
+            "flush_rows": self.flush_rows.get_stats(),
+            "flush_bytes": self.flush_bytes.get_stats(),
+            "flush_latency_ms": self.flush_latency_ms.get_stats()
+        }
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if self._ready:
+                    return self._ready.pop(0)
+                if self._batch.rows:
+                    remaining = self._batch.created + self.max_latency - time.monotonic()
+                    if remaining <= 0 or self._closed:
+                        batch = self._batch
+                        self._batch = Batch()
+                        return batch
+                    self._cond.wait(remaining)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self.flush(batch.rows)
+            except Exception as e:
+                self._log.exception(e)
+                batch.error = e
+            finally:
+                self.flush_rows.observe(len(batch.rows))
+                self.flush_bytes.observe(batch.size)
+                self.flush_latency_ms.observe((time.monotonic() - batch.created) * 1000)
+                batch.set_done()
+
+
+class InsertBufferRegistry:
+    "keep one insert buffer for every clickhouse collection that enables it"
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._buffers = dict()
+        self._lock = threading.Lock()
+
+    def add(self, schema, rows):
+        '''
+        add rows to the buffer of the collection of schema and wait until they are flushed
+
+        :raise Exception: the error returned by clickhouse for the batch
+        '''
+        batch = self._append(schema, rows)
+        batch.done.wait()
+        if batch.error:
+            raise batch.error
+
+    async def add_async(self, schema, rows):
+        '''
+        add rows to the buffer of the collection of schema and wait until they are flushed without blocking the event loop
+        '''
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._append(schema, rows, (loop, future))
+        await future
+
+    def _append(self, schema, rows, waiter=None):
+        size = get_rows_size(rows)
+        with self._lock:
+            #the rows are appended under the lock, so a buffer is not replaced between its lookup and the append
+            buffer, old_buffer = self._get_buffer(schema)
+            batch = buffer._append(rows, waiter, size)
+        if old_buffer:
+            #the flush of the pending rows waits for clickhouse, it must not block the caller
+            threading.Thread(target=old_buffer.close, name="close-insert-buffer-{}".format(old_buffer.collection_name), daemon=True).start()
+        return batch
+
+    def _get_buffer(self, schema):
+        '''
+        return the buffer of the collection of schema and the buffer it replaces, if any
+        '''
+        options = schema.get_insert_buffer_options()
+        collection_name = schema.get_collection_name()
+        columns = list(schema.get_columns())
+        old_buffer = None
+        if collection_name in self._buffers:
+            buffer_options, buffer = self._buffers[collection_name]
+            #a collection recreated with other columns must not reuse the columns of the old buffer
+            if buffer_options == options and buffer.columns == columns:
+                return buffer, None
+            old_buffer = buffer
+        buffer = InsertBuffer(
+            self.handler,
+            collection_name,
+            columns,
+            max_rows=options["max_rows"],
+            max_bytes=options["max_bytes"],
+            max_latency=options["max_latency_ms"] / 1000
+        )
+        self._buffers[collection_name] = (options, buffer)
+        return buffer, old_buffer
+
+    def close_buffer(self, collection_name):
+        '''
+        flush the pending rows of a collection and stop its buffer, before the table is truncated or dropped
+        '''
+        with self._lock:
+            options, buffer = self._buffers.pop(collection_name, (None, None))
+        if buffer:
+            buffer.close()
+
+    def close(self):
+        with self._lock:
+            buffers = [buffer for options, buffer in self._buffers.values()]
+            self._buffers.clear()
+        for buffer in buffers:
+            buffer.close()
+
+    def get_stats(self):
+        with self._lock:
+            buffers = dict(self._buffers)
+        return {collection_name: buffer.get_stats() for collection_name, (options, buffer) in buffers.items()}
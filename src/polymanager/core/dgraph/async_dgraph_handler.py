@@ -0,0 +1,127 @@
+import asyncio
+import json
+import logging
+import pydgraph
+from tenacity import retry, retry_if_exception_type, stop_after_attempt
+from polymanager.core.async_handler import AsyncHandler
+
+
+async def wait_future(future):
+    '''
+    wait for a grpc future without blocking the event loop
+    '''
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def set_done(_):
+        loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+    future.add_done_callback(set_done)
+    await done
+    return future
+
+
+class AsyncDGraphHandler(AsyncHandler):
+    '''
+    async variant of the dgraph handler for the requests of the REST API. The
+    mutations are sent with the async requests of pydgraph and committed with
+    commit_now, so every mutation is one round trip.
+    '''
+
+    def __init__(self, handler):
+        super().__init__()
+        self.handler = handler
+        self.dgraph_client = handler.client
+        self._log = logging.getLogger(__name__)
+
+    async def get_health(self):
+        res = await self.client.get(self.handler.url_health, timeout=5)
+        return res.json()
+
+    async def do_request(self, txn, request):
+        future = await wait_future(txn.async_do_request(request))
+        return pydgraph.Txn.handle_mutate_future(txn, future, request.commit_now)
+
+    async def query(self, query, variables=None):
+        txn = self.dgraph_client.txn(read_only=True)
+        future = await wait_future(txn.async_query(query, variables=variables))
+        return json.loads(pydgraph.Txn.handle_query_future(future).json)
+
+    async def get_nodes(self, namespace, collection_name, uids, predicates=None):
+        return (await self.query(self.handler.build_get_nodes_query(collection_name, uids, predicates)))["q"]
+
+    async def mutate(self, set_obj=None, del_obj=None):
+        txn = self.dgraph_client.txn()
+        mutation = txn.create_mutation(set_obj=set_obj, del_obj=del_obj)
+        return await self.do_request(txn, txn.create_request(mutations=[mutation], commit_now=True))
+
+    async def add_nodes(self, namespace, collection_name, list_predicates, ref_node):
+        '''
+        add nodes with one mutation per chunk of chunk_size nodes, at most
+        parallel_txns chunks are sent at the same time
+
+        :return: the uids of the nodes in the order of list_predicates
+        '''
+        chunk_size = self.handler.chunk_size
+        semaphore = asyncio.Semaphore(self.handler.parallel_txns)
+
+        async def add_chunk(chunk):
+            async with semaphore:
+                return await self.add_nodes_chunk(collection_name, chunk, ref_node)
+
+        chunks = [list_predicates[index:index + chunk_size] for index in range(0, len(list_predicates), chunk_size)]
+        res = []
+        for uids in await asyncio.gather(*[add_chunk(chunk) for chunk in chunks]):
+            res.extend(uids)
+        return res
+
+    @retry(retry=retry_if_exception_type(pydgraph.AbortedError), stop=stop_after_attempt(3), reraise=True)
+    async def add_nodes_chunk(self, collection_name, list_predicates, ref_node):
+        obj = self.handler.build_nodes_obj(collection_name, list_predicates, ref_node)
+        try:
+            response = await self.mutate(set_obj=obj)
+            return [response.uids["{}{}".format(ref_node, index)] for index in range(len(list_predicates))]
+        except Exception as e:
+            self._log.exception(e)
+            raise
+
+    async def add_node(self, namespace, collection_name, predicates, ref_node):
+        try:
+            return (await self.add_nodes_chunk(collection_name, [predicates], ref_node))[0]
+        except Exception as e:
+            self._log.exception(e)
+
+    async def delete_nodes(self, namespace, collection_name, nodes_id):
+        obj = [{"uid": node_id, "dgraph.type": collection_name} for node_id in nodes_id]
+        try:
+            await self.mutate(del_obj=obj)
+            return True
+        except Exception as e:
+            self._log.exception(e)
+
+    async def delete_node(self, namespace, collection_name, node_id):
+        return await self.delete_nodes(namespace, collection_name, [node_id])
+
+    async def update_node(self, namespace, collection_name, node_id, predicates):
+        obj = {
+            "uid": node_id
+        }
+        obj.update(predicates)
+        try:
+            response = await self.mutate(set_obj=obj)
+            return response.uids
+        except Exception as e:
+            self._log.exception(e)
+
+    async def upsert_relationships(self, collection_name, relationships, nodes, reset=False):
+        query, del_nquads, set_nquads = self.handler.build_upsert_relationships(collection_name, relationships, nodes, reset)
+        if not del_nquads and not set_nquads:
+            return True
+        txn = self.dgraph_client.txn()
+        try:
+            mutations = self.handler.create_upsert_mutations(txn, del_nquads, set_nquads)
+            await self.do_request(txn, txn.create_request(query=query, mutations=mutations, commit_now=True))
+            return True
+        except Exception as e:
+            self._log.exception(e)
+            raise
@@ -2,18 +2,22 @@ import pydgraph
 import logging
 import json
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from tenacity import retry, retry_if_exception_type, stop_after_attempt
 from polymanager.core.graph_handler import GraphHandler
 
 class DGraphHandler(GraphHandler):
     # This as possible module to translate need to dgraph
     # language. Must hold as less as possible any check.
 
-    def __init__(self, dgraph_conn, dgraph_admin=["127.0.0.1"], dgraph_admin_port=8080):
+    def __init__(self, dgraph_conn, dgraph_admin=["127.0.0.1"], dgraph_admin_port=8080, chunk_size=1000, parallel_txns=4):
         # address is the ip or the dns of the database instance
         # port is the tcp port of the communication
         self.url = "http://" + dgraph_admin[0] + ":" + str(dgraph_admin_port) + "/alter?runInBackground=false"
         self.url_health = "http://" + dgraph_admin[0] + ":" + str(dgraph_admin_port) + "/health"
         self.client = dgraph_conn.get_client()
+        self.chunk_size = chunk_size
+        self.parallel_txns = parallel_txns
         self._log = logging.getLogger(__name__)
 
     def delete_schema(self, schema):
@@ -77,25 +81,63 @@ class DGraphHandler(GraphHandler):
         json_res = json.loads(res.json)
         return json_res
 
+    def build_get_nodes_query(self, collection_name, uids, predicates=None):
+        '''
+        build the query that reads nodes by uid, the uids and the predicates must be checked before
+
+        :param predicates: the predicates to return, all predicates by default
+        '''
+        selection = " ".join(predicates) if predicates else "expand(_all_)"
+        return "{{ q(func: uid({})) @filter(type({})) {{ uid {} }} }}".format(",".join(uids), collection_name, selection)
+
+    def get_nodes(self, namespace, collection_name, uids, predicates=None):
+        '''
+        read nodes by uid with one query, the uids that are not nodes of the collection are ignored
+
+        :return: the predicates of the nodes found, in no particular order
+        '''
+        return self.query(self.build_get_nodes_query(collection_name, uids, predicates))["q"]
+
     def add_nodes(self, namespace, collection_name, list_predicates, ref_node):
+        '''
+        add nodes with one mutation per chunk of chunk_size nodes, the chunks
+        are committed in parallel transactions
+
+        :return: the uids of the nodes in the order of list_predicates
+        '''
+        chunks = [list_predicates[index:index + self.chunk_size] for index in range(0, len(list_predicates), self.chunk_size)]
+        if len(chunks) <= 1:
+            return self.add_nodes_chunk(collection_name, list_predicates, ref_node)
+        res = []
+        with ThreadPoolExecutor(max_workers=self.parallel_txns) as executor:
+            for uids in executor.map(lambda chunk: self.add_nodes_chunk(collection_name, chunk, ref_node), chunks):
+                res.extend(uids)
+        return res
+
+    @retry(retry=retry_if_exception_type(pydgraph.AbortedError), stop=stop_after_attempt(3), reraise=True)
+    def add_nodes_chunk(self, collection_name, list_predicates, ref_node):
+        obj = self.build_nodes_obj(collection_name, list_predicates, ref_node)
         txn = self.client.txn()
         try:
-            res = []
-            for predicates in list_predicates:
-                obj = {
-                    "uid": "_:{}".format(ref_node),
-                    "dgraph.type": collection_name,
-                }
-                obj.update(predicates)
-                response = txn.mutate(set_obj=obj)
-                res.append(response.uids[ref_node])
-            txn.commit()
-            return res
+            response = txn.mutate(set_obj=obj, commit_now=True)
+            return [response.uids["{}{}".format(ref_node, index)] for index in range(len(list_predicates))]
         except Exception as e:
             self._log.exception(e)
+            raise
         finally:
             txn.discard()
 
+    def build_nodes_obj(self, collection_name, list_predicates, ref_node):
+        obj = []
+        for index, predicates in enumerate(list_predicates):
+            node = {
+                "uid": "_:{}{}".format(ref_node, index),
+                "dgraph.type": collection_name,
+            }
+            node.update(predicates)
+            obj.append(node)
+        return obj
+
     def add_node(self, namespace, collection_name, predicates, ref_node):
         obj = {
             "uid": "_:{}".format(ref_node),
@@ -113,6 +155,15 @@ class DGraphHandler(GraphHandler):
         finally:
             txn.discard()
 
+    def write_deferred_batch(self, record):
+        '''
+        add a batch of nodes of the write-ahead spool or of the ingestion queue
+
+        :return: the number of rejected nodes, dgraph accepts or rejects every chunk
+        '''
+        self.add_nodes(record["namespace"], record["collection"], record["rows"], "new_node")
+        return 0
+
     def truncate(self, namespace, collection_name):
         query = """{{
             nodes as var (func: eq(dgraph.type, "{}")) {{
@@ -266,14 +317,64 @@ class DGraphHandler(GraphHandler):
     def update_relationships(self, namespace, collection_name, relationships, node, node_id):
         if len(relationships) == 0:
             return
-        for relationship in relationships:
-            self.update_edges(node_id, relationship, node[relationship])
+        self.upsert_relationships(collection_name, relationships, [(node_id, node)])
 
     def reset_relationships(self, namespace, collection_name, relationships, node_id):
         if len(relationships) == 0:
             return
-        for relationship in relationships:
-            self.remove_edges(node_id, relationship)
+        self.upsert_relationships(collection_name, relationships, [(node_id, {})], reset=True)
+
+    def upsert_relationships(self, collection_name, relationships, nodes, reset=False):
+        '''
+        set the relationships of nodes with one upsert block, the edges of a
+        node are only changed if it exists in the collection
+
+        :param relationships: the relationship predicates of the collection
+        :param nodes: a list of (node_id, node) where node maps a relationship predicate to a list of uids
+        :param reset: True to remove the existing edges of the relationship predicates first
+        '''
+        query, del_nquads, set_nquads = self.build_upsert_relationships(collection_name, relationships, nodes, reset)
+        if not del_nquads and not set_nquads:
+            return True
+        txn = self.client.txn()
+        try:
+            request = txn.create_request(query=query, mutations=self.create_upsert_mutations(txn, del_nquads, set_nquads), commit_now=True)
+            txn.do_request(request)
+            return True
+        except Exception as e:
+            self._log.exception(e)
+            raise
+        finally:
+            txn.discard()
+
+    def create_upsert_mutations(self, txn, del_nquads, set_nquads):
+        mutations = []
+        #the edges are removed before the new ones are set
+        if del_nquads:
+            mutations.append(txn.create_mutation(del_nquads="\n".join(del_nquads)))
+        if set_nquads:
+            mutations.append(txn.create_mutation(set_nquads="\n".join(set_nquads)))
+        return mutations
+
+    def build_upsert_relationships(self, collection_name, relationships, nodes, reset=False):
+        '''
+        build the query and the nquads of the upsert block of upsert_relationships
+
+        :return: a (query, del_nquads, set_nquads) tuple
+        '''
+        query_vars = []
+        del_nquads = []
+        set_nquads = []
+        for index, (node_id, node) in enumerate(nodes):
+            var = "node{}".format(index)
+            query_vars.append("{} as var(func: uid({})) @filter(type({}))".format(var, node_id, collection_name))
+            for relationship in relationships:
+                if reset:
+                    del_nquads.append("uid({}) <{}> * .".format(var, relationship))
+                for entity_uid in node.get(relationship, []):
+                    set_nquads.append("uid({}) <{}> <{}> .".format(var, relationship, entity_uid))
+        query = "{{\n{}\n}}".format("\n".join(query_vars))
+        return query, del_nquads, set_nquads
 
     def update_edges(self, uid, predicate, entities_uid):
         obj = []
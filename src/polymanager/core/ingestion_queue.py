@@ -0,0 +1,229 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+from redis.exceptions import ResponseError
+from polymanager.exceptions.ingestion_exception import QueueFull
+
+STREAM_PREFIX = "polymanager:ingest"
+#the set of the streams that the consumers read
+STREAMS_KEY = "polymanager:ingest:streams"
+DEAD_LETTER_SUFFIX = ":dead"
+GROUP = "polymanager"
+
+
+def decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+class IngestionQueue:
+    '''
+    distributed queue of the batches written in the collections, with one
+    kvrocks stream per collection.
+
+    The api nodes add a validated batch to the stream of its collection. The
+    consumers of the worker nodes read all the streams in the same consumer
+    group, so a batch is given to one consumer, which writes it with
+    handler.write_deferred_batch(record), then acknowledges and deletes it.
+    A batch that is not acknowledged after claim_idle_ms, because the write
+    failed or its consumer stopped, is claimed by another consumer, and a batch
+    delivered max_deliveries times is moved to the dead letter stream of its
+    collection.
+
+    :param db_provider: the provider of the kvrocks client
+    :param handlers: a dict of the providers of the sync handlers of the datastores
+    :param connectors: the datastores that queue their writes
+    :param consumers: the number of consumer threads started by start()
+    '''
+
+    def __init__(self, db_provider, handlers, connectors, enabled=False, consumers=0, batch_size=10, block_ms=1000,
+                 claim_idle_ms=30000, max_deliveries=5, max_len=100000, consumer_name=None):
+        self._db_provider = db_provider
+        self.handlers = handlers
+        self.connectors = connectors or []
+        self.enabled = enabled
+        self.consumers = consumers
+        self.batch_size = batch_size
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+        self.max_len = max_len
+        self.consumer_name = consumer_name or "{}-{}".format(socket.gethostname(), os.getpid())
+        self.written = 0
+        self.rejected = 0
+        self.claimed = 0
+        self.dead = 0
+        self.errors = 0
+        self.last_error = None
+        self._log = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._groups = set()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def is_enabled(self, datastore):
+        return self.enabled and datastore in self.connectors
+
+    def get_stream_name(self, datastore, collection_name):
+        return "{}:{}:{}".format(STREAM_PREFIX, datastore, collection_name)
+
+    def enqueue(self, datastore, collection_name, record):
+        '''
+        add a batch to the stream of its collection
+
+        :param record: a json serializable dict, it is given to write_deferred_batch as it is
+
+        :return: the id of the batch in the stream
+        :raise QueueFull: if the stream already contains max_len batches
+        '''
+        db = self._db_provider()
+        stream = self.get_stream_name(datastore, collection_name)
+        #the written batches are deleted, so the length of a stream is its backlog
+        if self.max_len and db.xlen(stream) >= self.max_len:
+            raise QueueFull("the ingestion queue of {} is full".format(stream))
+        pipeline = db.pipeline(transaction=False)
+        pipeline.sadd(STREAMS_KEY, stream)
+        pipeline.xadd(stream, {"datastore": datastore, "record": json.dumps(record)})
+        return decode(pipeline.execute()[1])
+
+    async def append_async(self, datastore, collection_name, record):
+        '''
+        add a batch without blocking the event loop
+        '''
+        return await asyncio.get_running_loop().run_in_executor(None, self.enqueue, datastore, collection_name, record)
+
+    def start(self):
+        '''
+        start the consumer threads of this node
+        '''
+        if not self.enabled:
+            return
+        for index in range(self.consumers):
+            name = "{}-{}".format(self.consumer_name, index)
+            thread = threading.Thread(target=self._consume, args=(name,), name="ingest-{}".format(index), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def close(self):
+        '''
+        stop the consumers, the batches being written are claimed by another consumer if they are not acknowledged
+        '''
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def get_streams(self, db):
+        '''
+        list the streams of the queued datastores and create their consumer group
+        '''
+        streams = []
+        for stream in sorted(decode(stream) for stream in db.smembers(STREAMS_KEY)):
+            if stream.split(":")[2] not in self.connectors:
+                continue
+            if stream not in self._groups:
+                try:
+                    db.xgroup_create(stream, GROUP, id="0", mkstream=True)
+                except ResponseError as e:
+                    if "BUSYGROUP" not in str(e):
+                        raise
+                with self._lock:
+                    self._groups.add(stream)
+            streams.append(stream)
+        return streams
+
+    def _consume(self, name):
+        while not self._stopped.is_set():
+            try:
+                db = self._db_provider()
+                streams = self.get_streams(db)
+                if not streams:
+                    self._stopped.wait(self.block_ms / 1000)
+                    continue
+                self.claim_batches(db, name, streams)
+                for stream, messages in db.xreadgroup(GROUP, name, {stream: ">" for stream in streams}, count=self.batch_size, block=self.block_ms) or []:
+                    for message_id, fields in messages:
+                        self.write_batch(db, decode(stream), message_id, fields)
+            except Exception as e:
+                self._log.exception(e)
+                with self._lock:
+                    self.errors = self.errors + 1
+                    self.last_error = str(e)
+                self._stopped.wait(self.block_ms / 1000)
+
+    def claim_batches(self, db, name, streams):
+        '''
+        write the batches that were not acknowledged since claim_idle_ms, and
+        move the batches delivered max_deliveries times to the dead letter stream
+        '''
+        for stream in streams:
+            pending = db.xpending_range(stream, GROUP, "-", "+", self.batch_size)
+            idle = [item for item in pending if item["time_since_delivered"] >= self.claim_idle_ms]
+            for item in idle:
+                if item["times_delivered"] >= self.max_deliveries:
+                    self.move_to_dead_letter(db, stream, item["message_id"])
+            ids = [item["message_id"] for item in idle if item["times_delivered"] < self.max_deliveries]
+            if not ids:
+                continue
+            #an other consumer can claim the same batches first, xclaim only returns the ones we got
+            messages = [(message_id, fields) for message_id, fields in db.xclaim(stream, GROUP, name, self.claim_idle_ms, ids) if fields]
+            with self._lock:
+                self.claimed = self.claimed + len(messages)
+            for message_id, fields in messages:
+                self.write_batch(db, stream, message_id, fields)
+
+    def write_batch(self, db, stream, message_id, fields):
+        fields = {decode(key): decode(value) for key, value in fields.items()}
+        try:
+            handler = self.handlers[fields["datastore"]]
+            rejected = handler().write_deferred_batch(json.loads(fields["record"]))
+        except Exception as e:
+            #the batch stays pending and is claimed again after claim_idle_ms
+            self._log.exception(e)
+            with self._lock:
+                self.errors = self.errors + 1
+                self.last_error = str(e)
+            return False
+        self.acknowledge(db, stream, message_id)
+        with self._lock:
+            self.written = self.written + 1
+            self.rejected = self.rejected + (rejected or 0)
+        return True
+
+    def acknowledge(self, db, stream, message_id):
+        pipeline = db.pipeline(transaction=False)
+        pipeline.xack(stream, GROUP, message_id)
+        pipeline.xdel(stream, message_id)
+        pipeline.execute()
+
+    def move_to_dead_letter(self, db, stream, message_id):
+        messages = db.xrange(stream, message_id, message_id)
+        if messages:
+            db.xadd(stream + DEAD_LETTER_SUFFIX, messages[0][1])
+        self._log.error("the batch %s of %s was delivered %s times, it is moved to %s",
+                        decode(message_id), stream, self.max_deliveries, stream + DEAD_LETTER_SUFFIX)
+        self.acknowledge(db, stream, message_id)
+        with self._lock:
+            self.dead = self.dead + 1
+
+    def get_stats(self):
+        stats = {}
+        with self._lock:
+            stats["consumers"] = len(self._threads)
+            stats["written"] = self.written
+            stats["rejected"] = self.rejected
+            stats["claimed"] = self.claimed
+            stats["dead"] = self.dead
+            stats["errors"] = self.errors
+            stats["last_error"] = self.last_error
+        db = self._db_provider()
+        stats["streams"] = {}
+        for stream in self.get_streams(db):
+            stats["streams"][stream] = {
+                "length": db.xlen(stream),
+                "pending": db.xpending(stream, GROUP)["pending"],
+                "dead": db.xlen(stream + DEAD_LETTER_SUFFIX)
+            }
+        return stats
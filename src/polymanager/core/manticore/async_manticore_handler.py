@@ -0,0 +1,58 @@
+import json
+from polymanager.core.async_handler import AsyncHandler, iter_chunks
+
+
+class AsyncManticoreHandler(AsyncHandler):
+    '''
+    async variant of the manticore handler for the requests of the REST API.
+    The requests are built by the sync handler, only the I/O is done here.
+    '''
+
+    def __init__(self, handler, pool_size=10):
+        super().__init__(pool_size)
+        self.handler = handler
+        self.url = handler.url
+
+    async def sql(self, query):
+        res = await self.client.post(self.url+"/sql", content="mode=raw&query={}".format(query))
+        return res.text
+
+    async def delete_document(self, table, doc_id):
+        return await self.sql("DELETE FROM {} WHERE id={}".format(table, doc_id))
+
+    async def delete_documents(self, table, docs_id):
+        return await self.sql("DELETE FROM {} WHERE id IN ({})".format(table, ",".join(docs_id)))
+
+    async def send_bulk(self, payload):
+        if self.handler.bulk_chunked:
+            content = iter_chunks(payload)
+        else:
+            content = b"".join(payload)
+        response = await self.client.post(
+            self.url + "/json/bulk",
+            headers={"Content-Type": "application/x-ndjson"},
+            content=content)
+        return self.handler.get_bulk_items(response.status_code, response.json())
+
+    async def bulk_documents(self, action, success_status, collection_name, documents_list):
+        res = {document["id"]: False for document in documents_list}
+        offset = 0
+        lines = self.handler.build_bulk_commands(action, collection_name, documents_list)
+        for payload in self.handler.split_bulk(lines):
+            items = await self.send_bulk(payload)
+            self.handler.read_bulk_items(res, action, success_status, documents_list[offset:offset + len(payload)], items)
+            offset = offset + len(payload)
+        return res
+
+    async def bulk_replace_documents(self, collection_name, documents_list):
+        return await self.bulk_documents("replace", 200, collection_name, documents_list)
+
+    async def bulk_add_documents(self, collection_name, documents_list):
+        return await self.bulk_documents("insert", 201, collection_name, documents_list)
+
+    async def search(self, query):
+        response = await self.client.post(
+            self.url + "/json/search",
+            headers={"Content-Type": "application/json"},
+            content=json.dumps(query))
+        return self.handler.get_search_result(response.status_code, response.json())
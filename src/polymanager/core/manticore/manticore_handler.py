@@ -1,125 +1,171 @@
 import json
-import requests
 import logging
 from polymanager.core.document_handler import DocumentHandler
+from polymanager.helper.pool_helper import create_session, get_session_stats
 
 class ManticoreHandler(DocumentHandler):
 
     def __init__(
                 self,
-                hostname="127.0.0.1", port="9308"
+                hostname="127.0.0.1", port="9308", pool_size=10,
+                bulk_max_bytes=4194304, bulk_chunked=False
                 ):
         self.hostname = hostname
         self.port = port
         self.url = "http://{}:{}".format(self.hostname, self.port)
+        self.session = create_session(pool_size)
+        self.bulk_max_bytes = bulk_max_bytes
+        self.bulk_chunked = bulk_chunked
         self._log = logging.getLogger(__name__)
 
+    def get_pool_stats(self):
+        return get_session_stats(self.session)
+
     def insert_schema(self, schema):
         gen_chema = schema.generate_schema()
         if gen_chema:
-            res = requests.post(self.url+"/sql",data=gen_chema)
+            res = self.session.post(self.url+"/sql",data=gen_chema)
             print(res.text)
 
     def get_tables(self):
         req = "mode=raw&query=show tables;"
-        res = requests.post(self.url+"/sql",data=req)
+        res = self.session.post(self.url+"/sql",data=req)
         return json.loads(res.text)
 
     def query(self, query):
         req = "mode=raw&query={}".format(query)
-        res = requests.post(self.url+"/sql",data=req)
+        res = self.session.post(self.url+"/sql",data=req)
         return json.loads(res.text)
 
     def truncate(self, table):
         req = "mode=raw&query=TRUNCATE TABLE {}".format(table)
-        res = requests.post(self.url+"/sql", data=req)
+        res = self.session.post(self.url+"/sql", data=req)
         print(res.text)
 
     def delete_document(self, table, doc_id):
         req = "mode=raw&query=DELETE FROM {} WHERE id={}".format(table, doc_id)
-        res = requests.post(self.url+"/sql",
+        res = self.session.post(self.url+"/sql",
         data=req)
         print(res.text)
 
     def delete_documents(self, table, docs_id):
         req = "mode=raw&query=DELETE FROM {} WHERE id IN ({})".format(table, ",".join(docs_id))
-        res = requests.post(self.url+"/sql",
+        res = self.session.post(self.url+"/sql",
         data=req)
         print(res.text)
 
     def delete_schema(self, schema):
         req = "mode=raw&query=DROP TABLE IF EXISTS {}".format(schema.get_collection_name())
-        res = requests.post(self.url+"/sql",
+        res = self.session.post(self.url+"/sql",
         data=req)
         print(res.text)
 
     def build_add_documents(self, index_name, documents_list):
-        ndjson = ""
-        if not documents_list:
-            raise Exception("documents list is empty")
-        for document_obj in documents_list:
-            command = dict()
-            command["insert"] = dict()
-            doc = command["insert"]
-            doc["index"] = index_name
-            doc["id"] = document_obj["id"]
-            doc["doc"] = dict(document_obj)
-            doc["doc"].pop("id")
-            #doc["doc"].update(document_obj)
-            ndjson += json.dumps(command) + "\n"
-        return ndjson
+        return self.build_bulk_commands("insert", index_name, documents_list)
 
     def build_replace_documents(self, index_name, documents_list):
-        ndjson = ""
+        return self.build_bulk_commands("replace", index_name, documents_list)
+
+    def build_bulk_commands(self, action, index_name, documents_list):
+        '''
+        generate the ndjson lines of a bulk request, one line per document
+        '''
         if not documents_list:
             raise Exception("documents list is empty")
         for document_obj in documents_list:
-            command = dict()
-            command["replace"] = dict()
-            doc = command["replace"]
+            doc = dict()
             doc["index"] = index_name
             doc["id"] = document_obj["id"]
             doc["doc"] = dict(document_obj)
             doc["doc"].pop("id")
-            #doc["doc"].update(document_obj)
-            ndjson += json.dumps(command) + "\n"
-        return ndjson
+            yield json.dumps({action: doc}).encode("utf-8") + b"\n"
 
-    def bulk_replace_documents(self, collection_name, documents_list):
+    def split_bulk(self, lines):
         '''
-        add a list of documents for indexation in manticore
-
-        :param documents_list: A list of dict document with properties
-
-        :return: A dict that tells for every node_id
-        if it has been indexed or not
+        group the ndjson lines in payloads of at most bulk_max_bytes bytes,
+        a line bigger than bulk_max_bytes is sent alone
         '''
+        payload = []
+        size = 0
+        for line in lines:
+            if payload and size + len(line) > self.bulk_max_bytes:
+                yield payload
+                payload = []
+                size = 0
+            payload.append(line)
+            size = size + len(line)
+        if payload:
+            yield payload
+
+    def send_bulk(self, payload):
         url = self.url + "/json/bulk"
-        ndjson = self.build_replace_documents(collection_name, documents_list)
-        response = requests.get(
+        if self.bulk_chunked:
+            #a generator body is sent with a chunked transfer encoding
+            data = iter(payload)
+        else:
+            data = b"".join(payload)
+        response = self.session.post(
                                 url,
                                 headers={
                                     "Content-Type":
                                     "application/x-ndjson"
                                     },
-                                data=ndjson
+                                data=data
                                 )
+        return self.get_bulk_items(response.status_code, response.json())
 
-        res = {document["id"]: False for document in documents_list}
-        if response.status_code == 200 or response.status_code == 500:
-            parsed_resp = response.json()
+    def get_bulk_items(self, status_code, parsed_resp):
+        if status_code == 200 or status_code == 500:
             if "items" not in parsed_resp:
-                raise Exception(response.json())
-            for indice, item in enumerate(parsed_resp["items"]):
-                node_id = documents_list[indice]["id"]
-                if "replace" not in item:
-                    raise Exception(response.json())
-                insert_item = item["replace"]
-                if insert_item["status"] == 200:
-                    res[node_id] = True
-            return res
+                raise Exception(parsed_resp)
+            return parsed_resp["items"]
         else:
-            raise Exception(response.json())
+            raise Exception(parsed_resp)
+
+    def bulk_documents(self, action, success_status, collection_name, documents_list):
+        res = {document["id"]: False for document in documents_list}
+        offset = 0
+        lines = self.build_bulk_commands(action, collection_name, documents_list)
+        for payload in self.split_bulk(lines):
+            items = self.send_bulk(payload)
+            self.read_bulk_items(res, action, success_status, documents_list[offset:offset + len(payload)], items)
+            offset = offset + len(payload)
+        return res
+
+    def read_bulk_items(self, res, action, success_status, documents_list, items):
+        '''
+        set in res the status of the documents of a bulk payload from the items of its response
+        '''
+        for indice, item in enumerate(items[:len(documents_list)]):
+            doc_id = documents_list[indice]["id"]
+            if action not in item:
+                raise Exception(items)
+            if item[action]["status"] == success_status:
+                res[doc_id] = True
+
+    def bulk_replace_documents(self, collection_name, documents_list):
+        '''
+        replace a list of documents in manticore
+
+        :param documents_list: A list of dict document with properties
+
+        :return: A dict that tells for every document id, in the order of documents_list,
+        if it has been replaced or not
+        '''
+        return self.bulk_documents("replace", 200, collection_name, documents_list)
+
+    def write_deferred_batch(self, record):
+        '''
+        index a batch of the write-ahead spool or of the ingestion queue, the documents
+        are replaced so a batch written twice does not fail on its existing ids
+
+        :return: the number of rejected documents
+        '''
+        res = self.bulk_replace_documents(record["collection"], record["rows"])
+        rejected = [doc_id for doc_id, indexed in res.items() if not indexed]
+        if rejected:
+            self._log.error("the documents %s of %s were not indexed", rejected, record["collection"])
+        return len(rejected)
 
     def bulk_add_documents(self, collection_name, documents_list):
         '''
@@ -127,35 +173,10 @@ class ManticoreHandler(DocumentHandler):
 
         :param documents_list: A list of dict document with properties
 
-        :return: A dict that tells for every node_id
+        :return: A dict that tells for every document id, in the order of documents_list,
         if it has been indexed or not
         '''
-        url = self.url + "/json/bulk"
-        ndjson = self.build_add_documents(collection_name, documents_list)
-        response = requests.get(
-                                url,
-                                headers={
-                                    "Content-Type":
-                                    "application/x-ndjson"
-                                    },
-                                data=ndjson
-                                )
-
-        res = {document["id"]: False for document in documents_list}
-        if response.status_code == 200 or response.status_code == 500:
-            parsed_resp = response.json()
-            if "items" not in parsed_resp:
-                raise Exception(response.json())
-            for indice, item in enumerate(parsed_resp["items"]):
-                doc_id = documents_list[indice]["id"]
-                if "insert" not in item:
-                    raise Exception(response.json())
-                insert_item = item["insert"]
-                if insert_item["status"] == 201:
-                    res[doc_id] = True
-            return res
-        else:
-            raise Exception(response.json())
+        return self.bulk_documents("insert", 201, collection_name, documents_list)
 
     def add_document(self, document):
         url = self.url + "/json/insert"
@@ -166,7 +187,7 @@ class ManticoreHandler(DocumentHandler):
         doc["doc"] = dict()
         doc["doc"].update(document)
 
-        response = requests.get(url, headers={"Content-Type":
+        response = self.session.get(url, headers={"Content-Type":
                                 "application/json"}, data=json.dumps(doc))
         if response.status_code != 200:
             raise Exception(response.json())
@@ -177,6 +198,23 @@ class ManticoreHandler(DocumentHandler):
             return False
         return True
 
+    def search(self, query):
+        '''
+        run a search with the json api of manticore
+
+        :param query: the json body of the search
+
+        :return: the hits and the total number of documents that match the query
+        '''
+        url = self.url + "/json/search"
+        response = self.session.post(url, headers={"Content-Type": "application/json"}, data=json.dumps(query))
+        return self.get_search_result(response.status_code, response.json())
+
+    def get_search_result(self, status_code, parsed_resp):
+        if status_code != 200 or "hits" not in parsed_resp:
+            raise Exception(parsed_resp)
+        return {"total": parsed_resp["hits"]["total"], "hits": parsed_resp["hits"]["hits"]}
+
     def page_documents(self, index_name, request, page, per_page, sort_attr, threats, countries):
         url = self.url + "/json/search"
         doc = dict()
@@ -203,10 +241,10 @@ class ManticoreHandler(DocumentHandler):
                 ]
 
         self._log.info(doc)
-        response = requests.post(url, headers={"Content-Type": "application/json"}, data=json.dumps(doc))
+        response = self.session.post(url, headers={"Content-Type": "application/json"}, data=json.dumps(doc))
         if response.status_code != 200:
             raise Exception(response.json())
         parsed_resp = response.json()
         if not parsed_resp["hits"]:
             raise Exception(response.json())
-        return parsed_resp["hits"]["hits"]
\ No newline at end of file
+        return parsed_resp["hits"]["hits"]
\ No newline at end of file
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class SearchCache:
+    '''
+    small LRU cache of the search results of manticore collections.
+
+    Entries expire after ttl_ms milliseconds. A write on a collection bumps its
+    generation so the results cached before the write are never served again.
+    Writes done by other nodes are only seen once the entries expire.
+    '''
+
+    def __init__(self, max_size=1000, ttl_ms=2000):
+        self.max_size = max_size
+        self.ttl_ms = ttl_ms
+        self._results = OrderedDict()
+        self._generations = dict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def fetch(self, collection_name, query, loader):
+        '''
+        return the cached result of a query or run it with loader()
+
+        :param collection_name: the name of the collection
+        :param query: the json body of the search
+        :param loader: a callable that runs the search
+
+        :return: the result of the search
+        '''
+        if not self.max_size:
+            return loader()
+        now = time.monotonic()
+        key, found, result = self._lookup(collection_name, query, now)
+        if found:
+            return result
+        result = loader()
+        self._store(key, now, result)
+        return result
+
+    async def fetch_async(self, collection_name, query, loader):
+        '''
+        same as fetch with a loader that returns a coroutine
+        '''
+        if not self.max_size:
+            return await loader()
+        now = time.monotonic()
+        key, found, result = self._lookup(collection_name, query, now)
+        if found:
+            return result
+        result = await loader()
+        self._store(key, now, result)
+        return result
+
+    def _lookup(self, collection_name, query, now):
+        with self._lock:
+            key = (collection_name, self._generations.get(collection_name, 0), json.dumps(query, sort_keys=True))
+            if key in self._results:
+                expires, result = self._results[key]
+                if expires > now:
+                    self._results.move_to_end(key)
+                    self.hits = self.hits + 1
+                    return key, True, result
+                del self._results[key]
+            self.misses = self.misses + 1
+        return key, False, None
+
+    def _store(self, key, now, result):
+        collection_name = key[0]
+        with self._lock:
+            #do not store a result that was invalidated by a write while we were loading it
+            if key[1] != self._generations.get(collection_name, 0):
+                return
+            self._results[key] = (now + self.ttl_ms / 1000, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_size:
+                self._results.popitem(last=False)
+
+    def invalidate(self, collection_name):
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            for key in [key for key in self._results if key[0] == collection_name]:
+                del self._results[key]
+            self.invalidations = self.invalidations + 1
+
+    def get_stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0,
+                "invalidations": self.invalidations,
+                "size": len(self._results)
+            }
@@ -0,0 +1,399 @@
+import asyncio
+import json
+import logging
+import os
+import shutil
+import struct
+import threading
+import zlib
+from polymanager.exceptions.spool_exception import SpoolFull
+
+#a record is its sequence number, the size and the crc32 of its payload followed by the payload
+RECORD_HEADER = struct.Struct(">QII")
+SEGMENT_SUFFIX = ".log"
+CHECKPOINT_FILE = "checkpoint"
+#the batches that could not be replayed, with the same record format as the segments
+DEAD_LETTER_FILE = "dead-letter"
+
+
+def segment_name(first_seq):
+    return "{:020d}{}".format(first_seq, SEGMENT_SUFFIX)
+
+def read_records(path, offset=0):
+    '''
+    read the valid records of a segment from offset
+
+    :return: a generator of (sequence number, payload, offset of the next record),
+    it stops at the end of the segment or at the first torn or corrupted record
+    '''
+    with open(path, "rb") as segment:
+        segment.seek(offset)
+        while True:
+            header = segment.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            seq, size, crc = RECORD_HEADER.unpack(header)
+            payload = segment.read(size)
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                return
+            offset = offset + RECORD_HEADER.size + size
+            yield seq, payload, offset
+
+def is_retryable(error):
+    '''
+    a batch refused with a 4xx error is refused again, except for a timeout or a rate limit
+    '''
+    status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return not (isinstance(status_code, int) and 400 <= status_code < 500 and status_code not in [408, 429])
+
+
+class Spool:
+    '''
+    durable write-ahead log of the batches written in a collection.
+
+    A batch is appended to the current segment file and acknowledged once the
+    segment is fsynced, the appends that wait for the same fsync share it.
+    A background thread replays the batches in order with replay(record),
+    it retries a batch until the database accepts it and saves the sequence
+    number of the last replayed batch in the checkpoint file. A batch that
+    failed max_attempts times, or that was refused with a 4xx error, is moved
+    to the dead letter file so it does not block the batches that follow it.
+    The segments that are fully replayed are deleted, and appends fail with
+    SpoolFull when the segments would use more than max_bytes.
+    '''
+
+    def __init__(self, directory, replay, segment_bytes=67108864, max_bytes=1073741824, retry_min_ms=100, retry_max_ms=30000, max_attempts=10):
+        self.directory = directory
+        self.replay = replay
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.retry_min_ms = retry_min_ms
+        self.retry_max_ms = retry_max_ms
+        self.max_attempts = max_attempts
+        self.replayed = 0
+        self.rejected = 0
+        self.errors = 0
+        self.last_error = None
+        self._log = logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._sync_lock = threading.Lock()
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+        self._checkpoint = self._read_checkpoint()
+        self.dead = len(list(self._read_dead_letters()))
+        self._segments = self._recover_segments()
+        self._total_bytes = sum(size for first_seq, size in self._segments)
+        last_seq = self._checkpoint
+        if self._segments:
+            first_seq, size = self._segments[-1]
+            last_seq = max(last_seq, first_seq - 1)
+            for seq, payload, offset in read_records(self._segment_path(first_seq)):
+                last_seq = max(last_seq, seq)
+        self._next_seq = last_seq + 1
+        self._synced_seq = last_seq
+        self._writer = None
+        self._thread = threading.Thread(target=self._run, name="spool-{}".format(os.path.basename(directory)), daemon=True)
+        self._thread.start()
+
+    def _segment_path(self, first_seq):
+        return os.path.join(self.directory, segment_name(first_seq))
+
+    def _read_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as checkpoint:
+                return int(checkpoint.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_checkpoint(self, seq):
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        with open(path + ".tmp", "w") as checkpoint:
+            checkpoint.write(str(seq))
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _read_dead_letters(self):
+        path = os.path.join(self.directory, DEAD_LETTER_FILE)
+        if not os.path.exists(path):
+            return iter([])
+        return read_records(path)
+
+    def _write_dead_letter(self, seq, record, error):
+        '''
+        append a batch that could not be replayed to the dead letter file, with its last error
+        '''
+        payload = json.dumps({"record": record, "error": str(error)}).encode("utf-8")
+        with open(os.path.join(self.directory, DEAD_LETTER_FILE), "ab") as dead_letter:
+            dead_letter.write(RECORD_HEADER.pack(seq, len(payload), zlib.crc32(payload)) + payload)
+            dead_letter.flush()
+            os.fsync(dead_letter.fileno())
+
+    def _recover_segments(self):
+        '''
+        list the segments and cut the torn record that a crash can leave at the end of the last one
+        '''
+        names = sorted(name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        segments = [(int(name[:-len(SEGMENT_SUFFIX)]), os.path.getsize(os.path.join(self.directory, name))) for name in names]
+        if segments:
+            first_seq, size = segments[-1]
+            end = 0
+            for seq, payload, offset in read_records(self._segment_path(first_seq)):
+                end = offset
+            if end < size:
+                self._log.warning("truncating the torn end of %s at %s", self._segment_path(first_seq), end)
+                with open(self._segment_path(first_seq), "r+b") as segment:
+                    segment.truncate(end)
+                    os.fsync(segment.fileno())
+                segments[-1] = (first_seq, end)
+        return segments
+
+    def append(self, record):
+        '''
+        append a batch to the spool and wait until it is on disk
+
+        :param record: a json serializable dict, it is given to replay as it is
+
+        :return: the sequence number of the batch
+        :raise SpoolFull: if the spool uses max_bytes
+        '''
+        payload = json.dumps(record).encode("utf-8")
+        size = RECORD_HEADER.size + len(payload)
+        with self._cond:
+            if self._closed:
+                raise Exception("the spool {} is closed".format(self.directory))
+            if self._total_bytes + size > self.max_bytes:
+                raise SpoolFull("the spool {} is full".format(self.directory))
+            seq = self._next_seq
+            if self._writer is None or self._segments[-1][1] >= self.segment_bytes:
+                self._open_segment(seq)
+            self._writer.write(RECORD_HEADER.pack(seq, len(payload), zlib.crc32(payload)) + payload)
+            self._writer.flush()
+            self._next_seq = seq + 1
+            first_seq, segment_size = self._segments[-1]
+            self._segments[-1] = (first_seq, segment_size + size)
+            self._total_bytes = self._total_bytes + size
+        self._sync(seq)
+        return seq
+
+    async def append_async(self, record):
+        '''
+        append a batch without blocking the event loop while the segment is fsynced
+        '''
+        return await asyncio.get_running_loop().run_in_executor(None, self.append, record)
+
+    def _open_segment(self, seq):
+        if self._writer is not None:
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+            self._writer.close()
+        if not self._segments or self._segments[-1][1] > 0:
+            self._segments.append((seq, 0))
+        else:
+            #the last segment is empty, it is reused
+            os.rename(self._segment_path(self._segments[-1][0]), self._segment_path(seq))
+            self._segments[-1] = (seq, 0)
+        self._writer = open(self._segment_path(self._segments[-1][0]), "ab")
+
+    def _sync(self, seq):
+        with self._sync_lock:
+            if self._synced_seq >= seq:
+                #an other append already synced this batch
+                return
+            with self._cond:
+                #the segments before the current one were synced when they were closed
+                writer = self._writer
+                last_seq = self._next_seq - 1
+            try:
+                os.fsync(writer.fileno())
+            except ValueError:
+                #the segment was closed, and synced, by a rotation in the meantime
+                pass
+            with self._cond:
+                self._synced_seq = max(self._synced_seq, last_seq)
+                self._cond.notify_all()
+
+    def close(self):
+        '''
+        stop the replay, the batches that are not replayed yet stay in the spool
+        '''
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        with self._cond:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                "pending": self._synced_seq - self._checkpoint,
+                "bytes": self._total_bytes,
+                "segments": len(self._segments),
+                "checkpoint": self._checkpoint,
+                "replayed": self.replayed,
+                "rejected": self.rejected,
+                "errors": self.errors,
+                "dead": self.dead,
+                "last_error": self.last_error
+            }
+
+    def _next_record(self, position):
+        '''
+        wait for the batch that follows the checkpoint
+
+        :param position: the first sequence number and the offset of the last batch read
+        :return: (sequence number, record, position of the next batch) or None if the spool is closed
+        '''
+        with self._cond:
+            while not self._closed and self._synced_seq <= self._checkpoint:
+                self._cond.wait()
+            if self._closed:
+                return None
+            segments = [first_seq for first_seq, size in self._segments]
+        first_seq, offset = position
+        if first_seq not in segments:
+            first_seq, offset = segments[0], 0
+        for index in range(segments.index(first_seq), len(segments)):
+            for seq, payload, end in read_records(self._segment_path(segments[index]), offset):
+                if seq > self._checkpoint:
+                    return seq, json.loads(payload), (segments[index], end)
+                offset = end
+            offset = 0
+        raise Exception("the batch {} of the spool {} can not be read".format(self._checkpoint + 1, self.directory))
+
+    def _replay_record(self, seq, record):
+        attempts = 0
+        while True:
+            try:
+                rejected = self.replay(record)
+                with self._cond:
+                    self.rejected = self.rejected + (rejected or 0)
+                return True
+            except Exception as e:
+                self._log.exception(e)
+                attempts = attempts + 1
+                with self._cond:
+                    self.errors = self.errors + 1
+                    self.last_error = str(e)
+                if attempts >= self.max_attempts or not is_retryable(e):
+                    self._log.error("moving the batch %s of %s to the dead letter file after %s attempts", seq, self.directory, attempts)
+                    self._write_dead_letter(seq, record, e)
+                    with self._cond:
+                        self.dead = self.dead + 1
+                    return True
+                with self._cond:
+                    #the batch is retried until the database is back, unless the spool is closed
+                    delay = min(self.retry_max_ms, self.retry_min_ms * 2 ** (attempts - 1)) / 1000
+                    self._cond.wait(delay)
+                    if self._closed:
+                        return False
+
+    def _release_segments(self):
+        '''
+        delete the segments that only contain replayed batches
+        '''
+        with self._cond:
+            released = []
+            while len(self._segments) > 1 and self._segments[1][0] <= self._checkpoint + 1:
+                released.append(self._segments.pop(0))
+            self._total_bytes = self._total_bytes - sum(size for first_seq, size in released)
+        for first_seq, size in released:
+            os.remove(self._segment_path(first_seq))
+
+    def _run(self):
+        position = (None, 0)
+        while True:
+            try:
+                next_record = self._next_record(position)
+            except Exception as e:
+                self._log.exception(e)
+                return
+            if next_record is None:
+                return
+            seq, record, position = next_record
+            if not self._replay_record(seq, record):
+                return
+            self._write_checkpoint(seq)
+            with self._cond:
+                self._checkpoint = seq
+                self.replayed = self.replayed + 1
+            self._release_segments()
+
+
+class SpoolRegistry:
+    '''
+    keep one spool for every collection, in directory/datastore/collection
+
+    :param handlers: a dict of the providers of the sync handlers of the datastores,
+    a spooled batch is replayed with handler.write_deferred_batch(record)
+    :param connectors: the datastores that spool their writes
+    '''
+
+    def __init__(self, directory, handlers, connectors, segment_bytes=67108864, max_bytes=1073741824, max_attempts=10):
+        self.directory = directory
+        self.handlers = handlers
+        self.connectors = connectors or []
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.max_attempts = max_attempts
+        self._spools = dict()
+        self._lock = threading.Lock()
+
+    def is_enabled(self, datastore):
+        return bool(self.directory) and datastore in self.connectors
+
+    def get_spool(self, datastore, collection_name):
+        with self._lock:
+            key = (datastore, collection_name)
+            if key not in self._spools:
+                handler = self.handlers[datastore]
+                self._spools[key] = Spool(
+                    os.path.join(self.directory, datastore, collection_name),
+                    lambda record: handler().write_deferred_batch(record),
+                    segment_bytes=self.segment_bytes,
+                    max_bytes=self.max_bytes,
+                    max_attempts=self.max_attempts
+                )
+            return self._spools[key]
+
+    def delete_spool(self, datastore, collection_name):
+        '''
+        stop the spool of a deleted collection and remove its directory with the batches that are not replayed
+        '''
+        if not self.is_enabled(datastore):
+            return
+        with self._lock:
+            spool = self._spools.pop((datastore, collection_name), None)
+        if spool is not None:
+            spool.close()
+        shutil.rmtree(os.path.join(self.directory, datastore, collection_name), ignore_errors=True)
+
+    async def append_async(self, datastore, collection_name, record):
+        return await self.get_spool(datastore, collection_name).append_async(record)
+
+    def recover(self):
+        '''
+        start the replay of the spools left by a previous run
+        '''
+        if not self.directory:
+            return
+        for datastore in self.connectors:
+            path = os.path.join(self.directory, datastore)
+            if os.path.isdir(path):
+                for collection_name in sorted(os.listdir(path)):
+                    self.get_spool(datastore, collection_name)
+
+    def close(self):
+        with self._lock:
+            spools = list(self._spools.values())
+            self._spools.clear()
+        for spool in spools:
+            spool.close()
+
+    def get_stats(self):
+        with self._lock:
+            spools = dict(self._spools)
+        return {"{}/{}".format(datastore, collection_name): spool.get_stats() for (datastore, collection_name), spool in spools.items()}
@@ -0,0 +1,12 @@
+class CompositeWriteError(Exception):
+    "raised when a write did not reach the targets required by the write mode"
+
+    def __init__(self, result, retry_after=None):
+        #result is the report of every target, it is returned as the detail of the error
+        self.result = result
+        #set when every failed target only refused the write for now, as a full spool
+        self.retry_after = retry_after
+        super().__init__("; ".join(
+            "{} {}: {}".format(target["datastore"], target["collection"], target["error"])
+            for target in result["targets"] if target["status"] == "failed"
+        ))
@@ -0,0 +1,2 @@
+class StageTimeout(Exception):
+    "raised when a stage of a federated search did not finish in time"
@@ -0,0 +1,5 @@
+class QueueFull(Exception):
+    "raised when the stream of a collection already has the most batches to write"
+
+    #seconds a client waits before sending the batch again, while the stream is consumed
+    retry_after = 1
@@ -0,0 +1,2 @@
+class LockTimeout(Exception):
+    "raised when a lock is held by another caller for too long"
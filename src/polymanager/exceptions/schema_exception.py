@@ -6,4 +6,14 @@ class ExistingSchema(Exception):
     pass
 
 class InvalidSchema(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class InvalidDocuments(InvalidSchema):
+    "raised when some documents of a batch do not match the schema"
+
+    def __init__(self, errors):
+        #errors is a dict that maps the index of a document to its error messages
+        self.errors = errors
+        super().__init__("; ".join(
+            "document {}: {}".format(index, ", ".join(messages)) for index, messages in sorted(errors.items())
+        ))
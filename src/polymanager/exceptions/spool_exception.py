@@ -0,0 +1,5 @@
+class SpoolFull(Exception):
+    "raised when the spool of a collection has no room for a batch"
+
+    #seconds a client waits before sending the batch again, while the spool is replayed
+    retry_after = 1
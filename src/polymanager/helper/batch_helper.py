@@ -0,0 +1,25 @@
+import asyncio
+
+#the maximum number of ids read by one request
+MAX_GET_IDS = 10000
+
+
+def iter_chunks(values, chunk_size):
+    for index in range(0, len(values), chunk_size):
+        yield values[index:index + chunk_size]
+
+async def gather_chunks(values, fetch_chunk, chunk_size=1000, concurrency=4):
+    '''
+    fetch the chunks of values concurrently, with at most concurrency chunks at a time
+
+    :param fetch_chunk: an async function that takes a list of at most chunk_size values and returns a list
+    :return: the results of all the chunks in one list
+    '''
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(chunk):
+        async with semaphore:
+            return await fetch_chunk(chunk)
+
+    results = await asyncio.gather(*[fetch(chunk) for chunk in iter_chunks(values, chunk_size)])
+    return [row for rows in results for row in rows]
@@ -9,25 +9,56 @@ def load_env():
     env["rest_port"] = os.environ.get('REST_PORT')
     env["kvrocks_hostname"] = os.environ.get('KVROCKS_HOSTNAME')
     env["kvrocks_port"] = os.environ.get('KVROCKS_PORT')
+    env["kvrocks_pool_size"] = int(os.environ.get('KVROCKS_POOL_SIZE', 10))
     env["connectors"] = os.environ.get('CONNECTORS').split(",")
+    #the write-ahead spool is enabled when SPOOL_DIR is set
+    env["spool_dir"] = os.environ.get('SPOOL_DIR')
+    env["spool_connectors"] = os.environ.get('SPOOL_CONNECTORS', os.environ.get('CONNECTORS')).split(",")
+    env["spool_segment_bytes"] = int(os.environ.get('SPOOL_SEGMENT_BYTES', 67108864))
+    env["spool_max_bytes"] = int(os.environ.get('SPOOL_MAX_BYTES', 1073741824))
+    env["spool_max_attempts"] = int(os.environ.get('SPOOL_MAX_ATTEMPTS', 10))
+    #the inserts are queued in kvrocks streams and written by the consumers of the worker nodes when INGEST_QUEUE is true
+    env["ingest_queue"] = os.environ.get('INGEST_QUEUE', "false").lower() == "true"
+    env["ingest_connectors"] = os.environ.get('INGEST_CONNECTORS', os.environ.get('CONNECTORS')).split(",")
+    env["ingest_consumers"] = int(os.environ.get('INGEST_CONSUMERS', 4 if env["node_type"] == "worker" else 0))
+    env["ingest_batch_size"] = int(os.environ.get('INGEST_BATCH_SIZE', 10))
+    env["ingest_claim_idle_ms"] = int(os.environ.get('INGEST_CLAIM_IDLE_MS', 30000))
+    env["ingest_max_deliveries"] = int(os.environ.get('INGEST_MAX_DELIVERIES', 5))
+    env["ingest_max_len"] = int(os.environ.get('INGEST_MAX_LEN', 100000))
+    env["ingest_pool_size"] = env["kvrocks_pool_size"] + env["ingest_consumers"]
 
     if "manticoresearch" in env["connectors"]:
         env["manticoresearch_hostname"] = os.environ.get('MANTICORESEARCH_HOSTNAME')
         env["manticoresearch_port"] = os.environ.get('MANTICORESEARCH_PORT')
+        env["manticoresearch_pool_size"] = int(os.environ.get('MANTICORESEARCH_POOL_SIZE', 10))
+        env["manticoresearch_bulk_max_bytes"] = int(os.environ.get('MANTICORESEARCH_BULK_MAX_BYTES', 4194304))
+        env["manticoresearch_bulk_chunked"] = os.environ.get('MANTICORESEARCH_BULK_CHUNKED', "false").lower() == "true"
+        env["manticoresearch_search_cache_size"] = int(os.environ.get('MANTICORESEARCH_SEARCH_CACHE_SIZE', 1000))
+        env["manticoresearch_search_cache_ttl_ms"] = int(os.environ.get('MANTICORESEARCH_SEARCH_CACHE_TTL_MS', 2000))
     
     if "clickhouse" in env["connectors"]:
         env["clickhouse_hostname"] = os.environ.get('CLICKHOUSE_HOSTNAME')
         env["clickhouse_port"] = os.environ.get('CLICKHOUSE_PORT')
+        env["clickhouse_pool_size"] = int(os.environ.get('CLICKHOUSE_POOL_SIZE', 10))
+        env["clickhouse_insert_format"] = os.environ.get('CLICKHOUSE_INSERT_FORMAT', "JSONEachRow")
+        env["clickhouse_compression"] = os.environ.get('CLICKHOUSE_COMPRESSION', "none")
+        env["clickhouse_delete_mode"] = os.environ.get('CLICKHOUSE_DELETE_MODE', "auto")
+        env["clickhouse_delete_window_ms"] = int(os.environ.get('CLICKHOUSE_DELETE_WINDOW_MS', 50))
 
     if "arangodb" in env["connectors"]:
         env["arangodb_hostname"] = os.environ.get('ARANGODB_HOSTNAME')
         env["arangodb_port"] = os.environ.get('ARANGODB_PORT')
         env["arangodb_user"] = os.environ.get('ARANGODB_USER')
         env["arangodb_password"] = os.environ.get('ARANGODB_PASSWORD')
+        env["arangodb_pool_size"] = int(os.environ.get('ARANGODB_POOL_SIZE', 10))
+        env["arangodb_chunk_size"] = int(os.environ.get('ARANGODB_CHUNK_SIZE', 1000))
+        env["arangodb_wait_for_sync"] = os.environ.get('ARANGODB_WAIT_FOR_SYNC', "false").lower() == "true"
     
     if "clickhouse" in env["connectors"]:
         if os.environ.get('DGRAPH_ADDRESSES'):
             env["dgraph_addresses"] = os.environ.get('DGRAPH_ADDRESSES').split(",")
         env["dgraph_port"] = os.environ.get('DGRAPH_PORT')
         env["dgraph_admin_port"] = os.environ.get('DGRAPH_ADMIN_PORT')
+        env["dgraph_chunk_size"] = int(os.environ.get('DGRAPH_CHUNK_SIZE', 1000))
+        env["dgraph_parallel_txns"] = int(os.environ.get('DGRAPH_PARALLEL_TXNS', 4))
     return env
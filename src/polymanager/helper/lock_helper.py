@@ -0,0 +1,67 @@
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager, asynccontextmanager
+from polymanager.exceptions.lock_exception import LockTimeout
+
+#the lock is only deleted by the caller that holds it
+RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+
+class KVRocksLock:
+    '''
+    a lock for every key, shared by all the polymanager processes.
+
+    A lock is a kvrocks key set with SET NX PX, it expires after ttl_ms if its
+    holder stops without releasing it. A caller that waits more than timeout_ms
+    for a lock gets a LockTimeout.
+    '''
+
+    def __init__(self, db_provider, prefix="polymanager:lock", ttl_ms=30000, timeout_ms=10000, retry_ms=10):
+        self.db_provider = db_provider
+        self.prefix = prefix
+        self.ttl_ms = ttl_ms
+        self.timeout_ms = timeout_ms
+        self.retry_ms = retry_ms
+
+    def get_name(self, key):
+        return "{}:{}".format(self.prefix, ":".join(str(part) for part in key))
+
+    @contextmanager
+    def hold(self, key):
+        name = self.get_name(key)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.timeout_ms / 1000
+        try:
+            while not self._acquire(name, token):
+                if time.monotonic() > deadline:
+                    raise LockTimeout("{} is locked by another update".format(name))
+                time.sleep(self.retry_ms / 1000)
+            yield
+        finally:
+            self._release(name, token)
+
+    @asynccontextmanager
+    async def hold_async(self, key):
+        '''
+        same as hold, the calls to kvrocks are run in the executor so the event loop is not blocked
+        '''
+        loop = asyncio.get_running_loop()
+        name = self.get_name(key)
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.timeout_ms / 1000
+        try:
+            while not await loop.run_in_executor(None, self._acquire, name, token):
+                if time.monotonic() > deadline:
+                    raise LockTimeout("{} is locked by another update".format(name))
+                await asyncio.sleep(self.retry_ms / 1000)
+            yield
+        finally:
+            #the release is also sent when the caller is cancelled while the lock is acquired
+            await loop.run_in_executor(None, self._release, name, token)
+
+    def _acquire(self, name, token):
+        return bool(self.db_provider().set(name, token, nx=True, px=self.ttl_ms))
+
+    def _release(self, name, token):
+        self.db_provider().eval(RELEASE_SCRIPT, 1, name, token)
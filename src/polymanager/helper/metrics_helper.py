@@ -0,0 +1,36 @@
+import threading
+
+
+class Histogram:
+    "a thread-safe histogram with cumulative buckets"
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._count = self._count + 1
+            self._sum = self._sum + value
+            for index, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    self._counts[index] = self._counts[index] + 1
+                    return
+            self._counts[-1] = self._counts[-1] + 1
+
+    def get_stats(self):
+        with self._lock:
+            buckets = {}
+            total = 0
+            for index, bucket in enumerate(self.buckets):
+                total = total + self._counts[index]
+                buckets["le_{}".format(bucket)] = total
+            buckets["le_inf"] = self._count
+            return {
+                "count": self._count,
+                "sum": self._sum,
+                "buckets": buckets
+            }
@@ -0,0 +1,58 @@
+import zlib
+from polymanager.exceptions.schema_exception import InvalidSchema
+
+#the openapi description of a request body sent as ndjson
+NDJSON_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/x-ndjson": {
+                "schema": {"type": "string", "format": "binary"}
+            }
+        }
+    }
+}
+
+async def iter_ndjson_lines(chunks, encoding=None, max_line_size=16777216, read_size=1048576):
+    '''
+    split an ndjson body in lines while it is received
+
+    :param chunks: an async iterator of the bytes of the body
+    :param encoding: the content encoding of the body, gzip or None
+    :param max_line_size: the maximum size of a line in bytes
+    :param read_size: the maximum size of the data decompressed at once
+
+    :return: an async generator of (line number, line), empty lines are skipped
+    '''
+    if encoding not in [None, "", "identity", "gzip"]:
+        raise InvalidSchema("{} is not a supported content encoding".format(encoding))
+    decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16) if encoding == "gzip" else None
+    line_number = 0
+    pending = b""
+    async for chunk in chunks:
+        for data in decompress(decompressor, chunk, read_size):
+            lines = (pending + data).split(b"\n")
+            pending = lines.pop()
+            if len(pending) > max_line_size:
+                raise InvalidSchema("line {} is bigger than {} bytes".format(line_number + len(lines) + 1, max_line_size))
+            for line in lines:
+                line_number = line_number + 1
+                if line.strip():
+                    yield line_number, line
+    if decompressor is not None and not decompressor.eof:
+        raise InvalidSchema("the gzip body is truncated")
+    if pending.strip():
+        yield line_number + 1, pending
+
+def decompress(decompressor, chunk, read_size):
+    if decompressor is None:
+        yield chunk
+        return
+    try:
+        #a small compressed chunk can expand a lot, it is decompressed by read_size bytes
+        data = decompressor.decompress(chunk, read_size)
+        yield data
+        while decompressor.unconsumed_tail:
+            yield decompressor.decompress(decompressor.unconsumed_tail, read_size)
+    except zlib.error as e:
+        raise InvalidSchema("invalid gzip body: {}".format(e))
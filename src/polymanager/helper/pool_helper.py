@@ -0,0 +1,85 @@
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+def create_session(pool_size=10, max_retries=0, adapter=None):
+    '''
+    create a requests session that keeps its connections alive
+
+    :param pool_size: the maximum number of connections kept per host
+    :param max_retries: the number of retries on connection errors
+    :param adapter: an existing adapter to share its pool with this session
+
+    :return: a requests.Session
+    '''
+    if adapter is None:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=max_retries)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def create_async_client(pool_size=10, auth=None, timeout=120):
+    '''
+    create an httpx AsyncClient that keeps its connections alive
+
+    :param pool_size: the maximum number of connections of the client
+    :param auth: a (user, password) tuple for basic authentication
+
+    :return: a httpx.AsyncClient
+    '''
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+    return httpx.AsyncClient(limits=limits, auth=auth, timeout=timeout)
+
+def get_async_client_stats(client):
+    '''
+    return the utilisation of the connection pool of a httpx AsyncClient
+    '''
+    pool = client._transport._pool
+    connections = list(pool.connections)
+    idle = len([conn for conn in connections if conn.is_idle()])
+    return {
+        "pool_size": pool._max_connections,
+        "in_use": len(connections) - idle,
+        "idle": idle,
+        "created": len(connections)
+    }
+
+def get_session_stats(session):
+    '''
+    return the utilisation of the connection pools of a requests session
+
+    :return: a dict with, for every host, the connections in use, the idle connections,
+    the number of connections created and the number of requests sent
+    '''
+    stats = {}
+    adapter = session.get_adapter("http://")
+    stats["pool_size"] = adapter._pool_maxsize
+    stats["hosts"] = {}
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        idle = len([conn for conn in list(pool.pool.queue) if conn is not None]) if pool.pool else 0
+        available = pool.pool.qsize() if pool.pool else 0
+        stats["hosts"]["{}:{}".format(pool.host, pool.port)] = {
+            "in_use": pool.pool.maxsize - available if pool.pool else 0,
+            "idle": idle,
+            "created": pool.num_connections,
+            "requests": pool.num_requests
+        }
+    return stats
+
+def get_redis_pool_stats(pool):
+    '''
+    return the utilisation of a redis BlockingConnectionPool
+    '''
+    created = len(pool._connections)
+    idle = len([conn for conn in list(pool.pool.queue) if conn is not None])
+    return {
+        "pool_size": pool.max_connections,
+        "in_use": created - idle,
+        "idle": idle,
+        "created": created
+    }
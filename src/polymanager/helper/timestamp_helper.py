@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+from dateutil.parser import parse
+import re
+
+#the ISO-8601/RFC3339 strings that fromisoformat parses like dateutil once normalized
+ISO_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})(?:[T ](\d{2}:\d{2}(?::\d{2})?)(?:\.(\d{1,9}))?(Z|[+-]\d{2}(?::?\d{2})?)?)?$")
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+#like pydantic, bigger epochs are in milliseconds
+MS_WATERSHED = int(2e10)
+CACHE_SIZE = 4096
+
+_parsed = {}
+
+def parse_iso_timestamp(value):
+    '''
+    parse an ISO-8601/RFC3339 string with fromisoformat
+
+    :return: the datetime, or None if the string is not in a supported format
+    '''
+    match = ISO_PATTERN.match(value)
+    if match is None:
+        return None
+    date, time, fraction, offset = match.groups()
+    if time is None:
+        text = date
+    else:
+        text = date + "T" + time
+        if fraction is not None:
+            if len(time) < 8:
+                return None
+            #dateutil truncates the fraction to microseconds
+            text = text + "." + fraction[:6].ljust(6, "0")
+        if offset == "Z":
+            text = text + "+00:00"
+        elif offset is not None:
+            digits = offset[1:].replace(":", "")
+            text = text + offset[0] + digits[:2] + ":" + (digits[2:] or "00")
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+def parse_epoch(value):
+    scale = 1
+    while abs(value) > MS_WATERSHED * scale:
+        scale = scale * 1000
+    if isinstance(value, int):
+        return EPOCH + timedelta(microseconds=value * 1000000 // scale)
+    return EPOCH + timedelta(seconds=value / scale)
+
+def remember_timestamp(value, parsed):
+    '''
+    keep the datetime parsed from a string, so the next parse of this string is a lookup
+    '''
+    if len(_parsed) >= CACHE_SIZE:
+        _parsed.clear()
+    _parsed[value] = parsed
+
+def parse_timestamp(value):
+    '''
+    parse a timestamp like dateutil.parser.parse does, with a fast path for the
+    ISO-8601/RFC3339 strings, the epochs and the datetimes already parsed
+
+    :param value: a string, an epoch in seconds or milliseconds or a datetime
+
+    :return: a datetime
+    '''
+    if isinstance(value, str):
+        parsed = _parsed.get(value)
+        if parsed is None:
+            parsed = parse_iso_timestamp(value)
+            if parsed is None:
+                #exotic formats and numeric strings are left to dateutil
+                return parse(value)
+            remember_timestamp(value, parsed)
+        return parsed
+    elif isinstance(value, datetime):
+        return value
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        return parse_epoch(value)
+    return parse(value)
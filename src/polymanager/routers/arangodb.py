@@ -1,10 +1,15 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from polymanager.routers.graph_models import *
 from polymanager.exceptions.schema_exception import UnkownSchema, ExistingSchema, InvalidSchema
+from polymanager.exceptions.spool_exception import SpoolFull
+from polymanager.exceptions.ingestion_exception import QueueFull
 from polymanager.schemas.arangodb.arangodb_schema import ArangodbSchema
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
-from polymanager.schemas.arangodb.arangodb_collection import ArangodbCollection
+from polymanager.schemas.arangodb.arangodb_collection import ArangodbCollection, AsyncArangodbCollection
+from polymanager.helper.ndjson_helper import NDJSON_REQUEST_BODY
+from polymanager.helper.batch_helper import MAX_GET_IDS
 import logging
 router = APIRouter()
 
@@ -78,13 +83,13 @@ def delete_arangodb_collection(collection: CollectionDel):
         raise HTTPException(status_code=500, detail=result)
 
 @router.post("/collection/arangodb/nodes", tags=["arangodb"])
-def add_arangodb_handler(node: Nodes):
+async def add_arangodb_handler(node: InsertNodes):
     try:
         result = {}
         collection_name = "{}".format(node.collection)
         internal_schema = KVRocksInternalSchema( "arangodb")
-        node_collection = ArangodbCollection(internal_schema, collection_name)
-        result = node_collection.add_nodes(node.nodes)
+        node_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        result = await node_collection.add_nodes(node.nodes, keys=node.keys, overwrite_mode=node.overwrite_mode, wait_for_sync=node.wait_for_sync)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -94,6 +99,10 @@ def add_arangodb_handler(node: Nodes):
         result["status"] = "failed"
         result["error"] = str(e)
         raise HTTPException(status_code=400, detail=result)
+    except (SpoolFull, QueueFull) as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=503, detail=result, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger = logging.getLogger()
         logger.exception(e)
@@ -103,13 +112,13 @@ def add_arangodb_handler(node: Nodes):
 
 
 @router.post("/collection/arangodb/node", tags=["arangodb"])
-def add_arangodb_node(node: Node):
+async def add_arangodb_node(node: Node):
     try:
         result = {}
         collection_name = "{}".format(node.collection)
         internal_schema = KVRocksInternalSchema( "arangodb")
-        node_collection = ArangodbCollection(internal_schema, collection_name)
-        result = node_collection.add_node(node.node)
+        node_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        result = await node_collection.add_node(node.node)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -119,6 +128,10 @@ def add_arangodb_node(node: Node):
         result["status"] = "failed"
         result["error"] = str(e)
         raise HTTPException(status_code=400, detail=result)
+    except (SpoolFull, QueueFull) as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=503, detail=result, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger = logging.getLogger()
         logger.exception(e)
@@ -127,13 +140,37 @@ def add_arangodb_node(node: Node):
         raise HTTPException(status_code=500, detail=result)
 
 @router.put("/collection/arangodb/relationship", tags=["arangodb"])
-def update_arangodb_relationship(edge: UpdateEdge):
+async def update_arangodb_relationship(edge: UpdateEdge):
     try:
         result = {}
         collection_name = "{}".format(edge.collection)
         internal_schema = KVRocksInternalSchema( "arangodb")
-        edge_collection = ArangodbCollection(internal_schema, collection_name)
-        result = edge_collection.update_relationship(edge.edge, edge.reset)
+        edge_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        result = await edge_collection.update_relationship(edge.edge, edge.reset)
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.put("/collection/arangodb/relationships", tags=["arangodb"])
+async def update_arangodb_relationships(edges: UpdateEdges):
+    try:
+        result = {}
+        collection_name = "{}".format(edges.collection)
+        internal_schema = KVRocksInternalSchema( "arangodb")
+        edge_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        result = await edge_collection.update_relationships(edges.edges)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -150,14 +187,43 @@ def update_arangodb_relationship(edge: UpdateEdge):
         result["error"] = str(e)
         raise HTTPException(status_code=500, detail=result)
 
+@router.post("/collection/arangodb/traverse", tags=["arangodb"])
+async def traverse_arangodb_collection(traverse: Traverse):
+    result = {}
+    try:
+        collection_name = "{}".format(traverse.collection)
+        internal_schema = KVRocksInternalSchema( "arangodb")
+        edge_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        rows = await edge_collection.traverse(
+            traverse.node_id,
+            min_depth=traverse.min_depth,
+            max_depth=traverse.max_depth,
+            direction=traverse.direction,
+            limit=traverse.limit)
+        return StreamingResponse(rows, media_type="application/x-ndjson")
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
 @router.delete("/collection/arangodb/relationships", tags=["arangodb"])
-def delete_arangodb_relationships(edges: DelEdges):
+async def delete_arangodb_relationships(edges: DelEdges):
     try:
         result = {}
         collection_name = "{}".format(edges.collection)
         internal_schema = KVRocksInternalSchema( "arangodb")
-        node_collection = ArangodbCollection(internal_schema, collection_name)
-        result = node_collection.delete_relationships(edges.edges_id)
+        node_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        result = await node_collection.delete_relationships(edges.edges_id)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -170,14 +236,38 @@ def delete_arangodb_relationships(edges: DelEdges):
         result["error"] = str(e)
         raise HTTPException(status_code=500, detail=result)
 
+@router.post("/collection/arangodb/nodes/ndjson", tags=["arangodb"], openapi_extra=NDJSON_REQUEST_BODY)
+async def ingest_arangodb_ndjson(request: Request, namespace: str, collection: str, chunk_size: int = Query(1000, gt=0, le=100000)):
+    result = {}
+    try:
+        collection_name = "{}".format(collection)
+        internal_schema = KVRocksInternalSchema( "arangodb")
+        node_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        result = await node_collection.ingest_ndjson(request.stream(), chunk_size, request.headers.get("content-encoding"))
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
 @router.delete("/collection/arangodb/nodes", tags=["arangodb"])
-def delete_arangodb_handler(node: DelNodes):
+async def delete_arangodb_handler(node: DelNodes):
     try:
         result = {}
         collection_name = "{}".format(node.collection)
         internal_schema = KVRocksInternalSchema( "arangodb")
-        node_collection = ArangodbCollection(internal_schema, collection_name)
-        result = node_collection.delete_nodes(node.nodes_id)
+        node_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        result = await node_collection.delete_nodes(node.nodes_id)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -195,13 +285,13 @@ def delete_arangodb_handler(node: DelNodes):
         raise HTTPException(status_code=500, detail=result)
 
 @router.delete("/collection/arangodb/node", tags=["arangodb"])
-def delete_arangodb_node(node: DelNode):
+async def delete_arangodb_node(node: DelNode):
     try:
         result = {}
         collection_name = "{}".format(node.collection)
         internal_schema = KVRocksInternalSchema( "arangodb")
-        node_collection = ArangodbCollection(internal_schema, collection_name)
-        result = node_collection.delete_node(node.node_id)
+        node_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        result = await node_collection.delete_node(node.node_id)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -219,13 +309,13 @@ def delete_arangodb_node(node: DelNode):
         raise HTTPException(status_code=500, detail=result)
 
 @router.put("/collection/arangodb/node", tags=["arangodb"])
-def update_arangodb_node(node: UpdateNode):
+async def update_arangodb_node(node: UpdateNode):
     try:
         result = {}
         collection_name = "{}".format(node.collection)
         internal_schema = KVRocksInternalSchema( "arangodb")
-        node_collection = ArangodbCollection(internal_schema, collection_name)
-        result = node_collection.update_node(node.node_id, node.node)
+        node_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        result = await node_collection.update_node(node.node_id, node.node)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -240,4 +330,34 @@ def update_arangodb_node(node: UpdateNode):
         logger.exception(e)
         result["status"] = "failed"
         result["error"] = str(e)
-        raise HTTPException(status_code=500, detail=result)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=result)
+
+@router.get("/collection/arangodb/nodes:get", tags=["arangodb"])
+async def get_arangodb_nodes_by_id(namespace: str, collection: str, nodes_id: List[str] = Query(..., min_items=1, max_items=MAX_GET_IDS), fields: Optional[List[str]] = Query(None)):
+    return await post_arangodb_nodes_by_id(GetNodes(namespace=namespace, collection=collection, nodes_id=nodes_id, fields=fields))
+
+@router.post("/collection/arangodb/nodes:get", tags=["arangodb"])
+async def post_arangodb_nodes_by_id(get: GetNodes):
+    result = {}
+    try:
+        collection_name = "{}".format(get.collection)
+        internal_schema = KVRocksInternalSchema( "arangodb")
+        node_collection = await AsyncArangodbCollection.load(internal_schema, collection_name)
+        result["nodes"] = await node_collection.get_nodes(get.nodes_id, fields=get.fields)
+        result["missing"] = [_id for _id, _record in zip(get.nodes_id, result["nodes"]) if _record is None]
+        result["status"] = "success"
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
@@ -1,10 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from polymanager.routers.document_models import *
 from polymanager.exceptions.schema_exception import UnkownSchema, ExistingSchema, InvalidSchema
+from polymanager.exceptions.spool_exception import SpoolFull
+from polymanager.exceptions.ingestion_exception import QueueFull
+from polymanager.exceptions.lock_exception import LockTimeout
 from polymanager.schemas.clickhouse.clickhouse_schema import ClickhouseSchema
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
-from polymanager.schemas.clickhouse.clickhouse_collection import ClickhouseCollection
+from polymanager.schemas.clickhouse.clickhouse_collection import ClickhouseCollection, AsyncClickhouseCollection
+from polymanager.helper.ndjson_helper import NDJSON_REQUEST_BODY
+from polymanager.helper.batch_helper import MAX_GET_IDS
 import logging
 
 router = APIRouter()
@@ -80,13 +87,13 @@ def delete_clickhouse_collection(collection: CollectionDel):
         raise HTTPException(status_code=500, detail=result)
 
 @router.post("/collection/clickhouse/documents", tags=["clickhouse"])
-def add_clickhouse_documents(document: Documents):
+async def add_clickhouse_documents(document: Documents):
     result = {}
     try:
         collection_name = "{}.{}".format(document.namespace, document.collection)
         internal_schema = KVRocksInternalSchema( "clickhouse")
-        document_collection = ClickhouseCollection(internal_schema, collection_name)
-        result = document_collection.add_documents(document.documents)
+        document_collection = await AsyncClickhouseCollection.load(internal_schema, collection_name)
+        result = await document_collection.add_documents(document.documents)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -96,6 +103,10 @@ def add_clickhouse_documents(document: Documents):
         result["status"] = "failed"
         result["error"] = str(e)
         raise HTTPException(status_code=400, detail=result)
+    except (SpoolFull, QueueFull) as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=503, detail=result, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger = logging.getLogger()
         logger.exception(e)
@@ -105,13 +116,13 @@ def add_clickhouse_documents(document: Documents):
 
 
 @router.post("/collection/clickhouse/document", tags=["clickhouse"])
-def add_clickhouse_document(document: Document):
+async def add_clickhouse_document(document: Document):
     result = {}
     try:
         collection_name = "{}.{}".format(document.namespace, document.collection)
         internal_schema = KVRocksInternalSchema( "clickhouse")
-        document_collection = ClickhouseCollection(internal_schema, collection_name)
-        result = document_collection.add_document(document.document)
+        document_collection = await AsyncClickhouseCollection.load(internal_schema, collection_name)
+        result = await document_collection.add_document(document.document)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -121,6 +132,10 @@ def add_clickhouse_document(document: Document):
         result["status"] = "failed"
         result["error"] = str(e)
         raise HTTPException(status_code=400, detail=result)
+    except (SpoolFull, QueueFull) as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=503, detail=result, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger = logging.getLogger()
         logger.exception(e)
@@ -129,14 +144,38 @@ def add_clickhouse_document(document: Document):
         raise HTTPException(status_code=500, detail=result)
 
 
+@router.post("/collection/clickhouse/documents/ndjson", tags=["clickhouse"], openapi_extra=NDJSON_REQUEST_BODY)
+async def ingest_clickhouse_ndjson(request: Request, namespace: str, collection: str, chunk_size: int = Query(1000, gt=0, le=100000)):
+    result = {}
+    try:
+        collection_name = "{}.{}".format(namespace, collection)
+        internal_schema = KVRocksInternalSchema( "clickhouse")
+        document_collection = await AsyncClickhouseCollection.load(internal_schema, collection_name)
+        result = await document_collection.ingest_ndjson(request.stream(), chunk_size, request.headers.get("content-encoding"))
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
 @router.delete("/collection/clickhouse/documents", tags=["clickhouse"])
-def delete_clickhouse_documents(document: DelDocuments):
+async def delete_clickhouse_documents(document: DelDocuments):
     result = {}
     try:
         collection_name = "{}.{}".format(document.namespace, document.collection)
         internal_schema = KVRocksInternalSchema( "clickhouse")
-        document_collection = ClickhouseCollection(internal_schema, collection_name)
-        result = document_collection.delete_documents(document.documents_id)
+        document_collection = await AsyncClickhouseCollection.load(internal_schema, collection_name)
+        result = await document_collection.delete_documents(document.documents_id, wait=document.wait)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -154,13 +193,13 @@ def delete_clickhouse_documents(document: DelDocuments):
         raise HTTPException(status_code=500, detail=result)
 
 @router.delete("/collection/clickhouse/document", tags=["clickhouse"])
-def delete_clickhouse_document(document: DelDocument):
+async def delete_clickhouse_document(document: DelDocument):
     result = {}
     try:
         collection_name = "{}.{}".format(document.namespace, document.collection)
         internal_schema = KVRocksInternalSchema( "clickhouse")
-        document_collection = ClickhouseCollection(internal_schema, collection_name)
-        result = document_collection.delete_document(document.document_id)
+        document_collection = await AsyncClickhouseCollection.load(internal_schema, collection_name)
+        result = await document_collection.delete_document(document.document_id, wait=document.wait)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -178,13 +217,99 @@ def delete_clickhouse_document(document: DelDocument):
         raise HTTPException(status_code=500, detail=result)
 
 @router.put("/collection/clickhouse/document", tags=["clickhouse"])
-def update_clickhouse_document(document: UpdateDocument):
+async def update_clickhouse_document(document: UpdateDocument):
     result = {}
     try:
         collection_name = "{}.{}".format(document.namespace, document.collection)
         internal_schema = KVRocksInternalSchema( "clickhouse")
+        document_collection = await AsyncClickhouseCollection.load(internal_schema, collection_name)
+        result = await document_collection.update_document(document.document)
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except LockTimeout as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=409, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.post("/collection/clickhouse/select", tags=["clickhouse"])
+async def select_clickhouse_documents(select: SelectDocuments):
+    result = {}
+    try:
+        collection_name = "{}.{}".format(select.namespace, select.collection)
+        internal_schema = KVRocksInternalSchema( "clickhouse")
+        document_collection = await AsyncClickhouseCollection.load(internal_schema, collection_name)
+        rows = await document_collection.select_documents(
+            fields=select.fields,
+            filters=[_filter.dict() for _filter in select.filters],
+            order=select.order,
+            limit=select.limit,
+            after=select.after,
+            raw=select.raw,
+            final=select.final)
+        return StreamingResponse(rows, media_type="application/x-ndjson")
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.get("/collection/clickhouse/mutations", tags=["clickhouse"])
+def show_clickhouse_mutations(namespace: str, collection: str, only_pending: bool = False):
+    result = {}
+    try:
+        collection_name = "{}.{}".format(namespace, collection)
+        internal_schema = KVRocksInternalSchema( "clickhouse")
         document_collection = ClickhouseCollection(internal_schema, collection_name)
-        result = document_collection.update_document(document.document)
+        result["mutations"] = document_collection.get_mutations(only_pending=only_pending)
+        result["status"] = "success"
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.get("/collection/clickhouse/documents:get", tags=["clickhouse"])
+async def get_clickhouse_documents_by_id(namespace: str, collection: str, documents_id: List[int] = Query(..., min_items=1, max_items=MAX_GET_IDS), fields: Optional[List[str]] = Query(None)):
+    return await post_clickhouse_documents_by_id(GetDocuments(namespace=namespace, collection=collection, documents_id=documents_id, fields=fields))
+
+@router.post("/collection/clickhouse/documents:get", tags=["clickhouse"])
+async def post_clickhouse_documents_by_id(get: GetDocuments):
+    result = {}
+    try:
+        collection_name = "{}.{}".format(get.namespace, get.collection)
+        internal_schema = KVRocksInternalSchema( "clickhouse")
+        document_collection = await AsyncClickhouseCollection.load(internal_schema, collection_name)
+        result["documents"] = await document_collection.get_documents(get.documents_id, fields=get.fields)
+        result["missing"] = [_id for _id, _record in zip(get.documents_id, result["documents"]) if _record is None]
+        result["status"] = "success"
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -199,4 +324,4 @@ def update_clickhouse_document(document: UpdateDocument):
         logger.exception(e)
         result["status"] = "failed"
         result["error"] = str(e)
-        raise HTTPException(status_code=500, detail=result)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=result)
@@ -0,0 +1,146 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from polymanager.routers.document_models import Document, Documents
+from polymanager.routers.composite_models import *
+from polymanager.exceptions.schema_exception import UnkownSchema, ExistingSchema, InvalidSchema
+from polymanager.exceptions.composite_exception import CompositeWriteError
+from polymanager.schemas.composite.composite_schema import CompositeSchema
+from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
+from polymanager.schemas.composite.composite_collection import CompositeCollection
+import logging
+
+router = APIRouter()
+
+@router.get("/collection/composite", tags=["composite"])
+def show_composite_collections():
+    result = {}
+    try:
+        internal_schema = KVRocksInternalSchema("composite")
+        schema_objs = internal_schema.load_schemas()
+        res = []
+        for schema_obj in schema_objs:
+            res.append(schema_obj.get_schema())
+        result["schemas"] = res
+        result["status"] = "success"
+        return result
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.post("/collection/composite", tags=["composite"])
+def add_composite_collection(collection: Composite):
+    result = {}
+    try:
+        internal_schema = KVRocksInternalSchema("composite")
+        schema = CompositeSchema(
+            collection.namespace,
+            collection.collection,
+            [target.dict() for target in collection.targets],
+            write_mode=collection.write_mode)
+        if internal_schema.get_schema(schema.get_collection_name(), use_cache=False):
+            raise ExistingSchema("this collection already exists")
+        #the targets must exist and agree on the type of their shared fields
+        CompositeCollection(internal_schema, schema.get_collection_name(), schema=schema).check_targets()
+        internal_schema.save_schema(schema)
+        result["status"] = "success"
+        return result
+    except ExistingSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=409, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.delete("/collection/composite", tags=["composite"])
+def delete_composite_collection(collection: CompositeDel):
+    result = {}
+    try:
+        internal_schema = KVRocksInternalSchema("composite")
+        collection_name = "{}.{}".format(collection.namespace, collection.collection)
+        schema = internal_schema.get_schema(collection_name)
+        if not schema:
+            raise UnkownSchema("this collection does not exist")
+        internal_schema.delete_schema(schema.get_collection_name())
+        result["status"] = "success"
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.post("/collection/composite/documents", tags=["composite"])
+async def add_composite_documents(document: Documents, write_mode: Optional[str] = Query(None)):
+    result = {}
+    try:
+        collection_name = "{}.{}".format(document.namespace, document.collection)
+        internal_schema = KVRocksInternalSchema("composite")
+        composite_collection = await CompositeCollection.load(internal_schema, collection_name)
+        result = await composite_collection.add_documents(document.documents, write_mode=write_mode)
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except CompositeWriteError as e:
+        logger = logging.getLogger()
+        logger.error(e)
+        if e.retry_after is not None:
+            raise HTTPException(status_code=503, detail=e.result, headers={"Retry-After": str(e.retry_after)})
+        raise HTTPException(status_code=500, detail=e.result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.post("/collection/composite/document", tags=["composite"])
+async def add_composite_document(document: Document, write_mode: Optional[str] = Query(None)):
+    result = {}
+    try:
+        collection_name = "{}.{}".format(document.namespace, document.collection)
+        internal_schema = KVRocksInternalSchema("composite")
+        composite_collection = await CompositeCollection.load(internal_schema, collection_name)
+        result = await composite_collection.add_document(document.document, write_mode=write_mode)
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except CompositeWriteError as e:
+        logger = logging.getLogger()
+        logger.error(e)
+        if e.retry_after is not None:
+            raise HTTPException(status_code=503, detail=e.result, headers={"Retry-After": str(e.retry_after)})
+        raise HTTPException(status_code=500, detail=e.result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
@@ -0,0 +1,17 @@
+from pydantic import BaseModel, conlist
+
+class CompositeTarget(BaseModel):
+    datastore: str
+    namespace: str
+    collection: str
+    role: str = "primary"
+
+class Composite(BaseModel):
+    collection: str
+    namespace: str
+    targets: conlist(CompositeTarget, min_items=1)
+    write_mode: str = "all_or_report"
+
+class CompositeDel(BaseModel):
+    collection: str
+    namespace: str
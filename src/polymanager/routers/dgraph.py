@@ -1,10 +1,14 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Optional
 from polymanager.routers.graph_models import *
 from polymanager.exceptions.schema_exception import UnkownSchema, ExistingSchema, InvalidSchema
+from polymanager.exceptions.spool_exception import SpoolFull
+from polymanager.exceptions.ingestion_exception import QueueFull
 from polymanager.schemas.dgraph.dgraph_schema import DGraphSchema
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
-from polymanager.schemas.dgraph.dgraph_collection import DgraphCollection
+from polymanager.schemas.dgraph.dgraph_collection import DgraphCollection, AsyncDgraphCollection
+from polymanager.helper.ndjson_helper import NDJSON_REQUEST_BODY
+from polymanager.helper.batch_helper import MAX_GET_IDS
 import logging
 router = APIRouter()
 
@@ -78,13 +82,13 @@ def delete_dgraph_collection(collection: CollectionDel):
         raise HTTPException(status_code=500, detail=result)
 
 @router.post("/collection/dgraph/nodes", tags=["dgraph"])
-def add_dgraph_handler(node: Nodes):
+async def add_dgraph_handler(node: Nodes):
     try:
         result = {}
         collection_name = "{}.{}".format(node.namespace, node.collection)
         internal_schema = KVRocksInternalSchema( "dgraph")
-        node_collection = DgraphCollection(internal_schema, collection_name)
-        result = node_collection.add_nodes(node.nodes)
+        node_collection = await AsyncDgraphCollection.load(internal_schema, collection_name)
+        result = await node_collection.add_nodes(node.nodes)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -94,6 +98,10 @@ def add_dgraph_handler(node: Nodes):
         result["status"] = "failed"
         result["error"] = str(e)
         raise HTTPException(status_code=400, detail=result)
+    except (SpoolFull, QueueFull) as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=503, detail=result, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger = logging.getLogger()
         logger.exception(e)
@@ -103,13 +111,13 @@ def add_dgraph_handler(node: Nodes):
 
 
 @router.post("/collection/dgraph/node", tags=["dgraph"])
-def add_dgraph_node(node: Node):
+async def add_dgraph_node(node: Node):
     try:
         result = {}
         collection_name = "{}.{}".format(node.namespace, node.collection)
         internal_schema = KVRocksInternalSchema( "dgraph")
-        node_collection = DgraphCollection(internal_schema, collection_name)
-        result = node_collection.add_node(node.node)
+        node_collection = await AsyncDgraphCollection.load(internal_schema, collection_name)
+        result = await node_collection.add_node(node.node)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -119,6 +127,10 @@ def add_dgraph_node(node: Node):
         result["status"] = "failed"
         result["error"] = str(e)
         raise HTTPException(status_code=400, detail=result)
+    except (SpoolFull, QueueFull) as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=503, detail=result, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger = logging.getLogger()
         logger.exception(e)
@@ -127,13 +139,61 @@ def add_dgraph_node(node: Node):
         raise HTTPException(status_code=500, detail=result)
 
 @router.put("/collection/dgraph/relationship", tags=["dgraph"])
-def update_dgraph_relationship(node: UpdateRelationship):
+async def update_dgraph_relationship(node: UpdateRelationship):
     try:
         result = {}
         collection_name = "{}.{}".format(node.namespace, node.collection)
         internal_schema = KVRocksInternalSchema( "dgraph")
-        node_collection = DgraphCollection(internal_schema, collection_name)
-        result = node_collection.update_relationship(node.node_id, node.node, node.reset)
+        node_collection = await AsyncDgraphCollection.load(internal_schema, collection_name)
+        result = await node_collection.update_relationship(node.node_id, node.node, node.reset)
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.put("/collection/dgraph/relationships", tags=["dgraph"])
+async def update_dgraph_relationships(nodes: UpdateRelationships):
+    try:
+        result = {}
+        collection_name = "{}.{}".format(nodes.namespace, nodes.collection)
+        internal_schema = KVRocksInternalSchema( "dgraph")
+        node_collection = await AsyncDgraphCollection.load(internal_schema, collection_name)
+        result = await node_collection.update_relationships([_node.dict() for _node in nodes.nodes], nodes.reset)
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.post("/collection/dgraph/nodes/ndjson", tags=["dgraph"], openapi_extra=NDJSON_REQUEST_BODY)
+async def ingest_dgraph_ndjson(request: Request, namespace: str, collection: str, chunk_size: int = Query(1000, gt=0, le=100000)):
+    result = {}
+    try:
+        collection_name = "{}.{}".format(namespace, collection)
+        internal_schema = KVRocksInternalSchema( "dgraph")
+        node_collection = await AsyncDgraphCollection.load(internal_schema, collection_name)
+        result = await node_collection.ingest_ndjson(request.stream(), chunk_size, request.headers.get("content-encoding"))
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -151,13 +211,13 @@ def update_dgraph_relationship(node: UpdateRelationship):
         raise HTTPException(status_code=500, detail=result)
 
 @router.delete("/collection/dgraph/nodes", tags=["dgraph"])
-def delete_dgraph_handler(node: DelNodes):
+async def delete_dgraph_handler(node: DelNodes):
     try:
         result = {}
         collection_name = "{}.{}".format(node.namespace, node.collection)
         internal_schema = KVRocksInternalSchema( "dgraph")
-        node_collection = DgraphCollection(internal_schema, collection_name)
-        result = node_collection.delete_nodes(node.nodes_id)
+        node_collection = await AsyncDgraphCollection.load(internal_schema, collection_name)
+        result = await node_collection.delete_nodes(node.nodes_id)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -175,13 +235,13 @@ def delete_dgraph_handler(node: DelNodes):
         raise HTTPException(status_code=500, detail=result)
 
 @router.delete("/collection/dgraph/node", tags=["dgraph"])
-def delete_dgraph_node(node: DelNode):
+async def delete_dgraph_node(node: DelNode):
     try:
         result = {}
         collection_name = "{}.{}".format(node.namespace, node.collection)
         internal_schema = KVRocksInternalSchema( "dgraph")
-        node_collection = DgraphCollection(internal_schema, collection_name)
-        result = node_collection.delete_node(node.node_id)
+        node_collection = await AsyncDgraphCollection.load(internal_schema, collection_name)
+        result = await node_collection.delete_node(node.node_id)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -199,13 +259,43 @@ def delete_dgraph_node(node: DelNode):
         raise HTTPException(status_code=500, detail=result)
 
 @router.put("/collection/dgraph/node", tags=["dgraph"])
-def update_dgraph_node(node: UpdateNode):
+async def update_dgraph_node(node: UpdateNode):
     try:
         result = {}
         collection_name = "{}.{}".format(node.namespace, node.collection)
         internal_schema = KVRocksInternalSchema( "dgraph")
-        node_collection = DgraphCollection(internal_schema, collection_name)
-        result = node_collection.update_node(node.node_id, node.node)
+        node_collection = await AsyncDgraphCollection.load(internal_schema, collection_name)
+        result = await node_collection.update_node(node.node_id, node.node)
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.get("/collection/dgraph/nodes:get", tags=["dgraph"])
+async def get_dgraph_nodes_by_id(namespace: str, collection: str, nodes_id: List[str] = Query(..., min_items=1, max_items=MAX_GET_IDS), fields: Optional[List[str]] = Query(None)):
+    return await post_dgraph_nodes_by_id(GetNodes(namespace=namespace, collection=collection, nodes_id=nodes_id, fields=fields))
+
+@router.post("/collection/dgraph/nodes:get", tags=["dgraph"])
+async def post_dgraph_nodes_by_id(get: GetNodes):
+    result = {}
+    try:
+        collection_name = "{}.{}".format(get.namespace, get.collection)
+        internal_schema = KVRocksInternalSchema( "dgraph")
+        node_collection = await AsyncDgraphCollection.load(internal_schema, collection_name)
+        result["nodes"] = await node_collection.get_nodes(get.nodes_id, fields=get.fields)
+        result["missing"] = [_id for _id, _record in zip(get.nodes_id, result["nodes"]) if _record is None]
+        result["status"] = "success"
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -220,4 +310,4 @@ def update_dgraph_node(node: UpdateNode):
         logger.exception(e)
         result["status"] = "failed"
         result["error"] = str(e)
-        raise HTTPException(status_code=500, detail=result)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=result)
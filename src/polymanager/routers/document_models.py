@@ -1,7 +1,8 @@
-from pydantic import BaseModel, conlist
+from pydantic import BaseModel, conlist, conint
 from typing import (
-    List, Optional
+    List, Optional, Any
 )
+from polymanager.helper.batch_helper import MAX_GET_IDS
 class UpdateDocument(BaseModel):
     collection: str
     namespace: str
@@ -11,11 +12,13 @@ class DelDocument(BaseModel):
     collection: str
     namespace: str
     document_id: int
+    wait: bool = True
 
 class DelDocuments(BaseModel):
     collection: str
     namespace: str
     documents_id: list
+    wait: bool = True
 
 class Document(BaseModel):
     collection: str
@@ -27,6 +30,40 @@ class Documents(BaseModel):
     namespace: str
     documents: conlist(dict, min_items=1)
 
+class GetDocuments(BaseModel):
+    collection: str
+    namespace: str
+    documents_id: conlist(int, min_items=1, max_items=MAX_GET_IDS)
+    fields: Optional[List[str]] = None
+
+class DocumentsFilter(BaseModel):
+    field: str
+    op: str = "eq"
+    value: Any
+
+class SelectDocuments(BaseModel):
+    collection: str
+    namespace: str
+    fields: Optional[List[str]] = None
+    filters: List[DocumentsFilter] = []
+    order: str = "asc"
+    limit: conint(gt=0) = 1000
+    after: Optional[list] = None
+    raw: bool = False
+    final: bool = False
+
+class SearchDocuments(BaseModel):
+    collection: str
+    namespace: str
+    query: Optional[str] = None
+    match_fields: Optional[List[str]] = None
+    filters: List[DocumentsFilter] = []
+    fields: Optional[List[str]] = None
+    sort: Optional[str] = None
+    order: str = "asc"
+    limit: conint(gt=0, le=1000) = 20
+    after: Optional[list] = None
+
 # class ClickhouseGlobalOptions(BaseModel):
 #     order_by: List[str]
 
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, HTTPException
+from polymanager.routers.federated_models import *
+from polymanager.exceptions.schema_exception import UnkownSchema, InvalidSchema
+from polymanager.exceptions.federated_exception import StageTimeout
+from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
+from polymanager.schemas.manticore.manticore_collection import AsyncManticoreSearchCollection
+from polymanager.schemas.federated_search import FederatedSearch, get_target_collection
+import logging
+
+router = APIRouter()
+
+@router.post("/federated/search", tags=["federated"])
+async def federated_search(search: FederatedSearchDocuments):
+    result = {}
+    try:
+        collection_name = "{}_{}".format(search.namespace, search.collection)
+        internal_schema = KVRocksInternalSchema( "manticoresearch")
+        federated = FederatedSearch(
+            await AsyncManticoreSearchCollection.load(internal_schema, collection_name),
+            await get_target_collection(search.target.datastore, search.target.namespace, search.target.collection),
+            join_field=search.join_field,
+            target_fields=search.target.fields,
+            chunk_size=search.chunk_size,
+            concurrency=search.concurrency,
+            search_timeout_ms=search.search_timeout_ms,
+            hydrate_timeout_ms=search.hydrate_timeout_ms)
+        result = await federated.search(
+            query=search.query,
+            match_fields=search.match_fields,
+            filters=[_filter.dict() for _filter in search.filters],
+            fields=search.fields,
+            sort=search.sort,
+            order=search.order,
+            limit=search.limit,
+            after=search.after)
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except StageTimeout as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=504, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
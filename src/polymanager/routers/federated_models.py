@@ -0,0 +1,29 @@
+from pydantic import BaseModel, conint
+from typing import (
+    List, Optional
+)
+from polymanager.routers.document_models import DocumentsFilter
+
+class FederatedTarget(BaseModel):
+    datastore: str
+    namespace: str
+    collection: str
+    fields: Optional[List[str]] = None
+
+class FederatedSearchDocuments(BaseModel):
+    collection: str
+    namespace: str
+    query: Optional[str] = None
+    match_fields: Optional[List[str]] = None
+    filters: List[DocumentsFilter] = []
+    fields: Optional[List[str]] = None
+    sort: Optional[str] = "_score"
+    order: str = "desc"
+    limit: conint(gt=0, le=1000) = 20
+    after: Optional[list] = None
+    target: FederatedTarget
+    join_field: str = "node_id"
+    chunk_size: conint(gt=0, le=1000) = 1000
+    concurrency: conint(gt=0, le=32) = 4
+    search_timeout_ms: conint(gt=0) = 5000
+    hydrate_timeout_ms: conint(gt=0) = 5000
@@ -1,45 +1,61 @@
 from fastapi import APIRouter, HTTPException
-from polymanager.containers import CoreContainer, ArangoDBContainer, DGraphContainer, ClickhouseContainer
+from polymanager.containers import CoreContainer, ArangoDBContainer, DGraphContainer, ClickhouseContainer, ManticoreContainer, RedisContainer, SpoolContainer, IngestionContainer
+from polymanager.helper.pool_helper import get_redis_pool_stats
 import logging
 from polymanager.exceptions.status_exception import NotReadyDatabase
 router = APIRouter()
 
-def check_arangodb_status():
-    arangodb_handler = ArangoDBContainer().handler()
-    res = arangodb_handler.get_health()
+async def check_arangodb_status():
+    arangodb_handler = ArangoDBContainer.async_handler()
+    res = await arangodb_handler.get_health()
     if res and res["code"] == 200:
         return True
     else:
         return False
 
-def check_dgraph_status():
-    dgraph_handler = DGraphContainer().handler()
-    res = dgraph_handler.get_health()
+async def check_dgraph_status():
+    dgraph_handler = DGraphContainer.async_handler()
+    res = await dgraph_handler.get_health()
     if res and res[0]["status"] == "healthy":
         return True
     else:
         return False
 
-def check_clikhouse_status():
-    clickhouse_handler = ClickhouseContainer().handler()
-    res = clickhouse_handler.ping()
+async def check_clikhouse_status():
+    clickhouse_handler = ClickhouseContainer.async_handler()
+    res = await clickhouse_handler.ping()
     if res == "Ok.\n":
         return True
     else:
         return False
 
-def check_status():
+def get_pools_stats():
+    pools = {}
+    pools["kvrocks"] = get_redis_pool_stats(RedisContainer.pool())
+    for datastore in CoreContainer.config.connectors():
+        if datastore == "arangodb":
+            pools["arangodb"] = ArangoDBContainer.handler().get_pool_stats()
+            pools["arangodb_async"] = ArangoDBContainer.async_handler().get_pool_stats()
+        elif datastore == "clickhouse":
+            pools["clickhouse"] = ClickhouseContainer.handler().get_pool_stats()
+            pools["clickhouse_async"] = ClickhouseContainer.async_handler().get_pool_stats()
+        elif datastore == "manticoresearch":
+            pools["manticoresearch"] = ManticoreContainer.handler().get_pool_stats()
+            pools["manticoresearch_async"] = ManticoreContainer.async_handler().get_pool_stats()
+    return pools
+
+async def check_status():
     status = True
     try:
         for datastore in CoreContainer.config.connectors():
             if datastore == "arangodb":
-                arangodb_status = check_arangodb_status()
+                arangodb_status = await check_arangodb_status()
                 status = status and arangodb_status
             elif datastore == "dgraph":
-                dgraph_status = check_dgraph_status()
+                dgraph_status = await check_dgraph_status()
                 status = status and dgraph_status
             elif datastore == "clickhouse":
-                clickhouse_status = check_clikhouse_status()
+                clickhouse_status = await check_clikhouse_status()
                 status = status and clickhouse_status
             elif datastore == "manticoresearch":
                 #manticoresearch doesn't have an health api to check the database status
@@ -51,11 +67,11 @@ def check_status():
         return False
 
 @router.get("/health", tags=["global"])
-def check_health():
+async def check_health():
     result = {}
     status = True
     try:
-        status = check_status()
+        status = await check_status()
         if status:
             result["status"] = "ready"
         else:
@@ -72,4 +88,28 @@ def check_health():
         logger.exception(e)
         result["status"] = "failed"
         result["error"] = str(e)
-        raise HTTPException(status_code=500, detail=result)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=result)
+
+@router.get("/stats", tags=["global"])
+def get_stats():
+    result = {}
+    try:
+        result["schema_cache"] = RedisContainer.schema_cache().get_stats()
+        result["pools"] = get_pools_stats()
+        if "clickhouse" in CoreContainer.config.connectors():
+            result["clickhouse_buffers"] = ClickhouseContainer.buffers().get_stats()
+            result["clickhouse_delete_buffers"] = ClickhouseContainer.delete_buffers().get_stats()
+        if "manticoresearch" in CoreContainer.config.connectors():
+            result["manticoresearch_search_cache"] = ManticoreContainer.search_cache().get_stats()
+        if CoreContainer.config.spool_dir():
+            result["spools"] = SpoolContainer.spools().get_stats()
+        if CoreContainer.config.ingest_queue():
+            result["ingestion_queue"] = IngestionContainer.queue().get_stats()
+        result["status"] = "success"
+        return result
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
@@ -1,8 +1,9 @@
-from pydantic import BaseModel, conlist
+from pydantic import BaseModel, conlist, conint
 from typing import (
     List
 )
 from typing import Optional
+from polymanager.helper.batch_helper import MAX_GET_IDS
 
 class DelEdges(BaseModel):
     collection: str
@@ -15,6 +16,20 @@ class UpdateEdge(BaseModel):
     reset: Optional[bool] = False
     edge: dict = {}
 
+class UpdateEdges(BaseModel):
+    collection: str
+    namespace: str
+    edges: conlist(dict, min_items=1)
+
+class Traverse(BaseModel):
+    collection: str
+    namespace: str
+    node_id: str
+    min_depth: conint(ge=0, le=10) = 1
+    max_depth: conint(ge=1, le=10) = 1
+    direction: str = "any"
+    limit: conint(gt=0, le=100000) = 1000
+
 class UpdateRelationship(BaseModel):
     collection: str
     namespace: str
@@ -22,6 +37,16 @@ class UpdateRelationship(BaseModel):
     reset: Optional[bool] = False
     node_id: str
 
+class RelationshipNode(BaseModel):
+    node_id: str
+    node: dict = {}
+
+class UpdateRelationships(BaseModel):
+    collection: str
+    namespace: str
+    nodes: conlist(RelationshipNode, min_items=1)
+    reset: Optional[bool] = False
+
 class UpdateNode(BaseModel):
     collection: str
     namespace: str
@@ -38,6 +63,12 @@ class DelNodes(BaseModel):
     namespace: str
     nodes_id: list = []
 
+class GetNodes(BaseModel):
+    collection: str
+    namespace: str
+    nodes_id: conlist(str, min_items=1, max_items=MAX_GET_IDS)
+    fields: Optional[List[str]] = None
+
 class Node(BaseModel):
     collection: str
     namespace: str
@@ -48,6 +79,11 @@ class Nodes(BaseModel):
     namespace: str
     nodes: list = []
 
+class InsertNodes(Nodes):
+    keys: Optional[List[str]] = None
+    overwrite_mode: Optional[str] = None
+    wait_for_sync: Optional[bool] = None
+
 class Collection(BaseModel):
     collection: str
     namespace: str
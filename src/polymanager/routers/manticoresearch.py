@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Optional
 from polymanager.routers.document_models import *
 from polymanager.exceptions.schema_exception import UnkownSchema, ExistingSchema, InvalidSchema
+from polymanager.exceptions.spool_exception import SpoolFull
+from polymanager.exceptions.ingestion_exception import QueueFull
 from polymanager.schemas.manticore.manticoresearch_schema import ManticoreSearchSchema
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
-from polymanager.schemas.manticore.manticore_collection import ManticoreSearchCollection
+from polymanager.schemas.manticore.manticore_collection import ManticoreSearchCollection, AsyncManticoreSearchCollection
+from polymanager.helper.ndjson_helper import NDJSON_REQUEST_BODY
+from polymanager.helper.batch_helper import MAX_GET_IDS
 import logging
 
 router = APIRouter()
@@ -78,13 +83,13 @@ def delete_manticore_collection(collection: CollectionDel):
         raise HTTPException(status_code=500, detail=result)
 
 @router.post("/collection/manticoresearch/documents", tags=["manticoresearch"])
-def add_manticore_documents(document: Documents):
+async def add_manticore_documents(document: Documents):
     result = {}
     try:
         collection_name = "{}_{}".format(document.namespace, document.collection)
         internal_schema = KVRocksInternalSchema( "manticoresearch")
-        document_collection = ManticoreSearchCollection(internal_schema, collection_name)
-        result = document_collection.add_documents(document.documents)
+        document_collection = await AsyncManticoreSearchCollection.load(internal_schema, collection_name)
+        result = await document_collection.add_documents(document.documents)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -94,6 +99,10 @@ def add_manticore_documents(document: Documents):
         result["status"] = "failed"
         result["error"] = str(e)
         raise HTTPException(status_code=400, detail=result)
+    except (SpoolFull, QueueFull) as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=503, detail=result, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger = logging.getLogger()
         logger.exception(e)
@@ -103,13 +112,13 @@ def add_manticore_documents(document: Documents):
 
 
 @router.post("/collection/manticoresearch/document", tags=["manticoresearch"])
-def add_manticore_document(document: Document):
+async def add_manticore_document(document: Document):
     result = {}
     try:
         collection_name = "{}_{}".format(document.namespace, document.collection)
         internal_schema = KVRocksInternalSchema( "manticoresearch")
-        document_collection = ManticoreSearchCollection(internal_schema, collection_name)
-        result = document_collection.add_document(document.document)
+        document_collection = await AsyncManticoreSearchCollection.load(internal_schema, collection_name)
+        result = await document_collection.add_document(document.document)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -119,6 +128,10 @@ def add_manticore_document(document: Document):
         result["status"] = "failed"
         result["error"] = str(e)
         raise HTTPException(status_code=400, detail=result)
+    except (SpoolFull, QueueFull) as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=503, detail=result, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger = logging.getLogger()
         logger.exception(e)
@@ -127,14 +140,38 @@ def add_manticore_document(document: Document):
         raise HTTPException(status_code=500, detail=result)
 
 
+@router.post("/collection/manticoresearch/documents/ndjson", tags=["manticoresearch"], openapi_extra=NDJSON_REQUEST_BODY)
+async def ingest_manticore_ndjson(request: Request, namespace: str, collection: str, chunk_size: int = Query(1000, gt=0, le=100000)):
+    result = {}
+    try:
+        collection_name = "{}_{}".format(namespace, collection)
+        internal_schema = KVRocksInternalSchema( "manticoresearch")
+        document_collection = await AsyncManticoreSearchCollection.load(internal_schema, collection_name)
+        result = await document_collection.ingest_ndjson(request.stream(), chunk_size, request.headers.get("content-encoding"))
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
 @router.delete("/collection/manticoresearch/documents", tags=["manticoresearch"])
-def delete_manticore_documents(document: DelDocuments):
+async def delete_manticore_documents(document: DelDocuments):
     result = {}
     try:
         collection_name = "{}_{}".format(document.namespace, document.collection)
         internal_schema = KVRocksInternalSchema( "manticoresearch")
-        document_collection = ManticoreSearchCollection(internal_schema, collection_name)
-        result = document_collection.delete_documents(document.documents_id)
+        document_collection = await AsyncManticoreSearchCollection.load(internal_schema, collection_name)
+        result = await document_collection.delete_documents(document.documents_id)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -152,13 +189,13 @@ def delete_manticore_documents(document: DelDocuments):
         raise HTTPException(status_code=500, detail=result)
 
 @router.delete("/collection/manticoresearch/document", tags=["manticoresearch"])
-def delete_manticore_document(document: DelDocument):
+async def delete_manticore_document(document: DelDocument):
     result = {}
     try:
         collection_name = "{}_{}".format(document.namespace, document.collection)
         internal_schema = KVRocksInternalSchema( "manticoresearch")
-        document_collection = ManticoreSearchCollection(internal_schema, collection_name)
-        result = document_collection.delete_document(document.document_id)
+        document_collection = await AsyncManticoreSearchCollection.load(internal_schema, collection_name)
+        result = await document_collection.delete_document(document.document_id)
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -176,13 +213,75 @@ def delete_manticore_document(document: DelDocument):
         raise HTTPException(status_code=500, detail=result)
 
 @router.put("/collection/manticoresearch/document", tags=["manticoresearch"])
-def update_manticore_document(document: UpdateDocument):
+async def update_manticore_document(document: UpdateDocument):
     result = {}
     try:
         collection_name = "{}_{}".format(document.namespace, document.collection)
         internal_schema = KVRocksInternalSchema( "manticoresearch")
-        document_collection = ManticoreSearchCollection(internal_schema, collection_name)
-        result = document_collection.update_document(document.document)
+        document_collection = await AsyncManticoreSearchCollection.load(internal_schema, collection_name)
+        result = await document_collection.update_document(document.document)
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.post("/collection/manticoresearch/search", tags=["manticoresearch"])
+async def search_manticore_documents(search: SearchDocuments):
+    result = {}
+    try:
+        collection_name = "{}_{}".format(search.namespace, search.collection)
+        internal_schema = KVRocksInternalSchema( "manticoresearch")
+        document_collection = await AsyncManticoreSearchCollection.load(internal_schema, collection_name)
+        result = await document_collection.search_documents(
+            query=search.query,
+            match_fields=search.match_fields,
+            filters=[_filter.dict() for _filter in search.filters],
+            fields=search.fields,
+            sort=search.sort,
+            order=search.order,
+            limit=search.limit,
+            after=search.after)
+        return result
+    except UnkownSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=404, detail=result)
+    except InvalidSchema as e:
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=400, detail=result)
+    except Exception as e:
+        logger = logging.getLogger()
+        logger.exception(e)
+        result["status"] = "failed"
+        result["error"] = str(e)
+        raise HTTPException(status_code=500, detail=result)
+
+@router.get("/collection/manticoresearch/documents:get", tags=["manticoresearch"])
+async def get_manticore_documents_by_id(namespace: str, collection: str, documents_id: List[int] = Query(..., min_items=1, max_items=MAX_GET_IDS), fields: Optional[List[str]] = Query(None)):
+    return await post_manticore_documents_by_id(GetDocuments(namespace=namespace, collection=collection, documents_id=documents_id, fields=fields))
+
+@router.post("/collection/manticoresearch/documents:get", tags=["manticoresearch"])
+async def post_manticore_documents_by_id(get: GetDocuments):
+    result = {}
+    try:
+        collection_name = "{}_{}".format(get.namespace, get.collection)
+        internal_schema = KVRocksInternalSchema( "manticoresearch")
+        document_collection = await AsyncManticoreSearchCollection.load(internal_schema, collection_name)
+        result["documents"] = await document_collection.get_documents(get.documents_id, fields=get.fields)
+        result["missing"] = [_id for _id, _record in zip(get.documents_id, result["documents"]) if _record is None]
+        result["status"] = "success"
         return result
     except UnkownSchema as e:
         result["status"] = "failed"
@@ -197,4 +296,4 @@ def update_manticore_document(document: UpdateDocument):
         logger.exception(e)
         result["status"] = "failed"
         result["error"] = str(e)
-        raise HTTPException(status_code=500, detail=result)
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=result)
@@ -1,7 +1,12 @@
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
 from polymanager.containers import ArangoDBContainer
+from polymanager.schemas.deferred_writer import get_deferred_writer
 from polymanager.exceptions.schema_exception import UnkownSchema, InvalidSchema
 from polymanager.schemas.graph_collection import GraphCollection
+from polymanager.schemas.ndjson_ingestion import NdjsonIngestion
+from polymanager.helper.ndjson_helper import iter_ndjson_lines
+from polymanager.helper.batch_helper import gather_chunks
+import json
 import uuid
 class ArangodbCollection(GraphCollection):
 
@@ -14,7 +19,7 @@ class ArangodbCollection(GraphCollection):
 
     def add_node(self, node):
         result = {}
-        arangodb_handler = ArangoDBContainer().handler()
+        arangodb_handler = ArangoDBContainer.handler()
 
         #checking schema before insert
         self.arangodb_schema.check_node_schema(node)
@@ -27,29 +32,46 @@ class ArangodbCollection(GraphCollection):
         result["node_id"] = uid
         return result
 
-    def add_nodes(self, nodes):
-        result = {}
-        arangodb_handler = ArangoDBContainer().handler()
+    def add_nodes(self, nodes, keys=None, overwrite_mode=None, wait_for_sync=None):
+        arangodb_handler = ArangoDBContainer.handler()
 
         #checking schema before insert
-        for _node in nodes:
-            self.arangodb_schema.check_node_schema(_node)
+        self.check_add_nodes(nodes, keys, overwrite_mode)
             
         #adding node to arangodb
-        nodes_schema = []
-        for _node in nodes:
-            nodes_schema.append(self.arangodb_schema.get_node_schema(_node))
+        nodes_schema = self.arangodb_schema.get_nodes_schema(nodes)
         uids = arangodb_handler.add_nodes(
             self.arangodb_schema.get_namespace(),
             self.arangodb_schema.get_collection_name(),
             nodes_schema,
-            "new_node")
+            "new_node",
+            keys=keys,
+            overwrite_mode=overwrite_mode,
+            wait_for_sync=wait_for_sync)
+        return self.get_add_nodes_result(uids)
+
+    def check_add_nodes(self, nodes, keys=None, overwrite_mode=None):
+        self.arangodb_schema.check_nodes_schema(nodes)
+        if keys is not None:
+            if len(keys) != len(nodes):
+                raise InvalidSchema("keys should contain a key for every node")
+            for _key in keys:
+                if not self.is_valid_uuid(_key):
+                    raise InvalidSchema("keys should be a list of uuid4 string")
+        if overwrite_mode not in [None, "ignore", "replace", "update", "conflict"]:
+            raise InvalidSchema("overwrite_mode should be ignore, replace, update or conflict")
+
+    def get_add_nodes_result(self, uids):
+        result = {}
         result["nodes_id"] = uids
+        errors = {index: uid["error"] for index, uid in enumerate(uids) if "error" in uid}
+        if errors:
+            result["errors"] = errors
         return result
 
     def delete_node(self, node_id):
         result = {}
-        arangodb_handler = ArangoDBContainer().handler()
+        arangodb_handler = ArangoDBContainer.handler()
         if self.is_valid_uuid(node_id):
             arangodb_handler.delete_node(
                 self.arangodb_schema.get_namespace(),
@@ -63,7 +85,7 @@ class ArangodbCollection(GraphCollection):
 
     def delete_nodes(self, nodes_id):
         result = {}
-        arangodb_handler = ArangoDBContainer().handler()
+        arangodb_handler = ArangoDBContainer.handler()
         #checking schema before delete
         for _node in nodes_id:
             if not self.is_valid_uuid(_node):
@@ -79,7 +101,7 @@ class ArangodbCollection(GraphCollection):
 
     def update_node(self, node_id, node):
         result = {}
-        arangodb_handler = ArangoDBContainer().handler()
+        arangodb_handler = ArangoDBContainer.handler()
 
         #checking schema before insert
         self.arangodb_schema.check_node_schema(node)
@@ -96,7 +118,7 @@ class ArangodbCollection(GraphCollection):
 
     def update_relationship(self, edge, reset=False):
         result = {}
-        arangodb_handler = ArangoDBContainer().handler()
+        arangodb_handler = ArangoDBContainer.handler()
 
         #checking schema before insert
         self.arangodb_schema.check_relationship_schema(edge)
@@ -112,9 +134,27 @@ class ArangodbCollection(GraphCollection):
         result["edge_id"] = edge
         return result
 
+    def update_relationships(self, edges):
+        result = {}
+        arangodb_handler = ArangoDBContainer.handler()
+
+        #checking schema before insert
+        self.arangodb_schema.check_relationships_schema(edges)
+
+        #upserting the edges
+        edges_schema = [self.arangodb_schema.get_edge_schema(_edge) for _edge in edges]
+        edges_id = []
+        for index in range(0, len(edges_schema), arangodb_handler.chunk_size):
+            edges_id.extend(arangodb_handler.upsert_edges(
+                self.arangodb_schema.get_namespace(),
+                self.arangodb_schema.get_collection_name(),
+                edges_schema[index:index + arangodb_handler.chunk_size]))
+        result["edges_id"] = edges_id
+        return result
+
     def delete_relationships(self, edges_id):
         result = {}
-        arangodb_handler = ArangoDBContainer().handler()
+        arangodb_handler = ArangoDBContainer.handler()
         
         arangodb_handler.delete_relationships(
             self.arangodb_schema.get_namespace(),
@@ -124,9 +164,48 @@ class ArangodbCollection(GraphCollection):
         result["status"] = "success"
         return result  
 
+    def traverse(self, node_id, min_depth=1, max_depth=1, direction="any", limit=1000):
+        '''
+        stream the neighbourhood of a node as ndjson, one {vertex, edge, depth} line per vertex
+
+        :param node_id: the _id of the start node, collection/uuid4
+        :param direction: outbound, inbound or any
+
+        :return: a generator of bytes
+        '''
+        arangodb_handler = ArangoDBContainer.handler()
+        self.check_traverse(node_id, min_depth, max_depth, direction)
+        batches = arangodb_handler.traverse(
+            self.arangodb_schema.get_namespace(),
+            self.arangodb_schema.get_collection_name(),
+            node_id,
+            min_depth=min_depth,
+            max_depth=max_depth,
+            direction=direction,
+            limit=limit
+        )
+        return (json.dumps(row).encode("utf-8") + b"\n" for batch in batches for row in batch)
+
+    def check_nodes_id(self, nodes_id):
+        for _node in nodes_id:
+            if not isinstance(_node, str) or not self.is_valid_uuid(_node):
+                raise InvalidSchema("nodes_id should be a list of uuid4 string")
+
+    def check_traverse(self, node_id, min_depth, max_depth, direction):
+        #checking the traversal before running it
+        if not self.arangodb_schema.get_global_collection_opts().get("edge_collection"):
+            raise InvalidSchema("traverse requires an edge collection.")
+        if direction not in ["outbound", "inbound", "any"]:
+            raise InvalidSchema("direction should be outbound, inbound or any")
+        if min_depth > max_depth:
+            raise InvalidSchema("min_depth should be lower than max_depth")
+        parts = node_id.split("/")
+        if len(parts) != 2 or not self.is_valid_uuid(parts[1]):
+            raise InvalidSchema("node_id should be a collection/uuid4 string")
+
     def truncate(self):
         result = {}
-        arangodb_handler = ArangoDBContainer().handler()
+        arangodb_handler = ArangoDBContainer.handler()
         #delete all nodes type
         arangodb_handler.truncate(
             self.arangodb_schema.get_namespace(),
@@ -134,9 +213,221 @@ class ArangodbCollection(GraphCollection):
         result["status"] = "success"
         return result
 
-    def __init__(self, internal_schema: KVRocksInternalSchema, collection_name):
+    def __init__(self, internal_schema: KVRocksInternalSchema, collection_name, schema=None):
+        '''
+        :param schema: the schema of the collection when it is already read
+        '''
         self.internal_schema = internal_schema
-        exists = self.internal_schema.get_schema(collection_name)
+        exists = schema or self.internal_schema.get_schema(collection_name)
         if not exists:
             raise UnkownSchema("this collection does not exist")
-        self.arangodb_schema = exists
\ No newline at end of file
+        self.arangodb_schema = exists
+
+class AsyncArangodbCollection(ArangodbCollection):
+    '''
+    arangodb collection for the async routes, the requests wait for arangodb
+    without blocking the event loop
+    '''
+
+    async def add_node(self, node):
+        result = {}
+        arangodb_handler = ArangoDBContainer.async_handler()
+
+        #checking schema before insert
+        self.arangodb_schema.check_node_schema(node)
+        result["node_id"] = await arangodb_handler.add_node(
+            self.arangodb_schema.get_namespace(),
+            self.arangodb_schema.get_collection_name(),
+            self.arangodb_schema.get_node_schema(node), "new_node")
+        return result
+
+    async def add_nodes(self, nodes, keys=None, overwrite_mode=None, wait_for_sync=None):
+        #checking schema before insert
+        self.check_add_nodes(nodes, keys, overwrite_mode)
+        return await self.insert_nodes(self.arangodb_schema.get_nodes_schema(nodes), keys, overwrite_mode, wait_for_sync)
+
+    async def insert_nodes(self, nodes_schema, keys=None, overwrite_mode=None, wait_for_sync=None):
+        arangodb_handler = ArangoDBContainer.async_handler()
+        id_name, deferred_writer = get_deferred_writer("arangodb")
+        if deferred_writer is not None:
+            return await self.defer_nodes(id_name, deferred_writer, nodes_schema, keys, overwrite_mode, wait_for_sync)
+        uids = await arangodb_handler.add_nodes(
+            self.arangodb_schema.get_namespace(),
+            self.arangodb_schema.get_collection_name(),
+            nodes_schema,
+            "new_node",
+            keys=keys,
+            overwrite_mode=overwrite_mode,
+            wait_for_sync=wait_for_sync)
+        return self.get_add_nodes_result(uids)
+
+    async def defer_nodes(self, id_name, deferred_writer, nodes_schema, keys=None, overwrite_mode=None, wait_for_sync=None):
+        '''
+        add the nodes to the ingestion queue or the write-ahead spool, their keys
+        are generated now so the ids are known before the nodes are inserted
+        '''
+        arangodb_handler = ArangoDBContainer.handler()
+        if keys is None:
+            keys = [str(uuid.uuid4()) for _node in nodes_schema]
+        collection_name = self.arangodb_schema.get_collection_name()
+        result = {}
+        result[id_name] = await deferred_writer.append_async("arangodb", collection_name, {
+            "namespace": self.arangodb_schema.get_namespace(),
+            "collection": collection_name,
+            "rows": nodes_schema,
+            "keys": keys,
+            "overwrite_mode": overwrite_mode,
+            "wait_for_sync": wait_for_sync
+        })
+        documents = arangodb_handler.build_node_documents(nodes_schema, keys)
+        result["nodes_id"] = arangodb_handler.get_node_ids(collection_name, documents, [{}] * len(documents))
+        return result
+
+    async def delete_node(self, node_id):
+        result = {}
+        arangodb_handler = ArangoDBContainer.async_handler()
+        if not self.is_valid_uuid(node_id):
+            raise InvalidSchema("node_id should be a uuid4 string")
+        await arangodb_handler.delete_node(
+            self.arangodb_schema.get_namespace(),
+            self.arangodb_schema.get_collection_name(),
+            node_id
+        )
+        result["status"] = "success"
+        return result
+
+    async def delete_nodes(self, nodes_id):
+        result = {}
+        arangodb_handler = ArangoDBContainer.async_handler()
+        #checking schema before delete
+        for _node in nodes_id:
+            if not self.is_valid_uuid(_node):
+                raise InvalidSchema("nodes_id should be a list of uuid4 string")
+        await arangodb_handler.delete_nodes(
+            self.arangodb_schema.get_namespace(),
+            self.arangodb_schema.get_collection_name(),
+            nodes_id
+        )
+        result["status"] = "success"
+        return result
+
+    async def update_node(self, node_id, node):
+        result = {}
+        arangodb_handler = ArangoDBContainer.async_handler()
+
+        #checking schema before insert
+        self.arangodb_schema.check_node_schema(node)
+        await arangodb_handler.update_node(
+            self.arangodb_schema.get_namespace(),
+            self.arangodb_schema.get_collection_name(),
+            node_id,
+            self.arangodb_schema.get_node_schema(node)
+            )
+        result["status"] = "success"
+        return result
+
+    async def update_relationship(self, edge, reset=False):
+        result = {}
+        arangodb_handler = ArangoDBContainer.async_handler()
+
+        #checking schema before insert
+        self.arangodb_schema.check_relationship_schema(edge)
+        result["edge_id"] = await arangodb_handler.update_relationships(
+            self.arangodb_schema.get_namespace(),
+            self.arangodb_schema.get_collection_name(),
+            self.arangodb_schema.get_edge_schema(edge),
+        )
+        return result
+
+    async def update_relationships(self, edges):
+        result = {}
+        arangodb_handler = ArangoDBContainer.async_handler()
+
+        #checking schema before insert
+        self.arangodb_schema.check_relationships_schema(edges)
+        edges_schema = [self.arangodb_schema.get_edge_schema(_edge) for _edge in edges]
+        chunk_size = arangodb_handler.handler.chunk_size
+        edges_id = []
+        for index in range(0, len(edges_schema), chunk_size):
+            edges_id.extend(await arangodb_handler.upsert_edges(
+                self.arangodb_schema.get_namespace(),
+                self.arangodb_schema.get_collection_name(),
+                edges_schema[index:index + chunk_size]))
+        result["edges_id"] = edges_id
+        return result
+
+    async def delete_relationships(self, edges_id):
+        result = {}
+        arangodb_handler = ArangoDBContainer.async_handler()
+        await arangodb_handler.delete_relationships(
+            self.arangodb_schema.get_namespace(),
+            self.arangodb_schema.get_collection_name(),
+            edges_id,
+        )
+        result["status"] = "success"
+        return result
+
+    async def traverse(self, node_id, min_depth=1, max_depth=1, direction="any", limit=1000):
+        arangodb_handler = ArangoDBContainer.async_handler()
+        self.check_traverse(node_id, min_depth, max_depth, direction)
+        batches = await arangodb_handler.traverse(
+            self.arangodb_schema.get_namespace(),
+            self.arangodb_schema.get_collection_name(),
+            node_id,
+            min_depth=min_depth,
+            max_depth=max_depth,
+            direction=direction,
+            limit=limit
+        )
+        return (json.dumps(row).encode("utf-8") + b"\n" async for batch in batches for row in batch)
+
+    async def get_nodes(self, nodes_id, fields=None, chunk_size=1000, concurrency=4):
+        '''
+        read nodes by key with one DOCUMENT() query per chunk of chunk_size keys
+
+        :param fields: the fields to return with _key and _id, all fields by default
+        :param concurrency: the number of chunks read at the same time
+        :return: the nodes in the order of nodes_id, None for the keys that are not found
+        '''
+        arangodb_handler = ArangoDBContainer.async_handler()
+        self.check_nodes_id(nodes_id)
+        attributes = self.arangodb_schema.get_projection(fields)
+        nodes = await gather_chunks(
+            list(dict.fromkeys(nodes_id)),
+            lambda keys: arangodb_handler.get_documents(
+                self.arangodb_schema.get_namespace(),
+                self.arangodb_schema.get_collection_name(),
+                keys,
+                attributes),
+            chunk_size=chunk_size,
+            concurrency=concurrency)
+        found = {node["_key"]: node for node in nodes}
+        return [found.get(node_id) for node_id in nodes_id]
+
+    async def ingest_ndjson(self, chunks, chunk_size=1000, encoding=None):
+        '''
+        add the nodes of an ndjson body while it is received
+
+        :param chunks: an async iterator of the bytes of the body
+        :param encoding: the content encoding of the body, gzip or None
+
+        :return: the summary of every chunk of chunk_size nodes, with the ids of its valid lines in nodes_id
+        '''
+        arangodb_handler = ArangoDBContainer.async_handler()
+        id_name, deferred_writer = get_deferred_writer("arangodb")
+
+        def prepare_row(node):
+            self.arangodb_schema.check_node_schema(node)
+            return self.arangodb_schema.get_node_schema(node)
+
+        async def send_rows(nodes_schema):
+            if deferred_writer is not None:
+                return {}, await self.defer_nodes(id_name, deferred_writer, nodes_schema)
+            uids = await arangodb_handler.add_nodes(
+                self.arangodb_schema.get_namespace(),
+                self.arangodb_schema.get_collection_name(),
+                nodes_schema, "new_node")
+            return {index: uid["error"] for index, uid in enumerate(uids) if "error" in uid}, {"nodes_id": uids}
+
+        ingestion = NdjsonIngestion(prepare_row, send_rows, chunk_size)
+        return await ingestion.run(iter_ndjson_lines(chunks, encoding))
@@ -3,14 +3,14 @@
 from dataclasses import field
 from tokenize import String
 from xmlrpc.client import Boolean
-from pydantic import create_model, StrictStr, constr, StrictInt, StrictFloat, Json, BaseModel, validator
-from dateutil.parser import parse
-from datetime import datetime
+from pydantic import StrictStr, constr, StrictInt, StrictFloat, Json, BaseModel, validator
+from polymanager.helper.timestamp_helper import parse_timestamp
 from typing import (
     List, Dict, Optional
 )
 from polymanager.exceptions.schema_exception import InvalidSchema
 from polymanager.schemas.graph_schema import GraphSchema 
+from polymanager.schemas.schema_validator import Timestamp, compile_model, compile_batch_model, compile_transformer, check_document, check_documents
 
 class Index(BaseModel):
     index_type: str
@@ -62,39 +62,43 @@ class ArangodbSchema(GraphSchema):
             new_edge[key] = new_value
         return new_edge
 
+    def get_node_transformer(self):
+        '''
+        return the function that converts a node to a document, it is built once per schema
+        '''
+        if self._node_transformer is None:
+            self._node_transformer = compile_transformer(
+                {key: (key, self.get_field_converter(options["type"])) for key, options in self.fields.items()})
+        return self._node_transformer
+
     def get_node_schema(self, node):
-        new_node = {}
-        for key, value in node.items():
-            field_options = self.fields[key]
-            new_value = self.parse_field(field_options["type"], value)
-            new_node[key] = new_value
-        return new_node
+        return self.get_node_transformer()(node)
+
+    def get_nodes_schema(self, nodes):
+        transform = self.get_node_transformer()
+        return [transform(node) for node in nodes]
 
     def get_relationship_fields(self):
-        fields = list()
-        for key, options in self.get_fields().items():
-            fields.append(key)
-        return fields
+        return list(self.get_fields())
+
+    def get_field_converter(self, field_type):
+        '''
+        return the function that converts a value of this type, None if the value is not converted
+        '''
+        if field_type == "timestamp":
+            return lambda field_value: parse_timestamp(field_value).isoformat()
+        return None
 
     def parse_field(self, field_type, field_value):
-        if field_type == "text":
-            return field_value
-        elif field_type == "int":
-            return field_value
-        elif field_type == "float":
-            return field_value
-        elif field_type == "timestamp":
-            return parse(field_value).isoformat()
-        elif field_type == "relationship":
-            return field_value
-        else:
-            return field_value
+        converter = self.get_field_converter(field_type)
+        return field_value if converter is None else converter(field_value)
 
-    def check_relationship_schema(self, node):
+    def get_attrs_scheme(self, with_relationship):
         attrs_scheme = dict()
         for key, options in self.fields.items():
             if options["type"] == "relationship":
-                attrs_scheme[key] = (StrictStr, ...)
+                if with_relationship:
+                    attrs_scheme[key] = (StrictStr, ...)
             elif options["type"] == "text":
                 attrs_scheme[key] = (StrictStr, ...)
             elif options["type"] == "int":
@@ -102,7 +106,7 @@ class ArangodbSchema(GraphSchema):
             elif options["type"] == "float":
                 attrs_scheme[key] = (StrictFloat, ...)
             elif options["type"] == "timestamp":
-                attrs_scheme[key] = (datetime, ...)
+                attrs_scheme[key] = (Timestamp, ...)
             elif options["type"] == "[int]":
                 attrs_scheme[key] = (List[StrictInt], ...)
             elif options["type"] == "[text]":
@@ -111,44 +115,33 @@ class ArangodbSchema(GraphSchema):
                 attrs_scheme[key] = (List[StrictFloat], ...)
             elif options["type"] == "json":
                 attrs_scheme[key] = (Json, ...)
-        node_model = create_model('DynamicNodeModel', **attrs_scheme)
-        node_model.__config__.extra = 'forbid'
-        node_model.__config__.validate_all = True
-        try:
-            if len(node.keys()) == 0:
-                raise Exception()
-            node_model(**node)
-        except Exception as e:
-            raise InvalidSchema(e)
+        return attrs_scheme
+
+    def get_relationship_model(self):
+        if self._relationship_model is None:
+            self._relationship_model = compile_model(self.get_attrs_scheme(True))
+            self._relationships_model = compile_batch_model(self._relationship_model)
+        return self._relationship_model
+
+    def get_node_model(self):
+        if self._node_model is None:
+            self._node_model = compile_model(self.get_attrs_scheme(False))
+            self._nodes_model = compile_batch_model(self._node_model)
+        return self._node_model
+
+    def check_relationship_schema(self, node):
+        check_document(self.get_relationship_model(), node, allow_empty=False)
+
+    def check_relationships_schema(self, nodes):
+        self.get_relationship_model()
+        check_documents(self._relationships_model, nodes, allow_empty=False)
 
     def check_node_schema(self, node):
-        attrs_scheme = dict()
-        for key, options in self.fields.items():
-            if options["type"] == "text":
-                attrs_scheme[key] = (StrictStr, ...)
-            elif options["type"] == "int":
-                attrs_scheme[key] = (StrictInt, ...)
-            elif options["type"] == "float":
-                attrs_scheme[key] = (StrictFloat, ...)
-            elif options["type"] == "timestamp":
-                attrs_scheme[key] = (datetime, ...)
-            elif options["type"] == "[int]":
-                attrs_scheme[key] = (List[StrictInt], ...)
-            elif options["type"] == "[text]":
-                attrs_scheme[key] = (List[StrictStr], ...)
-            elif options["type"] == "[float]":
-                attrs_scheme[key] = (List[StrictFloat], ...)
-            elif options["type"] == "json":
-                attrs_scheme[key] = (Json, ...)
-        node_model = create_model('DynamicNodeModel', **attrs_scheme)
-        node_model.__config__.extra = 'forbid'
-        node_model.__config__.validate_all = True
-        try:
-            if len(node.keys()) == 0:
-                raise Exception()
-            node_model(**node)
-        except Exception as e:
-            raise InvalidSchema(e)
+        check_document(self.get_node_model(), node, allow_empty=False)
+
+    def check_nodes_schema(self, nodes):
+        self.get_node_model()
+        check_documents(self._nodes_model, nodes, allow_empty=False)
 
     def get_fields(self):
         return self.fields
@@ -156,6 +149,17 @@ class ArangodbSchema(GraphSchema):
     def get_field(self, field):
         return field
 
+    def get_projection(self, fields):
+        '''
+        return the attributes of the fields read by id, None to read all of them
+        '''
+        if not fields:
+            return None
+        for field in fields:
+            if field not in self.fields:
+                raise InvalidSchema("{} is not a field of this collection".format(field))
+        return [self.get_field(field) for field in fields]
+
     def get_schema(self):
         new_schema = {}
         new_schema["fields"] = self.fields
@@ -221,5 +225,10 @@ class ArangodbSchema(GraphSchema):
         self.namespace = namespace
         self.fields = fields
         self.global_collection_opts = global_collection_opts
+        self._node_model = None
+        self._nodes_model = None
+        self._relationship_model = None
+        self._relationships_model = None
+        self._node_transformer = None
         if self.global_collection_opts:
             self.check_global_options(global_collection_opts)
\ No newline at end of file
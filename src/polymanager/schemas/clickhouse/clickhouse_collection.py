@@ -1,82 +1,276 @@
 from polymanager.containers import ClickhouseContainer
+from polymanager.schemas.deferred_writer import get_deferred_writer
 from polymanager.exceptions.schema_exception import UnkownSchema, InvalidSchema
 from polymanager.schemas.document_collection import DocumentCollection
+from polymanager.schemas.ndjson_ingestion import NdjsonIngestion
+from polymanager.helper.ndjson_helper import iter_ndjson_lines
+from polymanager.helper.batch_helper import gather_chunks
+import json
 
 class ClickhouseCollection(DocumentCollection):
 
-    def __init__(self, internal_schema, collection_name):
+    def __init__(self, internal_schema, collection_name, schema=None):
+        '''
+        :param schema: the schema of the collection when it is already read
+        '''
         self.internal_schema = internal_schema
-        exists = self.internal_schema.get_schema(collection_name)
+        exists = schema or self.internal_schema.get_schema(collection_name)
         if not exists:
             raise UnkownSchema("this collection does not exist")
         self.schema = exists
 
     def add_document(self, document):
         result = {}
-        clickhouse_handler = ClickhouseContainer().handler()
+        clickhouse_handler = ClickhouseContainer.handler()
 
         #checking schema before insert
         self.schema.check_document_schema(document)
 
-        #adding document to manticore
+        #adding document to clickhouse
         index_document = self.schema.get_document_schema(document)
-        clickhouse_handler.bulk_add_documents(self.schema.get_collection_name(),[index_document])
+        if self.schema.get_insert_buffer_options():
+            ClickhouseContainer.buffers().add(self.schema, [index_document])
+        else:
+            clickhouse_handler.bulk_add_documents(self.schema.get_collection_name(),[index_document], columns=list(self.schema.get_columns()))
         result["status"] = "success"
         return result
 
     def add_documents(self, documents):
         result = {}
-        clickhouse_handler = ClickhouseContainer().handler()
+        clickhouse_handler = ClickhouseContainer.handler()
 
         #checking schema before insert
-        for _document in documents:
-            self.schema.check_document_schema(_document)
+        self.schema.check_documents_schema(documents)
         #adding document to dgraph and manticore
-        documents_schema = []
-        for _document in documents:
-            index_document = self.schema.get_document_schema(_document)
-            documents_schema.append(index_document)
-        clickhouse_handler.bulk_add_documents(self.schema.get_collection_name(), documents_schema)
+        documents_schema = self.schema.get_documents_schema(documents)
+        buffer_options = self.schema.get_insert_buffer_options()
+        if buffer_options and len(documents_schema) < buffer_options["max_rows"]:
+            #small bulk inserts are grouped with the other inserts of the collection
+            ClickhouseContainer.buffers().add(self.schema, documents_schema)
+        else:
+            clickhouse_handler.bulk_add_documents(self.schema.get_collection_name(), documents_schema, columns=list(self.schema.get_columns()))
         result["status"] = "success"
         return result
 
-    def delete_document(self, document_id):
+    def delete_document(self, document_id, wait=True):
         result = {}
-        clickhouse_handler = ClickhouseContainer().handler()
-        clickhouse_handler.delete_document(self.schema.get_collection_name(), document_id)
+        ClickhouseContainer.delete_buffers().delete(self.schema.get_collection_name(), [document_id], wait=wait)
         result["status"] = "success"
         return result
 
-    def delete_documents(self, documents_id):
+    def delete_documents(self, documents_id, wait=True):
         result = {}
-        clickhouse_handler = ClickhouseContainer().handler()
         int_documents = []
         for _document in documents_id:
             if isinstance(_document, int):
-                int_documents.append(str(_document))
+                int_documents.append(_document)
             else:
                 raise InvalidSchema("documents_id should be a list of int")
         #delete documents
-        clickhouse_handler.delete_documents(self.schema.get_collection_name(), int_documents)
+        ClickhouseContainer.delete_buffers().delete(self.schema.get_collection_name(), int_documents, wait=wait)
         result["status"] = "success"
         return result
 
     def update_document(self, document):
         result = {}
-        clickhouse_handler = ClickhouseContainer().handler()
+        clickhouse_handler = ClickhouseContainer.handler()
 
         #checking schema before insert
         self.schema.check_document_schema(document)
         #updating the document
         index_document = self.schema.get_document_schema(document)
         #index_document["id"] = document_id
-        clickhouse_handler.replace_document(self.schema.get_collection_name(),index_document)
+        engine = self.schema.get_engine()
+        collection_name = self.schema.get_collection_name()
+        columns = list(self.schema.get_columns())
+        if engine == "ReplacingMergeTree":
+            #the new version replaces the old one when the parts are merged
+            clickhouse_handler.bulk_add_documents(collection_name, [index_document], columns=columns)
+        elif engine == "CollapsingMergeTree":
+            #the old state is cancelled by a row with a negative sign
+            sign = self.schema.get_global_options().sign
+            sql, params = self.schema.build_select_query(
+                filters=[{"field": "id", "op": "eq", "value": index_document["id"]}],
+                limit=1,
+                final=True)
+            #two concurrent updates of a document would cancel the same state
+            with ClickhouseContainer.update_locks().hold((collection_name, index_document["id"])):
+                rows = [dict(row, **{sign: -1}) for row in clickhouse_handler.select(sql, params)]
+                rows.append(dict(index_document, **{sign: 1}))
+                clickhouse_handler.bulk_add_documents(collection_name, rows, columns=columns + [sign])
+        else:
+            clickhouse_handler.replace_document(collection_name, index_document)
         result["status"] = "success"
         return result
 
+    def select_documents(self, fields=None, filters=None, order="asc", limit=1000, after=None, raw=False, final=False):
+        '''
+        stream the documents of the collection as ndjson
+
+        :param raw: True to send the JSONEachRow result of clickhouse without parsing it
+        :param final: True to return only the last version of the documents
+
+        :return: a generator of bytes
+        '''
+        clickhouse_handler = ClickhouseContainer.handler()
+        sql, params = self.schema.build_select_query(fields, filters, order, limit, after, final)
+        rows = clickhouse_handler.select(sql, params, raw=raw)
+        if raw:
+            return rows
+        return (json.dumps(self.schema.get_document_from_row(row)).encode("utf-8") + b"\n" for row in rows)
+
+    def get_mutations(self, only_pending=False):
+        '''
+        return the last mutations of the collection with their status
+        '''
+        clickhouse_handler = ClickhouseContainer.handler()
+        return clickhouse_handler.get_mutations(self.schema.get_collection_name(), only_pending=only_pending)
+
     def truncate(self):
         result = {}
-        clickhouse_handler = ClickhouseContainer().handler()
+        clickhouse_handler = ClickhouseContainer.handler()
+        #the buffered rows are flushed before the table is truncated
+        ClickhouseContainer.buffers().close_buffer(self.schema.get_collection_name())
         clickhouse_handler.truncate(self.schema.get_collection_name())
         result["status"] = "success"
-        return result
\ No newline at end of file
+        return result
+
+class AsyncClickhouseCollection(ClickhouseCollection):
+    '''
+    clickhouse collection for the async routes, the writes and the selects wait
+    for clickhouse without blocking the event loop
+    '''
+
+    async def add_document(self, document):
+        #checking schema before insert
+        self.schema.check_document_schema(document)
+        return await self.insert_documents([self.schema.get_document_schema(document)])
+
+    async def add_documents(self, documents):
+        #checking schema before insert
+        self.schema.check_documents_schema(documents)
+        return await self.insert_documents(self.schema.get_documents_schema(documents))
+
+    async def insert_documents(self, documents_schema):
+        result = {}
+        clickhouse_handler = ClickhouseContainer.async_handler()
+        id_name, deferred_writer = get_deferred_writer("clickhouse")
+        buffer_options = self.schema.get_insert_buffer_options()
+        #the updates of a CollapsingMergeTree read the state of the documents, its inserts are written directly
+        if deferred_writer is not None and self.schema.get_engine() != "CollapsingMergeTree":
+            #the documents are inserted by the ingestion queue or the spool
+            result[id_name] = await deferred_writer.append_async("clickhouse", self.schema.get_collection_name(), {
+                "collection": self.schema.get_collection_name(),
+                "columns": list(self.schema.get_columns()),
+                "rows": documents_schema
+            })
+        elif buffer_options and len(documents_schema) < buffer_options["max_rows"]:
+            #small bulk inserts are grouped with the other inserts of the collection
+            await ClickhouseContainer.buffers().add_async(self.schema, documents_schema)
+        else:
+            await clickhouse_handler.bulk_add_documents(self.schema.get_collection_name(), documents_schema, columns=list(self.schema.get_columns()))
+        result["status"] = "success"
+        return result
+
+    async def delete_document(self, document_id, wait=True):
+        return await self.remove_documents([document_id], wait=wait)
+
+    async def delete_documents(self, documents_id, wait=True):
+        for _document in documents_id:
+            if not isinstance(_document, int):
+                raise InvalidSchema("documents_id should be a list of int")
+        return await self.remove_documents(documents_id, wait=wait)
+
+    async def remove_documents(self, documents_id, wait=True):
+        result = {}
+        delete_buffers = ClickhouseContainer.delete_buffers()
+        if delete_buffers.window_ms:
+            await delete_buffers.get_buffer(self.schema.get_collection_name(), wait).add_async(list(documents_id))
+        else:
+            await ClickhouseContainer.async_handler().delete_documents(self.schema.get_collection_name(), documents_id, wait=wait)
+        result["status"] = "success"
+        return result
+
+    async def update_document(self, document):
+        result = {}
+        clickhouse_handler = ClickhouseContainer.async_handler()
+
+        #checking schema before insert
+        self.schema.check_document_schema(document)
+        #updating the document
+        index_document = self.schema.get_document_schema(document)
+        engine = self.schema.get_engine()
+        collection_name = self.schema.get_collection_name()
+        columns = list(self.schema.get_columns())
+        if engine == "ReplacingMergeTree":
+            await clickhouse_handler.bulk_add_documents(collection_name, [index_document], columns=columns)
+        elif engine == "CollapsingMergeTree":
+            sign = self.schema.get_global_options().sign
+            sql, params = self.schema.build_select_query(
+                filters=[{"field": "id", "op": "eq", "value": index_document["id"]}],
+                limit=1,
+                final=True)
+            async with ClickhouseContainer.update_locks().hold_async((collection_name, index_document["id"])):
+                rows = [dict(row, **{sign: -1}) async for row in await clickhouse_handler.select(sql, params)]
+                rows.append(dict(index_document, **{sign: 1}))
+                await clickhouse_handler.bulk_add_documents(collection_name, rows, columns=columns + [sign])
+        else:
+            await clickhouse_handler.replace_document(collection_name, index_document)
+        result["status"] = "success"
+        return result
+
+    async def select_documents(self, fields=None, filters=None, order="asc", limit=1000, after=None, raw=False, final=False):
+        '''
+        stream the documents of the collection as ndjson
+
+        :return: an async generator of bytes
+        '''
+        clickhouse_handler = ClickhouseContainer.async_handler()
+        sql, params = self.schema.build_select_query(fields, filters, order, limit, after, final)
+        rows = await clickhouse_handler.select(sql, params, raw=raw)
+        if raw:
+            return rows
+        return (json.dumps(self.schema.get_document_from_row(row)).encode("utf-8") + b"\n" async for row in rows)
+
+    async def get_documents(self, documents_id, fields=None, chunk_size=1000, concurrency=4):
+        '''
+        read documents by id with one WHERE id IN query per chunk of chunk_size ids
+
+        :param fields: the fields to return with the id, all fields by default
+        :param concurrency: the number of chunks read at the same time
+        :return: the documents in the order of documents_id, None for the ids that are not found
+        '''
+        clickhouse_handler = ClickhouseContainer.async_handler()
+        for _document in documents_id:
+            if not isinstance(_document, int) or isinstance(_document, bool):
+                raise InvalidSchema("documents_id should be a list of int")
+        #checking the fields before the chunks are read
+        self.schema.build_get_query([], fields)
+
+        async def get_chunk(chunk):
+            sql, params = self.schema.build_get_query(chunk, fields)
+            return [self.schema.get_document_from_row(row) async for row in await clickhouse_handler.select(sql, params)]
+
+        documents = await gather_chunks(list(dict.fromkeys(documents_id)), get_chunk, chunk_size=chunk_size, concurrency=concurrency)
+        found = {document["id"]: document for document in documents}
+        return [found.get(document_id) for document_id in documents_id]
+
+    async def ingest_ndjson(self, chunks, chunk_size=1000, encoding=None):
+        '''
+        insert the documents of an ndjson body while it is received
+
+        :param chunks: an async iterator of the bytes of the body
+        :param encoding: the content encoding of the body, gzip or None
+
+        :return: the summary of every chunk of chunk_size documents
+        '''
+        def prepare_row(document):
+            self.schema.check_document_schema(document)
+            return self.schema.get_document_schema(document)
+
+        async def send_rows(documents_schema):
+            await self.insert_documents(documents_schema)
+            return {}
+
+        ingestion = NdjsonIngestion(prepare_row, send_rows, chunk_size)
+        return await ingestion.run(iter_ndjson_lines(chunks, encoding))
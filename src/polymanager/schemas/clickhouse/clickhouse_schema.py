@@ -1,23 +1,48 @@
 
 
-from pydantic import create_model, StrictStr, StrictInt, StrictFloat, validator
-from dateutil.parser import parse
-from datetime import datetime
+from pydantic import StrictStr, StrictInt, StrictFloat, conint, confloat, constr, validator, root_validator
+from polymanager.helper.timestamp_helper import parse_timestamp
 from typing import (
-    List, Dict
+    List, Dict, Optional
 )
 from pydantic import BaseModel
 from polymanager.exceptions.schema_exception import InvalidSchema
 from polymanager.schemas.document_schema import DocumentSchema
+from polymanager.schemas.schema_validator import Timestamp, compile_model, compile_batch_model, compile_transformer, check_document, check_documents
+from types import MappingProxyType
+import re
+
+CODEC_PATTERN = re.compile(r"^(NONE|LZ4|LZ4HC(\([0-9]+\))?|ZSTD(\([0-9]+\))?|Delta(\([1248]\))?|DoubleDelta|Gorilla|T64)$")
 
 class Field(BaseModel):
     type_value: str = ""
+    codec: List[str] = []
+    low_cardinality: bool = False
+
     @validator('type_value')
     def type_in_supported_list(cls, v):
         if v not in ["int", "float", "text", "timestamp", "[int]", "[float]", "[text]"]:
             raise ValueError('{} is not a supported type'.format(v))
         return v
 
+    @validator('codec', each_item=True)
+    def codec_in_supported_list(cls, v):
+        if not CODEC_PATTERN.match(v):
+            raise ValueError('{} is not a supported codec'.format(v))
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def options_supported_by_type(cls, values):
+        field_type = values["type_value"]
+        if values["low_cardinality"] and field_type not in ["text", "[text]"]:
+            raise ValueError('low_cardinality is only supported by text fields')
+        for codec in values["codec"]:
+            if codec.startswith(("Delta", "DoubleDelta", "T64")) and field_type not in ["int", "timestamp"]:
+                raise ValueError('{} is only supported by int and timestamp fields'.format(codec))
+            elif codec == "Gorilla" and field_type != "float":
+                raise ValueError('Gorilla is only supported by float fields')
+        return values
+
     class Config:
         fields = {'type_value': 'type'}
         extra = "forbid"
@@ -36,115 +61,396 @@ class SupportedFields(BaseModel):
     class Config:
         fields = {'fields_value': 'fields'}
 
+class InsertBufferOptions(BaseModel):
+    max_rows: conint(gt=0) = 1000
+    max_bytes: conint(gt=0) = 1048576
+    max_latency_ms: conint(gt=0) = 200
+
+    class Config:
+        extra = "forbid"
+
+class PartitionBy(BaseModel):
+    field: str
+    granularity: str = "month"
+
+    @validator('granularity')
+    def granularity_in_supported_list(cls, v):
+        if v not in ["day", "week", "month", "year", "value"]:
+            raise ValueError('{} is not a supported granularity'.format(v))
+        return v
+
+    class Config:
+        extra = "forbid"
+
+class TTLOptions(BaseModel):
+    field: str
+    days: conint(gt=0)
+
+    class Config:
+        extra = "forbid"
+
+class SkipIndex(BaseModel):
+    name: constr(regex=r"^[A-Za-z_][A-Za-z0-9_]*$")
+    field: str
+    type_value: str
+    max_rows: conint(ge=0) = 0
+    false_positive: confloat(gt=0, lt=1) = 0.025
+    granularity: conint(gt=0) = 1
+
+    @validator('type_value')
+    def type_in_supported_list(cls, v):
+        if v not in ["minmax", "set", "bloom_filter"]:
+            raise ValueError('{} is not a supported index type'.format(v))
+        return v
+
+    class Config:
+        fields = {'type_value': 'type'}
+        extra = "forbid"
+
 class GlobalOptions(BaseModel):
     order_by: List[str]
+    engine: str = "MergeTree"
+    version: str = "_version"
+    sign: str = "_sign"
+    partition_by: Optional[PartitionBy] = None
+    ttl: Optional[TTLOptions] = None
+    indexes: List[SkipIndex] = []
+    insert_buffer: Optional[InsertBufferOptions] = None
+
+    @validator('engine')
+    def engine_in_supported_list(cls, v):
+        if v not in ["MergeTree", "ReplacingMergeTree", "CollapsingMergeTree"]:
+            raise ValueError('{} is not a supported engine'.format(v))
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def versioned_engine_ordered_by_id(cls, values):
+        #rows are deduplicated by their sorting key
+        if values["engine"] != "MergeTree" and "id" not in values["order_by"]:
+            raise ValueError('the order_by of a {} must contain the id field'.format(values["engine"]))
+        #an update reads the state to cancel, it must not miss the inserts waiting in a buffer
+        if values["engine"] == "CollapsingMergeTree" and values.get("insert_buffer"):
+            raise ValueError('the insert_buffer is not supported by a CollapsingMergeTree')
+        return values
 
 class ClickhouseSchema(DocumentSchema):
 
     def get_fields(self):
-        if self.include_namespace:
-            new_fields = {}
-            for key, options in self.fields.items():
-                options = self.fields[key]
-                new_key = "{}{}{}".format(self.namespace, self.namespace_separator, key)
-                if key == "id":
-                    new_fields["id"] = options
-                else:
-                    new_fields[new_key] = options
-            return new_fields
-        else:
-            return self.fields
+        if self._fields is None:
+            if self.include_namespace:
+                self._fields = MappingProxyType({key if key == "id" else self.get_field(key): options for key, options in self.fields.items()})
+            else:
+                self._fields = MappingProxyType(self.fields)
+        return self._fields
 
     def get_field(self, field):
         if self.include_namespace:
             return "{}{}{}".format(self.namespace, self.namespace_separator, field)
 
+    def get_document_transformer(self):
+        '''
+        return the function that converts a document to a row, it is built once per schema
+        '''
+        if self._document_transformer is None:
+            self._document_transformer = compile_transformer(
+                {key: (key, self.get_field_converter(options["type"])) for key, options in self.fields.items()})
+        return self._document_transformer
+
     def get_document_schema(self, document):
-        new_document = {}
-        for key, value in document.items():
-            field_options = self.fields[key]
-            new_value = self.parse_field(field_options["type"], value)
-            if key == "id":
-                new_document["id"] = new_value
-            else:
-                new_document[key] = new_value
-        return new_document
+        return self.get_document_transformer()(document)
+
+    def get_documents_schema(self, documents):
+        transform = self.get_document_transformer()
+        return [transform(document) for document in documents]
+
+    def get_document_from_row(self, row):
+        if self._timestamp_fields is None:
+            self._timestamp_fields = frozenset(key for key, options in self.fields.items() if options["type"] == "timestamp")
+        document = dict(row)
+        for key in self._timestamp_fields.intersection(row):
+            document[key] = row[key].replace(" ", "T")
+        return document
+
+    def get_field_converter(self, field_type):
+        '''
+        return the function that converts a value of this type, None if the value is not converted
+        '''
+        if field_type == "timestamp":
+            return lambda field_value: parse_timestamp(field_value).strftime("%Y-%m-%d %H:%M:%S")
+        return None
 
     def parse_field(self, field_type, field_value):
+        converter = self.get_field_converter(field_type)
+        return field_value if converter is None else converter(field_value)
+
+    def get_document_model(self):
+        if self._document_model is None:
+            attrs_scheme = dict()
+            for key, options in self.fields.items():
+                if options["type"] == "text":
+                    attrs_scheme[key] = (StrictStr, ...)
+                elif options["type"] == "int":
+                    attrs_scheme[key] = (StrictInt, ...)
+                elif options["type"] == "float":
+                    attrs_scheme[key] = (StrictFloat, ...)
+                elif options["type"] == "timestamp":
+                    attrs_scheme[key] = (Timestamp, ...)
+                elif options["type"] == "[int]":
+                    attrs_scheme[key] = (List[StrictInt], ...)
+                elif options["type"] == "[text]":
+                    attrs_scheme[key] = (List[StrictStr], ...)
+                elif options["type"] == "[float]":
+                    attrs_scheme[key] = (List[StrictFloat], ...)
+            self._document_model = compile_model(attrs_scheme)
+            self._documents_model = compile_batch_model(self._document_model)
+        return self._document_model
+
+    def check_document_schema(self, document):
+        check_document(self.get_document_model(), document)
+
+    def check_documents_schema(self, documents):
+        self.get_document_model()
+        check_documents(self._documents_model, documents)
+
+    def get_column_type(self, field_type):
         if field_type == "text":
-            return field_value
+            return "String"
+        elif field_type == "timestamp":
+            return "Datetime"
         elif field_type == "int":
-            return field_value
+            return "Int64"
         elif field_type == "float":
-            return field_value
-        elif field_type == "timestamp":
-            return parse(field_value).strftime("%Y-%m-%d %H:%M:%S")
+            return "Float32"
+        elif field_type == "[int]":
+            return "Array(Int64)"
+        elif field_type == "[float]":
+            return "Array(Float32)"
+        elif field_type == "[text]":
+            return "Array(String)"
+        return ""
+
+    def get_columns(self):
+        columns = {}
+        for key, options in self.fields.items():
+            columns[key] = self.get_column_type(options["type"])
+        return columns
+
+    def get_column_definition(self, key):
+        '''
+        return the type of a column in the CREATE TABLE query with its LowCardinality and codec options
+        '''
+        options = self.fields[key]
+        column_type = self.get_column_type(options["type"])
+        if options.get("low_cardinality"):
+            if options["type"] == "[text]":
+                column_type = "Array(LowCardinality(String))"
+            else:
+                column_type = "LowCardinality(String)"
+        if options.get("codec"):
+            column_type = column_type + " CODEC({})".format(", ".join(options["codec"]))
+        return column_type
+
+    def get_index_definition(self, index):
+        if index.type_value == "set":
+            index_type = "set({})".format(index.max_rows)
+        elif index.type_value == "bloom_filter":
+            index_type = "bloom_filter({})".format(index.false_positive)
         else:
-            return field_value
+            index_type = "minmax"
+        return "INDEX {} {} TYPE {} GRANULARITY {}".format(index.name, index.field, index_type, index.granularity)
 
+    def get_partition_expression(self):
+        partition_by = self.get_global_options().partition_by
+        functions = {"day": "toYYYYMMDD", "week": "toMonday", "month": "toYYYYMM", "year": "toYear"}
+        if partition_by.granularity == "value":
+            return partition_by.field
+        return "{}({})".format(functions[partition_by.granularity], partition_by.field)
 
-    def check_document_schema(self, document):
-        attrs_scheme = dict()
-        for key, options in self.fields.items():
-            if options["type"] == "text":
-                attrs_scheme[key] = (StrictStr, ...)
-            elif options["type"] == "int":
-                attrs_scheme[key] = (StrictInt, ...)
-            elif options["type"] == "float":
-                attrs_scheme[key] = (StrictFloat, ...)
-            elif options["type"] == "timestamp":
-                attrs_scheme[key] = (datetime, ...)
-            elif options["type"] == "[int]":
-                attrs_scheme[key] = (List[StrictInt], ...)
-            elif options["type"] == "[text]":
-                attrs_scheme[key] = (List[StrictStr], ...)
-            elif options["type"] == "[float]":
-                attrs_scheme[key] = (List[StrictFloat], ...)
-        document_model = create_model('DynamicNodeModel', **attrs_scheme)
-        document_model.__config__.extra = 'forbid'
-        document_model.__config__.validate_all = True
-        try:
-            document_model(**document)
-        except Exception as e:
-            raise InvalidSchema(e)
+    def get_engine(self):
+        return self.get_global_options().engine
+
+    def get_engine_columns(self):
+        '''
+        return the columns managed by the engine, they are filled by their default value
+        '''
+        options = self.get_global_options()
+        if options.engine == "ReplacingMergeTree":
+            return {options.version: "UInt64 DEFAULT toUnixTimestamp64Nano(now64(9))"}
+        elif options.engine == "CollapsingMergeTree":
+            return {options.sign: "Int8 DEFAULT 1"}
+        return {}
+
+    def get_engine_clause(self):
+        options = self.get_global_options()
+        if options.engine == "ReplacingMergeTree":
+            return "ReplacingMergeTree({})".format(options.version)
+        elif options.engine == "CollapsingMergeTree":
+            return "CollapsingMergeTree({})".format(options.sign)
+        return "MergeTree()"
 
     def generate_schema(self):
         sql = ""
         attrs_handled = 0
-        for index, key in enumerate(self.fields):
-            options = self.fields[key]
-            _type = ""
-            set_type = ""
-            if options["type"] == "text":
-                set_type = "String"
-            elif options["type"] == "timestamp":
-                set_type = "Datetime"
-            elif options["type"] == "int":
-                set_type = "Int64"
-            elif options["type"] == "float":
-                set_type = "Float32"
-            elif options["type"] == "[int]":
-                set_type = "Array(Int64)"
-            elif options["type"] == "[float]":
-                set_type = "Array(Float32)"
-            elif options["type"] == "[text]":
-                set_type = "Array(String)"
+        columns = {key: self.get_column_definition(key) for key in self.fields}
+        if columns:
+            columns.update(self.get_engine_columns())
+        options = self.get_global_options()
+        for key, set_type in columns.items():
             _type = "{} {}".format(key, set_type)
             attrs_handled = attrs_handled + 1
             _type = _type + ","
             sql = sql + _type
         if attrs_handled == 0:
             return ""
+        for index in options.indexes:
+            sql = sql + self.get_index_definition(index) + ","
         if sql[-1] == ',': sql = sql[:-1]
-        req = "query=CREATE TABLE {} ({}) ENGINE = MergeTree() ORDER BY ({})".format(
+        engine = self.get_engine_clause()
+        if options.partition_by:
+            engine = engine + " PARTITION BY {}".format(self.get_partition_expression())
+        req = "query=CREATE TABLE {} ({}) ENGINE = {} ORDER BY ({})".format(
             self.get_collection_name(),
             sql,
+            engine,
             ",".join(self.global_collection_opts["order_by"])
         )
+        if options.ttl:
+            req = req + " TTL {} + INTERVAL {} DAY".format(options.ttl.field, options.ttl.days)
         print(req)
         return req
 
 
+    def get_query_value(self, field_type, value):
+        '''
+        convert a value of a filter to the text format of a clickhouse query parameter
+        '''
+        if field_type == "int":
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise InvalidSchema("{} is not an int".format(value))
+            return str(value)
+        elif field_type == "float":
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise InvalidSchema("{} is not a float".format(value))
+            return repr(float(value))
+        elif field_type == "text":
+            if not isinstance(value, str):
+                raise InvalidSchema("{} is not a text".format(value))
+            return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+        elif field_type == "timestamp":
+            try:
+                return parse_timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+            except Exception:
+                raise InvalidSchema("{} is not a timestamp".format(value))
+        raise InvalidSchema("{} fields can not be filtered".format(field_type))
+
+    def get_query_array(self, field_type, values):
+        if not isinstance(values, list):
+            raise InvalidSchema("{} is not a list".format(values))
+        items = []
+        for value in values:
+            item = self.get_query_value(field_type, value)
+            if field_type == "text":
+                #the array literal is sent as a query parameter, clickhouse unescapes it before parsing the literal
+                item = self.get_query_value(field_type, "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'")
+            elif field_type == "timestamp":
+                item = "'" + item + "'"
+            items.append(item)
+        return "[" + ",".join(items) + "]"
+
+    def build_select_query(self, fields=None, filters=None, order="asc", limit=1000, after=None, final=False):
+        '''
+        build a select query on the collection with query parameters
+
+        :param fields: the fields to return, all fields by default
+        :param filters: a list of dict with a field, an op (eq, ne, lt, lte, gt, gte, in, has) and a value
+        :param order: asc or desc, the rows are sorted by the order_by key of the collection
+        :param limit: the maximum number of rows
+        :param after: the values of the order_by key of the last row of the previous page
+        :param final: True to return only the last version of the documents
+
+        :return: the sql query and a dict of query parameters
+        '''
+        operators = {"eq": "=", "ne": "!=", "lt": "<", "lte": "<=", "gt": ">", "gte": ">="}
+        columns = self.get_columns()
+        order_by = self.global_collection_opts["order_by"]
+        if fields:
+            for field in fields:
+                if field not in columns:
+                    raise InvalidSchema("{} is not a field of this collection".format(field))
+        else:
+            fields = list(columns)
+        if order not in ["asc", "desc"]:
+            raise InvalidSchema("order must be asc or desc")
+        if not isinstance(limit, int) or limit <= 0:
+            raise InvalidSchema("limit must be a positive int")
+        if final and self.get_engine() == "MergeTree":
+            raise InvalidSchema("final requires a ReplacingMergeTree or CollapsingMergeTree engine")
+        conditions = []
+        params = {}
+        for _filter in filters or []:
+            field = _filter.get("field")
+            op = _filter.get("op", "eq")
+            value = _filter.get("value")
+            if field not in columns:
+                raise InvalidSchema("{} is not a field of this collection".format(field))
+            field_type = self.fields[field]["type"]
+            name = "p{}".format(len(params))
+            if op in operators:
+                params[name] = self.get_query_value(field_type, value)
+                conditions.append("{} {} {{{}:{}}}".format(field, operators[op], name, columns[field]))
+            elif op == "in":
+                params[name] = self.get_query_array(field_type, value)
+                conditions.append("has({{{}:Array({})}}, {})".format(name, columns[field], field))
+            elif op == "has" and field_type.startswith("["):
+                element_type = field_type[1:-1]
+                params[name] = self.get_query_value(element_type, value)
+                conditions.append("has({}, {{{}:{}}})".format(field, name, self.get_column_type(element_type)))
+            else:
+                raise InvalidSchema("{} is not a supported operator for {}".format(op, field))
+        if after is not None:
+            if not isinstance(after, list) or len(after) != len(order_by):
+                raise InvalidSchema("after must contain a value for every order_by field ({})".format(",".join(order_by)))
+            names = []
+            for index, field in enumerate(order_by):
+                name = "p{}".format(len(params))
+                params[name] = self.get_query_value(self.fields[field]["type"], after[index])
+                names.append("{{{}:{}}}".format(name, columns[field]))
+            conditions.append("({}) {} ({})".format(",".join(order_by), ">" if order == "asc" else "<", ",".join(names)))
+        sql = "SELECT {} FROM {}".format(",".join(fields), self.get_collection_name())
+        if final:
+            sql = sql + " FINAL"
+        if conditions:
+            sql = sql + " WHERE " + " AND ".join(conditions)
+        sql = sql + " ORDER BY {} LIMIT {} FORMAT JSONEachRow".format(
+            ",".join("{} {}".format(field, order.upper()) for field in order_by),
+            limit
+        )
+        return sql, params
+
+    def build_get_query(self, documents_id, fields=None):
+        '''
+        build the query that reads documents by id, the id is always returned. The last
+        version of a document is read when the engine replaces or collapses them
+
+        :param fields: the fields to return, all fields by default
+
+        :return: the sql query and a dict of query parameters
+        '''
+        columns = self.get_columns()
+        if fields:
+            for field in fields:
+                if field not in columns:
+                    raise InvalidSchema("{} is not a field of this collection".format(field))
+            fields = ["id"] + [field for field in fields if field != "id"]
+        else:
+            fields = list(columns)
+        params = {"p0": self.get_query_array("int", documents_id)}
+        sql = "SELECT {} FROM {}".format(",".join(fields), self.get_collection_name())
+        if self.get_engine() != "MergeTree":
+            sql = sql + " FINAL"
+        sql = sql + " WHERE id IN {{p0:Array({})}} LIMIT 1 BY id FORMAT JSONEachRow".format(columns["id"])
+        return sql, params
+
     def get_schema(self):
         new_schema = {}
         new_schema["fields"] = self.fields
@@ -169,20 +475,64 @@ class ClickhouseSchema(DocumentSchema):
         except Exception as e:
             raise InvalidSchema(e)
 
-    def check_global_options(self, global_collection_opts):
+    def get_global_options(self):
+        if self._global_options is None:
+            self._global_options = GlobalOptions(**self.global_collection_opts)
+        return self._global_options
+
+    def get_insert_buffer_options(self):
+        if self._insert_buffer_options is None:
+            insert_buffer = self.get_global_options().insert_buffer
+            self._insert_buffer_options = insert_buffer.dict() if insert_buffer else {}
+        return self._insert_buffer_options
+
+    def check_global_options(self, global_collection_opts, fields):
         try:
-            GlobalOptions(**global_collection_opts)
+            options = GlobalOptions(**global_collection_opts)
         except Exception as e:
             raise InvalidSchema(e)
+        engine_columns = {"MergeTree": [], "ReplacingMergeTree": [options.version], "CollapsingMergeTree": [options.sign]}
+        for column in engine_columns[options.engine]:
+            if column in fields:
+                raise InvalidSchema("{} is reserved for the engine, it can not be a field".format(column))
+        if options.partition_by:
+            field = options.partition_by.field
+            if field not in fields:
+                raise InvalidSchema("partition_by: {} is not a field of this collection".format(field))
+            if options.partition_by.granularity != "value" and fields[field]["type"] != "timestamp":
+                raise InvalidSchema("partition_by: a {} granularity requires a timestamp field".format(options.partition_by.granularity))
+            if fields[field]["type"] not in ["int", "text", "timestamp"]:
+                raise InvalidSchema("partition_by: {} fields can not be used as partition key".format(fields[field]["type"]))
+        if options.ttl:
+            if options.ttl.field not in fields or fields[options.ttl.field]["type"] != "timestamp":
+                raise InvalidSchema("ttl: {} is not a timestamp field of this collection".format(options.ttl.field))
+        names = set()
+        for index in options.indexes:
+            if index.name in names:
+                raise InvalidSchema("indexes: {} is defined twice".format(index.name))
+            names.add(index.name)
+            if index.field not in fields:
+                raise InvalidSchema("indexes: {} is not a field of this collection".format(index.field))
+            field_type = fields[index.field]["type"]
+            if index.type_value == "minmax" and field_type not in ["int", "float", "timestamp"]:
+                raise InvalidSchema("indexes: minmax index requires an int, float or timestamp field")
+            if index.type_value == "bloom_filter" and field_type in ["float", "[float]"]:
+                raise InvalidSchema("indexes: bloom_filter index does not support float fields")
 
 
     def __init__(self, namespace, collection, fields, global_collection_opts):
         self.namespace_separator="_"
         self.include_namespace = True
         self.check_fields(fields)
-        self.check_global_options(global_collection_opts)
+        self.check_global_options(global_collection_opts, fields)
         self.collection = collection
         self.namespace = namespace
         self.fields = fields
         self.global_collection_opts = global_collection_opts
-        
\ No newline at end of file
+        self._document_model = None
+        self._documents_model = None
+        self._insert_buffer_options = None
+        self._global_options = None
+        self._fields = None
+        self._document_transformer = None
+        self._timestamp_fields = None
@@ -0,0 +1,182 @@
+from polymanager.containers import CoreContainer
+from polymanager.exceptions.schema_exception import UnkownSchema, InvalidSchema
+from polymanager.exceptions.composite_exception import CompositeWriteError
+from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
+from polymanager.schemas.composite.composite_schema import WRITE_MODES
+from polymanager.schemas.clickhouse.clickhouse_collection import AsyncClickhouseCollection
+from polymanager.schemas.manticore.manticore_collection import AsyncManticoreSearchCollection
+from polymanager.schemas.dgraph.dgraph_collection import AsyncDgraphCollection
+from polymanager.schemas.arangodb.arangodb_collection import AsyncArangodbCollection
+import asyncio
+import logging
+
+#the writes of the secondary targets that are still running, they must be referenced until they are done
+_background_writes = set()
+
+def get_target_class(schema, target):
+    '''
+    return the async collection class, the internal schema and the collection name of a target
+    '''
+    datastore = target["datastore"]
+    collection_name = schema.get_target_collection_name(target)
+    if datastore not in CoreContainer.config.connectors():
+        raise InvalidSchema("the {} datastore of {} is not enabled".format(datastore, collection_name))
+    collection_classes = {
+        "clickhouse": AsyncClickhouseCollection,
+        "manticoresearch": AsyncManticoreSearchCollection,
+        "dgraph": AsyncDgraphCollection,
+        "arangodb": AsyncArangodbCollection
+    }
+    return collection_classes[datastore], KVRocksInternalSchema(datastore), collection_name
+
+async def load_target_collection(schema, target):
+    collection_class, internal_schema, collection_name = get_target_class(schema, target)
+    try:
+        return await collection_class.load(internal_schema, collection_name)
+    except UnkownSchema:
+        raise InvalidSchema("the {} collection {} does not exist".format(target["datastore"], collection_name))
+
+class CompositeCollection:
+    '''
+    write the documents of a composite collection to all its targets concurrently.
+
+    The write mode tells when a write succeeds:
+
+    * all_or_report: all the targets are written, the write fails with the report of every target if one of them failed
+    * best_effort: all the targets are written, the write only fails if none of them succeeded
+    * async_secondary: only the primary targets are awaited, the secondary targets are written in the background
+    '''
+
+    def __init__(self, internal_schema, collection_name, schema=None, collections=None):
+        '''
+        :param schema: the schema of a composite collection that is not saved yet, to check its targets
+        :param collections: the collections of the targets when they are already created
+        '''
+        self.internal_schema = internal_schema
+        exists = schema or self.internal_schema.get_schema(collection_name)
+        if not exists:
+            raise UnkownSchema("this collection does not exist")
+        self.schema = exists
+        if collections is None:
+            collections = [self.get_target_collection(target) for target in self.schema.get_targets()]
+        self.collections = collections
+
+    @classmethod
+    async def load(cls, internal_schema, collection_name):
+        '''
+        create the collection in the async routes, the schemas are read without blocking the event loop
+        '''
+        schema = await internal_schema.get_schema_async(collection_name)
+        if not schema:
+            raise UnkownSchema("this collection does not exist")
+        collections = await asyncio.gather(*[load_target_collection(schema, target) for target in schema.get_targets()])
+        return cls(internal_schema, collection_name, schema=schema, collections=list(collections))
+
+    def get_target_collection(self, target):
+        collection_class, internal_schema, collection_name = get_target_class(self.schema, target)
+        try:
+            return collection_class(internal_schema, collection_name)
+        except UnkownSchema:
+            raise InvalidSchema("the {} collection {} does not exist".format(target["datastore"], collection_name))
+
+    def get_target_schema(self, target, collection):
+        if target["datastore"] == "dgraph":
+            return collection.dgraph_schema
+        elif target["datastore"] == "arangodb":
+            return collection.arangodb_schema
+        return collection.schema
+
+    def get_target_model(self, target, collection):
+        schema = self.get_target_schema(target, collection)
+        if target["datastore"] in ["dgraph", "arangodb"]:
+            return schema.get_node_model()
+        return schema.get_document_model()
+
+    def get_target_models(self):
+        return [self.get_target_model(target, collection) for target, collection in zip(self.schema.get_targets(), self.collections)]
+
+    def check_targets(self):
+        '''
+        check that the fields shared by the targets have the same type
+        '''
+        self.schema.get_document_model(self.get_target_models())
+
+    def get_target_rows(self, target, collection, documents):
+        '''
+        keep the fields of the target in the documents and convert them to its format
+        '''
+        schema = self.get_target_schema(target, collection)
+        fields = list(self.get_target_model(target, collection).__fields__)
+        documents = [{key: document[key] for key in fields if key in document} for document in documents]
+        if target["datastore"] in ["dgraph", "arangodb"]:
+            return schema.get_nodes_schema(documents)
+        return schema.get_documents_schema(documents)
+
+    async def write_target(self, target, collection, rows):
+        if target["datastore"] in ["dgraph", "arangodb"]:
+            return await collection.insert_nodes(rows)
+        return await collection.insert_documents(rows)
+
+    async def add_document(self, document, write_mode=None):
+        return await self.add_documents([document], write_mode=write_mode)
+
+    async def add_documents(self, documents, write_mode=None):
+        write_mode = write_mode or self.schema.get_write_mode()
+        if write_mode not in WRITE_MODES:
+            raise InvalidSchema("{} is not a supported write mode".format(write_mode))
+
+        #checking schema before insert, once for all the targets
+        self.schema.check_documents_schema(self.get_target_models(), documents)
+
+        targets = self.schema.get_targets()
+        #converting the documents for every target before any write starts
+        target_rows = [self.get_target_rows(target, collection, documents) for target, collection in zip(targets, self.collections)]
+        awaited = []
+        reports = []
+        for target, collection, rows in zip(targets, self.collections, target_rows):
+            report = {"datastore": target["datastore"], "collection": self.schema.get_target_collection_name(target), "role": target["role"]}
+            write = self.write_target(target, collection, rows)
+            if write_mode == "async_secondary" and target["role"] == "secondary":
+                self.write_in_background(report, write)
+                report["status"] = "pending"
+            else:
+                awaited.append((report, write))
+            reports.append(report)
+
+        results = await asyncio.gather(*[write for report, write in awaited], return_exceptions=True)
+        errors = []
+        for (report, write), target_result in zip(awaited, results):
+            if isinstance(target_result, Exception):
+                errors.append(target_result)
+                logger = logging.getLogger()
+                logger.error(target_result, exc_info=target_result)
+                report["status"] = "failed"
+                report["error"] = str(target_result)
+            else:
+                report.update(target_result)
+                report["status"] = "success"
+
+        failed = [report for report, write in awaited if report["status"] == "failed"]
+        result = {}
+        if not failed:
+            result["status"] = "success"
+        elif len(failed) == len(awaited):
+            result["status"] = "failed"
+        else:
+            result["status"] = "partial"
+        result["targets"] = reports
+        if failed and (write_mode != "best_effort" or result["status"] == "failed"):
+            retry_after = [getattr(error, "retry_after", None) for error in errors]
+            raise CompositeWriteError(result, None if None in retry_after else max(retry_after))
+        return result
+
+    def write_in_background(self, report, write):
+        def log_failure(task):
+            _background_writes.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger = logging.getLogger()
+                logger.error("the write of the secondary target %s %s failed: %s", report["datastore"], report["collection"], task.exception())
+
+        task = asyncio.ensure_future(write)
+        _background_writes.add(task)
+        task.add_done_callback(log_failure)
@@ -0,0 +1,126 @@
+from pydantic import BaseModel, conlist, validator, root_validator
+from polymanager.exceptions.schema_exception import InvalidSchema
+from polymanager.schemas.schema_validator import compile_model, compile_batch_model, check_documents
+
+WRITE_MODES = ["all_or_report", "best_effort", "async_secondary"]
+
+class Target(BaseModel):
+    datastore: str
+    namespace: str
+    collection: str
+    role: str = "primary"
+
+    @validator('datastore')
+    def datastore_in_supported_list(cls, v):
+        if v not in ["clickhouse", "manticoresearch", "dgraph", "arangodb"]:
+            raise ValueError('{} is not a supported datastore'.format(v))
+        return v
+
+    @validator('role')
+    def role_in_supported_list(cls, v):
+        if v not in ["primary", "secondary"]:
+            raise ValueError('{} is not a supported role'.format(v))
+        return v
+
+    class Config:
+        extra = "forbid"
+
+class SupportedTargets(BaseModel):
+    targets: conlist(Target, min_items=1)
+    write_mode: str = "all_or_report"
+
+    @validator('write_mode')
+    def write_mode_in_supported_list(cls, v):
+        if v not in WRITE_MODES:
+            raise ValueError('{} is not a supported write mode'.format(v))
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def targets_are_unique(cls, values):
+        names = [(target.datastore, target.namespace, target.collection) for target in values["targets"]]
+        if len(set(names)) != len(names):
+            raise ValueError('a collection can only be a target once')
+        if not any(target.role == "primary" for target in values["targets"]):
+            raise ValueError('at least one target must be primary')
+        return values
+
+class CompositeSchema:
+    '''
+    a logical collection written to several collections of the other datastores.
+
+    The fields of the composite collection are the fields of its targets, a field
+    shared by several targets must have the same type in all of them. A document
+    is validated once against all the fields, then every target receives the
+    fields of its own schema.
+    '''
+
+    def get_collection_name(self):
+        return "{}.{}".format(self.namespace, self.collection)
+
+    def get_namespace(self):
+        return self.namespace
+
+    def get_targets(self):
+        return self.targets
+
+    def get_write_mode(self):
+        return self.write_mode
+
+    def get_target_collection_name(self, target):
+        if target["datastore"] == "manticoresearch":
+            return "{}_{}".format(target["namespace"], target["collection"])
+        elif target["datastore"] == "arangodb":
+            return "{}".format(target["collection"])
+        return "{}.{}".format(target["namespace"], target["collection"])
+
+    def check_targets(self, targets, write_mode):
+        try:
+            SupportedTargets(targets=targets, write_mode=write_mode)
+        except Exception as e:
+            raise InvalidSchema(e)
+
+    def get_document_model(self, target_models):
+        '''
+        merge the models of the targets in the model of the composite documents,
+        it is built again only when the schema of a target changed
+
+        :param target_models: the pydantic model of every target
+        '''
+        if self._target_models is None or len(self._target_models) != len(target_models) or \
+                any(model is not cached for model, cached in zip(target_models, self._target_models)):
+            attrs_scheme = dict()
+            for target, model in zip(self.targets, target_models):
+                for key, field in model.__fields__.items():
+                    if key in attrs_scheme and attrs_scheme[key][0] != field.outer_type_:
+                        raise InvalidSchema("{} has a different type in the {} collection {}".format(
+                            key, target["datastore"], self.get_target_collection_name(target)))
+                    attrs_scheme[key] = (field.outer_type_, ...)
+            self._document_model = compile_model(attrs_scheme)
+            self._documents_model = compile_batch_model(self._document_model)
+            self._target_models = tuple(target_models)
+        return self._document_model
+
+    def check_documents_schema(self, target_models, documents):
+        self.get_document_model(target_models)
+        check_documents(self._documents_model, documents, allow_empty=False)
+
+    def get_schema(self):
+        new_schema = {}
+        new_schema["namespace"] = self.namespace
+        new_schema["collection"] = self.collection
+        new_schema["targets"] = self.targets
+        new_schema["write_mode"] = self.write_mode
+        return new_schema
+
+    def load_schema(schema):
+        return CompositeSchema(schema["namespace"], schema["collection"], schema["targets"], write_mode=schema["write_mode"])
+
+    def __init__(self, namespace, collection, targets, write_mode="all_or_report"):
+        self.check_targets(targets, write_mode)
+        self.namespace = namespace
+        self.collection = collection
+        self.targets = [Target(**target).dict() for target in targets]
+        self.write_mode = write_mode
+        self._document_model = None
+        self._documents_model = None
+        self._target_models = None
@@ -0,0 +1,17 @@
+from polymanager.containers import IngestionContainer, SpoolContainer
+
+
+def get_deferred_writer(datastore):
+    '''
+    return the writer of the inserts of a datastore that are not written directly
+
+    :return: (the name of the id given to a batch, the ingestion queue or the spool),
+    or (None, None) if the inserts of the datastore are written directly
+    '''
+    queue = IngestionContainer.queue()
+    if queue.is_enabled(datastore):
+        return "queue_id", queue
+    spools = SpoolContainer.spools()
+    if spools.is_enabled(datastore):
+        return "spool_id", spools
+    return None, None
@@ -1,15 +1,19 @@
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
 from polymanager.containers import DGraphContainer
+from polymanager.schemas.deferred_writer import get_deferred_writer
 from polymanager.exceptions.schema_exception import UnkownSchema, InvalidSchema
 from polymanager.schemas.graph_collection import GraphCollection
+from polymanager.schemas.ndjson_ingestion import NdjsonIngestion
+from polymanager.helper.ndjson_helper import iter_ndjson_lines
+from polymanager.helper.batch_helper import gather_chunks
 import json
 
 class DgraphCollection(GraphCollection):
 
     def add_node(self, node):
         result = {}
-        dgraph_handler = DGraphContainer().handler()
-        #manticore_handler = ManticoreContainer().handler()
+        dgraph_handler = DGraphContainer.handler()
+        #manticore_handler = ManticoreContainer.handler()
 
         #checking schema before insert
         self.dgraph_schema.check_node_schema(node)
@@ -24,16 +28,13 @@ class DgraphCollection(GraphCollection):
 
     def add_nodes(self, nodes):
         result = {}
-        dgraph_handler = DGraphContainer().handler()
+        dgraph_handler = DGraphContainer.handler()
 
         #checking schema before insert
-        for _node in nodes:
-            self.dgraph_schema.check_node_schema(_node)
+        self.dgraph_schema.check_nodes_schema(nodes)
             
         #adding node to dgraph and manticore
-        nodes_schema = []
-        for _node in nodes:
-            nodes_schema.append(self.dgraph_schema.get_node_schema(_node))
+        nodes_schema = self.dgraph_schema.get_nodes_schema(nodes)
         uids = dgraph_handler.add_nodes(
             self.dgraph_schema.get_namespace(),
             self.dgraph_schema.get_collection_name(),
@@ -43,7 +44,7 @@ class DgraphCollection(GraphCollection):
 
     def delete_node(self, node_id):
         result = {}
-        dgraph_handler = DGraphContainer().handler()
+        dgraph_handler = DGraphContainer.handler()
         try:
             node_id_int = int(node_id, 16)
             uid = dgraph_handler.delete_node(
@@ -57,7 +58,7 @@ class DgraphCollection(GraphCollection):
 
     def delete_nodes(self, nodes_id):
         result = {}
-        dgraph_handler = DGraphContainer().handler()
+        dgraph_handler = DGraphContainer.handler()
         #checking schema before delete
         int_nodes = []
         for _node in nodes_id:
@@ -77,7 +78,7 @@ class DgraphCollection(GraphCollection):
 
     def update_node(self, node_id, node):
         result = {}
-        dgraph_handler = DGraphContainer().handler()
+        dgraph_handler = DGraphContainer.handler()
 
         #checking schema before insert
         self.dgraph_schema.check_node_schema(node)
@@ -93,30 +94,49 @@ class DgraphCollection(GraphCollection):
 
     def update_relationship(self, node_id, node, reset=False):
         result = {}
-        dgraph_handler = DGraphContainer().handler()
+        dgraph_handler = DGraphContainer.handler()
 
         #checking schema before insert
+        self.dgraph_schema.check_node_id(node_id)
         self.dgraph_schema.check_relationship_schema(node)
         
-        #updating the node
-        if reset:
-            dgraph_handler.reset_relationships(
-            self.dgraph_schema.get_namespace(),
-            self.dgraph_schema.get_collection_name(),
-            self.dgraph_schema.get_relationship_fields(),
-            node_id)
-        dgraph_handler.update_relationships(
-            self.dgraph_schema.get_namespace(),
+        #updating the node with one upsert block
+        dgraph_handler.upsert_relationships(
             self.dgraph_schema.get_collection_name(),
             self.dgraph_schema.get_relationship_fields(),
-            self.dgraph_schema.get_node_schema(node),
-            node_id)
+            [(node_id, self.dgraph_schema.get_node_schema(node))],
+            reset=reset)
         result["node_id"] = node_id
         return result
 
+    def update_relationships(self, nodes, reset=False):
+        '''
+        update the relationships of several nodes
+
+        :param nodes: a list of dict with a node_id and a node with the relationship fields
+        '''
+        result = {}
+        dgraph_handler = DGraphContainer.handler()
+
+        #checking schema before insert
+        for _node in nodes:
+            self.dgraph_schema.check_node_id(_node["node_id"])
+            self.dgraph_schema.check_relationship_schema(_node["node"])
+
+        #updating the nodes with one upsert block per chunk
+        nodes_schema = [(_node["node_id"], self.dgraph_schema.get_node_schema(_node["node"])) for _node in nodes]
+        for index in range(0, len(nodes_schema), dgraph_handler.chunk_size):
+            dgraph_handler.upsert_relationships(
+                self.dgraph_schema.get_collection_name(),
+                self.dgraph_schema.get_relationship_fields(),
+                nodes_schema[index:index + dgraph_handler.chunk_size],
+                reset=reset)
+        result["nodes_id"] = [_node["node_id"] for _node in nodes]
+        return result
+
     def truncate(self):
         result = {}
-        dgraph_handler = DGraphContainer().handler()
+        dgraph_handler = DGraphContainer.handler()
         #delete all nodes type
         dgraph_handler.truncate(
             self.dgraph_schema.get_namespace(),
@@ -127,9 +147,173 @@ class DgraphCollection(GraphCollection):
     def delete_relationships(self, edges_id):
         pass
 
-    def __init__(self, internal_schema: KVRocksInternalSchema, collection_name):
+    def __init__(self, internal_schema: KVRocksInternalSchema, collection_name, schema=None):
+        '''
+        :param schema: the schema of the collection when it is already read
+        '''
         self.internal_schema = internal_schema
-        exists = self.internal_schema.get_schema(collection_name)
+        exists = schema or self.internal_schema.get_schema(collection_name)
         if not exists:
             raise UnkownSchema("this collection does not exist")
         self.dgraph_schema = exists
+
+
+class AsyncDgraphCollection(DgraphCollection):
+    '''
+    dgraph collection for the async routes, the mutations wait for dgraph
+    without blocking the event loop
+    '''
+
+    async def add_node(self, node):
+        result = {}
+        dgraph_handler = DGraphContainer.async_handler()
+
+        #checking schema before insert
+        self.dgraph_schema.check_node_schema(node)
+        result["node_id"] = await dgraph_handler.add_node(
+            self.dgraph_schema.get_namespace(),
+            self.dgraph_schema.get_collection_name(),
+            self.dgraph_schema.get_node_schema(node), "new_node")
+        return result
+
+    async def add_nodes(self, nodes):
+        #checking schema before insert
+        self.dgraph_schema.check_nodes_schema(nodes)
+        return await self.insert_nodes(self.dgraph_schema.get_nodes_schema(nodes))
+
+    async def insert_nodes(self, nodes_schema):
+        result = {}
+        dgraph_handler = DGraphContainer.async_handler()
+        id_name, deferred_writer = get_deferred_writer("dgraph")
+        if deferred_writer is not None:
+            #the uids are given by dgraph when the ingestion queue or the spool adds the nodes
+            result["nodes_id"] = None
+            result[id_name] = await self.defer_nodes(deferred_writer, nodes_schema)
+            return result
+        result["nodes_id"] = await dgraph_handler.add_nodes(
+            self.dgraph_schema.get_namespace(),
+            self.dgraph_schema.get_collection_name(),
+            nodes_schema, "new_node")
+        return result
+
+    async def defer_nodes(self, deferred_writer, nodes_schema):
+        return await deferred_writer.append_async("dgraph", self.dgraph_schema.get_collection_name(), {
+            "namespace": self.dgraph_schema.get_namespace(),
+            "collection": self.dgraph_schema.get_collection_name(),
+            "rows": nodes_schema
+        })
+
+    async def delete_node(self, node_id):
+        return await self.delete_nodes([node_id], "node_id should be a hex string")
+
+    async def delete_nodes(self, nodes_id, error="nodes_id should be a list of hex string"):
+        result = {}
+        dgraph_handler = DGraphContainer.async_handler()
+        #checking schema before delete
+        for _node in nodes_id:
+            try:
+                int(_node, 16)
+            except Exception as e:
+                raise InvalidSchema(error)
+        await dgraph_handler.delete_nodes(
+            self.dgraph_schema.get_namespace(),
+            self.dgraph_schema.get_collection_name(),
+            nodes_id)
+        result["status"] = "success"
+        return result
+
+    async def update_node(self, node_id, node):
+        result = {}
+        dgraph_handler = DGraphContainer.async_handler()
+
+        #checking schema before insert
+        self.dgraph_schema.check_node_schema(node)
+        await dgraph_handler.update_node(
+            self.dgraph_schema.get_namespace(),
+            self.dgraph_schema.get_collection_name(),
+            node_id,
+            self.dgraph_schema.get_node_schema(node))
+        result["status"] = "success"
+        return result
+
+    async def update_relationship(self, node_id, node, reset=False):
+        await self.update_relationships([{"node_id": node_id, "node": node}], reset=reset)
+        return {"node_id": node_id}
+
+    async def update_relationships(self, nodes, reset=False):
+        result = {}
+        dgraph_handler = DGraphContainer.async_handler()
+
+        #checking schema before insert
+        for _node in nodes:
+            self.dgraph_schema.check_node_id(_node["node_id"])
+            self.dgraph_schema.check_relationship_schema(_node["node"])
+
+        #updating the nodes with one upsert block per chunk
+        nodes_schema = [(_node["node_id"], self.dgraph_schema.get_node_schema(_node["node"])) for _node in nodes]
+        chunk_size = dgraph_handler.handler.chunk_size
+        for index in range(0, len(nodes_schema), chunk_size):
+            await dgraph_handler.upsert_relationships(
+                self.dgraph_schema.get_collection_name(),
+                self.dgraph_schema.get_relationship_fields(),
+                nodes_schema[index:index + chunk_size],
+                reset=reset)
+        result["nodes_id"] = [_node["node_id"] for _node in nodes]
+        return result
+
+    async def get_nodes(self, nodes_id, fields=None, chunk_size=1000, concurrency=4):
+        '''
+        read nodes by uid with one uid() query per chunk of chunk_size uids
+
+        :param fields: the fields to return with the node_id, all fields by default
+        :param concurrency: the number of chunks read at the same time
+        :return: the nodes in the order of nodes_id, None for the uids that are not nodes of the collection
+        '''
+        dgraph_handler = DGraphContainer.async_handler()
+        #checking the uids before they are written in the query
+        for _node in nodes_id:
+            try:
+                self.dgraph_schema.check_node_id(_node)
+            except InvalidSchema:
+                raise InvalidSchema("nodes_id should be a list of hex string")
+        predicates = self.dgraph_schema.get_projection(fields)
+        nodes = await gather_chunks(
+            list(dict.fromkeys(nodes_id)),
+            lambda uids: dgraph_handler.get_nodes(
+                self.dgraph_schema.get_namespace(),
+                self.dgraph_schema.get_collection_name(),
+                uids,
+                predicates),
+            chunk_size=chunk_size,
+            concurrency=concurrency)
+        found = {int(node["uid"], 16): self.dgraph_schema.get_node_from_predicates(node) for node in nodes}
+        return [found.get(int(node_id, 16)) for node_id in nodes_id]
+
+    async def ingest_ndjson(self, chunks, chunk_size=1000, encoding=None):
+        '''
+        add the nodes of an ndjson body while it is received
+
+        :param chunks: an async iterator of the bytes of the body
+        :param encoding: the content encoding of the body, gzip or None
+
+        :return: the summary of every chunk of chunk_size nodes, with the uids of its valid lines in nodes_id
+        '''
+        dgraph_handler = DGraphContainer.async_handler()
+        id_name, deferred_writer = get_deferred_writer("dgraph")
+
+        def prepare_row(node):
+            self.dgraph_schema.check_node_schema(node)
+            return self.dgraph_schema.get_node_schema(node)
+
+        async def send_rows(nodes_schema):
+            if deferred_writer is not None:
+                #the uids are given by dgraph when the ingestion queue or the spool adds the nodes
+                return {}, {"nodes_id": None, id_name: await self.defer_nodes(deferred_writer, nodes_schema)}
+            nodes_id = await dgraph_handler.add_nodes(
+                self.dgraph_schema.get_namespace(),
+                self.dgraph_schema.get_collection_name(),
+                nodes_schema, "new_node")
+            return {}, {"nodes_id": nodes_id}
+
+        ingestion = NdjsonIngestion(prepare_row, send_rows, chunk_size)
+        return await ingestion.run(iter_ndjson_lines(chunks, encoding))
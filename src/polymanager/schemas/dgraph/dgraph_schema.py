@@ -1,13 +1,18 @@
 
 
-from pydantic import create_model, StrictStr, constr, StrictInt, StrictFloat, BaseModel, validator
-from dateutil.parser import parse
+from pydantic import StrictStr, constr, StrictInt, StrictFloat, BaseModel, validator
+from polymanager.helper.timestamp_helper import parse_timestamp
 from datetime import datetime
 from typing import (
     List, Dict, Optional
 )
 from polymanager.exceptions.schema_exception import InvalidSchema
 from polymanager.schemas.graph_schema import GraphSchema 
+from polymanager.schemas.schema_validator import Timestamp, compile_model, compile_batch_model, compile_transformer, check_document, check_documents
+from types import MappingProxyType
+import re
+
+UID_PATTERN = "^0x[0-9a-fA-F]+$"
 class Index(BaseModel):
     tokenizer: str
     class Config:
@@ -100,81 +105,108 @@ class DGraphSchema(GraphSchema):
     def get_namespace(self):
             return self.namespace
 
+    def get_node_transformer(self):
+        '''
+        return the function that converts a node to its predicates, it is built once per schema
+        '''
+        if self._node_transformer is None:
+            self._node_transformer = compile_transformer(
+                {key: (self.get_field(key), self.get_field_converter(options["type"])) for key, options in self.fields.items()})
+        return self._node_transformer
+
     def get_node_schema(self, node):
-        new_node = {}
-        for key, value in node.items():
-            field_options = self.fields[key]
-            new_key = "{}{}{}".format(self.namespace, self.namespace_separator, key)
-            new_value = self.parse_field(field_options["type"], value)
-            new_node[new_key] = new_value
-        return new_node
+        return self.get_node_transformer()(node)
+
+    def get_nodes_schema(self, nodes):
+        transform = self.get_node_transformer()
+        return [transform(node) for node in nodes]
+
+    def get_node_from_predicates(self, predicates):
+        '''
+        convert the predicates read from dgraph back to the fields of a node, the uid is returned as node_id
+        '''
+        prefix = self.get_field("")
+        node = {"node_id": predicates["uid"]}
+        for key, value in predicates.items():
+            if key.startswith(prefix):
+                node[key[len(prefix):]] = value
+        return node
 
     def get_relationship_fields(self):
-        fields = list()
-        for key, options in self.get_fields().items():
-            if options["type"] == "relationship":
-                fields.append(key)
-        return fields
+        if self._relationship_fields is None:
+            self._relationship_fields = tuple(key for key, options in self.get_fields().items() if options["type"] == "relationship")
+        return list(self._relationship_fields)
+
+    def get_field_converter(self, field_type):
+        '''
+        return the function that converts a value of this type, None if the value is not converted
+        '''
+        if field_type == "timestamp":
+            return lambda field_value: parse_timestamp(field_value).isoformat()
+        return None
 
     def parse_field(self, field_type, field_value):
-        if field_type == "text":
-            return field_value
-        elif field_type == "int":
-            return field_value
-        elif field_type == "float":
-            return field_value
-        elif field_type == "timestamp":
-            return parse(field_value).isoformat()
-        elif field_type == "relationship":
-            return field_value
+        converter = self.get_field_converter(field_type)
+        return field_value if converter is None else converter(field_value)
+
+    def get_relationship_model(self):
+        if self._relationship_model is None:
+            attrs_scheme = dict()
+            for key, options in self.fields.items():
+                if options["type"] == "relationship":
+                    attrs_scheme[key] = (List[constr(regex=UID_PATTERN)], ...)
+            self._relationship_model = compile_model(attrs_scheme)
+        return self._relationship_model
+
+    def get_node_model(self):
+        if self._node_model is None:
+            attrs_scheme = dict()
+            for key, options in self.fields.items():
+                if options["type"] == "text":
+                    attrs_scheme[key] = (StrictStr, ...)
+                elif options["type"] == "int":
+                    attrs_scheme[key] = (StrictInt, ...)
+                elif options["type"] == "float":
+                    attrs_scheme[key] = (StrictFloat, ...)
+                elif options["type"] == "timestamp":
+                    attrs_scheme[key] = (Timestamp, ...)
+            self._node_model = compile_model(attrs_scheme)
+            self._nodes_model = compile_batch_model(self._node_model)
+        return self._node_model
 
     def check_relationship_schema(self, node):
-        attrs_scheme = dict()
-        for key, options in self.fields.items():
-            if options["type"] == "relationship":
-                attrs_scheme[key] = (List[constr(regex="0x[0-9a-fA-F]+")], ...)
-        node_model = create_model('DynamicNodeModel', **attrs_scheme)
-        node_model.__config__.extra = 'forbid'
-        node_model.__config__.validate_all = True
-        try:
-            if len(node.keys()) == 0:
-                raise Exception()
-            node_model(**node)
-        except Exception as e:
-            raise InvalidSchema(e)
+        check_document(self.get_relationship_model(), node, allow_empty=False)
+
+    def check_node_id(self, node_id):
+        if not isinstance(node_id, str) or not re.match(UID_PATTERN, node_id):
+            raise InvalidSchema("node_id should be a hex string")
 
     def check_node_schema(self, node):
-        attrs_scheme = dict()
-        for key, options in self.fields.items():
-            if options["type"] == "text":
-                attrs_scheme[key] = (StrictStr, ...)
-            elif options["type"] == "int":
-                attrs_scheme[key] = (StrictInt, ...)
-            elif options["type"] == "float":
-                attrs_scheme[key] = (StrictFloat, ...)
-            elif options["type"] == "timestamp":
-                attrs_scheme[key] = (datetime, ...)
-        node_model = create_model('DynamicNodeModel', **attrs_scheme)
-        node_model.__config__.extra = 'forbid'
-        node_model.__config__.validate_all = True
-        try:
-            if len(node.keys()) == 0:
-                raise Exception()
-            node_model(**node)
-        except Exception as e:
-            raise InvalidSchema(e)
+        check_document(self.get_node_model(), node, allow_empty=False)
+
+    def check_nodes_schema(self, nodes):
+        self.get_node_model()
+        check_documents(self._nodes_model, nodes, allow_empty=False)
 
     def get_fields(self):
-        new_fields = {}
-        for key, options in self.fields.items():
-            options = self.fields[key]
-            new_key = "{}{}{}".format(self.namespace, self.namespace_separator, key)
-            new_fields[new_key] = options
-        return new_fields
+        if self._fields is None:
+            self._fields = MappingProxyType({self.get_field(key): options for key, options in self.fields.items()})
+        return self._fields
 
     def get_field(self, field):
         return "{}{}{}".format(self.namespace, self.namespace_separator, field)
 
+    def get_projection(self, fields):
+        '''
+        return the predicates of the fields read by id, None to read all of them
+        '''
+        if not fields:
+            return None
+        for field in fields:
+            if field not in self.fields:
+                raise InvalidSchema("{} is not a field of this collection".format(field))
+        return [self.get_field(field) for field in fields]
+
     def get_schema(self):
         new_schema = {}
         new_schema["fields"] = self.fields
@@ -216,5 +248,11 @@ class DGraphSchema(GraphSchema):
         self.namespace = namespace
         self.fields = fields
         self.global_collection_opts = global_collection_opts
+        self._node_model = None
+        self._nodes_model = None
+        self._relationship_model = None
+        self._fields = None
+        self._node_transformer = None
+        self._relationship_fields = None
         if self.global_collection_opts:
             self.check_global_options(global_collection_opts)
\ No newline at end of file
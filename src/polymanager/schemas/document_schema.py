@@ -27,10 +27,18 @@ class DocumentSchema(ABC):
     def get_document_schema(self, document):
         pass
 
+    @abstractmethod
+    def get_documents_schema(self, documents):
+        pass
+
     @abstractmethod
     def check_document_schema(self, document):
         pass
 
+    @abstractmethod
+    def check_documents_schema(self, documents):
+        pass
+
     @abstractmethod
     def generate_schema(self):
         pass
@@ -0,0 +1,121 @@
+from polymanager.containers import CoreContainer
+from polymanager.exceptions.schema_exception import InvalidSchema
+from polymanager.exceptions.federated_exception import StageTimeout
+from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
+from polymanager.schemas.manticore.manticore_collection import AsyncManticoreSearchCollection
+from polymanager.schemas.dgraph.dgraph_collection import AsyncDgraphCollection
+from polymanager.schemas.arangodb.arangodb_collection import AsyncArangodbCollection
+import asyncio
+
+TARGET_DATASTORES = ["dgraph", "arangodb"]
+
+
+async def get_target_collection(datastore, namespace, collection):
+    '''
+    return the async collection whose records are read for the hits of a search
+    '''
+    if datastore not in TARGET_DATASTORES:
+        raise InvalidSchema("{} is not a supported target datastore".format(datastore))
+    if datastore not in CoreContainer.config.connectors():
+        raise InvalidSchema("the {} datastore is not enabled".format(datastore))
+    internal_schema = KVRocksInternalSchema(datastore)
+    if datastore == "dgraph":
+        return await AsyncDgraphCollection.load(internal_schema, "{}.{}".format(namespace, collection))
+    return await AsyncArangodbCollection.load(internal_schema, "{}".format(collection))
+
+
+def merge_hits(documents, records, join_field):
+    '''
+    pair every document found by the search with its record, in the order of the search
+
+    :param records: the records of the join_field values, None for the values that are not found
+    :return: the hits and the join_field values that are not found
+    '''
+    hits = []
+    missing = []
+    for document, record in zip(documents, records):
+        if record is None and document.get(join_field) is not None:
+            missing.append(document[join_field])
+        hits.append({"score": document.pop("_score", None), "document": document, "node": record})
+    return hits, missing
+
+
+class FederatedSearch:
+    '''
+    search the documents of a manticore collection, then read their records in a
+    dgraph or arangodb collection.
+
+    The join_field of every document holds the id of its record in the target
+    collection. The records are read with one batched query per chunk of chunk_size
+    ids, at most concurrency chunks at a time, and the hits keep the order of the
+    search, so they are in score order when the search is sorted by _score. The
+    search and the reads of the records each have their own timeout.
+    '''
+
+    def __init__(self, search_collection, target_collection, join_field="node_id", target_fields=None, chunk_size=1000, concurrency=4,
+                 search_timeout_ms=5000, hydrate_timeout_ms=5000):
+        '''
+        :param target_fields: the fields of the records to return, all fields by default
+        '''
+        self.search_collection = search_collection
+        self.target_collection = target_collection
+        self.join_field = join_field
+        self.target_fields = target_fields
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.search_timeout_ms = search_timeout_ms
+        self.hydrate_timeout_ms = hydrate_timeout_ms
+
+    async def search(self, query=None, match_fields=None, filters=None, fields=None, sort="_score", order="desc", limit=20, after=None):
+        '''
+        see ManticoreSearchSchema.build_search_query for the parameters of the search
+
+        :return: a dict with the hits, their score, document and node, the total number of matches,
+        the cursor of the next page and the ids that are not found in the target collection
+        :raise StageTimeout: if the search or the reads of the records did not finish in time
+        '''
+        if fields and self.join_field not in fields:
+            fields = list(fields) + [self.join_field]
+        try:
+            res = await asyncio.wait_for(
+                self.search_collection.search_documents(
+                    query=query,
+                    match_fields=match_fields,
+                    filters=filters,
+                    fields=fields,
+                    sort=sort,
+                    order=order,
+                    limit=limit,
+                    after=after,
+                    with_score=True),
+                self.search_timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            raise StageTimeout("the search did not finish in {} ms".format(self.search_timeout_ms))
+
+        records = await self.hydrate([document.get(self.join_field) for document in res["documents"]])
+        result = {}
+        result["hits"], result["missing"] = merge_hits(res["documents"], records, self.join_field)
+        result["total"] = res["total"]
+        result["next"] = res["next"]
+        result["status"] = "success"
+        return result
+
+    async def hydrate(self, ids):
+        '''
+        read the records of ids in the target collection
+
+        :return: the records in the order of ids, None for the ids that are None or not found
+        '''
+        nodes_id = [_id for _id in ids if _id is not None]
+        if not nodes_id:
+            return [None] * len(ids)
+        try:
+            nodes = await asyncio.wait_for(
+                self.target_collection.get_nodes(nodes_id, fields=self.target_fields, chunk_size=self.chunk_size, concurrency=self.concurrency),
+                self.hydrate_timeout_ms / 1000)
+        except asyncio.TimeoutError:
+            raise StageTimeout("the records of the hits were not read in {} ms".format(self.hydrate_timeout_ms))
+        except InvalidSchema as e:
+            raise InvalidSchema("the {} of the documents are not ids of the target collection: {}".format(self.join_field, e))
+        found = iter(nodes)
+        return [None if _id is None else next(found) for _id in ids]
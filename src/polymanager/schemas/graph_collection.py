@@ -1,8 +1,19 @@
 from abc import ABC, abstractmethod
+from polymanager.exceptions.schema_exception import UnkownSchema
 
 
 class GraphCollection(ABC):
-    
+
+    @classmethod
+    async def load(cls, internal_schema, collection_name):
+        '''
+        create the collection in the async routes, its schema is read without blocking the event loop
+        '''
+        schema = await internal_schema.get_schema_async(collection_name)
+        if not schema:
+            raise UnkownSchema("this collection does not exist")
+        return cls(internal_schema, collection_name, schema=schema)
+
     @abstractmethod
     def add_node(self, node):
         pass
@@ -27,10 +27,18 @@ class GraphSchema(ABC):
     def get_node_schema(self, node):
         pass
 
+    @abstractmethod
+    def get_nodes_schema(self, nodes):
+        pass
+
     @abstractmethod
     def check_node_schema(self, node):
         pass
 
+    @abstractmethod
+    def check_nodes_schema(self, nodes):
+        pass
+
     @abstractmethod
     def check_relationship_schema(self, node):
         pass
@@ -2,7 +2,8 @@ from polymanager.schemas.dgraph.dgraph_schema import DGraphSchema
 from polymanager.schemas.manticore.manticoresearch_schema import ManticoreSearchSchema
 from polymanager.schemas.clickhouse.clickhouse_schema import ClickhouseSchema
 from polymanager.schemas.arangodb.arangodb_schema import ArangodbSchema
-from polymanager.containers import RedisContainer, DGraphContainer, ManticoreContainer, ClickhouseContainer, ArangoDBContainer
+from polymanager.schemas.composite.composite_schema import CompositeSchema
+from polymanager.containers import RedisContainer, DGraphContainer, ManticoreContainer, ClickhouseContainer, ArangoDBContainer, SpoolContainer
 from polymanager.exceptions.schema_exception import ExistingSchema
 import json
 
@@ -10,7 +11,7 @@ class KVRocksInternalSchema:
     "kvrocks is used to store all schemas for various datasources"
 
     def __init__(self, datastore):
-        if datastore not in ["manticoresearch", "dgraph", "clickhouse", "arangodb"]:
+        if datastore not in ["manticoresearch", "dgraph", "clickhouse", "arangodb", "composite"]:
             raise Exception("this datastore is not supported")
         self.datastore = datastore
 
@@ -29,12 +30,17 @@ class KVRocksInternalSchema:
                     schema_obj = ClickhouseSchema.load_schema(json.loads(res[schema_name]))
                 elif self.datastore == "arangodb":
                     schema_obj = ArangodbSchema.load_schema(json.loads(res[schema_name]))
+                elif self.datastore == "composite":
+                    schema_obj = CompositeSchema.load_schema(json.loads(res[schema_name]))
                 schemas.append(schema_obj)
             return schemas
         else:
             return schemas
         
-    def get_schema(self, collection_name):
+    def get_schema(self, collection_name, use_cache=True):
+        if use_cache:
+            schema_cache = RedisContainer.schema_cache()
+            return schema_cache.fetch(self.datastore, collection_name, lambda: self.get_schema(collection_name, use_cache=False))
         db = RedisContainer.db()
         schema = db.hget(self.datastore, collection_name)
         if not schema:
@@ -47,53 +53,70 @@ class KVRocksInternalSchema:
             return ClickhouseSchema.load_schema(json.loads(schema))
         elif self.datastore == "arangodb":
             return ArangodbSchema.load_schema(json.loads(schema))
+        elif self.datastore == "composite":
+            return CompositeSchema.load_schema(json.loads(schema))
+
+    async def get_schema_async(self, collection_name):
+        '''
+        same as get_schema for the async routes, the schema is read from kvrocks in the executor
+        '''
+        schema_cache = RedisContainer.schema_cache()
+        return await schema_cache.fetch_async(self.datastore, collection_name, lambda: self.get_schema(collection_name, use_cache=False))
 
     def populate_database(self, schema):
         if self.datastore == "dgraph":
-            dgraph_handler = DGraphContainer().handler()
+            dgraph_handler = DGraphContainer.handler()
             dgraph_handler.insert_schema(schema)
         elif self.datastore == "manticoresearch":
-            manticore_handler = ManticoreContainer().handler()
+            manticore_handler = ManticoreContainer.handler()
             manticore_handler.insert_schema(schema)
         elif self.datastore == "clickhouse":
-            clickhouse_handler = ClickhouseContainer().handler()
+            clickhouse_handler = ClickhouseContainer.handler()
             clickhouse_handler.insert_schema(schema)
         elif self.datastore == "arangodb":
-            arangodb_handler = ArangoDBContainer().handler()
+            arangodb_handler = ArangoDBContainer.handler()
             arangodb_handler.insert_schema(schema)
+        #a composite collection only maps the collections of its targets, they are not created
 
     def delete_database(self, schema):
         if self.datastore == "dgraph":
-            dgraph_handler = DGraphContainer().handler()
+            dgraph_handler = DGraphContainer.handler()
             #delete all nodes type
             dgraph_handler.delete_nodes_type(schema.get_collection_name())
             dgraph_handler.delete_schema(schema)
         elif self.datastore == "manticoresearch":
-            manticore_handler = ManticoreContainer().handler()
+            manticore_handler = ManticoreContainer.handler()
             manticore_handler.delete_schema(schema)
         elif self.datastore == "clickhouse":
-            clickhouse_handler = ClickhouseContainer().handler()
+            clickhouse_handler = ClickhouseContainer.handler()
+            #the buffered rows are flushed before the table is dropped
+            ClickhouseContainer.buffers().close_buffer(schema.get_collection_name())
             clickhouse_handler.delete_schema(schema)
         elif self.datastore == "arangodb":
-            arangodb_handler = ArangoDBContainer().handler()
+            arangodb_handler = ArangoDBContainer.handler()
             arangodb_handler.delete_schema(schema)
+        #the targets of a composite collection are kept when it is deleted
+        if self.datastore != "composite":
+            #the batches spooled for the collection could not be replayed anymore
+            SpoolContainer.spools().delete_spool(self.datastore, schema.get_collection_name())
         
     def save_schema(self, schema):
         #validate schema before insert
-        exists = self.get_schema(schema.get_collection_name())
+        exists = self.get_schema(schema.get_collection_name(), use_cache=False)
         if exists:
             raise ExistingSchema("this collection already exists")
 
         #add schema to the internal state
         db = RedisContainer.db()
         db.hset(self.datastore, schema.get_collection_name(),json.dumps(schema.get_schema()) )
+        RedisContainer.schema_cache().invalidate(self.datastore, schema.get_collection_name())
         
         #populate the schema
         self.populate_database(schema)
 
     def delete_schema(self, collection_name):
         db = RedisContainer.db()
-        schema = self.get_schema(collection_name)
+        schema = self.get_schema(collection_name, use_cache=False)
         if schema:
             # #remove all predicates, types, tables of this schema
             
@@ -101,4 +124,5 @@ class KVRocksInternalSchema:
             
             #remove schema from internals
             db.hdel(self.datastore, schema.get_collection_name())
+            RedisContainer.schema_cache().invalidate(self.datastore, schema.get_collection_name())
 
@@ -1,12 +1,16 @@
 from polymanager.containers import ManticoreContainer
+from polymanager.schemas.deferred_writer import get_deferred_writer
 from polymanager.exceptions.schema_exception import UnkownSchema, InvalidSchema
 from polymanager.schemas.document_collection import DocumentCollection
+from polymanager.schemas.ndjson_ingestion import NdjsonIngestion
+from polymanager.helper.ndjson_helper import iter_ndjson_lines
+from polymanager.helper.batch_helper import gather_chunks
 
 class ManticoreSearchCollection(DocumentCollection):
 
     def add_document(self, document):
         result = {}
-        manticore_handler = ManticoreContainer().handler()
+        manticore_handler = ManticoreContainer.handler()
 
         #checking schema before insert
         self.schema.check_document_schema(document)
@@ -14,35 +18,34 @@ class ManticoreSearchCollection(DocumentCollection):
         #adding document to manticore
         index_document = self.schema.get_document_schema(document)
         manticore_handler.bulk_add_documents(self.schema.get_collection_name(),[index_document])
+        ManticoreContainer.search_cache().invalidate(self.schema.get_collection_name())
         result["status"] = "success"
         return result
 
     def add_documents(self, documents):
         result = {}
-        manticore_handler = ManticoreContainer().handler()
+        manticore_handler = ManticoreContainer.handler()
 
         #checking schema before insert
-        for _document in documents:
-            self.schema.check_document_schema(_document)
+        self.schema.check_documents_schema(documents)
         #adding document to dgraph and manticore
-        documents_schema = []
-        for _document in documents:
-            index_document = self.schema.get_document_schema(_document)
-            documents_schema.append(index_document)
+        documents_schema = self.schema.get_documents_schema(documents)
         manticore_handler.bulk_add_documents(self.schema.get_collection_name(), documents_schema)
+        ManticoreContainer.search_cache().invalidate(self.schema.get_collection_name())
         result["status"] = "success"
         return result
 
     def delete_document(self, document_id):
         result = {}
-        manticore_handler = ManticoreContainer().handler()
+        manticore_handler = ManticoreContainer.handler()
         manticore_handler.delete_document(self.schema.get_collection_name(), document_id)
+        ManticoreContainer.search_cache().invalidate(self.schema.get_collection_name())
         result["status"] = "success"
         return result
 
     def delete_documents(self, documents_id):
         result = {}
-        manticore_handler = ManticoreContainer().handler()
+        manticore_handler = ManticoreContainer.handler()
         int_documents = []
         for _document in documents_id:
             if isinstance(_document, int):
@@ -51,12 +54,13 @@ class ManticoreSearchCollection(DocumentCollection):
                 raise InvalidSchema("documents_id should be a list of int")
         #delete documents
         manticore_handler.delete_documents(self.schema.get_collection_name(), int_documents)
+        ManticoreContainer.search_cache().invalidate(self.schema.get_collection_name())
         result["status"] = "success"
         return result
 
     def update_document(self, document):
         result = {}
-        manticore_handler = ManticoreContainer().handler()
+        manticore_handler = ManticoreContainer.handler()
 
         #checking schema before insert
         self.schema.check_document_schema(document)
@@ -64,19 +68,188 @@ class ManticoreSearchCollection(DocumentCollection):
         index_document = self.schema.get_document_schema(document)
         #index_document["id"] = document_id
         manticore_handler.bulk_replace_documents(self.schema.get_collection_name(),[index_document])
+        ManticoreContainer.search_cache().invalidate(self.schema.get_collection_name())
+        result["status"] = "success"
+        return result
+
+    def search_documents(self, query=None, match_fields=None, filters=None, fields=None, sort=None, order="asc", limit=20, after=None):
+        '''
+        search the documents of the collection, see ManticoreSearchSchema.build_search_query
+
+        :return: a dict with the documents, the total number of matches and the cursor of the next page
+        '''
+        manticore_handler = ManticoreContainer.handler()
+        body = self.schema.build_search_query(query, match_fields, filters, fields, sort, order, limit, after)
+        collection_name = self.schema.get_collection_name()
+        res = ManticoreContainer.search_cache().fetch(collection_name, body, lambda: manticore_handler.search(body))
+        return self.get_search_result(res, fields, sort, limit)
+
+    def get_search_result(self, res, fields, sort, limit, with_score=False):
+        result = {}
+        result["documents"] = [self.schema.get_document_from_hit(hit, fields) for hit in res["hits"]]
+        if with_score:
+            for document, hit in zip(result["documents"], res["hits"]):
+                document["_score"] = hit["_score"]
+        result["total"] = res["total"]
+        if len(res["hits"]) == limit:
+            result["next"] = self.schema.get_search_cursor(res["hits"][-1], sort)
+        else:
+            result["next"] = None
         result["status"] = "success"
         return result
 
     def truncate(self):
         result = {}
-        manticore_handler = ManticoreContainer().handler()
+        manticore_handler = ManticoreContainer.handler()
         manticore_handler.truncate(self.schema.get_collection_name())
+        ManticoreContainer.search_cache().invalidate(self.schema.get_collection_name())
         result["status"] = "success"
         return result
 
-    def __init__(self, internal_schema, collection_name):
+    def __init__(self, internal_schema, collection_name, schema=None):
+        '''
+        :param schema: the schema of the collection when it is already read
+        '''
         self.internal_schema = internal_schema
-        exists = self.internal_schema.get_schema(collection_name)
+        exists = schema or self.internal_schema.get_schema(collection_name)
         if not exists:
             raise UnkownSchema("this collection does not exist")
-        self.schema = exists
\ No newline at end of file
+        self.schema = exists
+
+class AsyncManticoreSearchCollection(ManticoreSearchCollection):
+    '''
+    manticore collection for the async routes, the writes and the searches wait
+    for manticore without blocking the event loop
+    '''
+
+    async def add_document(self, document):
+        #checking schema before insert
+        self.schema.check_document_schema(document)
+        return await self.insert_documents([self.schema.get_document_schema(document)])
+
+    async def add_documents(self, documents):
+        #checking schema before insert
+        self.schema.check_documents_schema(documents)
+        return await self.insert_documents(self.schema.get_documents_schema(documents))
+
+    async def insert_documents(self, documents_schema):
+        result = {}
+        manticore_handler = ManticoreContainer.async_handler()
+        id_name, deferred_writer = get_deferred_writer("manticoresearch")
+        if deferred_writer is not None:
+            #the documents are indexed by the ingestion queue or the spool
+            result[id_name] = await deferred_writer.append_async("manticoresearch", self.schema.get_collection_name(), {
+                "collection": self.schema.get_collection_name(),
+                "rows": documents_schema
+            })
+            result["status"] = "success"
+            return result
+        await manticore_handler.bulk_add_documents(self.schema.get_collection_name(), documents_schema)
+        ManticoreContainer.search_cache().invalidate(self.schema.get_collection_name())
+        result["status"] = "success"
+        return result
+
+    async def delete_document(self, document_id):
+        result = {}
+        manticore_handler = ManticoreContainer.async_handler()
+        await manticore_handler.delete_document(self.schema.get_collection_name(), document_id)
+        ManticoreContainer.search_cache().invalidate(self.schema.get_collection_name())
+        result["status"] = "success"
+        return result
+
+    async def delete_documents(self, documents_id):
+        result = {}
+        manticore_handler = ManticoreContainer.async_handler()
+        int_documents = []
+        for _document in documents_id:
+            if isinstance(_document, int):
+                int_documents.append(str(_document))
+            else:
+                raise InvalidSchema("documents_id should be a list of int")
+        await manticore_handler.delete_documents(self.schema.get_collection_name(), int_documents)
+        ManticoreContainer.search_cache().invalidate(self.schema.get_collection_name())
+        result["status"] = "success"
+        return result
+
+    async def update_document(self, document):
+        result = {}
+        manticore_handler = ManticoreContainer.async_handler()
+
+        #checking schema before insert
+        self.schema.check_document_schema(document)
+        index_document = self.schema.get_document_schema(document)
+        await manticore_handler.bulk_replace_documents(self.schema.get_collection_name(),[index_document])
+        ManticoreContainer.search_cache().invalidate(self.schema.get_collection_name())
+        result["status"] = "success"
+        return result
+
+    async def search_documents(self, query=None, match_fields=None, filters=None, fields=None, sort=None, order="asc", limit=20, after=None, with_score=False):
+        '''
+        :param with_score: add the relevance of every document as _score
+        '''
+        manticore_handler = ManticoreContainer.async_handler()
+        body = self.schema.build_search_query(query, match_fields, filters, fields, sort, order, limit, after)
+        collection_name = self.schema.get_collection_name()
+        res = await ManticoreContainer.search_cache().fetch_async(collection_name, body, lambda: manticore_handler.search(body))
+        return self.get_search_result(res, fields, sort, limit, with_score=with_score)
+
+    async def get_documents(self, documents_id, fields=None, chunk_size=1000, concurrency=4):
+        '''
+        read documents by id with one id IN search per chunk of chunk_size ids, at most 1000
+
+        :param fields: the fields to return with the id, all fields by default
+        :param concurrency: the number of chunks read at the same time
+        :return: the documents in the order of documents_id, None for the ids that are not found
+        '''
+        manticore_handler = ManticoreContainer.async_handler()
+        for _document in documents_id:
+            if not isinstance(_document, int) or isinstance(_document, bool):
+                raise InvalidSchema("documents_id should be a list of int")
+        #a search returns at most 1000 documents
+        chunk_size = min(chunk_size, 1000)
+
+        def build_query(chunk):
+            return self.schema.build_search_query(filters=[{"field": "id", "op": "in", "value": chunk}], fields=fields, limit=max(len(chunk), 1))
+
+        #checking the fields before the chunks are read
+        build_query([])
+
+        async def get_chunk(chunk):
+            #the reads by id do not go through the search cache, they would evict the searches
+            res = await manticore_handler.search(build_query(chunk))
+            return [self.schema.get_document_from_hit(hit, fields) for hit in res["hits"]]
+
+        documents = await gather_chunks(list(dict.fromkeys(documents_id)), get_chunk, chunk_size=chunk_size, concurrency=concurrency)
+        found = {document["id"]: document for document in documents}
+        return [found.get(document_id) for document_id in documents_id]
+
+    async def ingest_ndjson(self, chunks, chunk_size=1000, encoding=None):
+        '''
+        index the documents of an ndjson body while it is received
+
+        :param chunks: an async iterator of the bytes of the body
+        :param encoding: the content encoding of the body, gzip or None
+
+        :return: the summary of every chunk of chunk_size documents
+        '''
+        manticore_handler = ManticoreContainer.async_handler()
+        collection_name = self.schema.get_collection_name()
+        id_name, deferred_writer = get_deferred_writer("manticoresearch")
+
+        def prepare_row(document):
+            self.schema.check_document_schema(document)
+            return self.schema.get_document_schema(document)
+
+        async def send_rows(documents_schema):
+            if deferred_writer is not None:
+                #the documents are indexed by the ingestion queue or the spool, as the other inserts
+                result = await self.insert_documents(documents_schema)
+                return {}, {id_name: result[id_name]}
+            try:
+                res = await manticore_handler.bulk_add_documents(collection_name, documents_schema)
+            finally:
+                ManticoreContainer.search_cache().invalidate(collection_name)
+            return {index: "not indexed" for index, document in enumerate(documents_schema) if not res.get(document["id"])}
+
+        ingestion = NdjsonIngestion(prepare_row, send_rows, chunk_size)
+        return await ingestion.run(iter_ndjson_lines(chunks, encoding))
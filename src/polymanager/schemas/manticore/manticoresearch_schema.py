@@ -1,15 +1,16 @@
 
 
 from tokenize import String
-from pydantic import create_model, StrictStr, StrictInt, StrictFloat, Json, validator
-from dateutil.parser import parse
-from datetime import datetime
+from pydantic import StrictStr, StrictInt, StrictFloat, Json, validator
+from polymanager.helper.timestamp_helper import parse_timestamp
 from typing import (
     Dict, Optional
 )
 from pydantic import BaseModel
 from polymanager.exceptions.schema_exception import InvalidSchema
 from polymanager.schemas.document_schema import DocumentSchema
+from polymanager.schemas.schema_validator import Timestamp, compile_model, compile_batch_model, compile_transformer, check_document, check_documents
+from types import MappingProxyType
 class Index(BaseModel):
     stored: Optional[bool] = None
     class Config:
@@ -47,62 +48,64 @@ class ManticoreSearchSchema(DocumentSchema):
     def check_global_options(self):
         pass
 
+    def get_document_transformer(self):
+        '''
+        return the function that converts a document to the fields of the index, it is built once per schema
+        '''
+        if self._document_transformer is None:
+            self._document_transformer = compile_transformer(
+                {key: (key if key == "id" else self.get_field(key), self.get_field_converter(options["type"])) for key, options in self.fields.items()})
+        return self._document_transformer
+
     def get_document_schema(self, document):
-        new_document = {}
-        for key, value in document.items():
-            field_options = self.fields[key]
-            new_key = "{}{}{}".format(self.namespace, self.namespace_separator, key)
-            new_value = self.parse_field(field_options["type"], value)
-            if key == "id":
-                new_document["id"] = new_value
-            else:
-                new_document[new_key] = new_value
-        return new_document
+        return self.get_document_transformer()(document)
+
+    def get_documents_schema(self, documents):
+        transform = self.get_document_transformer()
+        return [transform(document) for document in documents]
+
+    def get_field_converter(self, field_type):
+        '''
+        return the function that converts a value of this type, None if the value is not converted
+        '''
+        if field_type == "timestamp":
+            return lambda field_value: int(parse_timestamp(field_value).timestamp())
+        return None
 
     def parse_field(self, field_type, field_value):
-        if field_type == "text":
-            return field_value
-        elif field_type == "int":
-            return field_value
-        elif field_type == "float":
-            return field_value
-        elif field_type == "timestamp":
-            return int(parse(field_value).timestamp())
-        elif field_type == "json":
-            return field_value
+        converter = self.get_field_converter(field_type)
+        return field_value if converter is None else converter(field_value)
+
 
+    def get_document_model(self):
+        if self._document_model is None:
+            attrs_scheme = dict()
+            for key, options in self.fields.items():
+                if options["type"] == "text":
+                    attrs_scheme[key] = (StrictStr, ...)
+                elif options["type"] == "int":
+                    attrs_scheme[key] = (StrictInt, ...)
+                elif options["type"] == "float":
+                    attrs_scheme[key] = (StrictFloat, ...)
+                elif options["type"] == "timestamp":
+                    attrs_scheme[key] = (Timestamp, ...)
+                elif options["type"] == "json":
+                    attrs_scheme[key] = (Json, ...)
+            self._document_model = compile_model(attrs_scheme)
+            self._documents_model = compile_batch_model(self._document_model)
+        return self._document_model
 
     def check_document_schema(self, document):
-        attrs_scheme = dict()
-        for key, options in self.fields.items():
-            if options["type"] == "text":
-                attrs_scheme[key] = (StrictStr, ...)
-            elif options["type"] == "int":
-                attrs_scheme[key] = (StrictInt, ...)
-            elif options["type"] == "float":
-                attrs_scheme[key] = (StrictFloat, ...)
-            elif options["type"] == "timestamp":
-                attrs_scheme[key] = (datetime, ...)
-            elif options["type"] == "json":
-                attrs_scheme[key] = (Json, ...)
-        document_model = create_model('DynamicNodeModel', **attrs_scheme)
-        document_model.__config__.extra = 'forbid'
-        document_model.__config__.validate_all = True
-        try:
-            document_model(**document)
-        except Exception as e:
-            raise InvalidSchema(e)
+        check_document(self.get_document_model(), document)
+
+    def check_documents_schema(self, documents):
+        self.get_document_model()
+        check_documents(self._documents_model, documents)
 
     def get_fields(self):
-        new_fields = {}
-        for key, options in self.fields.items():
-            options = self.fields[key]
-            new_key = "{}{}{}".format(self.namespace, self.namespace_separator, key)
-            if key == "id":
-                new_fields["id"] = options
-            else:
-                new_fields[new_key] = options
-        return new_fields
+        if self._fields is None:
+            self._fields = MappingProxyType({key if key == "id" else self.get_field(key): options for key, options in self.fields.items()})
+        return self._fields
 
     def get_field(self, field):
         return "{}{}{}".format(self.namespace, self.namespace_separator, field)
@@ -141,6 +144,155 @@ class ManticoreSearchSchema(DocumentSchema):
         return req
 
 
+    def get_filter_value(self, field_type, value):
+        if field_type == "int":
+            if not isinstance(value, int) or isinstance(value, bool):
+                raise InvalidSchema("{} is not an int".format(value))
+            return value
+        elif field_type == "float":
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise InvalidSchema("{} is not a float".format(value))
+            return value
+        elif field_type == "timestamp":
+            if isinstance(value, int) and not isinstance(value, bool):
+                return value
+            try:
+                return self.parse_field(field_type, value)
+            except Exception:
+                raise InvalidSchema("{} is not a timestamp".format(value))
+        raise InvalidSchema("{} fields can not be filtered".format(field_type))
+
+    def get_attribute(self, field):
+        '''
+        return the name of an attribute in manticore and its type
+        '''
+        if field == "id":
+            return "id", "int"
+        if field not in self.fields:
+            raise InvalidSchema("{} is not a field of this collection".format(field))
+        field_type = self.fields[field]["type"]
+        if field_type not in ["int", "float", "timestamp"]:
+            raise InvalidSchema("{} is not an int, float or timestamp field".format(field))
+        return self.get_field(field), field_type
+
+    def build_search_query(self, query=None, match_fields=None, filters=None, fields=None, sort=None, order="asc", limit=20, after=None):
+        '''
+        build the json body of a search on the collection
+
+        :param query: a full-text query
+        :param match_fields: the text fields searched by the query, all fields by default
+        :param filters: a list of dict with a field, an op (eq, ne, lt, lte, gt, gte, in) and a value
+        :param fields: the fields to return, all fields by default
+        :param sort: an int, float or timestamp field, id or _score. Documents are sorted by id by default
+        :param order: asc or desc
+        :param limit: the maximum number of documents, at most 1000
+        :param after: the cursor returned with the previous page
+
+        :return: the json body of the search
+        '''
+        ranges = {"lt": "lt", "lte": "lte", "gt": "gt", "gte": "gte"}
+        if order not in ["asc", "desc"]:
+            raise InvalidSchema("order must be asc or desc")
+        if not isinstance(limit, int) or limit <= 0 or limit > 1000:
+            raise InvalidSchema("limit must be an int between 1 and 1000")
+        must = []
+        must_not = []
+        if query is not None:
+            if match_fields:
+                for field in match_fields:
+                    if field not in self.fields or self.fields[field]["type"] != "text":
+                        raise InvalidSchema("{} is not a text field of this collection".format(field))
+                must.append({"match": {",".join(self.get_field(field) for field in match_fields): query}})
+            else:
+                must.append({"match": {"*": query}})
+        for _filter in filters or []:
+            op = _filter.get("op", "eq")
+            attribute, field_type = self.get_attribute(_filter.get("field"))
+            value = _filter.get("value")
+            if op == "eq":
+                must.append({"equals": {attribute: self.get_filter_value(field_type, value)}})
+            elif op == "ne":
+                must_not.append({"equals": {attribute: self.get_filter_value(field_type, value)}})
+            elif op in ranges:
+                must.append({"range": {attribute: {ranges[op]: self.get_filter_value(field_type, value)}}})
+            elif op == "in":
+                if not isinstance(value, list):
+                    raise InvalidSchema("{} is not a list".format(value))
+                must.append({"in": {attribute: [self.get_filter_value(field_type, item) for item in value]}})
+            else:
+                raise InvalidSchema("{} is not a supported operator".format(op))
+        if sort == "_score":
+            if after is not None:
+                raise InvalidSchema("after requires a sort on an int, float or timestamp field")
+            sort_attribute = None
+            body_sort = [{"_score": {"order": order}}, {"id": {"order": "asc"}}]
+        elif sort is None or sort == "id":
+            sort_attribute = None
+            body_sort = [{"id": {"order": order}}]
+        else:
+            sort_attribute, sort_type = self.get_attribute(sort)
+            body_sort = [{sort_attribute: {"order": order}}, {"id": {"order": order}}]
+        if after is not None:
+            #search after the last document of the previous page
+            compare = "gt" if order == "asc" else "lt"
+            if sort_attribute is None:
+                if not isinstance(after, list) or len(after) != 1:
+                    raise InvalidSchema("after must contain the id of the last document")
+                must.append({"range": {"id": {compare: self.get_filter_value("int", after[0])}}})
+            else:
+                if not isinstance(after, list) or len(after) != 2:
+                    raise InvalidSchema("after must contain the {} and the id of the last document".format(sort))
+                value = self.get_filter_value(sort_type, after[0])
+                must.append({"bool": {"should": [
+                    {"range": {sort_attribute: {compare: value}}},
+                    {"bool": {"must": [
+                        {"equals": {sort_attribute: value}},
+                        {"range": {"id": {compare: self.get_filter_value("int", after[1])}}}
+                    ]}}
+                ]}})
+        body = {"index": self.get_collection_name(), "limit": limit, "sort": body_sort}
+        if must or must_not:
+            body["query"] = {"bool": {}}
+            if must:
+                body["query"]["bool"]["must"] = must
+            if must_not:
+                body["query"]["bool"]["must_not"] = must_not
+        else:
+            body["query"] = {"match_all": {}}
+        if fields:
+            for field in fields:
+                if field not in self.fields:
+                    raise InvalidSchema("{} is not a field of this collection".format(field))
+            source = [self.get_field(field) for field in fields if field != "id"]
+            if sort_attribute and sort_attribute not in source:
+                source.append(sort_attribute)
+            body["_source"] = source
+        return body
+
+    def get_document_from_hit(self, hit, fields=None):
+        document = {"id": int(hit["_id"])}
+        if self._source_fields is None:
+            self._source_fields = MappingProxyType({self.get_field(key): key for key in self.fields})
+        for key, value in hit["_source"].items():
+            field = self._source_fields.get(key)
+            if field is None:
+                prefix = "{}{}".format(self.namespace, self.namespace_separator)
+                field = key[len(prefix):] if key.startswith(prefix) else key
+            if fields and field not in fields:
+                continue
+            document[field] = value
+        return document
+
+    def get_search_cursor(self, hit, sort=None):
+        '''
+        return the after value of the page that follows this hit
+        '''
+        if sort is None or sort == "id":
+            return [int(hit["_id"])]
+        elif sort == "_score":
+            return None
+        return [hit["_source"][self.get_field(sort)], int(hit["_id"])]
+
     def get_schema(self):
         new_schema = {}
         new_schema["fields"] = self.fields
@@ -169,4 +321,8 @@ class ManticoreSearchSchema(DocumentSchema):
         self.namespace = namespace
         self.fields = fields
         self.global_collection_opts = global_collection_opts
-        
\ No newline at end of file
+        self._document_model = None
+        self._documents_model = None
+        self._fields = None
+        self._document_transformer = None
+        self._source_fields = None
@@ -0,0 +1,99 @@
+import asyncio
+import json
+import logging
+from polymanager.exceptions.schema_exception import InvalidSchema
+
+
+class NdjsonIngestion:
+    '''
+    ingest the rows of an ndjson body by chunks of chunk_size rows.
+
+    Every row is validated as soon as its line is read. A full chunk is sent
+    while the next one is read, so at most one chunk is waiting for the
+    database and the memory used does not depend on the size of the body.
+    '''
+
+    def __init__(self, prepare_row, send_rows, chunk_size=1000):
+        '''
+        :param prepare_row: a callable that checks a row against the schema and
+        returns the row to send, it raises InvalidSchema for an invalid row
+        :param send_rows: a coroutine function that sends a list of rows and returns
+        a dict {index of the row in the list: error} of the rows that were not written,
+        or a tuple of this dict and a dict of fields added to the summary of the chunk
+        :param chunk_size: the number of rows sent at once
+        '''
+        self.prepare_row = prepare_row
+        self.send_rows = send_rows
+        self.chunk_size = chunk_size
+
+    async def run(self, lines):
+        '''
+        :param lines: an async iterator of (line number, line)
+
+        :return: a dict with the number of lines read, accepted and rejected
+        and the summary of every chunk
+        '''
+        result = {"status": "success", "lines": 0, "accepted": 0, "rejected": 0, "chunks": []}
+        chunk = self.new_chunk()
+        pending = None
+        try:
+            async for line_number, line in lines:
+                result["lines"] = result["lines"] + 1
+                if chunk["first_line"] is None:
+                    chunk["first_line"] = line_number
+                chunk["last_line"] = line_number
+                try:
+                    row = json.loads(line)
+                    if not isinstance(row, dict):
+                        raise InvalidSchema("a line should be a json object")
+                    chunk["rows"].append(self.prepare_row(row))
+                    chunk["lines"].append(line_number)
+                except (ValueError, TypeError, InvalidSchema) as e:
+                    chunk["rejected"].append({"line": line_number, "error": str(e)})
+                if len(chunk["rows"]) >= self.chunk_size:
+                    if pending is not None:
+                        await pending
+                    pending = asyncio.ensure_future(self.send_chunk(chunk, result))
+                    chunk = self.new_chunk()
+            if pending is not None:
+                await pending
+                pending = None
+            if chunk["first_line"] is not None:
+                await self.send_chunk(chunk, result)
+        finally:
+            if pending is not None:
+                #the body could not be read until the end, the chunk already sent is still written
+                await asyncio.gather(pending, return_exceptions=True)
+        if result["rejected"]:
+            result["status"] = "partial" if result["accepted"] else "failed"
+        return result
+
+    def new_chunk(self):
+        return {"first_line": None, "last_line": None, "rows": [], "lines": [], "rejected": []}
+
+    async def send_chunk(self, chunk, result):
+        errors = {}
+        fields = {}
+        if chunk["rows"]:
+            try:
+                errors = await self.send_rows(chunk["rows"])
+                if isinstance(errors, tuple):
+                    errors, fields = errors
+            except Exception as e:
+                #the whole chunk failed, all its rows are rejected
+                logging.getLogger(__name__).exception(e)
+                errors = {index: e for index in range(len(chunk["rows"]))}
+        rejected = chunk["rejected"] + [{"line": chunk["lines"][index], "error": str(error)} for index, error in errors.items()]
+        rejected.sort(key=lambda item: item["line"])
+        summary = {
+            "first_line": chunk["first_line"],
+            "last_line": chunk["last_line"],
+            "accepted": len(chunk["rows"]) - len(errors),
+            "rejected": rejected,
+            "status": "success" if not rejected else "failed" if len(rejected) == len(chunk["rows"]) + len(chunk["rejected"]) else "partial"
+        }
+        summary.update(fields)
+        result["accepted"] = result["accepted"] + summary["accepted"]
+        result["rejected"] = result["rejected"] + len(rejected)
+        result["chunks"].append(summary)
+        return summary
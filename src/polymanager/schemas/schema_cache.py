@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+
+class SchemaCache:
+    '''
+    process-wide cache of the schemas stored in kvrocks.
+
+    Schemas are kept by (datastore, collection_name). Every chief and worker
+    node subscribes to the same kvrocks channel and evicts its local copy when
+    a schema is saved or deleted somewhere in the cluster. While this
+    subscription is not established the cache is bypassed, so a node never
+    serves a schema that it could not be told about. The collections that do
+    not exist are cached too, at most max_missing of them, until a schema is
+    saved with their name.
+    '''
+
+    CHANNEL = "polymanager:schemas"
+
+    def __init__(self, db_provider, max_missing=10000):
+        self._db_provider = db_provider
+        self._schemas = dict()
+        self._missing = set()
+        self.max_missing = max_missing
+        self._lock = threading.Lock()
+        self._listener = None
+        self._listening = False
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._log = logging.getLogger(__name__)
+
+    def fetch(self, datastore, collection_name, loader):
+        '''
+        return the cached schema or load it with loader()
+
+        :param datastore: the datastore of the collection
+        :param collection_name: the name of the collection
+        :param loader: a callable that reads the schema from kvrocks
+
+        :return: the schema object or None if it does not exist
+        '''
+        found, schema, generation = self._lookup(datastore, collection_name)
+        if found:
+            return schema
+        return self._store(datastore, collection_name, loader(), generation)
+
+    async def fetch_async(self, datastore, collection_name, loader):
+        '''
+        same as fetch, loader is run in the executor so a miss does not block the event loop
+        '''
+        found, schema, generation = self._lookup(datastore, collection_name)
+        if found:
+            return schema
+        schema = await asyncio.get_running_loop().run_in_executor(None, loader)
+        return self._store(datastore, collection_name, schema, generation)
+
+    def _lookup(self, datastore, collection_name):
+        self.start()
+        key = (datastore, collection_name)
+        with self._lock:
+            if self._listening and (key in self._schemas or key in self._missing):
+                self.hits = self.hits + 1
+                return True, self._schemas.get(key), None
+            self.misses = self.misses + 1
+            return False, None, self._generation
+
+    def _store(self, datastore, collection_name, schema, generation):
+        key = (datastore, collection_name)
+        with self._lock:
+            #do not store a schema that was invalidated while we were loading it
+            if self._listening and generation == self._generation:
+                if schema:
+                    self._schemas[key] = schema
+                else:
+                    if len(self._missing) >= self.max_missing:
+                        self._missing.clear()
+                    self._missing.add(key)
+        return schema
+
+    def evict(self, datastore, collection_name):
+        with self._lock:
+            self._schemas.pop((datastore, collection_name), None)
+            self._missing.discard((datastore, collection_name))
+            self._generation = self._generation + 1
+            self.invalidations = self.invalidations + 1
+
+    def clear(self):
+        with self._lock:
+            self._schemas.clear()
+            self._missing.clear()
+            self._generation = self._generation + 1
+
+    def invalidate(self, datastore, collection_name):
+        '''
+        evict a schema locally and notify all other nodes
+
+        :param datastore: the datastore of the collection
+        :param collection_name: the name of the collection
+        '''
+        self.evict(datastore, collection_name)
+        db = self._db_provider()
+        db.publish(self.CHANNEL, json.dumps({"datastore": datastore, "collection": collection_name}))
+
+    def get_stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "invalidations": self.invalidations,
+                "size": len(self._schemas),
+                "missing": len(self._missing),
+                "listening": self._listening
+            }
+
+    def start(self):
+        if self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen, name="schema-cache-listener", daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._db_provider().pubsub(ignore_subscribe_messages=False)
+                pubsub.subscribe(self.CHANNEL)
+                for message in pubsub.listen():
+                    if message["type"] == "subscribe":
+                        #messages may have been missed while we were not subscribed
+                        self.clear()
+                        with self._lock:
+                            self._listening = True
+                    elif message["type"] == "message":
+                        data = json.loads(message["data"])
+                        self.evict(data["datastore"], data["collection"])
+            except Exception as e:
+                self._log.warning("schema cache listener disconnected: {}".format(e))
+            finally:
+                with self._lock:
+                    self._listening = False
+                    self._schemas.clear()
+                    self._missing.clear()
+                    self._generation = self._generation + 1
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            time.sleep(1)
@@ -0,0 +1,110 @@
+from pydantic import create_model, ValidationError
+from pydantic.datetime_parse import parse_datetime
+from datetime import datetime
+from types import MappingProxyType
+from typing import (
+    List
+)
+from polymanager.exceptions.schema_exception import InvalidSchema, InvalidDocuments
+from polymanager.helper.timestamp_helper import ISO_PATTERN, remember_timestamp
+
+
+class Timestamp(datetime):
+    '''
+    timestamp field of the compiled models, it is validated like a pydantic datetime.
+    The datetime parsed from an ISO-8601 string is kept for the conversion of the document.
+    '''
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value):
+        parsed = parse_datetime(value)
+        if isinstance(value, str) and ISO_PATTERN.match(value):
+            remember_timestamp(value, parsed)
+        return parsed
+
+def compile_model(attrs_scheme):
+    '''
+    build the pydantic model used to validate one document of a schema
+
+    :param attrs_scheme: a dict of pydantic field definitions
+
+    :return: a pydantic model that forbids unknown fields
+    '''
+    model = create_model('DynamicNodeModel', **attrs_scheme)
+    model.__config__.extra = 'forbid'
+    model.__config__.validate_all = True
+    return model
+
+def compile_batch_model(model):
+    '''
+    build the pydantic model used to validate a list of documents in one pass
+
+    :param model: the model returned by compile_model
+
+    :return: a pydantic model with a list of model as root
+    '''
+    return create_model('DynamicBatchModel', __root__=(List[model], ...))
+
+def compile_transformer(plan):
+    '''
+    build the function that converts a document to the format of a database
+
+    :param plan: a dict {field: (key in the database, converter of the value or None)}
+
+    :return: a function that converts one document, the fields that are not
+    in the plan raise a KeyError
+    '''
+    keys = MappingProxyType({field: key for field, (key, converter) in plan.items()})
+    converters = MappingProxyType({field: converter for field, (key, converter) in plan.items() if converter is not None})
+    if not converters:
+        def transform(document):
+            return {keys[field]: value for field, value in document.items()}
+    else:
+        def transform(document):
+            new_document = {}
+            for field, value in document.items():
+                converter = converters.get(field)
+                new_document[keys[field]] = value if converter is None else converter(value)
+            return new_document
+    return transform
+
+def check_document(model, document, allow_empty=True):
+    try:
+        if not allow_empty and len(document.keys()) == 0:
+            raise Exception()
+        model(**document)
+    except Exception as e:
+        raise InvalidSchema(e)
+
+def check_documents(batch_model, documents, allow_empty=True):
+    '''
+    validate a list of documents and report the errors for every index
+
+    :param batch_model: the model returned by compile_batch_model
+    :param documents: a list of dict
+    :param allow_empty: False if an empty document must be rejected
+
+    :raise InvalidDocuments: if at least one document is invalid
+    '''
+    errors = dict()
+    if not allow_empty:
+        for index, document in enumerate(documents):
+            if isinstance(document, dict) and len(document.keys()) == 0:
+                errors[index] = ["document is empty"]
+    try:
+        batch_model.parse_obj(documents)
+    except ValidationError as e:
+        for error in e.errors():
+            loc = error["loc"]
+            if len(loc) < 2:
+                raise InvalidSchema(e)
+            index = loc[1]
+            field = ".".join(str(item) for item in loc[2:])
+            message = "{}: {}".format(field, error["msg"]) if field else error["msg"]
+            errors.setdefault(index, []).append(message)
+    if errors:
+        raise InvalidDocuments(errors)
@@ -465,4 +465,47 @@ def test_get_collections(wait_for_databases, clean_databases):
     })
     response2 = client.get("/collection/arangodb")
     print(response2.text)
-    assert response2.text == '{"schemas":[{"fields":{"test":{"type":"text"},"test2":{"type":"text"}},"collection":"collection9","namespace":"test"}],"status":"success"}'
\ No newline at end of file
+    assert response2.text == '{"schemas":[{"fields":{"test":{"type":"text"},"test2":{"type":"text"}},"collection":"collection9","namespace":"test"}],"status":"success"}'
+def test_get_nodes_by_id(wait_for_databases, clean_databases):
+    client.post("/collection/arangodb", json={
+    "collection": "collection5",
+    "namespace": "test",
+    "global_options": {
+        "indexes":[],
+        "edge_collection": False
+    },
+    "fields":
+        {
+            "field1": {
+                "type": "text"
+            },
+            "field2": {
+                "type": "text"
+            }
+        }
+    })
+    response = client.post("/collection/arangodb/nodes", json={
+    "collection": "collection5",
+    "namespace": "test",
+    "nodes": [{"field1": "test{}".format(index), "field2": "test"} for index in range(3)]
+    })
+    keys = [node["_key"] for node in json.loads(response.text)["nodes_id"]]
+    missing = "00000000-0000-4000-8000-000000000000"
+    response = client.post("/collection/arangodb/nodes:get", json={
+    "collection": "collection5",
+    "namespace": "test",
+    "nodes_id": [keys[2], missing, keys[0]],
+    "fields": ["field1"]
+    })
+    assert response.status_code == 200
+    nodes = response.json()["nodes"]
+    assert [node and node["field1"] for node in nodes] == ["test2", None, "test0"]
+    assert sorted(nodes[0].keys()) == ["_id", "_key", "field1"]
+    assert response.json()["missing"] == [missing]
+    response = client.get("/collection/arangodb/nodes:get", params={
+    "collection": "collection5",
+    "namespace": "test",
+    "nodes_id": [keys[1]]
+    })
+    assert response.status_code == 200
+    assert response.json()["nodes"][0]["field2"] == "test"
@@ -1,10 +1,13 @@
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
 from polymanager.schemas.arangodb.arangodb_schema import ArangodbSchema
-from polymanager.schemas.arangodb.arangodb_collection import ArangodbCollection
+from polymanager.schemas.arangodb.arangodb_collection import ArangodbCollection, AsyncArangodbCollection
 from polymanager.containers import CoreContainer, ArangoDBContainer, RedisContainer
 from polymanager.exceptions.schema_exception import InvalidSchema, UnkownSchema
 from polymanager.helper.conf_helper import load_env
 import pytest
+import asyncio
+import json
+import uuid
 
 pytest_plugins = ["docker_compose"]
 
@@ -359,4 +362,219 @@ def test_delete_relationships(wait_for_databases, clean_databases):
         test_edge_schema.get_collection_name(),
         node2["node_id"]["_id"]
     )
-    assert len(res) == 0
\ No newline at end of file
+    assert len(res) == 0
+
+def test_add_nodes_with_keys(wait_for_databases, clean_databases):
+    test_schema = ArangodbSchema("test","collection9", {
+            "test": {
+                "type": "text"
+            }
+        })
+
+    internal_schema = KVRocksInternalSchema("arangodb")
+    internal_schema.save_schema(test_schema)
+    node_collection = ArangodbCollection(internal_schema, test_schema.get_collection_name())
+    arangodb_handler = ArangoDBContainer.handler()
+    keys = [str(uuid.uuid4()) for index in range(3)]
+    res = node_collection.add_nodes([{"test": "test"}, {"test": "test"}], keys=keys[:2], wait_for_sync=True)
+    assert [node["_key"] for node in res["nodes_id"]] == keys[:2]
+    assert "errors" not in res
+    res = node_collection.add_nodes([{"test": "test"}, {"test": "test2"}], keys=keys[1:])
+    assert res["errors"].keys() == {0}
+    res = node_collection.add_nodes([{"test": "test3"}], keys=keys[:1], overwrite_mode="replace")
+    assert "errors" not in res
+    assert arangodb_handler.get_predicate("test", "collection9", keys[0], "test") == "test3"
+    with pytest.raises(InvalidSchema):
+        node_collection.add_nodes([{"test": "test"}], keys=["invalid"])
+
+def test_update_relationships(wait_for_databases, clean_databases):
+    test_schema = ArangodbSchema("test","collection15", {
+            "attr1": {
+                "type": "text"
+            }
+        },
+        global_collection_opts = {
+            "indexes": [],
+            "edge_collection": False
+        })
+    test_edge_schema = ArangodbSchema("test","collection16", {
+            "from": {
+                "type": "relationship"
+            },
+            "to": {
+                "type": "relationship"
+            },
+            "label": {
+                "type": "text"
+            }
+        },
+    global_collection_opts = {
+            "indexes": [],
+            "edge_collection": True
+        })
+
+    internal_schema = KVRocksInternalSchema("arangodb")
+    internal_schema.save_schema(test_schema)
+    internal_schema.save_schema(test_edge_schema)
+    node_collection = ArangodbCollection(internal_schema, test_schema.get_collection_name())
+    edge_collection = ArangodbCollection(internal_schema, test_edge_schema.get_collection_name())
+    nodes = node_collection.add_nodes([{"attr1": "test1"}, {"attr1": "test2"}, {"attr1": "test3"}])
+    node1, node2, node3 = [node["_id"] for node in nodes["nodes_id"]]
+    res = edge_collection.update_relationships([
+        {"from": node1, "to": node2, "label": "contains"},
+        {"from": node2, "to": node3, "label": "contains"}
+    ])
+    assert len(res["edges_id"]) == 2
+    res2 = edge_collection.update_relationships([{"from": node1, "to": node2, "label": "contains2"}])
+    assert res2["edges_id"][0]["_key"] == res["edges_id"][0]["_key"]
+    arangodb_handler = ArangoDBContainer().handler()
+    res = arangodb_handler.get_edges(
+        test_edge_schema.get_namespace(),
+        test_edge_schema.get_collection_name(),
+        node1
+    )
+    assert len(res) == 1
+    assert res[0]["label"] == "contains2"
+    with pytest.raises(InvalidSchema):
+        edge_collection.update_relationships([{"from": node1, "label": "contains"}])
+
+def test_traverse(wait_for_databases, clean_databases):
+    test_schema = ArangodbSchema("test","collection17", {
+            "attr1": {
+                "type": "text"
+            }
+        },
+        global_collection_opts = {
+            "indexes": [],
+            "edge_collection": False
+        })
+    test_edge_schema = ArangodbSchema("test","collection18", {
+            "from": {
+                "type": "relationship"
+            },
+            "to": {
+                "type": "relationship"
+            },
+            "label": {
+                "type": "text"
+            }
+        },
+    global_collection_opts = {
+            "indexes": [],
+            "edge_collection": True
+        })
+
+    internal_schema = KVRocksInternalSchema("arangodb")
+    internal_schema.save_schema(test_schema)
+    internal_schema.save_schema(test_edge_schema)
+    node_collection = ArangodbCollection(internal_schema, test_schema.get_collection_name())
+    edge_collection = ArangodbCollection(internal_schema, test_edge_schema.get_collection_name())
+    nodes = node_collection.add_nodes([{"attr1": "test1"}, {"attr1": "test2"}, {"attr1": "test3"}])
+    node1, node2, node3 = [node["_id"] for node in nodes["nodes_id"]]
+    edge_collection.update_relationships([
+        {"from": node1, "to": node2, "label": "contains"},
+        {"from": node2, "to": node3, "label": "contains"}
+    ])
+    rows = [json.loads(row) for row in edge_collection.traverse(node1, max_depth=2, direction="outbound")]
+    assert [(row["vertex"]["_id"], row["depth"]) for row in rows] == [(node2, 1), (node3, 2)]
+    rows = list(edge_collection.traverse(node3, direction="outbound"))
+    assert len(rows) == 0
+    rows = list(edge_collection.traverse(node3, direction="inbound"))
+    assert len(rows) == 1
+    with pytest.raises(InvalidSchema):
+        edge_collection.traverse(node1, direction="up")
+    with pytest.raises(InvalidSchema):
+        node_collection.traverse(node1)
+
+def test_async_collection(wait_for_databases, clean_databases):
+    test_schema = ArangodbSchema("test","collection19", {
+            "attr1": {
+                "type": "text"
+            }
+        },
+        global_collection_opts = {
+            "indexes": [],
+            "edge_collection": False
+        })
+    test_edge_schema = ArangodbSchema("test","collection20", {
+            "from": {
+                "type": "relationship"
+            },
+            "to": {
+                "type": "relationship"
+            },
+            "label": {
+                "type": "text"
+            }
+        },
+    global_collection_opts = {
+            "indexes": [],
+            "edge_collection": True
+        })
+
+    internal_schema = KVRocksInternalSchema("arangodb")
+    internal_schema.save_schema(test_schema)
+    internal_schema.save_schema(test_edge_schema)
+    node_collection = AsyncArangodbCollection(internal_schema, test_schema.get_collection_name())
+    edge_collection = AsyncArangodbCollection(internal_schema, test_edge_schema.get_collection_name())
+
+    async def run():
+        nodes = await node_collection.add_nodes([{"attr1": "test1"}, {"attr1": "test2"}, {"attr1": "test3"}])
+        node1, node2, node3 = [node["_id"] for node in nodes["nodes_id"]]
+        await edge_collection.update_relationships([{"from": node1, "to": node2, "label": "contains"}])
+        await edge_collection.update_relationship({"from": node2, "to": node3, "label": "contains"})
+        await node_collection.update_node(nodes["nodes_id"][2]["_key"], {"attr1": "updated"})
+        rows = await edge_collection.traverse(node1, max_depth=2, direction="outbound")
+        return [json.loads(row) async for row in rows]
+
+    rows = asyncio.run(run())
+    assert [row["depth"] for row in rows] == [1, 2]
+    assert rows[1]["vertex"]["attr1"] == "updated"
+
+def test_get_nodes(wait_for_databases, clean_databases):
+    test_schema = ArangodbSchema("test","collection21", {
+            "attr1": {
+                "type": "text"
+            }
+        })
+
+    internal_schema = KVRocksInternalSchema("arangodb")
+    internal_schema.save_schema(test_schema)
+    node_collection = AsyncArangodbCollection(internal_schema, test_schema.get_collection_name())
+
+    async def run():
+        res = await node_collection.add_nodes([{"attr1": "test{}".format(index)} for index in range(5)])
+        keys = [node["_key"] for node in reversed(res["nodes_id"])] + [str(uuid.uuid4())]
+        return keys, await node_collection.get_nodes(keys, chunk_size=2, concurrency=2)
+
+    keys, nodes = asyncio.run(run())
+    assert [node["attr1"] for node in nodes[:5]] == ["test{}".format(index) for index in reversed(range(5))]
+    assert [node["_key"] for node in nodes[:5]] == keys[:5]
+    assert nodes[5] is None
+    with pytest.raises(InvalidSchema):
+        asyncio.run(node_collection.get_nodes(["1"]))
+
+def test_ingest_ndjson_nodes_id(wait_for_databases, clean_databases):
+    test_schema = ArangodbSchema("test","collection22", {
+            "attr1": {
+                "type": "text"
+            }
+        })
+
+    internal_schema = KVRocksInternalSchema("arangodb")
+    internal_schema.save_schema(test_schema)
+    node_collection = AsyncArangodbCollection(internal_schema, test_schema.get_collection_name())
+    body = b"\n".join([b'{"attr1": "test%d"}' % index for index in range(5)] + [b'{"attr1": 1}'])
+
+    async def iter_body():
+        yield body
+
+    async def run():
+        result = await node_collection.ingest_ndjson(iter_body(), chunk_size=2)
+        keys = [node["_key"] for chunk in result["chunks"] for node in chunk["nodes_id"]]
+        return keys, await node_collection.get_nodes(keys)
+
+    keys, nodes = asyncio.run(run())
+    #the keys are in the order of the valid lines
+    assert len(keys) == 5
+    assert [node["attr1"] for node in nodes] == ["test{}".format(index) for index in range(5)]
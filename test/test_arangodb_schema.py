@@ -179,4 +179,10 @@ class TestArangodbSchema():
             "edge_collection": False
         }
         with pytest.raises(Exception):
-            ArangodbSchema("test", "test", fields, global_collection_opts=global_collection_opts)
\ No newline at end of file
+            ArangodbSchema("test", "test", fields, global_collection_opts=global_collection_opts)
+    def test_projection(self):
+        arangodb_schema = ArangodbSchema("test", "test", {"a": {"type": "text"}, "b": {"type": "int"}})
+        assert arangodb_schema.get_projection(None) is None
+        assert arangodb_schema.get_projection(["b"]) == ["b"]
+        with pytest.raises(Exception):
+            arangodb_schema.get_projection(["_rev"])
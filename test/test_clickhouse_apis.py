@@ -1,7 +1,10 @@
 from fastapi import FastAPI
 import pytest
 from fastapi.testclient import TestClient
-from polymanager.containers import CoreContainer, RedisContainer, ClickhouseContainer
+from dependency_injector import providers
+from polymanager.containers import CoreContainer, RedisContainer, ClickhouseContainer, SpoolContainer, IngestionContainer
+from polymanager.core.spool import SpoolRegistry
+from polymanager.core.ingestion_queue import IngestionQueue
 from polymanager.helper.conf_helper import load_env
 from polymanager.routers import clickhouse
 
@@ -331,4 +334,184 @@ def test_update_document(wait_for_databases, clean_databases):
     }
     })
     res = clickhouse_handler.query("select * from {}".format("test.collection8"))
-    assert res.text.splitlines()[0].split("\t")[0] == "updated"
\ No newline at end of file
+    assert res.text.splitlines()[0].split("\t")[0] == "updated"
+def test_select_documents(wait_for_databases, clean_databases):
+    response = client.post("/collection/clickhouse", json={
+	"collection": "collection9",
+	"namespace": "test",
+    "global_options": {"order_by":["id"]},
+	"fields":
+		{
+            "test_field1": {
+                "type": "text"
+            },
+            "test_field2": {
+                "type":"timestamp"
+            },
+            "id": {
+                "type":"int"
+            }
+	    }
+    })
+    response = client.post("/collection/clickhouse/documents", json={
+    "collection": "collection9",
+    "namespace": "test",
+    "documents": [
+        {"test_field1": "a", "test_field2": "2021-05-03T14:56:34", "id": 1},
+        {"test_field1": "b", "test_field2": "2021-05-03T14:56:34", "id": 2},
+        {"test_field1": "a", "test_field2": "2021-05-03T14:56:34", "id": 3}
+    ]})
+    response = client.post("/collection/clickhouse/select", json={
+    "collection": "collection9",
+    "namespace": "test",
+    "fields": ["id", "test_field2"],
+    "filters": [{"field": "test_field1", "op": "eq", "value": "a"}],
+    "limit": 1
+    })
+    assert response.status_code == 200
+    assert response.text == '{"id": 1, "test_field2": "2021-05-03T14:56:34"}\n'
+    response = client.post("/collection/clickhouse/select", json={
+    "collection": "collection9",
+    "namespace": "test",
+    "fields": ["id"],
+    "filters": [{"field": "test_field1", "op": "eq", "value": "a"}],
+    "after": [1],
+    "raw": True
+    })
+    assert response.status_code == 200
+    assert response.text == '{"id":3}\n'
+    response = client.post("/collection/clickhouse/select", json={
+    "collection": "collection9",
+    "namespace": "test",
+    "fields": ["unknown"]
+    })
+    assert response.status_code == 400
+
+def test_show_mutations(wait_for_databases, clean_databases):
+    response = client.post("/collection/clickhouse", json={
+	"collection": "collection10",
+	"namespace": "test",
+    "global_options": {"order_by":["id"]},
+	"fields":
+		{
+            "test_field1": {
+                "type": "text"
+            },
+            "id": {
+                "type":"int"
+            }
+	    }
+    })
+    response = client.post("/collection/clickhouse/documents", json={
+    "collection": "collection10",
+    "namespace": "test",
+    "documents": [{"test_field1": "a", "id": 1}, {"test_field1": "b", "id": 2}]
+    })
+    response = client.delete("/collection/clickhouse/documents", json={
+    "collection": "collection10",
+    "namespace": "test",
+    "documents_id": [1, 2],
+    "wait": False
+    })
+    assert response.status_code == 200
+    response = client.get("/collection/clickhouse/mutations", params={"namespace": "test", "collection": "collection10"})
+    assert response.status_code == 200
+    assert len(response.json()["mutations"]) == 1
+    response = client.get("/collection/clickhouse/mutations", params={"namespace": "test", "collection": "unknown"})
+    assert response.status_code == 404
+
+def test_get_documents_by_id(wait_for_databases, clean_databases):
+    response = client.post("/collection/clickhouse", json={
+	"collection": "collection10",
+	"namespace": "test",
+    "global_options": {"order_by":["id"]},
+	"fields":
+		{
+            "test_field1": {
+                "type": "text"
+            },
+            "test_field2": {
+                "type":"timestamp"
+            },
+            "id": {
+                "type":"int"
+            }
+	    }
+    })
+    response = client.post("/collection/clickhouse/documents", json={
+    "collection": "collection10",
+    "namespace": "test",
+    "documents": [{"test_field1": str(doc_id), "test_field2": "2021-05-03T14:56:34", "id": doc_id} for doc_id in range(1, 6)]
+    })
+    response = client.post("/collection/clickhouse/documents:get", json={
+    "collection": "collection10",
+    "namespace": "test",
+    "documents_id": [4, 9, 2],
+    "fields": ["test_field1"]
+    })
+    assert response.status_code == 200
+    assert response.json()["documents"] == [{"id": 4, "test_field1": "4"}, None, {"id": 2, "test_field1": "2"}]
+    assert response.json()["missing"] == [9]
+    response = client.get("/collection/clickhouse/documents:get", params={
+    "collection": "collection10",
+    "namespace": "test",
+    "documents_id": [5, 1]
+    })
+    assert response.status_code == 200
+    assert [document["id"] for document in response.json()["documents"]] == [5, 1]
+    assert response.json()["documents"][0]["test_field2"] == "2021-05-03T14:56:34"
+    response = client.post("/collection/clickhouse/documents:get", json={
+    "collection": "collection10",
+    "namespace": "test",
+    "documents_id": [1],
+    "fields": ["unknown"]
+    })
+    assert response.status_code == 400
+
+def test_add_documents_spool_full(wait_for_databases, clean_databases, tmp_path):
+    response = client.post("/collection/clickhouse", json={
+        "collection": "collection11",
+        "namespace": "test",
+        "global_options": {"order_by":["id"]},
+        "fields": {"test_field1": {"type": "text"}, "id": {"type":"int"}}
+    })
+    #a spool without room for any batch
+    spools = SpoolRegistry(str(tmp_path), {"clickhouse": ClickhouseContainer.handler}, ["clickhouse"], max_bytes=1)
+    SpoolContainer.spools.override(providers.Object(spools))
+    try:
+        response = client.post("/collection/clickhouse/documents", json={
+            "collection": "collection11",
+            "namespace": "test",
+            "documents": [{"test_field1": "test", "id": 1}]
+        })
+    finally:
+        SpoolContainer.spools.reset_override()
+        spools.close()
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.json()["detail"]["status"] == "failed"
+
+def test_add_documents_queue_full(wait_for_databases, clean_databases):
+    response = client.post("/collection/clickhouse", json={
+        "collection": "collection12",
+        "namespace": "test",
+        "global_options": {"order_by":["id"]},
+        "fields": {"test_field1": {"type": "text"}, "id": {"type":"int"}}
+    })
+    #a queue without consumers that already has its single batch
+    queue = IngestionQueue(RedisContainer.db, {"clickhouse": ClickhouseContainer.handler}, ["clickhouse"], enabled=True, max_len=1)
+    stream = queue.get_stream_name("clickhouse", "test.collection12")
+    RedisContainer.db().xadd(stream, {"datastore": "clickhouse", "record": "{}"})
+    IngestionContainer.queue.override(providers.Object(queue))
+    try:
+        response = client.post("/collection/clickhouse/documents", json={
+            "collection": "collection12",
+            "namespace": "test",
+            "documents": [{"test_field1": "test", "id": 1}]
+        })
+    finally:
+        IngestionContainer.queue.reset_override()
+        RedisContainer.db().delete(stream)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.json()["detail"]["status"] == "failed"
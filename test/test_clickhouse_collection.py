@@ -1,11 +1,17 @@
 import pytest
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
 from polymanager.schemas.clickhouse.clickhouse_schema import ClickhouseSchema
-from polymanager.schemas.clickhouse.clickhouse_collection import ClickhouseCollection
+from polymanager.schemas.clickhouse.clickhouse_collection import ClickhouseCollection, AsyncClickhouseCollection
+from polymanager.core.clickchouse.clickhouse_handler import ClickhouseHandler
 from polymanager.containers import CoreContainer, ClickhouseContainer, RedisContainer
-from polymanager.exceptions.schema_exception import InvalidSchema
+from polymanager.exceptions.schema_exception import InvalidSchema, UnkownSchema
 from polymanager.helper.conf_helper import load_env
 from redis import ConnectionError
+import asyncio
+import gzip
+import json
+import time
+import threading
     
 pytest_plugins = ["docker_compose"]
 
@@ -37,6 +43,13 @@ def clean_databases():
     db_ = RedisContainer.db()
     db_.delete("clickhouse")
 
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError()
+        time.sleep(0.05)
+
 def test_add_document_to_invalid_collection(wait_for_databases, clean_databases):
     test_schema = ClickhouseSchema("test","collection1", {
             "test": {
@@ -225,4 +238,341 @@ def test_update_document(wait_for_databases, clean_databases):
     doc_collection.add_document({"test": "test", "test2": "test2", "id": 0x999})
     doc_collection.update_document({"test": "updated", "test2": "updated", "id": 0x999})
     res = clickhouse_handler.query("select * from {} where id=0x999;".format(test_schema.get_collection_name()))
-    assert res.text.split("\t")[0] == "updated"
\ No newline at end of file
+    assert res.text.split("\t")[0] == "updated"
+
+def test_schema_cache(wait_for_databases, clean_databases):
+    test_schema = ClickhouseSchema("test","collection9", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts={'order_by': ['id']})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    schema_cache = RedisContainer.schema_cache()
+    schema_cache.start()
+    wait_for(lambda: schema_cache.get_stats()["listening"])
+    ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    hits = schema_cache.get_stats()["hits"]
+    ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    assert schema_cache.get_stats()["hits"] == hits + 1
+    internal_schema.delete_schema(test_schema.get_collection_name())
+    with pytest.raises(UnkownSchema):
+        ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    #the collections that do not exist are cached until a schema is saved
+    hits = schema_cache.get_stats()["hits"]
+    with pytest.raises(UnkownSchema):
+        asyncio.run(AsyncClickhouseCollection.load(internal_schema, test_schema.get_collection_name()))
+    assert schema_cache.get_stats()["hits"] == hits + 1
+    internal_schema.save_schema(test_schema)
+    doc_collection = asyncio.run(AsyncClickhouseCollection.load(internal_schema, test_schema.get_collection_name()))
+    assert doc_collection.schema.get_collection_name() == test_schema.get_collection_name()
+
+def test_pooled_handler(wait_for_databases):
+    clickhouse_handler = ClickhouseContainer.handler()
+    assert clickhouse_handler is ClickhouseContainer.handler()
+    clickhouse_handler.ping()
+    stats = clickhouse_handler.get_pool_stats()
+    assert stats["pool_size"] == CoreContainer.config.clickhouse_pool_size()
+    assert sum(host["requests"] for host in stats["hosts"].values()) >= 1
+
+def test_add_documents_with_quotes(wait_for_databases, clean_databases):
+    clickhouse_handler = ClickhouseContainer.handler()
+    test_schema = ClickhouseSchema("test","collection10", {
+            "test": {
+                "type": "text"
+            },
+            "test2": {
+                "type": "[text]"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts={'order_by': ['id']})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    doc_collection.add_documents([{"test": "it's", "test2": ["a'b"], "id": 0x1}, {"test": "test", "test2": [], "id": 0x2}])
+    res = clickhouse_handler.query("select test from {} where id=0x1".format(test_schema.get_collection_name()))
+    assert res.text == "it\\'s\n"
+
+def test_select_documents_with_quotes(wait_for_databases, clean_databases):
+    test_schema = ClickhouseSchema("test","collection23", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts={'order_by': ['id']})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    doc_collection.add_documents([{"test": "O'Brien", "id": 0x1}, {"test": "a\\b", "id": 0x2}, {"test": "ab", "id": 0x3}])
+    rows = b"".join(doc_collection.select_documents(filters=[{"field": "test", "op": "in", "value": ["O'Brien", "a\\b"]}]))
+    assert [json.loads(row)["id"] for row in rows.splitlines()] == [0x1, 0x2]
+
+def test_add_documents_gzip(wait_for_databases, clean_databases):
+    clickhouse_handler = ClickhouseHandler(
+        hostname=CoreContainer.config.clickhouse_hostname(),
+        port=CoreContainer.config.clickhouse_port(),
+        compression="gzip",
+        chunk_size=64)
+    test_schema = ClickhouseSchema("test","collection11", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts={'order_by': ['id']})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    documents = [{"test": "test", "id": doc_id} for doc_id in range(1000)]
+    clickhouse_handler.bulk_add_documents(test_schema.get_collection_name(), documents, columns=list(test_schema.get_columns()))
+    res = clickhouse_handler.query("select count(*) from {}".format(test_schema.get_collection_name()))
+    assert int(res.text.splitlines()[0]) == 1000
+
+def test_add_document_with_insert_buffer(wait_for_databases, clean_databases):
+    clickhouse_handler = ClickhouseContainer.handler()
+    test_schema = ClickhouseSchema("test","collection12", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts={'order_by': ['id'], 'insert_buffer': {'max_rows': 20, 'max_latency_ms': 100}})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    threads = [threading.Thread(target=doc_collection.add_document, args=({"test": "test", "id": doc_id},)) for doc_id in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    res = clickhouse_handler.query("select count(*) from {}".format(test_schema.get_collection_name()))
+    assert int(res.text.splitlines()[0]) == 50
+    stats = ClickhouseContainer.buffers().get_stats()[test_schema.get_collection_name()]
+    assert stats["flush_rows"]["count"] < 50
+
+def test_insert_buffer_after_recreate(wait_for_databases, clean_databases):
+    clickhouse_handler = ClickhouseContainer.handler()
+    buffer_opts = {'order_by': ['id'], 'insert_buffer': {'max_rows': 20, 'max_latency_ms': 100}}
+    test_schema = ClickhouseSchema("test","collection22", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts=buffer_opts)
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    doc_collection.add_document({"test": "test", "id": 1})
+    internal_schema.delete_schema(test_schema.get_collection_name())
+    assert test_schema.get_collection_name() not in ClickhouseContainer.buffers().get_stats()
+
+    #the collection is recreated with the same insert buffer options and other columns
+    test_schema = ClickhouseSchema("test","collection22", {
+            "test": {
+                "type": "text"
+            },
+            "test2": {
+                "type": "int"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts=buffer_opts)
+    internal_schema.save_schema(test_schema)
+    doc_collection = ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    doc_collection.add_document({"test": "test", "test2": 2, "id": 2})
+    res = clickhouse_handler.query("select test2 from {} where id = 2".format(test_schema.get_collection_name()))
+    assert res.text.splitlines() == ["2"]
+
+def test_delete_documents_coalesced(wait_for_databases, clean_databases):
+    clickhouse_handler = ClickhouseContainer.handler()
+    test_schema = ClickhouseSchema("test","collection13", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts={'order_by': ['id']})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    doc_collection.add_documents([{"test": "test", "id": doc_id} for doc_id in range(20)])
+    threads = [threading.Thread(target=doc_collection.delete_document, args=(doc_id,)) for doc_id in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    res = clickhouse_handler.query("select count(*) from {}".format(test_schema.get_collection_name()))
+    assert int(res.text.splitlines()[0]) == 10
+    stats = ClickhouseContainer.delete_buffers().get_stats()[test_schema.get_collection_name() + ":sync"]
+    assert stats["flush_rows"]["count"] < 10
+    assert len(doc_collection.get_mutations()) == stats["flush_rows"]["count"]
+
+def test_delete_documents_async(wait_for_databases, clean_databases):
+    clickhouse_handler = ClickhouseContainer.handler()
+    test_schema = ClickhouseSchema("test","collection14", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts={'order_by': ['id']})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    doc_collection.add_documents([{"test": "test", "id": 0x1}, {"test": "test", "id": 0x2}])
+    doc_collection.delete_documents([0x1, 0x2], wait=False)
+    for _ in range(50):
+        if not doc_collection.get_mutations(only_pending=True):
+            break
+        time.sleep(0.1)
+    mutations = doc_collection.get_mutations()
+    assert len(mutations) == 1
+    assert mutations[0]["is_done"] == 1
+    res = clickhouse_handler.query("select count(*) from {}".format(test_schema.get_collection_name()))
+    assert int(res.text.splitlines()[0]) == 0
+
+def test_update_document_replacing_engine(wait_for_databases, clean_databases):
+    test_schema = ClickhouseSchema("test","collection15", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts={'order_by': ['id'], 'engine': 'ReplacingMergeTree'})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    doc_collection.add_document({"test": "test", "id": 0x1})
+    doc_collection.update_document({"test": "test2", "id": 0x1})
+    rows = b"".join(doc_collection.select_documents(final=True))
+    assert rows == b'{"test": "test2", "id": 1}\n'
+
+def test_update_document_collapsing_engine(wait_for_databases, clean_databases):
+    clickhouse_handler = ClickhouseContainer.handler()
+    test_schema = ClickhouseSchema("test","collection16", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts={'order_by': ['id'], 'engine': 'CollapsingMergeTree'})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    doc_collection.add_document({"test": "test", "id": 0x1})
+    doc_collection.update_document({"test": "test2", "id": 0x1})
+    res = clickhouse_handler.query("select sum(_sign) from {}".format(test_schema.get_collection_name()))
+    assert int(res.text.splitlines()[0]) == 1
+    rows = b"".join(doc_collection.select_documents(final=True))
+    assert rows == b'{"test": "test2", "id": 1}\n'
+
+def test_add_documents_with_ddl_options(wait_for_databases, clean_databases):
+    clickhouse_handler = ClickhouseContainer.handler()
+    test_schema = ClickhouseSchema("test","collection17", {
+            "test": {
+                "type": "text",
+                "low_cardinality": True
+            },
+            "ts": {
+                "type": "timestamp",
+                "codec": ["DoubleDelta", "ZSTD(3)"]
+            },
+            "id": {
+                "type": "int"
+            }
+	    }, global_collection_opts={
+            'order_by': ['id'],
+            'partition_by': {'field': 'ts', 'granularity': 'month'},
+            'ttl': {'field': 'ts', 'days': 36500},
+            'indexes': [{'name': 'test_idx', 'field': 'test', 'type': 'bloom_filter'}]
+        })
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = ClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    doc_collection.add_documents([{"test": "test", "ts": "2021-05-03T14:56:34", "id": 0x1}])
+    res = clickhouse_handler.query("select partition_key from system.tables where database='test' and name='collection17'")
+    assert res.text == "toYYYYMM(ts)\n"
+    assert doc_collection.schema.get_schema()["fields"]["test"]["low_cardinality"] == True
+
+def test_async_collection(wait_for_databases, clean_databases):
+    clickhouse_handler = ClickhouseContainer.handler()
+    test_schema = ClickhouseSchema("test","collection20", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+        }, global_collection_opts={'order_by': ['id'], 'insert_buffer': {'max_rows': 20, 'max_latency_ms': 100}})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = AsyncClickhouseCollection(internal_schema, test_schema.get_collection_name())
+
+    async def run():
+        await asyncio.gather(*[doc_collection.add_document({"test": "test", "id": doc_id}) for doc_id in range(50)])
+        await doc_collection.add_documents([{"test": "test", "id": doc_id} for doc_id in range(50, 100)])
+        await doc_collection.delete_documents([0, 1])
+        rows = await doc_collection.select_documents(limit=10)
+        return [row async for row in rows]
+
+    rows = asyncio.run(run())
+    assert len(rows) == 10
+    res = clickhouse_handler.query("select count(*) from {}".format(test_schema.get_collection_name()))
+    assert int(res.text.splitlines()[0]) == 98
+    with pytest.raises(InvalidSchema):
+        asyncio.run(doc_collection.add_document({"test": 1, "id": 1}))
+
+def test_ingest_ndjson(wait_for_databases, clean_databases):
+    clickhouse_handler = ClickhouseContainer.handler()
+    test_schema = ClickhouseSchema("test","collection21", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+        }, global_collection_opts={'order_by': ['id']})
+
+    internal_schema = KVRocksInternalSchema("clickhouse")
+    internal_schema.save_schema(test_schema)
+    doc_collection = AsyncClickhouseCollection(internal_schema, test_schema.get_collection_name())
+    lines = [b'{"test": "test", "id": %d}' % doc_id for doc_id in range(25)] + [b'{"test": 1, "id": 25}']
+    body = gzip.compress(b"\n".join(lines))
+
+    async def iter_body():
+        for index in range(0, len(body), 10):
+            yield body[index:index + 10]
+
+    result = asyncio.run(doc_collection.ingest_ndjson(iter_body(), chunk_size=10, encoding="gzip"))
+    assert result["accepted"] == 25
+    assert len(result["chunks"]) == 3
+    assert result["chunks"][-1]["rejected"][0]["line"] == 26
+    res = clickhouse_handler.query("select count(*) from {}".format(test_schema.get_collection_name()))
+    assert int(res.text.splitlines()[0]) == 25
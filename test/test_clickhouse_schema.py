@@ -1,4 +1,5 @@
 from polymanager.schemas.clickhouse.clickhouse_schema import ClickhouseSchema
+from polymanager.exceptions.schema_exception import InvalidDocuments, InvalidSchema
 import pytest
 
 class TestClickhouseSchema():
@@ -69,4 +70,138 @@ class TestClickhouseSchema():
         }
         clickhouse_schema = ClickhouseSchema("test", "test", fields, global_collection_opts={"order_by":["id"]})
         req = clickhouse_schema.generate_schema()
-        assert req == "query=CREATE TABLE test.test (a String,b Float32,c Datetime,d Array(Int64),id Int64) ENGINE = MergeTree() ORDER BY (id)"
\ No newline at end of file
+        assert req == "query=CREATE TABLE test.test (a String,b Float32,c Datetime,d Array(Int64),id Int64) ENGINE = MergeTree() ORDER BY (id)"
+
+    def test_document_model_is_compiled_once(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        assert clickhouse_schema.get_document_model() is clickhouse_schema.get_document_model()
+
+    def test_documents_schema(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        assert clickhouse_schema.check_documents_schema([{"id": 1, "a": "a"}, {"id": 2, "a": "b"}]) == None
+
+    def test_invalid_documents_schema(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        with pytest.raises(InvalidDocuments) as e:
+            clickhouse_schema.check_documents_schema([{"id": 1, "a": "a"}, {"id": 2, "a": 3}, {"id": 3, "a": "c"}, {"a": "d"}])
+        assert sorted(e.value.errors.keys()) == [1, 3]
+
+    def test_get_documents_schema(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "timestamp"}, "b": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        documents = [{"id": 1, "a": "2021/01/01", "b": "b"}, {"id": 2, "b": "c"}]
+        assert clickhouse_schema.get_documents_schema(documents) == [clickhouse_schema.get_document_schema(document) for document in documents]
+        assert clickhouse_schema.get_documents_schema(documents)[0] == {"id": 1, "a": "2021-01-01 00:00:00", "b": "b"}
+        assert clickhouse_schema.get_document_transformer() is clickhouse_schema.get_document_transformer()
+        assert clickhouse_schema.get_fields() == {"test_a": {"type": "timestamp"}, "test_b": {"type": "text"}, "id": {"type": "int"}}
+
+    def test_columns(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "timestamp"}, "b": {"type": "[float]"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        assert clickhouse_schema.get_columns() == {"a": "Datetime", "b": "Array(Float32)", "id": "Int64"}
+
+    def test_insert_buffer_options(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"id": {"type": "int"}}, global_collection_opts={"order_by":["id"], "insert_buffer": {"max_rows": 10}})
+        assert clickhouse_schema.get_insert_buffer_options() == {"max_rows": 10, "max_bytes": 1048576, "max_latency_ms": 200}
+
+    def test_invalid_insert_buffer_options(self):
+        with pytest.raises(Exception):
+            ClickhouseSchema("test", "test", {"id": {"type": "int"}}, global_collection_opts={"order_by":["id"], "insert_buffer": {"max_rows": 0}})
+
+    def test_collapsing_insert_buffer(self):
+        with pytest.raises(Exception):
+            ClickhouseSchema("test", "test", {"id": {"type": "int"}}, global_collection_opts={"order_by":["id"], "engine": "CollapsingMergeTree", "insert_buffer": {"max_rows": 10}})
+
+    def test_select_query_escaped_array(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "b": {"type": "[text]"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        sql, params = clickhouse_schema.build_select_query(
+            filters=[{"field": "a", "op": "in", "value": ["O'Brien", "a\\b", "a\tb\n"]}, {"field": "b", "op": "has", "value": "O'Brien"}])
+        #the parameter is unescaped by clickhouse, then the quoted items of the array literal are unescaped
+        assert params["p0"] == "['O\\\\'Brien','a\\\\\\\\b','a\\tb\\n']"
+        assert params["p1"] == "O'Brien"
+
+    def test_select_query(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "b": {"type": "[int]"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        sql, params = clickhouse_schema.build_select_query(
+            fields=["id", "a"],
+            filters=[{"field": "a", "op": "in", "value": ["it's", "b"]}, {"field": "b", "op": "has", "value": 3}],
+            order="desc",
+            limit=10,
+            after=[5])
+        assert sql == "SELECT id,a FROM test.test WHERE has({p0:Array(String)}, a) AND has(b, {p1:Int64}) AND (id) < ({p2:Int64}) ORDER BY id DESC LIMIT 10 FORMAT JSONEachRow"
+        assert params == {"p0": "['it\\\\'s','b']", "p1": "3", "p2": "5"}
+
+    def test_get_query(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        sql, params = clickhouse_schema.build_get_query([3, 1], fields=["a"])
+        assert sql == "SELECT id,a FROM test.test WHERE id IN {p0:Array(Int64)} LIMIT 1 BY id FORMAT JSONEachRow"
+        assert params == {"p0": "[3,1]"}
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"], "engine": "ReplacingMergeTree"})
+        sql, params = clickhouse_schema.build_get_query([1])
+        assert sql == "SELECT a,id FROM test.test FINAL WHERE id IN {p0:Array(Int64)} LIMIT 1 BY id FORMAT JSONEachRow"
+        with pytest.raises(InvalidSchema):
+            clickhouse_schema.build_get_query([1], fields=["b"])
+        with pytest.raises(InvalidSchema):
+            clickhouse_schema.build_get_query(["1"])
+
+    def test_invalid_select_query(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        with pytest.raises(InvalidSchema):
+            clickhouse_schema.build_select_query(filters=[{"field": "a", "op": "gt", "value": 1}])
+
+    def test_replacing_engine_schema(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"], "engine": "ReplacingMergeTree"})
+        req = clickhouse_schema.generate_schema()
+        assert req == "query=CREATE TABLE test.test (a String,id Int64,_version UInt64 DEFAULT toUnixTimestamp64Nano(now64(9))) ENGINE = ReplacingMergeTree(_version) ORDER BY (id)"
+        sql, params = clickhouse_schema.build_select_query(final=True)
+        assert sql == "SELECT a,id FROM test.test FINAL ORDER BY id ASC LIMIT 1000 FORMAT JSONEachRow"
+
+    def test_collapsing_engine_schema(self):
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"], "engine": "CollapsingMergeTree", "sign": "s"})
+        req = clickhouse_schema.generate_schema()
+        assert req == "query=CREATE TABLE test.test (a String,id Int64,s Int8 DEFAULT 1) ENGINE = CollapsingMergeTree(s) ORDER BY (id)"
+
+    def test_invalid_engine_schema(self):
+        with pytest.raises(InvalidSchema):
+            ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"], "engine": "Log"})
+        with pytest.raises(InvalidSchema):
+            ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["a"], "engine": "ReplacingMergeTree"})
+        with pytest.raises(InvalidSchema):
+            ClickhouseSchema("test", "test", {"_version": {"type": "int"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"], "engine": "ReplacingMergeTree"})
+        clickhouse_schema = ClickhouseSchema("test", "test", {"a": {"type": "text"}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        with pytest.raises(InvalidSchema):
+            clickhouse_schema.build_select_query(final=True)
+
+    def test_ddl_options_schema(self):
+        fields = {
+            "ts": {"type": "timestamp", "codec": ["DoubleDelta", "ZSTD(3)"]},
+            "c": {"type": "text", "low_cardinality": True},
+            "tags": {"type": "[text]"},
+            "id": {"type": "int"}
+        }
+        clickhouse_schema = ClickhouseSchema("test", "test", fields, global_collection_opts={
+            "order_by": ["c", "ts"],
+            "partition_by": {"field": "ts", "granularity": "day"},
+            "ttl": {"field": "ts", "days": 30},
+            "indexes": [{"name": "tags_idx", "field": "tags", "type": "bloom_filter"}, {"name": "c_idx", "field": "c", "type": "set", "max_rows": 100}]
+        })
+        req = clickhouse_schema.generate_schema()
+        assert req == "query=CREATE TABLE test.test (ts Datetime CODEC(DoubleDelta, ZSTD(3)),c LowCardinality(String),tags Array(String),id Int64," \
+            "INDEX tags_idx tags TYPE bloom_filter(0.025) GRANULARITY 1,INDEX c_idx c TYPE set(100) GRANULARITY 1) " \
+            "ENGINE = MergeTree() PARTITION BY toYYYYMMDD(ts) ORDER BY (c,ts) TTL ts + INTERVAL 30 DAY"
+        assert clickhouse_schema.get_columns()["c"] == "String"
+
+    def test_invalid_ddl_options_schema(self):
+        fields = {"ts": {"type": "timestamp"}, "a": {"type": "float"}, "id": {"type": "int"}}
+        with pytest.raises(InvalidSchema):
+            ClickhouseSchema("test", "test", {"a": {"type": "int", "low_cardinality": True}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        with pytest.raises(InvalidSchema):
+            ClickhouseSchema("test", "test", {"a": {"type": "text", "codec": ["Delta"]}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        with pytest.raises(InvalidSchema):
+            ClickhouseSchema("test", "test", {"a": {"type": "int", "codec": ["ZSTD(3); DROP"]}, "id": {"type": "int"}}, global_collection_opts={"order_by":["id"]})
+        with pytest.raises(InvalidSchema):
+            ClickhouseSchema("test", "test", fields, global_collection_opts={"order_by":["id"], "partition_by": {"field": "a"}})
+        with pytest.raises(InvalidSchema):
+            ClickhouseSchema("test", "test", fields, global_collection_opts={"order_by":["id"], "ttl": {"field": "id", "days": 1}})
+        with pytest.raises(InvalidSchema):
+            ClickhouseSchema("test", "test", fields, global_collection_opts={"order_by":["id"], "indexes": [{"name": "a_idx", "field": "a", "type": "bloom_filter"}]})
+        with pytest.raises(InvalidSchema):
+            ClickhouseSchema("test", "test", fields, global_collection_opts={"order_by":["id"], "indexes": [{"name": "a idx", "field": "a", "type": "minmax"}]})
@@ -0,0 +1,95 @@
+from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
+from polymanager.schemas.clickhouse.clickhouse_schema import ClickhouseSchema
+from polymanager.schemas.manticore.manticoresearch_schema import ManticoreSearchSchema
+from polymanager.schemas.composite.composite_schema import CompositeSchema
+from polymanager.schemas.composite.composite_collection import CompositeCollection
+from polymanager.containers import CoreContainer, RedisContainer, ClickhouseContainer, ManticoreContainer
+from polymanager.exceptions.schema_exception import InvalidSchema
+from polymanager.exceptions.composite_exception import CompositeWriteError
+from polymanager.helper.conf_helper import load_env
+from redis import ConnectionError
+import pytest
+import asyncio
+
+pytest_plugins = ["docker_compose"]
+
+@pytest.fixture(scope="session")
+def wait_for_databases(session_scoped_container_getter):
+    CoreContainer.config.override(load_env())
+    db_ = RedisContainer.db()
+    ready = False
+    while not ready:
+        try:
+            db_.ping()
+            ready = True
+        except ConnectionError:
+            pass
+    clickhouse_handler = ClickhouseContainer().handler()
+    ready = False
+    while not ready:
+        try:
+            res = clickhouse_handler.ping()
+            if res == "Ok.\n":
+                ready = True
+        except Exception:
+            pass
+
+@pytest.fixture
+def clean_databases():
+    clickhouse_handler = ClickhouseContainer().handler()
+    clickhouse_handler.query("DROP DATABASE IF EXISTS test")
+    manticore_handler = ManticoreContainer().handler()
+    manticore_handler.query("DROP TABLE IF EXISTS test_events")
+    db_ = RedisContainer.db()
+    db_.delete("clickhouse", "manticoresearch", "composite")
+
+def create_composite_collection(write_mode="all_or_report"):
+    KVRocksInternalSchema("clickhouse").save_schema(ClickhouseSchema("test", "events", {
+        "id": {"type": "int"},
+        "date": {"type": "timestamp"},
+        "value": {"type": "float"}
+    }, {"order_by": ["id"]}))
+    KVRocksInternalSchema("manticoresearch").save_schema(ManticoreSearchSchema("test", "events", {
+        "id": {"type": "int"},
+        "title": {"type": "text"}
+    }))
+    composite_schema = CompositeSchema("test", "events", [
+        {"datastore": "clickhouse", "namespace": "test", "collection": "events"},
+        {"datastore": "manticoresearch", "namespace": "test", "collection": "events", "role": "secondary"}
+    ], write_mode=write_mode)
+    internal_schema = KVRocksInternalSchema("composite")
+    internal_schema.save_schema(composite_schema)
+    return CompositeCollection(internal_schema, composite_schema.get_collection_name())
+
+def test_add_documents(wait_for_databases, clean_databases):
+    composite_collection = create_composite_collection()
+    documents = [{"id": doc_id, "date": "2021-01-01T00:00:00Z", "value": 1.5, "title": "event"} for doc_id in range(1, 11)]
+    res = asyncio.run(composite_collection.add_documents(documents))
+    assert res["status"] == "success"
+    assert [target["status"] for target in res["targets"]] == ["success", "success"]
+    res = ClickhouseContainer().handler().query("select count(*) from test.events")
+    assert int(res.text.splitlines()[0]) == 10
+    res = ManticoreContainer().handler().query("select count(*) from test_events")
+    assert res["data"][0]["count(*)"] == 10
+
+def test_add_invalid_documents(wait_for_databases, clean_databases):
+    composite_collection = create_composite_collection()
+    with pytest.raises(InvalidSchema):
+        asyncio.run(composite_collection.add_documents([{"id": 1, "date": "2021-01-01T00:00:00Z", "value": 1.5}]))
+    res = ClickhouseContainer().handler().query("select count(*) from test.events")
+    assert int(res.text.splitlines()[0]) == 0
+
+def test_write_modes(wait_for_databases, clean_databases):
+    composite_collection = create_composite_collection()
+    #the secondary target can not be written once its table is dropped
+    ManticoreContainer().handler().query("DROP TABLE test_events")
+    document = {"id": 1, "date": "2021-01-01T00:00:00Z", "value": 1.5, "title": "event"}
+    with pytest.raises(CompositeWriteError) as e:
+        asyncio.run(composite_collection.add_document(document))
+    assert e.value.result["status"] == "partial"
+    res = asyncio.run(composite_collection.add_document(document, write_mode="best_effort"))
+    assert res["status"] == "partial"
+    assert [target["status"] for target in res["targets"]] == ["success", "failed"]
+    res = asyncio.run(composite_collection.add_document(document, write_mode="async_secondary"))
+    assert res["status"] == "success"
+    assert [target["status"] for target in res["targets"]] == ["success", "pending"]
@@ -0,0 +1,69 @@
+from polymanager.schemas.composite.composite_schema import CompositeSchema
+from polymanager.schemas.clickhouse.clickhouse_schema import ClickhouseSchema
+from polymanager.schemas.manticore.manticoresearch_schema import ManticoreSearchSchema
+from polymanager.schemas.dgraph.dgraph_schema import DGraphSchema
+from polymanager.exceptions.schema_exception import InvalidDocuments, InvalidSchema
+import pytest
+
+TARGETS = [
+    {"datastore": "clickhouse", "namespace": "test", "collection": "events"},
+    {"datastore": "manticoresearch", "namespace": "test", "collection": "events", "role": "secondary"},
+    {"datastore": "arangodb", "namespace": "test", "collection": "events", "role": "secondary"}
+]
+
+def get_target_models():
+    clickhouse_schema = ClickhouseSchema("test", "events", {"id": {"type": "int"}, "date": {"type": "timestamp"}, "value": {"type": "float"}}, {"order_by": ["id"]})
+    manticore_schema = ManticoreSearchSchema("test", "events", {"id": {"type": "int"}, "title": {"type": "text"}})
+    dgraph_schema = DGraphSchema("test", "events", {"title": {"type": "text"}, "date": {"type": "timestamp"}})
+    return [clickhouse_schema.get_document_model(), manticore_schema.get_document_model(), dgraph_schema.get_node_model()]
+
+
+class TestCompositeSchema():
+
+    def test_schema(self):
+        composite_schema = CompositeSchema("test", "events", TARGETS, write_mode="best_effort")
+        assert composite_schema.get_collection_name() == "test.events"
+        assert composite_schema.get_targets()[0]["role"] == "primary"
+        assert CompositeSchema.load_schema(composite_schema.get_schema()).get_schema() == composite_schema.get_schema()
+
+    def test_target_collection_names(self):
+        composite_schema = CompositeSchema("test", "events", TARGETS)
+        assert [composite_schema.get_target_collection_name(target) for target in composite_schema.get_targets()] == ["test.events", "test_events", "events"]
+
+    def test_invalid_targets(self):
+        with pytest.raises(InvalidSchema):
+            CompositeSchema("test", "events", [])
+        with pytest.raises(InvalidSchema):
+            CompositeSchema("test", "events", [{"datastore": "mysql", "namespace": "test", "collection": "events"}])
+        with pytest.raises(InvalidSchema):
+            CompositeSchema("test", "events", [TARGETS[0], TARGETS[0]])
+        with pytest.raises(InvalidSchema):
+            CompositeSchema("test", "events", TARGETS[1:])
+        with pytest.raises(InvalidSchema):
+            CompositeSchema("test", "events", TARGETS, write_mode="sometimes")
+
+    def test_check_documents_schema(self):
+        composite_schema = CompositeSchema("test", "events", TARGETS)
+        target_models = get_target_models()
+        composite_schema.check_documents_schema(target_models, [{"id": 1, "date": "2021-01-01T00:00:00Z", "value": 1.5, "title": "a"}])
+        with pytest.raises(InvalidDocuments) as e:
+            composite_schema.check_documents_schema(target_models, [
+                {"id": 1, "date": "2021-01-01T00:00:00Z", "value": 1.5, "title": "a"},
+                {"id": 2, "date": "2021-01-01T00:00:00Z", "value": 1.5, "title": 1, "other": 1}
+            ])
+        assert list(e.value.errors) == [1]
+
+    def test_document_model_is_merged_once(self):
+        composite_schema = CompositeSchema("test", "events", TARGETS)
+        target_models = get_target_models()
+        model = composite_schema.get_document_model(target_models)
+        assert set(model.__fields__) == {"id", "date", "value", "title"}
+        assert composite_schema.get_document_model(list(target_models)) is model
+        assert composite_schema.get_document_model(get_target_models()) is not model
+
+    def test_conflicting_fields(self):
+        composite_schema = CompositeSchema("test", "events", TARGETS[:2])
+        clickhouse_schema = ClickhouseSchema("test", "events", {"id": {"type": "int"}, "title": {"type": "int"}}, {"order_by": ["id"]})
+        manticore_schema = ManticoreSearchSchema("test", "events", {"id": {"type": "int"}, "title": {"type": "text"}})
+        with pytest.raises(InvalidSchema):
+            composite_schema.get_document_model([clickhouse_schema.get_document_model(), manticore_schema.get_document_model()])
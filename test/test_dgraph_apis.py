@@ -336,4 +336,46 @@ def test_get_collections(wait_for_databases, clean_databases):
         }
     })
     response2 = client.get("/collection/dgraph")
-    assert response2.text == '{"schemas":[{"fields":{"test":{"type":"text"},"test2":{"type":"text","index":{"tokenizer":"hash"}}},"collection":"collection9","namespace":"polymanager.test"}],"status":"success"}'
\ No newline at end of file
+    assert response2.text == '{"schemas":[{"fields":{"test":{"type":"text"},"test2":{"type":"text","index":{"tokenizer":"hash"}}},"collection":"collection9","namespace":"polymanager.test"}],"status":"success"}'
+def test_get_nodes_by_id(wait_for_databases, clean_databases):
+    response = client.post("/collection/dgraph", json={
+    "collection": "collection5",
+    "namespace": "polymanager.test",
+    "fields":
+        {
+            "test_field1": {
+                "type": "text"
+            },
+            "test_field2": {
+                "type": "text"
+            }
+        }
+    })
+    response = client.post("/collection/dgraph/nodes", json={
+    "collection": "collection5",
+    "namespace": "polymanager.test",
+    "nodes": [{"test_field1": "test{}".format(index), "test_field2": "test"} for index in range(3)]
+    })
+    nodes_id = json.loads(response.text)["nodes_id"]
+    response = client.post("/collection/dgraph/nodes:get", json={
+    "collection": "collection5",
+    "namespace": "polymanager.test",
+    "nodes_id": [nodes_id[2], "0xfffffff", nodes_id[0]],
+    "fields": ["test_field1"]
+    })
+    assert response.status_code == 200
+    assert response.json()["nodes"] == [{"node_id": nodes_id[2], "test_field1": "test2"}, None, {"node_id": nodes_id[0], "test_field1": "test0"}]
+    assert response.json()["missing"] == ["0xfffffff"]
+    response = client.get("/collection/dgraph/nodes:get", params={
+    "collection": "collection5",
+    "namespace": "polymanager.test",
+    "nodes_id": [nodes_id[1]]
+    })
+    assert response.status_code == 200
+    assert response.json()["nodes"] == [{"node_id": nodes_id[1], "test_field1": "test1", "test_field2": "test"}]
+    response = client.get("/collection/dgraph/nodes:get", params={
+    "collection": "collection5",
+    "namespace": "polymanager.test",
+    "nodes_id": ["0x1) @filter("]
+    })
+    assert response.status_code == 400
@@ -1,10 +1,11 @@
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
 from polymanager.schemas.dgraph.dgraph_schema import DGraphSchema
-from polymanager.schemas.dgraph.dgraph_collection import DgraphCollection
+from polymanager.schemas.dgraph.dgraph_collection import DgraphCollection, AsyncDgraphCollection
 from polymanager.containers import CoreContainer, DGraphContainer, RedisContainer
 from polymanager.exceptions.schema_exception import InvalidSchema, UnkownSchema
 from polymanager.helper.conf_helper import load_env
 import pytest
+import asyncio
 
 pytest_plugins = ["docker_compose"]
 
@@ -230,4 +231,128 @@ def test_update_relationship(wait_for_databases, clean_databases):
     dgraph_handler = DGraphContainer().handler()
     node_collection.update_relationship(node_id["node_id"], {"attr_link": [node_id2["node_id"]]})
     pred2 = dgraph_handler.get_predicate_edges(node_id["node_id"], "polymanager.test.attr_link")
-    assert len(pred2[0]["polymanager.test.attr_link"]) == 1
\ No newline at end of file
+    assert len(pred2[0]["polymanager.test.attr_link"]) == 1
+
+def test_add_nodes_in_chunks(wait_for_databases, clean_databases):
+    test_schema = DGraphSchema("polymanager.test","collection13", {
+            "test": {
+                "type": "int"
+            }
+        })
+
+    internal_schema = KVRocksInternalSchema("dgraph")
+    internal_schema.save_schema(test_schema)
+    dgraph_handler = DGraphContainer().handler(chunk_size=3, parallel_txns=2)
+    nodes = [test_schema.get_node_schema({"test": index}) for index in range(10)]
+    uids = dgraph_handler.add_nodes(test_schema.get_namespace(), test_schema.get_collection_name(), nodes, "new_node")
+    assert len(set(uids)) == 10
+    for index, uid in enumerate(uids):
+        assert dgraph_handler.get_predicate(uid, "polymanager.test.test")["polymanager.test.test"] == index
+
+def test_reset_relationships(wait_for_databases, clean_databases):
+    test_schema = DGraphSchema("polymanager.test","collection14", {
+            "attr_link": {
+                "type": "relationship"
+            },
+            "attr_str": {
+                "type": "text"
+            }
+        })
+
+    internal_schema = KVRocksInternalSchema("dgraph")
+    internal_schema.save_schema(test_schema)
+    node_collection = DgraphCollection(internal_schema, test_schema.get_collection_name())
+    nodes_id = node_collection.add_nodes([{"attr_str": "test{}".format(index)} for index in range(4)])["nodes_id"]
+    dgraph_handler = DGraphContainer().handler()
+    node_collection.update_relationships([
+        {"node_id": nodes_id[0], "node": {"attr_link": [nodes_id[2], nodes_id[3]]}},
+        {"node_id": nodes_id[1], "node": {"attr_link": [nodes_id[2]]}}
+    ])
+    pred = dgraph_handler.get_predicate_edges(nodes_id[0], "polymanager.test.attr_link")
+    assert len(pred[0]["polymanager.test.attr_link"]) == 2
+    node_collection.update_relationship(nodes_id[0], {"attr_link": [nodes_id[1]]}, reset=True)
+    pred = dgraph_handler.get_predicate_edges(nodes_id[0], "polymanager.test.attr_link")
+    assert [edge["uid"] for edge in pred[0]["polymanager.test.attr_link"]] == [nodes_id[1]]
+    pred = dgraph_handler.get_predicate_edges(nodes_id[1], "polymanager.test.attr_link")
+    assert len(pred[0]["polymanager.test.attr_link"]) == 1
+    with pytest.raises(InvalidSchema):
+        node_collection.update_relationships([{"node_id": "invalid", "node": {"attr_link": []}}])
+
+def test_async_collection(wait_for_databases, clean_databases):
+    test_schema = DGraphSchema("polymanager.test","collection20", {
+            "test": {
+                "type": "text"
+            },
+            "test2": {
+                "type": "text",
+                "index":{
+                    "tokenizer": "hash"
+                }
+            }
+        })
+
+    internal_schema = KVRocksInternalSchema("dgraph")
+    internal_schema.save_schema(test_schema)
+    node_collection = AsyncDgraphCollection(internal_schema, test_schema.get_collection_name())
+    dgraph_handler = DGraphContainer().handler()
+
+    async def run():
+        res = await node_collection.add_nodes([{"test": "test", "test2": "test2"}, {"test": "test", "test2": "test3"}])
+        await node_collection.update_node(res["nodes_id"][1], {"test": "test", "test2": "test4"})
+        await node_collection.delete_node(res["nodes_id"][0])
+        return res
+
+    res = asyncio.run(run())
+    assert len(res["nodes_id"]) == 2
+    pred = dgraph_handler.get_predicate(res["nodes_id"][1], "polymanager.test.test2")
+    assert pred["polymanager.test.test2"] == "test4"
+    pred = dgraph_handler.get_predicate(res["nodes_id"][0], "polymanager.test.test2")
+    assert "polymanager.test.test2" not in pred
+
+def test_get_nodes(wait_for_databases, clean_databases):
+    test_schema = DGraphSchema("polymanager.test","collection21", {
+            "test": {
+                "type": "text"
+            }
+        })
+
+    internal_schema = KVRocksInternalSchema("dgraph")
+    internal_schema.save_schema(test_schema)
+    node_collection = AsyncDgraphCollection(internal_schema, test_schema.get_collection_name())
+
+    async def run():
+        res = await node_collection.add_nodes([{"test": "test{}".format(index)} for index in range(5)])
+        nodes_id = list(reversed(res["nodes_id"])) + ["0xfffffff"]
+        return nodes_id, await node_collection.get_nodes(nodes_id, chunk_size=2, concurrency=2)
+
+    nodes_id, nodes = asyncio.run(run())
+    assert [node["test"] for node in nodes[:5]] == ["test{}".format(index) for index in reversed(range(5))]
+    assert [node["node_id"] for node in nodes[:5]] == nodes_id[:5]
+    assert nodes[5] is None
+    with pytest.raises(InvalidSchema):
+        asyncio.run(node_collection.get_nodes(["0x1) @filter("]))
+
+def test_ingest_ndjson_nodes_id(wait_for_databases, clean_databases):
+    test_schema = DGraphSchema("polymanager.test","collection22", {
+            "test": {
+                "type": "text"
+            }
+        })
+
+    internal_schema = KVRocksInternalSchema("dgraph")
+    internal_schema.save_schema(test_schema)
+    node_collection = AsyncDgraphCollection(internal_schema, test_schema.get_collection_name())
+    body = b"\n".join([b'{"test": "test%d"}' % index for index in range(5)] + [b'{"test": 1}'])
+
+    async def iter_body():
+        yield body
+
+    async def run():
+        result = await node_collection.ingest_ndjson(iter_body(), chunk_size=2)
+        nodes_id = [node_id for chunk in result["chunks"] for node_id in chunk["nodes_id"]]
+        return nodes_id, await node_collection.get_nodes(nodes_id)
+
+    nodes_id, nodes = asyncio.run(run())
+    #the uids are in the order of the valid lines
+    assert len(nodes_id) == 5
+    assert [node["test"] for node in nodes] == ["test{}".format(index) for index in range(5)]
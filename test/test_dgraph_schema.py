@@ -1,4 +1,5 @@
 from polymanager.schemas.dgraph.dgraph_schema import DGraphSchema
+from polymanager.exceptions.schema_exception import InvalidDocuments, InvalidSchema
 import pytest
 
 class TestDGraphSchema():
@@ -31,6 +32,10 @@ class TestDGraphSchema():
         dgraph_schema = DGraphSchema("test", "test", {"a": {"type": "timestamp"},"b": {"type":"relationship"}})
         assert dgraph_schema.get_node_schema({"a": "2021/01/01"}) == {'test.a': '2021-01-01T00:00:00'}
 
+    def test_get_nodes_schema(self):
+        dgraph_schema = DGraphSchema("test", "test", {"a": {"type": "timestamp"}, "b": {"type": "int"}})
+        assert dgraph_schema.get_nodes_schema([{"a": "2021/01/01", "b": 1}, {"b": 2}]) == [{'test.a': '2021-01-01T00:00:00', 'test.b': 1}, {'test.b': 2}]
+
     def test_relationship_schema(self):
         with pytest.raises(Exception):
             dgraph_schema = DGraphSchema("test", "test", {"a": {"type": "text"},"b": {"type":"relationship"}})
@@ -92,4 +97,30 @@ test.b: [uid] .
 type <test.test> {
 test.a
 test.b
-}'''
\ No newline at end of file
+}'''
+
+    def test_invalid_nodes_schema(self):
+        dgraph_schema = DGraphSchema("test", "test", {"a": {"type": "text"}, "b": {"type": "int"}})
+        with pytest.raises(InvalidDocuments) as e:
+            dgraph_schema.check_nodes_schema([{"a": "a", "b": 1}, {}, {"a": 1, "b": 1}])
+        assert sorted(e.value.errors.keys()) == [1, 2]
+
+    def test_invalid_relationship_schema(self):
+        dgraph_schema = DGraphSchema("test", "test", {"a": {"type": "relationship"}})
+        with pytest.raises(InvalidSchema):
+            dgraph_schema.check_relationship_schema({"a": ["0x1> <a> <0x2"]})
+        with pytest.raises(InvalidSchema):
+            dgraph_schema.check_node_id("0x1) @filter(")
+        dgraph_schema.check_node_id("0x1f")
+
+    def test_node_from_predicates(self):
+        dgraph_schema = DGraphSchema("test", "test", {"a": {"type": "text"}, "b": {"type": "int"}})
+        node = dgraph_schema.get_node_from_predicates({"uid": "0x1", "test.a": "a", "test.b": 1, "dgraph.type": ["test.test"]})
+        assert node == {"node_id": "0x1", "a": "a", "b": 1}
+
+    def test_projection(self):
+        dgraph_schema = DGraphSchema("test", "test", {"a": {"type": "text"}, "b": {"type": "int"}})
+        assert dgraph_schema.get_projection(None) is None
+        assert dgraph_schema.get_projection(["b"]) == ["test.b"]
+        with pytest.raises(InvalidSchema):
+            dgraph_schema.get_projection(["uid"])
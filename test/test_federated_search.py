@@ -0,0 +1,95 @@
+from polymanager.schemas.federated_search import FederatedSearch, merge_hits
+from polymanager.exceptions.schema_exception import InvalidSchema
+from polymanager.exceptions.federated_exception import StageTimeout
+from polymanager.helper.batch_helper import gather_chunks
+import pytest
+import asyncio
+
+
+class SearchCollection():
+
+    def __init__(self, documents, delay=0):
+        self.documents = documents
+        self.delay = delay
+        self.fields = None
+
+    async def search_documents(self, query=None, match_fields=None, filters=None, fields=None, sort=None, order="asc", limit=20, after=None, with_score=False):
+        await asyncio.sleep(self.delay)
+        self.fields = fields
+        return {"documents": [dict(document) for document in self.documents], "total": len(self.documents), "next": None, "status": "success"}
+
+class TargetCollection():
+
+    def __init__(self, nodes, delay=0):
+        self.nodes = nodes
+        self.delay = delay
+        self.requested = []
+
+    async def get_nodes(self, nodes_id, fields=None, chunk_size=1000, concurrency=4):
+        await asyncio.sleep(self.delay)
+        if any(not isinstance(node_id, str) for node_id in nodes_id):
+            raise InvalidSchema("nodes_id should be a list of hex string")
+        self.requested.append(list(nodes_id))
+        return [self.nodes.get(node_id) for node_id in nodes_id]
+
+
+class TestFederatedSearch():
+
+    def test_hits_in_search_order(self):
+        search_collection = SearchCollection([
+            {"id": 3, "node_id": "0x3", "_score": 3},
+            {"id": 1, "node_id": "0x1", "_score": 2},
+            {"id": 2, "_score": 1},
+            {"id": 4, "node_id": "0x4", "_score": 1}
+        ])
+        target_collection = TargetCollection({"0x1": {"node_id": "0x1", "a": 1}, "0x3": {"node_id": "0x3", "a": 3}})
+        federated = FederatedSearch(search_collection, target_collection)
+        result = asyncio.run(federated.search(query="a", fields=["id"]))
+        assert search_collection.fields == ["id", "node_id"]
+        assert target_collection.requested == [["0x3", "0x1", "0x4"]]
+        assert [hit["score"] for hit in result["hits"]] == [3, 2, 1, 1]
+        assert [hit["document"]["id"] for hit in result["hits"]] == [3, 1, 2, 4]
+        assert [hit["node"] and hit["node"]["a"] for hit in result["hits"]] == [3, 1, None, None]
+        assert result["missing"] == ["0x4"]
+        assert result["total"] == 4
+
+    def test_no_hits(self):
+        target_collection = TargetCollection({})
+        result = asyncio.run(FederatedSearch(SearchCollection([]), target_collection).search(query="a"))
+        assert result["hits"] == []
+        assert target_collection.requested == []
+
+    def test_search_timeout(self):
+        federated = FederatedSearch(SearchCollection([], delay=1), TargetCollection({}), search_timeout_ms=10)
+        with pytest.raises(StageTimeout):
+            asyncio.run(federated.search(query="a"))
+
+    def test_hydrate_timeout(self):
+        federated = FederatedSearch(SearchCollection([{"id": 1, "node_id": "0x1"}]), TargetCollection({}, delay=1), hydrate_timeout_ms=10)
+        with pytest.raises(StageTimeout):
+            asyncio.run(federated.search(query="a"))
+
+    def test_invalid_join_field(self):
+        federated = FederatedSearch(SearchCollection([{"id": 1}]), TargetCollection({}), join_field="id")
+        with pytest.raises(InvalidSchema):
+            asyncio.run(federated.search(query="a"))
+
+    def test_merge_hits(self):
+        hits, missing = merge_hits([{"id": 1, "_score": 1}], [None], "id")
+        assert hits == [{"score": 1, "document": {"id": 1}, "node": None}]
+        assert missing == [1]
+
+    def test_gather_chunks(self):
+        running = []
+        peak = []
+
+        async def fetch_chunk(chunk):
+            running.append(chunk)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(chunk)
+            return [value * 2 for value in chunk]
+
+        results = asyncio.run(gather_chunks(list(range(10)), fetch_chunk, chunk_size=3, concurrency=2))
+        assert results == [value * 2 for value in range(10)]
+        assert max(peak) == 2
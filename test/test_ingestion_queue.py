@@ -0,0 +1,101 @@
+import pytest
+import time
+from polymanager.core.ingestion_queue import IngestionQueue, STREAMS_KEY, DEAD_LETTER_SUFFIX, GROUP
+from polymanager.containers import CoreContainer, RedisContainer
+from polymanager.exceptions.ingestion_exception import QueueFull
+from polymanager.helper.conf_helper import load_env
+from redis import ConnectionError
+
+pytest_plugins = ["docker_compose"]
+
+@pytest.fixture(scope="session")
+def wait_for_databases(session_scoped_container_getter):
+    CoreContainer.config.override(load_env())
+    db_ = RedisContainer.db()
+    ready = False
+    while not ready:
+        try:
+            db_.ping()
+            ready = True
+        except ConnectionError:
+            pass
+
+@pytest.fixture
+def clean_databases():
+    db_ = RedisContainer.db()
+    for stream in db_.smembers(STREAMS_KEY):
+        db_.delete(stream, stream + DEAD_LETTER_SUFFIX.encode("utf-8"))
+    db_.delete(STREAMS_KEY)
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError()
+        time.sleep(0.05)
+
+def create_queue(handler, **options):
+    return IngestionQueue(RedisContainer.db.provider, {"clickhouse": handler}, ["clickhouse"], enabled=True, block_ms=100, **options)
+
+
+class TestIngestionQueue():
+
+    def test_enqueue_and_consume(self, wait_for_databases, clean_databases):
+        written = []
+
+        class Handler:
+            def write_deferred_batch(self, record):
+                written.append(record)
+
+        queue = create_queue(Handler, consumers=2)
+        assert queue.is_enabled("clickhouse")
+        assert not queue.is_enabled("dgraph")
+        for index in range(10):
+            queue.enqueue("clickhouse", "test.test", {"rows": [index]})
+        queue.start()
+        wait_for(lambda: len(written) == 10)
+        queue.close()
+        assert sorted(record["rows"][0] for record in written) == list(range(10))
+        stats = queue.get_stats()
+        assert stats["written"] == 10
+        #the written batches are deleted from the stream
+        assert stats["streams"]["polymanager:ingest:clickhouse:test.test"] == {"length": 0, "pending": 0, "dead": 0}
+
+    def test_claim_stuck_batches(self, wait_for_databases, clean_databases):
+        written = []
+
+        class Handler:
+            def write_deferred_batch(self, record):
+                written.append(record)
+
+        db_ = RedisContainer.db()
+        queue = create_queue(Handler, consumers=1, claim_idle_ms=200)
+        queue.enqueue("clickhouse", "test.test", {"rows": [1]})
+        #a consumer reads the batch and stops before writing it
+        streams = queue.get_streams(db_)
+        assert len(db_.xreadgroup(GROUP, "stopped", {stream: ">" for stream in streams}, count=10)[0][1]) == 1
+        queue.start()
+        wait_for(lambda: len(written) == 1)
+        queue.close()
+        assert queue.get_stats()["claimed"] == 1
+
+    def test_dead_letter(self, wait_for_databases, clean_databases):
+        class Handler:
+            def write_deferred_batch(self, record):
+                raise Exception("database unavailable")
+
+        queue = create_queue(Handler, consumers=1, claim_idle_ms=50, max_deliveries=2)
+        queue.enqueue("clickhouse", "test.test", {"rows": [1]})
+        queue.start()
+        wait_for(lambda: queue.get_stats()["dead"] == 1)
+        queue.close()
+        stats = queue.get_stats()
+        assert stats["last_error"] == "database unavailable"
+        assert stats["streams"]["polymanager:ingest:clickhouse:test.test"]["dead"] == 1
+
+    def test_queue_full(self, wait_for_databases, clean_databases):
+        queue = create_queue(None, max_len=2)
+        queue.enqueue("clickhouse", "test.test", {"rows": [1]})
+        queue.enqueue("clickhouse", "test.test", {"rows": [2]})
+        with pytest.raises(QueueFull):
+            queue.enqueue("clickhouse", "test.test", {"rows": [3]})
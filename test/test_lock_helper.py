@@ -0,0 +1,87 @@
+import pytest
+import asyncio
+import threading
+import time
+from polymanager.helper.lock_helper import KVRocksLock
+from polymanager.containers import CoreContainer, RedisContainer
+from polymanager.exceptions.lock_exception import LockTimeout
+from polymanager.helper.conf_helper import load_env
+from redis import ConnectionError
+
+pytest_plugins = ["docker_compose"]
+
+@pytest.fixture(scope="session")
+def wait_for_databases(session_scoped_container_getter):
+    CoreContainer.config.override(load_env())
+    db_ = RedisContainer.db()
+    ready = False
+    while not ready:
+        try:
+            db_.ping()
+            ready = True
+        except ConnectionError:
+            pass
+
+def create_lock(**options):
+    return KVRocksLock(RedisContainer.db.provider, prefix="polymanager:lock:test", **options)
+
+
+class TestKVRocksLock():
+
+    def test_same_key_serialised(self, wait_for_databases):
+        lock = create_lock()
+        events = []
+
+        def update(name):
+            with lock.hold(("test.test", 1)):
+                events.append(("start", name))
+                time.sleep(0.02)
+                events.append(("end", name))
+
+        threads = [threading.Thread(target=update, args=(name,)) for name in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for index in range(0, len(events), 2):
+            assert events[index][0] == "start" and events[index + 1] == ("end", events[index][1])
+        assert not RedisContainer.db().exists(lock.get_name(("test.test", 1)))
+
+    def test_sync_and_async_serialised(self, wait_for_databases):
+        #two lock objects share the lock of a key, as two processes do
+        sync_lock = create_lock()
+        async_lock = create_lock()
+        events = []
+
+        def update():
+            with sync_lock.hold(("test.test", 1)):
+                events.append("sync start")
+                time.sleep(0.1)
+                events.append("sync end")
+
+        async def update_async():
+            async with async_lock.hold_async(("test.test", 1)):
+                events.append("async start")
+                events.append("async end")
+
+        thread = threading.Thread(target=update)
+        thread.start()
+        time.sleep(0.02)
+        asyncio.run(update_async())
+        thread.join()
+        assert events == ["sync start", "sync end", "async start", "async end"]
+
+    def test_timeout(self, wait_for_databases):
+        lock = create_lock(timeout_ms=50)
+        with lock.hold(("test.test", 2)):
+            with pytest.raises(LockTimeout):
+                with lock.hold(("test.test", 2)):
+                    pass
+            #the caller that timed out does not release the lock of the holder
+            assert RedisContainer.db().exists(lock.get_name(("test.test", 2)))
+
+    def test_expired_lock(self, wait_for_databases):
+        lock = create_lock(ttl_ms=50)
+        RedisContainer.db().set(lock.get_name(("test.test", 3)), "stopped holder", px=50)
+        with lock.hold(("test.test", 3)):
+            pass
@@ -337,4 +337,105 @@ def test_update_document(wait_for_databases, clean_databases):
     }
     })
     res = manticore_handler.query("select * from {} where match('updated');".format("test_collection"))
-    assert res["data"][0]["id"] == 0x999
\ No newline at end of file
+    assert res["data"][0]["id"] == 0x999
+
+def test_search_documents(wait_for_databases, clean_databases):
+    response = client.post("/collection/manticoresearch", json={
+    "collection": "collection",
+    "namespace": "test",
+    "fields":
+        {
+            "test_field1": {
+                "type": "text",
+                "index": {
+                    "stored": True
+                }
+            },
+            "test_field2": {
+                "type":"int"
+            },
+            "id": {
+                "type":"int"
+            }
+        }
+    })
+    response = client.post("/collection/manticoresearch/documents", json={
+        "collection": "collection",
+        "namespace": "test",
+        "documents": [{"test_field1": "hello world", "test_field2": doc_id % 2, "id": doc_id} for doc_id in range(1, 6)]
+    })
+    response = client.post("/collection/manticoresearch/search", json={
+        "collection": "collection",
+        "namespace": "test",
+        "query": "hello",
+        "filters": [{"field": "test_field2", "op": "eq", "value": 1}],
+        "limit": 2
+    })
+    assert response.status_code == 200
+    assert [document["id"] for document in response.json()["documents"]] == [1, 3]
+    assert response.json()["total"] == 3
+    response = client.post("/collection/manticoresearch/search", json={
+        "collection": "collection",
+        "namespace": "test",
+        "query": "hello",
+        "filters": [{"field": "test_field2", "op": "eq", "value": 1}],
+        "limit": 2,
+        "after": response.json()["next"]
+    })
+    assert [document["id"] for document in response.json()["documents"]] == [5]
+    assert response.json()["next"] == None
+    response = client.delete("/collection/manticoresearch/document", json={
+        "collection": "collection",
+        "namespace": "test",
+        "document_id": 1
+    })
+    response = client.post("/collection/manticoresearch/search", json={
+        "collection": "collection",
+        "namespace": "test",
+        "query": "hello",
+        "filters": [{"field": "test_field2", "op": "eq", "value": 1}],
+        "limit": 2
+    })
+    assert [document["id"] for document in response.json()["documents"]] == [3, 5]
+
+def test_get_documents_by_id(wait_for_databases, clean_databases):
+    response = client.post("/collection/manticoresearch", json={
+    "collection": "collection",
+    "namespace": "test",
+    "fields":
+        {
+            "test_field1": {
+                "type": "text",
+                "index": {
+                    "stored": True
+                }
+            },
+            "test_field2": {
+                "type":"int"
+            },
+            "id": {
+                "type":"int"
+            }
+        }
+    })
+    response = client.post("/collection/manticoresearch/documents", json={
+        "collection": "collection",
+        "namespace": "test",
+        "documents": [{"test_field1": "hello world", "test_field2": doc_id % 2, "id": doc_id} for doc_id in range(1, 6)]
+    })
+    response = client.post("/collection/manticoresearch/documents:get", json={
+        "collection": "collection",
+        "namespace": "test",
+        "documents_id": [5, 7, 2],
+        "fields": ["test_field2"]
+    })
+    assert response.status_code == 200
+    assert response.json()["documents"] == [{"id": 5, "test_field2": 1}, None, {"id": 2, "test_field2": 0}]
+    assert response.json()["missing"] == [7]
+    response = client.get("/collection/manticoresearch/documents:get", params={
+        "collection": "collection",
+        "namespace": "test",
+        "documents_id": [3]
+    })
+    assert response.status_code == 200
+    assert response.json()["documents"] == [{"id": 3, "test_field1": "hello world", "test_field2": 1}]
@@ -1,10 +1,12 @@
 from polymanager.schemas.kvrocks_internal_schema import KVRocksInternalSchema
 from polymanager.schemas.manticore.manticoresearch_schema import ManticoreSearchSchema
-from polymanager.schemas.manticore.manticore_collection import ManticoreSearchCollection
+from polymanager.schemas.manticore.manticore_collection import ManticoreSearchCollection, AsyncManticoreSearchCollection
 from polymanager.containers import CoreContainer, RedisContainer, ManticoreContainer
 from polymanager.exceptions.schema_exception import InvalidSchema
+from polymanager.core.manticore.manticore_handler import ManticoreHandler
 from polymanager.helper.conf_helper import load_env
 import pytest
+import asyncio
 
 pytest_plugins = ["docker_compose"]
 
@@ -215,4 +217,53 @@ def test_update_document(wait_for_databases, clean_databases):
     doc_collection.add_document({"test": "test", "test2": "test2", "test3":"2021-01-01 00:00", "id": 0x999})
     doc_collection.update_document({"test": "updated", "test2": "updated", "test3":"2000-01-01 00:00", "id": 0x999})
     res = manticore_handler.query("select test_test3 test3 from {} where match('updated');".format(test_schema.get_collection_name()))
-    assert res["data"][0]["test3"] == 946681200
\ No newline at end of file
+    assert res["data"][0]["test3"] == 946681200
+
+def test_add_documents_split_in_several_bulks(wait_for_databases, clean_databases):
+    manticore_handler = ManticoreHandler(
+        hostname=CoreContainer.config.manticoresearch_hostname(),
+        port=CoreContainer.config.manticoresearch_port(),
+        bulk_max_bytes=256)
+    test_schema = ManticoreSearchSchema("test","collection", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+        })
+
+    internal_schema = KVRocksInternalSchema( "manticoresearch")
+    internal_schema.save_schema(test_schema)
+    documents = [test_schema.get_document_schema({"test": "test", "id": doc_id}) for doc_id in range(1, 101)]
+    res = manticore_handler.bulk_add_documents(test_schema.get_collection_name(), documents)
+    assert list(res.keys()) == list(range(1, 101))
+    assert all(res.values())
+    res = manticore_handler.query("select count(*) from {}".format(test_schema.get_collection_name()))
+    assert res["data"][0]["count(*)"] == 100
+
+def test_async_collection(wait_for_databases, clean_databases):
+    manticore_handler = ManticoreContainer().handler()
+    test_schema = ManticoreSearchSchema("test","collection", {
+            "test": {
+                "type": "text"
+            },
+            "id": {
+                "type": "int"
+            }
+        })
+
+    internal_schema = KVRocksInternalSchema( "manticoresearch")
+    internal_schema.save_schema(test_schema)
+    doc_collection = AsyncManticoreSearchCollection(internal_schema, test_schema.get_collection_name())
+
+    async def run():
+        await doc_collection.add_documents([{"test": "test", "id": doc_id} for doc_id in range(1, 11)])
+        await doc_collection.delete_document(1)
+        await doc_collection.update_document({"test": "updated", "id": 2})
+        return await doc_collection.search_documents(query="updated")
+
+    res = asyncio.run(run())
+    assert res["total"] == 1
+    res = manticore_handler.query("select count(*) from {}".format(test_schema.get_collection_name()))
+    assert res["data"][0]["count(*)"] == 9
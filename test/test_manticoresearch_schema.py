@@ -1,4 +1,6 @@
 from polymanager.schemas.manticore.manticoresearch_schema import ManticoreSearchSchema
+from polymanager.core.manticore.search_cache import SearchCache
+from polymanager.exceptions.schema_exception import InvalidSchema
 import json
 import pytest
 
@@ -74,4 +76,66 @@ class TestManticoreSearchSchema():
         }
         manticore_schema = ManticoreSearchSchema("test", "test", fields, {"min_infix_len": 3})
         req = manticore_schema.generate_schema()
-        assert req == '''mode=raw&query=CREATE TABLE test_test (test_a text indexed,test_b json,test_c timestamp) min_infix_len = \'3\''''
\ No newline at end of file
+        assert req == '''mode=raw&query=CREATE TABLE test_test (test_a text indexed,test_b json,test_c timestamp) min_infix_len = \'3\''''
+
+    def test_search_query(self):
+        fields = {"a": {"type": "text"}, "b": {"type": "int"}, "c": {"type": "timestamp"}, "id": {"type": "int"}}
+        manticore_schema = ManticoreSearchSchema("test", "test", fields)
+        body = manticore_schema.build_search_query(
+            query="hello",
+            match_fields=["a"],
+            filters=[{"field": "b", "op": "in", "value": [1, 2]}, {"field": "b", "op": "ne", "value": 3}],
+            fields=["a"],
+            sort="b",
+            order="desc",
+            limit=10,
+            after=[5, 42])
+        assert body == {
+            "index": "test_test",
+            "limit": 10,
+            "sort": [{"test_b": {"order": "desc"}}, {"id": {"order": "desc"}}],
+            "query": {"bool": {
+                "must": [
+                    {"match": {"test_a": "hello"}},
+                    {"in": {"test_b": [1, 2]}},
+                    {"bool": {"should": [
+                        {"range": {"test_b": {"lt": 5}}},
+                        {"bool": {"must": [{"equals": {"test_b": 5}}, {"range": {"id": {"lt": 42}}}]}}
+                    ]}}
+                ],
+                "must_not": [{"equals": {"test_b": 3}}]
+            }},
+            "_source": ["test_a", "test_b"]
+        }
+        hit = {"_id": "42", "_score": 1, "_source": {"test_a": "hello", "test_b": 4}}
+        assert manticore_schema.get_document_from_hit(hit, ["a"]) == {"id": 42, "a": "hello"}
+        assert manticore_schema.get_search_cursor(hit, "b") == [4, 42]
+
+    def test_invalid_search_query(self):
+        fields = {"a": {"type": "text"}, "b": {"type": "int"}, "id": {"type": "int"}}
+        manticore_schema = ManticoreSearchSchema("test", "test", fields)
+        with pytest.raises(InvalidSchema):
+            manticore_schema.build_search_query(filters=[{"field": "a", "op": "eq", "value": "a"}])
+        with pytest.raises(InvalidSchema):
+            manticore_schema.build_search_query(filters=[{"field": "b", "op": "gt", "value": "1"}])
+        with pytest.raises(InvalidSchema):
+            manticore_schema.build_search_query(query="a", sort="_score", after=[1])
+        with pytest.raises(InvalidSchema):
+            manticore_schema.build_search_query(limit=5000)
+
+    def test_search_cache(self):
+        search_cache = SearchCache(max_size=2, ttl_ms=60000)
+        calls = []
+        def loader():
+            calls.append(1)
+            return {"hits": [], "total": 0}
+        search_cache.fetch("test_test", {"limit": 1}, loader)
+        search_cache.fetch("test_test", {"limit": 1}, loader)
+        assert len(calls) == 1
+        search_cache.invalidate("test_test")
+        search_cache.fetch("test_test", {"limit": 1}, loader)
+        assert len(calls) == 2
+        search_cache.fetch("test_test", {"limit": 2}, loader)
+        search_cache.fetch("test_test", {"limit": 3}, loader)
+        assert search_cache.get_stats()["size"] == 2
+        assert search_cache.get_stats()["hits"] == 1
@@ -0,0 +1,89 @@
+import pytest
+import asyncio
+import gzip
+from polymanager.schemas.ndjson_ingestion import NdjsonIngestion
+from polymanager.helper.ndjson_helper import iter_ndjson_lines
+from polymanager.exceptions.schema_exception import InvalidSchema
+
+
+async def iter_body(body, size):
+    for index in range(0, len(body), size):
+        yield body[index:index + size]
+
+def read_lines(body, size=7, encoding=None, max_line_size=16777216):
+    async def run():
+        return [line async for line in iter_ndjson_lines(iter_body(body, size), encoding, max_line_size)]
+    return asyncio.run(run())
+
+def check_row(row):
+    if not isinstance(row.get("id"), int):
+        raise InvalidSchema("id should be an int")
+    return row
+
+
+class TestNdjsonIngestion:
+
+    def test_read_lines(self):
+        body = b'{"id": 1}\n\n{"id": 2}\r\n  \n{"id": 3}'
+        assert read_lines(body) == [(1, b'{"id": 1}'), (3, b'{"id": 2}\r'), (5, b'{"id": 3}')]
+        assert read_lines(body, size=1) == read_lines(body, size=1000)
+
+    def test_read_gzip_lines(self):
+        body = b"".join(b'{"id": %d}\n' % index for index in range(1000))
+        lines = read_lines(gzip.compress(body), size=100, encoding="gzip")
+        assert len(lines) == 1000
+        assert lines[-1] == (1000, b'{"id": 999}')
+        with pytest.raises(InvalidSchema):
+            read_lines(gzip.compress(body)[:-20], encoding="gzip")
+        with pytest.raises(InvalidSchema):
+            read_lines(body, encoding="gzip")
+        with pytest.raises(InvalidSchema):
+            read_lines(body, encoding="br")
+
+    def test_line_too_long(self):
+        with pytest.raises(InvalidSchema):
+            read_lines(b'{"id": 1}\n{"test": "' + b"a" * 100 + b'"}', max_line_size=50)
+
+    def test_ingestion(self):
+        sent = []
+
+        async def send_rows(rows):
+            sent.append([row["id"] for row in rows])
+            await asyncio.sleep(0)
+            #the rows with an id of 5 are refused by the database
+            return {index: "refused" for index, row in enumerate(rows) if row["id"] == 5}
+
+        body = b"\n".join([b'{"id": %d}' % index for index in range(7)] + [b'{"id": "a"}', b"[1]", b"{", b'{"id": 7}'])
+        ingestion = NdjsonIngestion(check_row, send_rows, chunk_size=3)
+        result = asyncio.run(ingestion.run(iter_ndjson_lines(iter_body(body, 5))))
+        assert sent == [[0, 1, 2], [3, 4, 5], [6, 7]]
+        assert result["status"] == "partial"
+        assert result["lines"] == 11
+        assert result["accepted"] == 7
+        assert result["rejected"] == 4
+        assert [chunk["accepted"] for chunk in result["chunks"]] == [3, 2, 2]
+        assert result["chunks"][1]["rejected"] == [{"line": 6, "error": "refused"}]
+        assert [item["line"] for item in result["chunks"][2]["rejected"]] == [8, 9, 10]
+        assert result["chunks"][2]["first_line"] == 7
+        assert result["chunks"][2]["last_line"] == 11
+
+    def test_summary_fields(self):
+        async def send_rows(rows):
+            return {}, {"nodes_id": ["0x{:x}".format(row["id"]) for row in rows]}
+
+        body = b'{"id": 1}\n{"id": "a"}\n{"id": 2}\n{"id": 3}\n'
+        ingestion = NdjsonIngestion(check_row, send_rows, chunk_size=2)
+        result = asyncio.run(ingestion.run(iter_ndjson_lines(iter_body(body, 4))))
+        assert [chunk["nodes_id"] for chunk in result["chunks"]] == [["0x1", "0x2"], ["0x3"]]
+        assert result["accepted"] == 3
+
+    def test_failed_chunk(self):
+        async def send_rows(rows):
+            raise Exception("database unavailable")
+
+        ingestion = NdjsonIngestion(check_row, send_rows, chunk_size=2)
+        result = asyncio.run(ingestion.run(iter_ndjson_lines(iter_body(b'{"id": 1}\n{"id": 2}\n{"id": 3}\n', 4))))
+        assert result["status"] == "failed"
+        assert result["accepted"] == 0
+        assert [chunk["status"] for chunk in result["chunks"]] == ["failed", "failed"]
+        assert result["chunks"][0]["rejected"][1] == {"line": 2, "error": "database unavailable"}
@@ -0,0 +1,153 @@
+from polymanager.schemas.clickhouse.clickhouse_schema import ClickhouseSchema
+from polymanager.schemas.manticore.manticoresearch_schema import ManticoreSearchSchema
+from pydantic import create_model, StrictStr, StrictInt, StrictFloat
+from datetime import datetime
+from dateutil.parser import parse
+import pytest
+import time
+import os
+
+DOCUMENTS_COUNT = 500
+#the timings depend on the load of the machine, they are only compared when POLYMANAGER_BENCHMARKS=1
+CHECK_TIMINGS = os.environ.get("POLYMANAGER_BENCHMARKS") == "1"
+
+def get_benchmark_schema():
+    fields = {"id": {"type": "int"}}
+    for index in range(10):
+        fields["text{}".format(index)] = {"type": "text"}
+        fields["int{}".format(index)] = {"type": "int"}
+        fields["float{}".format(index)] = {"type": "float"}
+        fields["timestamp{}".format(index)] = {"type": "timestamp"}
+    return ClickhouseSchema("bench", "bench", fields, global_collection_opts={"order_by":["id"]})
+
+def get_benchmark_documents(count):
+    documents = []
+    for doc_id in range(count):
+        document = {"id": doc_id}
+        for index in range(10):
+            document["text{}".format(index)] = "value {}".format(doc_id)
+            document["int{}".format(index)] = doc_id
+            document["float{}".format(index)] = doc_id / 3
+            document["timestamp{}".format(index)] = "2021-05-03T14:56:34Z"
+        documents.append(document)
+    return documents
+
+def check_document_with_dynamic_model(schema, document):
+    #validation as it was done before the models were compiled once per schema
+    attrs_scheme = dict()
+    for key, options in schema.fields.items():
+        if options["type"] == "text":
+            attrs_scheme[key] = (StrictStr, ...)
+        elif options["type"] == "int":
+            attrs_scheme[key] = (StrictInt, ...)
+        elif options["type"] == "float":
+            attrs_scheme[key] = (StrictFloat, ...)
+        elif options["type"] == "timestamp":
+            attrs_scheme[key] = (datetime, ...)
+    document_model = create_model('DynamicNodeModel', **attrs_scheme)
+    document_model.__config__.extra = 'forbid'
+    document_model.__config__.validate_all = True
+    document_model(**document)
+
+def test_benchmark_document_validation():
+    schema = get_benchmark_schema()
+    documents = get_benchmark_documents(DOCUMENTS_COUNT)
+
+    start = time.perf_counter()
+    for document in documents:
+        check_document_with_dynamic_model(schema, document)
+    dynamic_cost = (time.perf_counter() - start) / DOCUMENTS_COUNT
+
+    start = time.perf_counter()
+    for document in documents:
+        schema.check_document_schema(document)
+    compiled_cost = (time.perf_counter() - start) / DOCUMENTS_COUNT
+
+    start = time.perf_counter()
+    schema.check_documents_schema(documents)
+    batch_cost = (time.perf_counter() - start) / DOCUMENTS_COUNT
+
+    print("\nper document validation cost: create_model {:.1f}us, compiled {:.1f}us, batch {:.1f}us".format(
+        dynamic_cost * 1e6, compiled_cost * 1e6, batch_cost * 1e6))
+    if CHECK_TIMINGS:
+        assert compiled_cost < dynamic_cost
+        assert batch_cost < dynamic_cost
+
+def test_compiled_validation_matches_dynamic_model():
+    schema = get_benchmark_schema()
+    valid = get_benchmark_documents(2)
+    invalid = [dict(valid[0], text0=1), dict(valid[0], unknown="a"), {key: value for key, value in valid[0].items() if key != "int0"}]
+    for document in valid:
+        check_document_with_dynamic_model(schema, document)
+        schema.check_document_schema(document)
+    schema.check_documents_schema(valid)
+    for document in invalid:
+        with pytest.raises(Exception):
+            check_document_with_dynamic_model(schema, document)
+        with pytest.raises(Exception):
+            schema.check_document_schema(document)
+        with pytest.raises(Exception):
+            schema.check_documents_schema(valid + [document])
+
+def get_wide_schema(schema_class, types, field_count=50):
+    fields = {"id": {"type": "int"}}
+    for index in range(field_count - 1):
+        fields["field{}".format(index)] = {"type": types[index % len(types)]}
+    return schema_class("bench", "bench", fields, global_collection_opts={"order_by":["id"]})
+
+def get_wide_documents(schema, count):
+    values = {"text": "value", "int": 42, "float": 0.5, "timestamp": "2021-05-03T14:56:34Z"}
+    return [{key: doc_id if key == "id" else values[options["type"]] for key, options in schema.fields.items()} for doc_id in range(count)]
+
+def get_document_schema_per_key(schema, document):
+    #transformation as it was done before the transformers were compiled once per schema
+    new_document = {}
+    for key, value in document.items():
+        field_options = schema.fields[key]
+        new_key = "{}{}{}".format(schema.namespace, schema.namespace_separator, key)
+        new_value = schema.parse_field(field_options["type"], value)
+        if key == "id":
+            new_document["id"] = new_value
+        else:
+            new_document[new_key] = new_value
+    return new_document
+
+def measure_transformation(schema):
+    documents = get_wide_documents(schema, DOCUMENTS_COUNT)
+    assert schema.get_documents_schema(documents) == [get_document_schema_per_key(schema, document) for document in documents]
+
+    start = time.perf_counter()
+    for document in documents:
+        get_document_schema_per_key(schema, document)
+    per_key_rate = DOCUMENTS_COUNT / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    schema.get_documents_schema(documents)
+    compiled_rate = DOCUMENTS_COUNT / (time.perf_counter() - start)
+    return per_key_rate, compiled_rate
+
+def test_benchmark_document_transformation():
+    for types in [["text", "int", "float", "timestamp"], ["text", "int", "float"]]:
+        per_key_rate, compiled_rate = measure_transformation(get_wide_schema(ManticoreSearchSchema, types))
+        print("\n50 fields ({}) transformation: per key {:.0f} rows/s, compiled {:.0f} rows/s".format(
+            ", ".join(types), per_key_rate, compiled_rate))
+    #the timestamps are parsed the same way by both, the gain is measured without them
+    if CHECK_TIMINGS:
+        assert compiled_rate > per_key_rate
+
+def test_benchmark_timestamp_conversion():
+    schema = get_benchmark_schema()
+    values = ["2021-05-03T14:56:{:02d}.{:06d}Z".format(index % 60, index) for index in range(DOCUMENTS_COUNT)]
+
+    start = time.perf_counter()
+    expected = [parse(value).strftime("%Y-%m-%d %H:%M:%S") for value in values]
+    dateutil_rate = DOCUMENTS_COUNT / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    converted = [schema.parse_field("timestamp", value) for value in values]
+    fast_rate = DOCUMENTS_COUNT / (time.perf_counter() - start)
+
+    print("\ntimestamp conversion: dateutil {:.0f} values/s, fast path {:.0f} values/s".format(dateutil_rate, fast_rate))
+    assert converted == expected
+    if CHECK_TIMINGS:
+        assert fast_rate > dateutil_rate
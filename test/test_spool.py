@@ -0,0 +1,183 @@
+import pytest
+import asyncio
+import json
+import os
+import threading
+import time
+from polymanager.core.spool import Spool, SpoolRegistry, SEGMENT_SUFFIX, DEAD_LETTER_FILE, read_records
+from polymanager.exceptions.spool_exception import SpoolFull
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError()
+        time.sleep(0.01)
+
+def list_segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+
+
+class TestSpool():
+
+    def test_replay_in_order(self, tmp_path):
+        replayed = []
+        spool = Spool(str(tmp_path), replayed.append)
+        seqs = [spool.append({"rows": [index]}) for index in range(20)]
+        assert seqs == list(range(1, 21))
+        wait_for(lambda: len(replayed) == 20)
+        spool.close()
+        assert replayed == [{"rows": [index]} for index in range(20)]
+        assert spool.get_stats()["pending"] == 0
+        assert spool.get_stats()["checkpoint"] == 20
+
+    def test_retry_until_replayed(self, tmp_path):
+        replayed = []
+        failures = [Exception("database unavailable")] * 3
+
+        def replay(record):
+            if failures:
+                raise failures.pop()
+            replayed.append(record)
+
+        spool = Spool(str(tmp_path), replay, retry_min_ms=1, retry_max_ms=5)
+        spool.append({"rows": [1]})
+        spool.append({"rows": [2]})
+        wait_for(lambda: len(replayed) == 2)
+        spool.close()
+        assert replayed == [{"rows": [1]}, {"rows": [2]}]
+        assert spool.get_stats()["errors"] == 3
+        assert spool.get_stats()["last_error"] == "database unavailable"
+
+    def test_dead_letter(self, tmp_path):
+        replayed = []
+
+        def replay(record):
+            if record["rows"] == [1]:
+                raise Exception("table dropped")
+            replayed.append(record)
+
+        spool = Spool(str(tmp_path), replay, retry_min_ms=1, retry_max_ms=5, max_attempts=3)
+        spool.append({"rows": [1]})
+        spool.append({"rows": [2]})
+        #the batch that always fails does not block the next one
+        wait_for(lambda: len(replayed) == 1)
+        spool.close()
+        assert spool.get_stats()["errors"] == 3
+        assert spool.get_stats()["dead"] == 1
+        dead = [json.loads(payload) for seq, payload, offset in read_records(os.path.join(str(tmp_path), DEAD_LETTER_FILE))]
+        assert dead == [{"record": {"rows": [1]}, "error": "table dropped"}]
+        #the dead batches are counted again after a restart
+        spool = Spool(str(tmp_path), replay)
+        assert spool.get_stats()["dead"] == 1
+        spool.close()
+
+    def test_refused_batch(self, tmp_path):
+        class Response:
+            status_code = 400
+
+        class RefusedError(Exception):
+            response = Response()
+
+        def replay(record):
+            raise RefusedError("unknown column")
+
+        spool = Spool(str(tmp_path), replay, retry_min_ms=1, retry_max_ms=5)
+        spool.append({"rows": [1]})
+        wait_for(lambda: spool.get_stats()["dead"] == 1)
+        spool.close()
+        #a 4xx error is not retried
+        assert spool.get_stats()["errors"] == 1
+
+    def test_recover_after_restart(self, tmp_path):
+        blocked = threading.Event()
+
+        def replay(record):
+            blocked.wait()
+            raise Exception("database unavailable")
+
+        spool = Spool(str(tmp_path), replay, retry_min_ms=1, retry_max_ms=5, max_attempts=1000000)
+        for index in range(5):
+            spool.append({"rows": [index]})
+        blocked.set()
+        wait_for(lambda: spool.get_stats()["errors"] > 0)
+        spool.close()
+        #a crash in the middle of an append leaves a torn record
+        with open(os.path.join(str(tmp_path), list_segments(str(tmp_path))[-1]), "ab") as segment:
+            segment.write(b"\x00\x00\x00")
+
+        replayed = []
+        spool = Spool(str(tmp_path), replayed.append)
+        assert spool.append({"rows": [5]}) == 6
+        wait_for(lambda: len(replayed) == 6)
+        spool.close()
+        assert replayed == [{"rows": [index]} for index in range(6)]
+
+    def test_release_segments(self, tmp_path):
+        replayed = []
+        spool = Spool(str(tmp_path), replayed.append, segment_bytes=100)
+        for index in range(10):
+            spool.append({"rows": ["a" * 50, index]})
+        wait_for(lambda: len(replayed) == 10)
+        wait_for(lambda: spool.get_stats()["segments"] == 1)
+        spool.close()
+        assert len(list_segments(str(tmp_path))) == 1
+
+    def test_spool_full(self, tmp_path):
+        blocked = threading.Event()
+        spool = Spool(str(tmp_path), lambda record: blocked.wait() and None, segment_bytes=100, max_bytes=300)
+        spool.append({"rows": ["a" * 100]})
+        spool.append({"rows": ["a" * 100]})
+        with pytest.raises(SpoolFull):
+            spool.append({"rows": ["a" * 100]})
+        blocked.set()
+        wait_for(lambda: spool.get_stats()["segments"] == 1)
+        spool.append({"rows": ["a" * 100]})
+        spool.close()
+
+    def test_concurrent_appends(self, tmp_path):
+        replayed = []
+        spool = Spool(str(tmp_path), replayed.append, segment_bytes=1000)
+
+        async def run():
+            return await asyncio.gather(*[spool.append_async({"rows": [index]}) for index in range(50)])
+
+        seqs = asyncio.run(run())
+        assert sorted(seqs) == list(range(1, 51))
+        wait_for(lambda: len(replayed) == 50)
+        spool.close()
+        #the batches are replayed in the order of their sequence numbers
+        assert [record["rows"][0] for record in replayed] == [index for seq, index in sorted(zip(seqs, range(50)))]
+
+    def test_registry(self, tmp_path):
+        replayed = []
+
+        class Handler:
+            def write_deferred_batch(self, record):
+                replayed.append(record)
+
+        registry = SpoolRegistry(str(tmp_path), {"clickhouse": Handler}, ["clickhouse"])
+        assert registry.is_enabled("clickhouse")
+        assert not registry.is_enabled("dgraph")
+        assert not SpoolRegistry(None, {}, ["clickhouse"]).is_enabled("clickhouse")
+        registry.get_spool("clickhouse", "test.test").append({"rows": [1]})
+        wait_for(lambda: len(replayed) == 1)
+        registry.close()
+        assert os.path.isdir(os.path.join(str(tmp_path), "clickhouse", "test.test"))
+        assert list(SpoolRegistry(str(tmp_path), {"clickhouse": Handler}, ["clickhouse"]).get_stats()) == []
+
+    def test_delete_spool(self, tmp_path):
+        blocked = threading.Event()
+
+        class Handler:
+            def write_deferred_batch(self, record):
+                blocked.wait()
+
+        registry = SpoolRegistry(str(tmp_path), {"clickhouse": Handler}, ["clickhouse"])
+        registry.get_spool("clickhouse", "test.test").append({"rows": [1]})
+        blocked.set()
+        registry.delete_spool("clickhouse", "test.test")
+        assert list(registry.get_stats()) == []
+        assert not os.path.exists(os.path.join(str(tmp_path), "clickhouse", "test.test"))
+        registry.close()
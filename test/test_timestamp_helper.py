@@ -0,0 +1,61 @@
+from polymanager.helper.timestamp_helper import parse_timestamp, parse_iso_timestamp
+from polymanager.schemas.clickhouse.clickhouse_schema import ClickhouseSchema
+from polymanager.schemas.manticore.manticoresearch_schema import ManticoreSearchSchema
+from polymanager.schemas.dgraph.dgraph_schema import DGraphSchema
+from dateutil.parser import parse
+from datetime import datetime, timezone
+import pytest
+
+TIMESTAMPS = [
+    "2021-05-03T14:56:34Z",
+    "2021-05-03T14:56:34+00:00",
+    "2021-05-03T14:56:34-00:00",
+    "2021-05-03T14:56:34.123+02:00",
+    "2021-05-03T14:56:34.5Z",
+    "2021-05-03T14:56:34.1234567Z",
+    "2021-05-03T14:56:34-0530",
+    "2021-05-03T14:56:34+05",
+    "2021-05-03 14:56:34",
+    "2021-05-03T14:56",
+    "2021-05-03",
+    "1999-12-31T23:59:59.999999-11:30",
+]
+
+class TestTimestampHelper():
+
+    @pytest.mark.parametrize("value", TIMESTAMPS)
+    def test_iso_timestamp(self, value):
+        parsed = parse_iso_timestamp(value)
+        expected = parse(value)
+        assert parsed.isoformat() == expected.isoformat()
+        assert parsed.strftime("%Y-%m-%d %H:%M:%S") == expected.strftime("%Y-%m-%d %H:%M:%S")
+        assert parsed.timestamp() == expected.timestamp()
+
+    @pytest.mark.parametrize("value", ["2021/01/01", "20210503", "May 3 2021 14:56", "2021-05-03T14:56.5"])
+    def test_exotic_timestamp(self, value):
+        assert parse_iso_timestamp(value) is None
+        assert parse_timestamp(value) == parse(value)
+
+    def test_epoch_timestamp(self):
+        expected = datetime(2021, 5, 3, 14, 56, 34, tzinfo=timezone.utc)
+        assert parse_timestamp(1620053794) == expected
+        assert parse_timestamp(1620053794000) == expected
+        assert parse_timestamp(1620053794.5) == expected.replace(microsecond=500000)
+
+    def test_parsed_timestamp(self):
+        value = datetime(2021, 5, 3, 14, 56, 34)
+        assert parse_timestamp(value) is value
+
+    @pytest.mark.parametrize("value", [value for value in TIMESTAMPS if value != "2021-05-03"])
+    def test_validated_document_schema(self, value):
+        #the value parsed by the validation is reused by the conversion
+        fields = {"a": {"type": "timestamp"}, "id": {"type": "int"}}
+        clickhouse_schema = ClickhouseSchema("test", "test", fields, global_collection_opts={"order_by":["id"]})
+        clickhouse_schema.check_document_schema({"a": value, "id": 1})
+        assert clickhouse_schema.get_document_schema({"a": value, "id": 1}) == {"a": parse(value).strftime("%Y-%m-%d %H:%M:%S"), "id": 1}
+        manticore_schema = ManticoreSearchSchema("test", "test", fields)
+        manticore_schema.check_document_schema({"a": value, "id": 1})
+        assert manticore_schema.get_document_schema({"a": value, "id": 1}) == {"test_a": int(parse(value).timestamp()), "id": 1}
+        dgraph_schema = DGraphSchema("test", "test", fields)
+        dgraph_schema.check_node_schema({"a": value, "id": 1})
+        assert dgraph_schema.get_node_schema({"a": value, "id": 1}) == {"test.a": parse(value).isoformat(), "test.id": 1}